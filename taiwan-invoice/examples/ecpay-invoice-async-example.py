@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+ECPay 綠界電子發票 Python asyncio 範例
+
+適用於月結等大量開立的場景:
+- 共用 aiohttp 連線池 (keep-alive)，避免每張發票都重新 TCP + TLS 握手
+- 可設定的同時請求上限 (Semaphore)
+- 支援: 開立、作廢、折讓、查詢，以及批次併發開立 (iter_issue 串流處理，同時進行的請求數有上限)
+
+資料結構與 AES 加解密沿用 ecpay-invoice-example.py。與同步版的差異在傳輸層:
+- 依 ECPay API 規格以 JSON (Content-Type: application/json) 送出 MerchantID / RqHeader / Data 信封；
+  同步版沿用原本的表單 (application/x-www-form-urlencoded) 送出
+- 連線失敗、逾時、HTTP 錯誤、回應不是 JSON 一律轉為 ConnectionError (同步版只轉換 requests 的例外)
+
+安裝:
+    pip install aiohttp pycryptodome
+
+API 文件: https://developers.ecpay.com.tw
+"""
+
+import asyncio
+import itertools
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+# 傳輸層例外 (注入的 AsyncTransport 在 HTTP/2 模式下丟出 httpx 的例外)；ValueError 為回應不是 JSON
+TRANSPORT_ERRORS: Tuple[type, ...] = (asyncio.TimeoutError, OSError, ValueError)
+if HAS_AIOHTTP:
+    TRANSPORT_ERRORS += (aiohttp.ClientError,)
+if HAS_HTTPX:
+    TRANSPORT_ERRORS += (httpx.HTTPError, httpx.InvalidURL)
+
+# 同步版範例 (檔名含連字號，無法直接 import) 由 scripts/example_loader.py 載入
+_SCRIPTS_DIR = str(Path(__file__).resolve().parent.parent / 'scripts')
+if _SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, _SCRIPTS_DIR)
+from example_loader import load_example  # noqa: E402
+
+_sync = load_example('ecpay-invoice-example')
+ECPayInvoiceService = _sync.ECPayInvoiceService
+InvoiceIssueData = _sync.InvoiceIssueData
+InvoiceVoidData = _sync.InvoiceVoidData
+InvoiceAllowanceData = _sync.InvoiceAllowanceData
+InvoiceIssueResponse = _sync.InvoiceIssueResponse
+
+
+class AsyncECPayInvoiceService(ECPayInvoiceService):
+    """
+    ECPay 綠界電子發票服務 (asyncio 版)
+
+    所有請求共用同一個 aiohttp.ClientSession，連線會被保留並重複使用；
+    max_concurrency 限制同時進行中的請求數，避免瞬間打爆對方或本機檔案描述元。
+
+    建議以 async with 使用，離開時自動關閉連線池:
+
+        async with AsyncECPayInvoiceService(merchant_id, hash_key, hash_iv) as svc:
+            responses = await svc.issue_many(invoices)
+    """
+
+    # API 路徑 (搭配 base_url 使用，例如本機模擬伺服器)
+    ISSUE_PATH = '/B2CInvoice/Issue'
+    VOID_PATH = '/B2CInvoice/Invalid'
+    ALLOWANCE_PATH = '/B2CInvoice/Allowance'
+    ALLOWANCE_VOID_PATH = '/B2CInvoice/AllowanceInvalid'
+    QUERY_PATH = '/B2CInvoice/GetIssue'
+
+    def __init__(self, merchant_id: str, hash_key: str, hash_iv: str, is_test: bool = True,
+                 base_url: Optional[str] = None, max_concurrency: int = 50,
+                 max_connections: int = 100, keepalive_timeout: float = 30.0,
+                 timeout: float = 30.0, transport: Optional[Any] = None):
+        """
+        初始化 ECPay 電子發票服務 (asyncio 版)
+
+        Args:
+            merchant_id: 商店代號
+            hash_key: HashKey (16 bytes)
+            hash_iv: HashIV (16 bytes)
+            is_test: 是否為測試環境
+            base_url: 覆寫 API 主機 (例如 http://127.0.0.1:8080)，None 則依 is_test 決定
+            max_concurrency: 同時進行中的請求上限
+            max_connections: 連線池大小
+            keepalive_timeout: 閒置連線保留秒數
+            timeout: 單一請求逾時秒數
+            transport: 共用的 AsyncTransport (scripts/http_transport.py)，指定時不建立自己的連線池，
+                       連線池參數與逾時以 transport 的設定為準
+        """
+        if not HAS_AIOHTTP:
+            raise ImportError('需要安裝 aiohttp: pip install aiohttp')
+
+        super().__init__(merchant_id, hash_key, hash_iv, is_test)
+
+        if base_url:
+            base_url = base_url.rstrip('/')
+            self.api_url = base_url + self.ISSUE_PATH
+            self.void_url = base_url + self.VOID_PATH
+            self.allowance_url = base_url + self.ALLOWANCE_PATH
+            self.allowance_void_url = base_url + self.ALLOWANCE_VOID_PATH
+            self.query_url = base_url + self.QUERY_PATH
+
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.transport = transport
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: Optional['aiohttp.ClientSession'] = None
+
+    async def __aenter__(self) -> 'AsyncECPayInvoiceService':
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """建立連線池 (重複呼叫不會建立新的 session；使用共用 transport 時不需建立)"""
+        if self.transport is not None:
+            return
+        if self._session is not None and not self._session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_connections,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={'Content-Type': 'application/json'},
+        )
+
+    async def close(self):
+        """關閉連線池 (共用的 transport 由建立者關閉)"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _post(self, url: str, api_data: Dict[str, any]) -> Dict[str, any]:
+        """
+        加密並送出請求，回傳 API 原始回應 (外層 JSON)
+
+        以 JSON 送出信封 (同步版為表單)，模擬伺服器與 ECPay 皆接受 JSON。
+
+        Raises:
+            ConnectionError: API 連線失敗、逾時、HTTP 錯誤或回應不是 JSON
+        """
+        if self._session is None and self.transport is None:
+            await self.open()
+
+        json_string = json.dumps(api_data, ensure_ascii=False)
+        payload = {
+            'MerchantID': api_data.get('MerchantID', self.merchant_id),
+            'RqHeader': {'Timestamp': int(time.time())},
+            'Data': self._encrypt_aes(json_string),
+        }
+
+        async with self._semaphore:
+            try:
+                if self.transport is not None:
+                    response = await self.transport.post(url, json=payload)
+                    response.raise_for_status()
+                    return response.json()
+
+                async with self._session.post(url, json=payload) as response:
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+            except ConnectionError:
+                raise
+            except TRANSPORT_ERRORS as e:
+                raise ConnectionError(f'API 連線失敗: {e!r}') from e
+
+    def _decrypt_result(self, result: Dict[str, any]) -> Dict[str, any]:
+        """解密回應中的 Data 欄位 (沒有 Data 時回傳原始回應)"""
+        if 'Data' in result:
+            return self._decrypt_aes(result['Data'])
+        return result
+
+    async def issue_invoice(self, data: InvoiceIssueData) -> InvoiceIssueResponse:
+        """
+        開立電子發票
+
+        Args:
+            data: 發票開立資料
+
+        Returns:
+            發票開立回應
+
+        Raises:
+            ValueError: 資料驗證失敗
+            ConnectionError: API 連線失敗
+        """
+        api_data = self._build_issue_payload(data)
+        result = await self._post(self.api_url, api_data)
+        return self._parse_issue_response(result)
+
+    async def void_invoice(self, data: InvoiceVoidData, reason: str = '訂單取消') -> Dict[str, any]:
+        """
+        作廢電子發票
+
+        Args:
+            data: 發票作廢資料
+            reason: 作廢原因
+
+        Returns:
+            作廢結果
+        """
+        api_data = self._build_void_payload(data, reason)
+        return self._decrypt_result(await self._post(self.void_url, api_data))
+
+    async def issue_allowance(self, data: InvoiceAllowanceData) -> Dict[str, any]:
+        """
+        開立折讓證明單
+
+        Args:
+            data: 折讓資料
+
+        Returns:
+            折讓結果
+        """
+        api_data = self._build_allowance_payload(data)
+        return self._decrypt_result(await self._post(self.allowance_url, api_data))
+
+    async def query_invoice(self, relate_number: str) -> Dict[str, any]:
+        """
+        以廠商自訂編號查詢發票
+
+        Args:
+            relate_number: 訂單編號 (開立時的 RelateNumber)
+
+        Returns:
+            查詢結果
+        """
+        api_data = self._build_query_payload(relate_number)
+        return self._decrypt_result(await self._post(self.query_url, api_data))
+
+    async def iter_issue(self, invoices: Iterable[InvoiceIssueData], return_exceptions: bool = True
+                         ) -> AsyncIterator[Tuple[int, InvoiceIssueData, Union[InvoiceIssueResponse, Exception]]]:
+        """
+        串流併發開立: 最多 max_concurrency 張同時進行，完成一張才從 invoices 取下一張
+
+        invoices 可以是 generator (例如逐行讀取訂單檔)，記憶體用量與發票總數無關。
+
+        Args:
+            invoices: 發票開立資料
+            return_exceptions: True 時單張失敗以例外物件回傳，不中斷其他發票
+
+        Yields:
+            (輸入順序, 發票資料, 回應或例外)，依完成順序
+        """
+        source = enumerate(invoices)
+        pending: Dict[asyncio.Task, Tuple[int, InvoiceIssueData]] = {}
+        try:
+            while True:
+                for index, data in itertools.islice(source, self.max_concurrency - len(pending)):
+                    pending[asyncio.ensure_future(self.issue_invoice(data))] = (index, data)
+                if not pending:
+                    return
+
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index, data = pending.pop(task)
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        if not return_exceptions:
+                            raise
+                        response = e
+                    yield index, data, response
+        finally:
+            # 呼叫端中途停止或發生例外時，取消尚未完成的請求
+            for task in pending:
+                task.cancel()
+
+    async def issue_many(self, invoices: Iterable[InvoiceIssueData],
+                         return_exceptions: bool = True) -> List[Union[InvoiceIssueResponse, Exception]]:
+        """
+        併發開立多張發票 (同時進行的請求數受 max_concurrency 限制)
+
+        以 iter_issue 逐批取用 invoices，不會一次建立所有請求；
+        發票數量很大時請直接使用 iter_issue，結果不需全部留在記憶體。
+
+        Args:
+            invoices: 發票開立資料
+            return_exceptions: True 時單張失敗以例外物件放在結果中，不中斷其他發票
+
+        Returns:
+            與輸入順序相同的回應清單
+        """
+        responses: List[Union[InvoiceIssueResponse, Exception]] = []
+        async for index, _, response in self.iter_issue(invoices, return_exceptions):
+            if index >= len(responses):
+                responses.extend([None] * (index + 1 - len(responses)))
+            responses[index] = response
+        return responses
+
+
+# ============================================================================
+# 使用範例
+# ============================================================================
+
+async def example_concurrent_issue():
+    """範例: 併發開立多張 B2C 發票"""
+    print("=== B2C 發票併發開立範例 ===\n")
+
+    invoices = [
+        InvoiceIssueData(
+            merchant_id=ECPayInvoiceService.TEST_MERCHANT_ID,
+            relate_number=f'ORD{int(time.time())}{i:04d}',
+            customer_identifier='0000000000',
+            customer_name='王小明',
+            customer_addr='台北市信義區信義路五段7號',
+            customer_phone='0912345678',
+            customer_email='test@example.com',
+            sales_amount=1050,
+            total_amount=1050,
+            items=[
+                {
+                    'ItemName': '測試商品A',
+                    'ItemCount': 1,
+                    'ItemWord': '個',
+                    'ItemPrice': 1050,
+                    'ItemTaxType': '1',
+                    'ItemAmount': 1050
+                }
+            ]
+        )
+        for i in range(10)
+    ]
+
+    async with AsyncECPayInvoiceService(
+        merchant_id=ECPayInvoiceService.TEST_MERCHANT_ID,
+        hash_key=ECPayInvoiceService.TEST_HASH_KEY,
+        hash_iv=ECPayInvoiceService.TEST_HASH_IV,
+        is_test=True,
+        max_concurrency=5
+    ) as service:
+        started = time.perf_counter()
+        responses = await service.issue_many(invoices)
+        elapsed = time.perf_counter() - started
+
+    for data, response in zip(invoices, responses):
+        if isinstance(response, Exception):
+            print(f"✗ {data.relate_number}: {response}")
+        elif response.success:
+            print(f"✓ {data.relate_number}: {response.invoice_number}")
+        else:
+            print(f"✗ {data.relate_number}: {response.error_message}")
+
+    print(f"\n共 {len(invoices)} 張，耗時 {elapsed:.2f} 秒")
+
+
+if __name__ == '__main__':
+    asyncio.run(example_concurrent_issue())
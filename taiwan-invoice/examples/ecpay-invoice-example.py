@@ -15,12 +15,25 @@ import base64
 import time
 import requests
 from datetime import datetime
-from typing import Dict, Literal, Optional, List
+from typing import Any, Dict, Literal, Optional, List
 from dataclasses import dataclass, field
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
 
 
+def is_valid_ubn(identifier: str) -> bool:
+    """
+    統一編號檢查碼驗證 (權數 1,2,1,2,1,2,4,1，各乘積位數和可被 5 整除)
+
+    載具、捐贈碼與批次驗證見 scripts/invoice_validator.py
+    """
+    if len(identifier) != 8 or not identifier.isdigit():
+        return False
+    products = (int(d) * w for d, w in zip(identifier, (1, 2, 1, 2, 1, 2, 4, 1)))
+    total = sum(p // 10 + p % 10 for p in products)
+    return total % 5 == 0 or (identifier[6] == '7' and (total + 1) % 5 == 0)
+
+
 @dataclass
 class InvoiceIssueData:
     """ECPay 發票開立資料"""
@@ -36,6 +49,8 @@ class InvoiceIssueData:
     tax_rate: int = 5  # 稅率 (預設5%)
     tax_amount: int = 0  # 稅額 (B2B 必填)
     total_amount: int = 0  # 總計 (含稅)
+    zero_tax_sales_amount: int = 0  # 零稅率銷售額 (B2B 混合課稅 TaxType=9；B2C 為 0)
+    free_tax_sales_amount: int = 0  # 免稅銷售額 (B2B 混合課稅 TaxType=9；B2C 為 0)
     carrier_type: Optional[Literal['', '1', '2', '3']] = ''  # 載具類型 (B2B不可使用)
     carrier_num: Optional[str] = ''  # 載具號碼
     donation: Literal['0', '1'] = '0'  # 是否捐贈
@@ -62,8 +77,8 @@ class InvoiceAllowanceData:
     merchant_id: str
     invoice_no: str  # 發票號碼
     invoice_date: str  # 發票開立日期 (YYYY-MM-DD)
-    allowance_notify: Literal['E', 'S', 'N', 'A'] = 'E'  # E=Email, S=簡訊, N=不通知, A=Email+簡訊
     customer_name: str
+    allowance_notify: Literal['E', 'S', 'N', 'A'] = 'E'  # E=Email, S=簡訊, N=不通知, A=Email+簡訊
     notify_mail: Optional[str] = ''
     notify_phone: Optional[str] = ''
     allowance_amount: int = 0  # 折讓金額
@@ -125,7 +140,8 @@ class ECPayInvoiceService:
     PROD_ALLOWANCE_VOID_URL = 'https://einvoice.ecpay.com.tw/B2CInvoice/AllowanceInvalid'
     PROD_QUERY_URL = 'https://einvoice.ecpay.com.tw/B2CInvoice/GetIssue'
 
-    def __init__(self, merchant_id: str, hash_key: str, hash_iv: str, is_test: bool = True):
+    def __init__(self, merchant_id: str, hash_key: str, hash_iv: str, is_test: bool = True,
+                 transport: Optional[Any] = None):
         """
         初始化 ECPay 電子發票服務
 
@@ -134,11 +150,13 @@ class ECPayInvoiceService:
             hash_key: HashKey (16 bytes)
             hash_iv: HashIV (16 bytes)
             is_test: 是否為測試環境
+            transport: 共用的 HTTP transport (scripts/http_transport.py 的 SyncTransport)，未指定時使用 requests
         """
         self.merchant_id = merchant_id
         self.hash_key = hash_key.encode('utf-8')
         self.hash_iv = hash_iv.encode('utf-8')
         self.is_test = is_test
+        self.transport = transport or requests
 
         # 設定 API URL
         if is_test:
@@ -211,7 +229,9 @@ class ECPayInvoiceService:
             >>> svc.calculate_b2b_amounts(1050)
             {'sales_amount': 1000, 'tax_amount': 50, 'total_amount': 1050}
         """
-        tax_amount = round(total_amount - (total_amount / 1.05))
+        # round(total_amount - total_amount / 1.05) = round(total_amount / 21)，以整數運算避免浮點誤差
+        # (稅率由 data/tax-rules.csv 讀取的版本見 scripts/tax_calculator.py)
+        tax_amount = (total_amount * 2 + 21) // 42
         sales_amount = total_amount - tax_amount
 
         return {
@@ -220,50 +240,24 @@ class ECPayInvoiceService:
             'total_amount': total_amount
         }
 
-    def issue_invoice(self, data: InvoiceIssueData) -> InvoiceIssueResponse:
+    def _build_issue_payload(self, data: InvoiceIssueData) -> Dict[str, any]:
         """
-        開立電子發票
-
-        Args:
-            data: 發票開立資料
-
-        Returns:
-            發票開立回應
+        驗證並組出開立發票的 Data 內容 (加密前)
 
         Raises:
             ValueError: 資料驗證失敗
-            ConnectionError: API 連線失敗
-
-        Example:
-            >>> # B2C 二聯式發票
-            >>> data = InvoiceIssueData(
-            ...     merchant_id='2000132',
-            ...     relate_number='ORD20240129001',
-            ...     customer_identifier='0000000000',
-            ...     customer_name='王小明',
-            ...     customer_addr='台北市信義區',
-            ...     customer_phone='0912345678',
-            ...     customer_email='test@example.com',
-            ...     sales_amount=1050,
-            ...     total_amount=1050,
-            ...     items=[
-            ...         {'ItemName': '商品A', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': 1000, 'ItemAmount': 1050}
-            ...     ]
-            ... )
-            >>> response = svc.issue_invoice(data)
         """
         # 驗證資料
         if data.customer_identifier != '0000000000':
             # B2B 三聯式
-            if len(data.customer_identifier) != 8:
-                raise ValueError('B2B 發票統編必須為 8 碼')
+            if not is_valid_ubn(data.customer_identifier):
+                raise ValueError('B2B 發票統編必須為 8 碼且檢查碼正確')
             if data.carrier_type or data.love_code:
                 raise ValueError('B2B 發票不可使用載具或捐贈')
             if data.tax_amount == 0:
                 raise ValueError('B2B 發票必須計算稅額')
 
-        # 準備 API 資料
-        api_data = {
+        payload = {
             'MerchantID': data.merchant_id,
             'RelateNumber': data.relate_number,
             'CustomerID': '',
@@ -286,6 +280,108 @@ class ECPayInvoiceService:
             'InvoiceRemark': data.remark,
             'TimeStamp': int(time.time())
         }
+        if data.tax_type == '9' and data.customer_identifier != '0000000000':
+            # B2B 混合課稅: 零稅率 / 免稅品項不計入 SalesAmount (B2C 的 SalesAmount 為全部品項含稅合計)
+            payload['ZeroTaxSalesAmount'] = data.zero_tax_sales_amount
+            payload['FreeTaxSalesAmount'] = data.free_tax_sales_amount
+        return payload
+
+    def _build_void_payload(self, data: InvoiceVoidData, reason: str) -> Dict[str, any]:
+        """組出作廢發票的 Data 內容 (加密前)"""
+        return {
+            'MerchantID': data.merchant_id,
+            'InvoiceNo': data.invoice_no,
+            'InvoiceDate': data.invoice_date,
+            'Reason': reason,
+            'TimeStamp': int(time.time())
+        }
+
+    def _build_allowance_payload(self, data: InvoiceAllowanceData) -> Dict[str, any]:
+        """組出開立折讓的 Data 內容 (加密前)"""
+        return {
+            'MerchantID': data.merchant_id,
+            'InvoiceNo': data.invoice_no,
+            'InvoiceDate': data.invoice_date,
+            'AllowanceNotify': data.allowance_notify,
+            'CustomerName': data.customer_name,
+            'NotifyMail': data.notify_mail,
+            'NotifyPhone': data.notify_phone,
+            'AllowanceAmount': data.allowance_amount,
+            'Items': data.items,
+            'TimeStamp': int(time.time())
+        }
+
+    def _build_query_payload(self, relate_number: str) -> Dict[str, any]:
+        """組出查詢發票的 Data 內容 (加密前)"""
+        return {
+            'MerchantID': self.merchant_id,
+            'RelateNumber': relate_number,
+            'TimeStamp': int(time.time())
+        }
+
+    def _parse_issue_response(self, result: Dict[str, any]) -> InvoiceIssueResponse:
+        """解析開立發票的 API 回應"""
+        if 'Data' in result:
+            decrypted = self._decrypt_aes(result['Data'])
+
+            if decrypted.get('RtnCode') == 1:
+                return InvoiceIssueResponse(
+                    success=True,
+                    invoice_number=decrypted.get('InvoiceNo', ''),
+                    invoice_date=decrypted.get('InvoiceDate', ''),
+                    random_number=decrypted.get('RandomNumber', ''),
+                    rtn_code=decrypted.get('RtnCode', 0),
+                    rtn_msg=decrypted.get('RtnMsg', ''),
+                    raw=decrypted
+                )
+            else:
+                return InvoiceIssueResponse(
+                    success=False,
+                    rtn_code=decrypted.get('RtnCode', 0),
+                    rtn_msg=decrypted.get('RtnMsg', ''),
+                    error_message=f"發票開立失敗: {decrypted.get('RtnMsg', '未知錯誤')}",
+                    raw=decrypted
+                )
+        else:
+            return InvoiceIssueResponse(
+                success=False,
+                error_message='API 回應格式錯誤',
+                raw=result
+            )
+
+    def issue_invoice(self, data: InvoiceIssueData) -> InvoiceIssueResponse:
+        """
+        開立電子發票
+
+        Args:
+            data: 發票開立資料
+
+        Returns:
+            發票開立回應
+
+        Raises:
+            ValueError: 資料驗證失敗
+            ConnectionError: API 連線失敗
+
+        Example:
+            >>> # B2C 二聯式發票
+            >>> data = InvoiceIssueData(
+            ...     merchant_id='2000132',
+            ...     relate_number='ORD20240129001',
+            ...     customer_identifier='0000000000',
+            ...     customer_name='王小明',
+            ...     customer_addr='台北市信義區',
+            ...     customer_phone='0912345678',
+            ...     customer_email='test@example.com',
+            ...     sales_amount=1050,
+            ...     total_amount=1050,
+            ...     items=[
+            ...         {'ItemName': '商品A', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': 1000, 'ItemAmount': 1050}
+            ...     ]
+            ... )
+            >>> response = svc.issue_invoice(data)
+        """
+        api_data = self._build_issue_payload(data)
 
         # 加密資料
         json_string = json.dumps(api_data, ensure_ascii=False)
@@ -293,7 +389,7 @@ class ECPayInvoiceService:
 
         # 發送請求
         try:
-            response = requests.post(
+            response = self.transport.post(
                 self.api_url,
                 data={'MerchantID': data.merchant_id, 'RqHeader': {'Timestamp': int(time.time())}, 'Data': encrypted_data},
                 headers={'Content-Type': 'application/x-www-form-urlencoded'},
@@ -304,33 +400,7 @@ class ECPayInvoiceService:
             # 解析回應
             result = response.json()
 
-            if 'Data' in result:
-                decrypted = self._decrypt_aes(result['Data'])
-
-                if decrypted.get('RtnCode') == 1:
-                    return InvoiceIssueResponse(
-                        success=True,
-                        invoice_number=decrypted.get('InvoiceNo', ''),
-                        invoice_date=decrypted.get('InvoiceDate', ''),
-                        random_number=decrypted.get('RandomNumber', ''),
-                        rtn_code=decrypted.get('RtnCode', 0),
-                        rtn_msg=decrypted.get('RtnMsg', ''),
-                        raw=decrypted
-                    )
-                else:
-                    return InvoiceIssueResponse(
-                        success=False,
-                        rtn_code=decrypted.get('RtnCode', 0),
-                        rtn_msg=decrypted.get('RtnMsg', ''),
-                        error_message=f"發票開立失敗: {decrypted.get('RtnMsg', '未知錯誤')}",
-                        raw=decrypted
-                    )
-            else:
-                return InvoiceIssueResponse(
-                    success=False,
-                    error_message='API 回應格式錯誤',
-                    raw=result
-                )
+            return self._parse_issue_response(result)
 
         except requests.exceptions.RequestException as e:
             raise ConnectionError(f'API 連線失敗: {str(e)}')
@@ -355,19 +425,13 @@ class ECPayInvoiceService:
             ... )
             >>> result = svc.void_invoice(void_data)
         """
-        api_data = {
-            'MerchantID': data.merchant_id,
-            'InvoiceNo': data.invoice_no,
-            'InvoiceDate': data.invoice_date,
-            'Reason': reason,
-            'TimeStamp': int(time.time())
-        }
+        api_data = self._build_void_payload(data, reason)
 
         json_string = json.dumps(api_data, ensure_ascii=False)
         encrypted_data = self._encrypt_aes(json_string)
 
         try:
-            response = requests.post(
+            response = self.transport.post(
                 self.void_url,
                 data={'MerchantID': data.merchant_id, 'RqHeader': {'Timestamp': int(time.time())}, 'Data': encrypted_data},
                 headers={'Content-Type': 'application/x-www-form-urlencoded'},
@@ -409,24 +473,13 @@ class ECPayInvoiceService:
             ... )
             >>> result = svc.issue_allowance(allowance_data)
         """
-        api_data = {
-            'MerchantID': data.merchant_id,
-            'InvoiceNo': data.invoice_no,
-            'InvoiceDate': data.invoice_date,
-            'AllowanceNotify': data.allowance_notify,
-            'CustomerName': data.customer_name,
-            'NotifyMail': data.notify_mail,
-            'NotifyPhone': data.notify_phone,
-            'AllowanceAmount': data.allowance_amount,
-            'Items': data.items,
-            'TimeStamp': int(time.time())
-        }
+        api_data = self._build_allowance_payload(data)
 
         json_string = json.dumps(api_data, ensure_ascii=False)
         encrypted_data = self._encrypt_aes(json_string)
 
         try:
-            response = requests.post(
+            response = self.transport.post(
                 self.allowance_url,
                 data={'MerchantID': data.merchant_id, 'RqHeader': {'Timestamp': int(time.time())}, 'Data': encrypted_data},
                 headers={'Content-Type': 'application/x-www-form-urlencoded'},
@@ -0,0 +1,649 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - 大量發票開立管線
+
+從 CSV / JSONL 訂單匯出檔串流讀取訂單，驗證並計算金額後，
+由固定數量的 worker 併發送出 (每個商店代號各自一個 token bucket 限速)，
+每筆結果寫入 append-only 的 checkpoint 檔，重新執行時自動略過已開立的訂單。
+無法解析的 JSONL 行與資料錯誤的訂單記錄為 invalid 後繼續處理，
+只要有訂單未開立 (invalid / rejected / failed)，CLI 即以非零結束碼退出。
+
+- 資料結構: 沿用 examples/ecpay-invoice-example.py 的 InvoiceIssueData
+- 傳輸: examples/ecpay-invoice-async-example.py 的連線池 client
+- 重試判斷: error_handler.InvoiceErrorHandler 的錯誤分類
+
+訂單欄位 (CSV 表頭 / JSONL key):
+    relate_number       訂單編號 (必填，唯一)
+    total_amount        含稅總額 (必填)
+    customer_identifier 買受人統編 (預設 0000000000 = B2C)
+    customer_name / customer_addr / customer_phone / customer_email
+    carrier_type / carrier_num / donation / love_code / print / remark
+    merchant_id         商店代號 (多商店時使用，預設為 --merchant-id)
+    items               商品明細 (JSONL 為陣列，CSV 為 JSON 字串；
+                        未提供時以 item_name 或「商品」產生單一品項；
+                        品項未提供 ItemAmount 時由 invoice_items 依數量與單價計算並分配尾差)
+
+用法:
+    python bulk_issue.py orders.csv
+    python bulk_issue.py orders.jsonl --workers 50 --rate 20 --checkpoint issued.log
+    python bulk_issue.py orders.csv --base-url http://127.0.0.1:8080   # 本機模擬伺服器
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple
+
+from ecpay_crypto import get_cipher
+from error_handler import InvoiceErrorHandler
+from example_loader import load_example
+from invoice_items import ItemAggregator
+from invoice_validator import is_valid_ubn, validate_issue_data
+from presubmit import PresubmitChecker
+
+async_example = load_example('ecpay-invoice-async-example')
+AsyncECPayInvoiceService = async_example.AsyncECPayInvoiceService
+ECPayInvoiceService = async_example.ECPayInvoiceService
+InvoiceIssueData = async_example.InvoiceIssueData
+
+B2C_IDENTIFIER = '0000000000'
+
+# RelateNumber 重複: 上次執行已開立但 checkpoint 未寫入 (例如程式中斷)
+RTN_DUPLICATE_RELATE_NUMBER = 10000006
+
+
+# ============================================================================
+# 訂單讀取與驗證
+# ============================================================================
+
+def read_orders(path: Path, on_error: Optional[Callable[[int, str], None]] = None) -> Iterator[Dict]:
+    """
+    串流讀取訂單 (依副檔名判斷 CSV 或 JSONL)
+
+    Args:
+        path: 訂單檔案路徑
+        on_error: JSONL 某行無法解析時呼叫 on_error(行號, 錯誤訊息) 並略過該行；
+                  未指定時丟出 ValueError
+
+    Yields:
+        訂單 dict
+
+    Raises:
+        ValueError: JSONL 格式錯誤 (未指定 on_error)
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.suffix.lower() in ('.jsonl', '.ndjson'):
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    order = json.loads(line)
+                except ValueError as e:
+                    error = f'第 {line_no} 行 JSON 格式錯誤: {e}'
+                else:
+                    if isinstance(order, dict):
+                        yield order
+                        continue
+                    error = f'第 {line_no} 行不是 JSON 物件'
+                if on_error is None:
+                    raise ValueError(error)
+                on_error(line_no, error)
+        else:
+            yield from csv.DictReader(f)
+
+
+def build_invoice(order: Dict, merchant_id: str, service: ECPayInvoiceService) -> InvoiceIssueData:
+    """
+    驗證訂單並計算發票金額
+
+    B2C 金額為含稅價；B2B (8 碼統編) 依 5% 稅率拆分未稅金額與稅額。
+    買受人、載具與捐贈欄位由 invoice_validator 驗證。
+
+    Raises:
+        ValueError: 訂單資料不完整或金額錯誤
+    """
+    relate_number = str(order.get('relate_number') or '').strip()
+    if not relate_number:
+        raise ValueError('缺少 relate_number')
+    if len(relate_number) > 30:
+        raise ValueError(f'relate_number 超過 30 字元: {relate_number}')
+
+    try:
+        total_amount = int(order.get('total_amount') or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"total_amount 必須為整數: {order.get('total_amount')}")
+    if total_amount <= 0:
+        raise ValueError(f'total_amount 必須大於 0: {total_amount}')
+
+    identifier = str(order.get('customer_identifier') or B2C_IDENTIFIER).strip()
+    is_b2b = identifier != B2C_IDENTIFIER
+    if is_b2b and not is_valid_ubn(identifier):
+        raise ValueError(f'統編格式或檢查碼錯誤: {identifier}')
+
+    if is_b2b:
+        amounts = service.calculate_b2b_amounts(total_amount)
+    else:
+        amounts = {'sales_amount': total_amount, 'tax_amount': 0, 'total_amount': total_amount}
+    amounts.update(zero_tax_sales_amount=0, free_tax_sales_amount=0)
+
+    items = order.get('items')
+    if isinstance(items, str):
+        items = json.loads(items) if items.strip() else None
+    tax_type = '1'
+    if items and any('ItemAmount' not in item for item in items):
+        # 只有數量與單價 (含稅): 計算小計、B2B 稅額並分配四捨五入尾差
+        aggregated = ItemAggregator().aggregate(items, b2b=is_b2b)
+        if aggregated.total_amount != total_amount:
+            raise ValueError(f'商品明細合計 {aggregated.total_amount} 與 total_amount {total_amount} 不符')
+        # B2B 混合課稅: 零稅率 / 免稅品項另列 ZeroTaxSalesAmount / FreeTaxSalesAmount，不計入 SalesAmount；
+        # B2C 的 SalesAmount 為全部品項含稅合計
+        amounts = {'sales_amount': aggregated.to_ecpay()['SalesAmount'], 'tax_amount': aggregated.tax_amount,
+                   'total_amount': aggregated.total_amount,
+                   'zero_tax_sales_amount': aggregated.zero_tax_sales_amount if is_b2b else 0,
+                   'free_tax_sales_amount': aggregated.free_tax_sales_amount if is_b2b else 0}
+        items, tax_type = aggregated.ecpay_items(), aggregated.tax_type
+    elif not items:
+        items = [{
+            'ItemName': order.get('item_name') or '商品',
+            'ItemCount': 1,
+            'ItemWord': order.get('item_word') or '式',
+            'ItemPrice': amounts['sales_amount'],
+            'ItemTaxType': '1',
+            'ItemAmount': amounts['sales_amount'],
+        }]
+
+    item_total = sum(int(item.get('ItemAmount', 0)) for item in items)
+    sales_total = amounts['sales_amount'] + amounts['zero_tax_sales_amount'] + amounts['free_tax_sales_amount']
+    if item_total != sales_total:
+        raise ValueError(f"商品小計合計 {item_total} 與銷售額 {sales_total} 不符")
+
+    invoice = InvoiceIssueData(
+        merchant_id=merchant_id,
+        relate_number=relate_number,
+        customer_identifier=identifier,
+        customer_name=order.get('customer_name') or '',
+        customer_addr=order.get('customer_addr') or '',
+        customer_phone=order.get('customer_phone') or '',
+        customer_email=order.get('customer_email') or '',
+        sales_amount=amounts['sales_amount'],
+        tax_type=tax_type,
+        tax_amount=amounts['tax_amount'],
+        total_amount=amounts['total_amount'],
+        zero_tax_sales_amount=amounts['zero_tax_sales_amount'],
+        free_tax_sales_amount=amounts['free_tax_sales_amount'],
+        carrier_type=order.get('carrier_type') or '',
+        carrier_num=order.get('carrier_num') or '',
+        donation=str(order.get('donation') or '0'),
+        love_code=order.get('love_code') or '',
+        print=str(order.get('print') or '0'),
+        items=items,
+        remark=order.get('remark') or '',
+    )
+    # 載具、捐贈碼、列印等欄位組合在本機先擋下，不浪費一次 API 往返
+    errors = validate_issue_data(invoice)
+    if errors:
+        raise ValueError('; '.join(errors))
+    return invoice
+
+
+# ============================================================================
+# 限速與 checkpoint
+# ============================================================================
+
+class TokenBucket:
+    """
+    Token bucket 限速器 (asyncio)
+
+    每秒補充 rate 個 token，最多累積 capacity 個；
+    acquire() 在 token 不足時等待，等待者依呼叫順序取得 token。
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError('rate 必須大於 0')
+
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """取得一個 token"""
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class CheckpointLog:
+    """
+    Append-only checkpoint 檔 (JSONL，一行一筆結果)
+
+    開啟時讀回既有紀錄，status 為 issued 的 (merchant_id, relate_number)
+    視為已完成；中斷時寫到一半的最後一行會被忽略。
+    """
+
+    def __init__(self, path: Path, fsync: bool = False):
+        """
+        Args:
+            path: checkpoint 檔案路徑
+            fsync: 每筆寫入後 fsync (較慢，但主機斷電也不會遺失紀錄)
+        """
+        self.path = Path(path)
+        self.fsync = fsync
+        self.completed: Set[Tuple[str, str]] = set()
+        self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+        # 中斷時最後一行可能沒寫完，補上換行避免下一筆接在殘行後面
+        if self.path.stat().st_size and not self._ends_with_newline():
+            self._file.write('\n')
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _load(self):
+        if not self.path.exists():
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('status') == 'issued':
+                    self.completed.add((record.get('merchant_id', ''), record.get('relate_number', '')))
+
+    def is_completed(self, merchant_id: str, relate_number: str) -> bool:
+        """訂單是否已開立"""
+        return (merchant_id, relate_number) in self.completed
+
+    def record(self, merchant_id: str, relate_number: str, status: str, **fields):
+        """寫入一筆結果"""
+        entry = {
+            'merchant_id': merchant_id,
+            'relate_number': relate_number,
+            'status': status,
+            'ts': int(time.time()),
+            **fields,
+        }
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+        if status == 'issued':
+            self.completed.add((merchant_id, relate_number))
+
+    def close(self):
+        self._file.close()
+
+
+# ============================================================================
+# 開立管線
+# ============================================================================
+
+class PipelineInvoiceService(AsyncECPayInvoiceService):
+    """改用依商店快取的 ECPayInvoiceCipher 加解密 (大量開立時 CPU 主要耗在加解密)"""
+
+    def __init__(self, merchant_id: str, hash_key: str, hash_iv: str, **kwargs):
+        super().__init__(merchant_id, hash_key, hash_iv, **kwargs)
+        self.cipher = get_cipher(hash_key, hash_iv)
+
+    def _encrypt_aes(self, data: str) -> str:
+        return self.cipher.encrypt_text(data)
+
+    def _decrypt_aes(self, encrypted_data: str) -> Dict:
+        return self.cipher.decrypt(encrypted_data)
+
+
+@dataclass
+class BulkIssueResult:
+    """執行結果統計"""
+    issued: int = 0  # 本次開立成功
+    recovered: int = 0  # 上次已開立但未記錄，查詢後補記
+    skipped: int = 0  # checkpoint 已記錄為開立成功
+    invalid: int = 0  # 訂單資料驗證失敗
+    rejected: int = 0  # API 回傳不可重試的錯誤
+    failed: int = 0  # 重試後仍失敗
+    retries: int = 0
+    elapsed: float = 0.0
+    errors: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def processed(self) -> int:
+        return self.issued + self.recovered + self.invalid + self.rejected + self.failed
+
+    @property
+    def ok(self) -> bool:
+        """所有訂單皆已開立 (沒有驗證失敗、API 拒絕或重試後失敗)"""
+        return not (self.invalid or self.rejected or self.failed)
+
+
+class BulkInvoiceIssuer:
+    """
+    大量發票開立管線
+
+    Example:
+        >>> issuer = BulkInvoiceIssuer(
+        ...     {'2000132': ('ejCk326UnaZWKisg', 'q9jcZX8Ib9LM8wYk')},
+        ...     checkpoint_path=Path('issued.log'),
+        ...     workers=50, rate=20
+        ... )
+        >>> result = asyncio.run(issuer.run(Path('orders.csv')))
+    """
+
+    def __init__(self, merchants: Dict[str, Tuple[str, str]], checkpoint_path: Path,
+                 default_merchant_id: Optional[str] = None, is_test: bool = True,
+                 base_url: Optional[str] = None, workers: int = 20, rate: float = 10.0,
+                 burst: Optional[float] = None, max_retries: int = 3, backoff_factor: float = 1.0,
+                 fsync: bool = False, handler: Optional[InvoiceErrorHandler] = None,
+                 presubmit: Optional[PresubmitChecker] = None):
+        """
+        Args:
+            merchants: {商店代號: (HashKey, HashIV)}
+            checkpoint_path: checkpoint 檔案路徑
+            default_merchant_id: 訂單未指定 merchant_id 時使用 (預設為第一個商店)
+            is_test: 是否為測試環境
+            base_url: 覆寫 API 主機 (本機模擬伺服器)
+            workers: 併發 worker 數
+            rate: 每個商店每秒送出的請求上限
+            burst: token bucket 容量 (預設等於 rate)
+            max_retries: 可重試錯誤的最大重試次數
+            backoff_factor: 重試等待秒數 = backoff_factor * 2 ** 重試次數
+            fsync: checkpoint 每筆寫入後 fsync
+            handler: 錯誤分類器
+            presubmit: 送出前規則檢查 (預測必定失敗的請求，不送出)
+        """
+        if not merchants:
+            raise ValueError('至少需要一組商店憑證')
+
+        self.merchants = merchants
+        self.default_merchant_id = default_merchant_id or next(iter(merchants))
+        self.checkpoint_path = Path(checkpoint_path)
+        self.is_test = is_test
+        self.base_url = base_url
+        self.workers = workers
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.fsync = fsync
+        self.handler = handler or InvoiceErrorHandler(provider='ecpay')
+        self.presubmit = presubmit or PresubmitChecker()
+
+        self._services: Dict[str, PipelineInvoiceService] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def _service(self, merchant_id: str) -> PipelineInvoiceService:
+        service = self._services.get(merchant_id)
+        if service is None:
+            if merchant_id not in self.merchants:
+                raise ValueError(f'未設定商店憑證: {merchant_id}')
+            hash_key, hash_iv = self.merchants[merchant_id]
+            service = PipelineInvoiceService(
+                merchant_id, hash_key, hash_iv, is_test=self.is_test, base_url=self.base_url,
+                max_concurrency=self.workers, max_connections=self.workers
+            )
+            self._services[merchant_id] = service
+            self._buckets[merchant_id] = TokenBucket(self.rate, self.burst)
+        return service
+
+    async def _submit(self, service: PipelineInvoiceService, invoice: InvoiceIssueData,
+                      result: BulkIssueResult) -> Tuple[str, Dict]:
+        """
+        送出一張發票 (含限速與重試)
+
+        Returns:
+            (status, checkpoint 欄位)
+        """
+        bucket = self._buckets[invoice.merchant_id]
+
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            try:
+                response = await service.issue_invoice(invoice)
+            except ConnectionError as e:
+                code, message = 'NETWORK_ERROR', str(e)
+            else:
+                if response.success:
+                    return 'issued', {
+                        'invoice_no': response.invoice_number,
+                        'invoice_date': response.invoice_date,
+                        'random_number': response.random_number,
+                        'attempts': attempt + 1,
+                    }
+
+                if response.rtn_code == RTN_DUPLICATE_RELATE_NUMBER:
+                    recovered = await self._recover(service, invoice.relate_number)
+                    if recovered:
+                        return 'recovered', {**recovered, 'attempts': attempt + 1}
+
+                code = str(response.rtn_code) if response.rtn_code else 'SERVER_ERROR'
+                message = response.rtn_msg or response.error_message
+
+            result.errors[code] = result.errors.get(code, 0) + 1
+            if not self.handler.should_retry(code) or attempt >= self.max_retries:
+                self.handler.log_error(code, context={'relate_number': invoice.relate_number})
+                status = 'failed' if self.handler.should_retry(code) else 'rejected'
+                return status, {'rtn_code': code, 'rtn_msg': message, 'attempts': attempt + 1}
+
+            result.retries += 1
+            await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+
+    async def _recover(self, service: PipelineInvoiceService, relate_number: str) -> Optional[Dict]:
+        """RelateNumber 重複時查詢既有發票，補寫 checkpoint"""
+        try:
+            query = await service.query_invoice(relate_number)
+        except ConnectionError:
+            return None
+        if query.get('RtnCode') != 1:
+            return None
+        return {
+            'invoice_no': query.get('IIS_Number', ''),
+            'invoice_date': query.get('IIS_Create_Date', ''),
+            'random_number': query.get('IIS_Random_Number', ''),
+        }
+
+    async def _worker(self, queue: asyncio.Queue, checkpoint: CheckpointLog, result: BulkIssueResult):
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                service, invoice = item
+                try:
+                    status, fields = await self._submit(service, invoice, result)
+                except Exception as e:
+                    status, fields = 'failed', {'rtn_code': 'UNKNOWN', 'rtn_msg': str(e)}
+                if status in ('issued', 'recovered'):
+                    self.presubmit.record(invoice, invoice_no=fields.get('invoice_no'))
+                checkpoint.record(invoice.merchant_id, invoice.relate_number,
+                                  'issued' if status == 'recovered' else status, **fields)
+                setattr(result, status, getattr(result, status) + 1)
+            finally:
+                queue.task_done()
+
+    async def run(self, orders_path: Path, limit: Optional[int] = None) -> BulkIssueResult:
+        """
+        執行大量開立
+
+        Args:
+            orders_path: 訂單檔案 (CSV / JSONL)
+            limit: 最多處理幾筆訂單 (不含略過的)
+
+        Returns:
+            執行結果統計
+        """
+        result = BulkIssueResult()
+        checkpoint = CheckpointLog(self.checkpoint_path, fsync=self.fsync)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        workers = [asyncio.create_task(self._worker(queue, checkpoint, result)) for _ in range(self.workers)]
+        seen: Set[Tuple[str, str]] = set()
+        queued = 0
+        started = time.perf_counter()
+
+        def reject_line(line_no: int, error: str):
+            checkpoint.record(self.default_merchant_id or '', '', 'invalid', line=line_no, error=error)
+            result.invalid += 1
+
+        try:
+            for order in read_orders(Path(orders_path), on_error=reject_line):
+                merchant_id = str(order.get('merchant_id') or self.default_merchant_id)
+                relate_number = str(order.get('relate_number') or '').strip()
+
+                if checkpoint.is_completed(merchant_id, relate_number):
+                    result.skipped += 1
+                    continue
+                if (merchant_id, relate_number) in seen:
+                    checkpoint.record(merchant_id, relate_number, 'invalid', error='檔案內 relate_number 重複')
+                    result.invalid += 1
+                    continue
+                if limit is not None and queued >= limit:
+                    break
+
+                try:
+                    service = self._service(merchant_id)
+                    invoice = build_invoice(order, merchant_id, service)
+                    service._build_issue_payload(invoice)
+                    violations = self.presubmit.check(invoice)
+                except ValueError as e:
+                    checkpoint.record(merchant_id, relate_number, 'invalid', error=str(e))
+                    result.invalid += 1
+                    continue
+                except Exception as e:
+                    # 欄位型別錯誤 (例如 items 不是陣列) 等非預期的資料問題，只影響這一筆
+                    checkpoint.record(merchant_id, relate_number, 'invalid', error=f'{type(e).__name__}: {e}')
+                    result.invalid += 1
+                    continue
+
+                if violations:
+                    for violation in violations:
+                        result.errors[violation.code] = result.errors.get(violation.code, 0) + 1
+                    checkpoint.record(merchant_id, relate_number, 'invalid', rtn_code=violations[0].code,
+                                      error='; '.join(str(violation) for violation in violations))
+                    result.invalid += 1
+                    continue
+
+                seen.add((merchant_id, relate_number))
+                queued += 1
+                await queue.put((service, invoice))
+
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            for service in self._services.values():
+                await service.close()
+            checkpoint.close()
+
+        result.elapsed = time.perf_counter() - started
+        return result
+
+
+def format_result(result: BulkIssueResult) -> str:
+    """格式化執行結果"""
+    rate = result.processed / result.elapsed if result.elapsed > 0 else 0.0
+    lines = [
+        "=" * 60,
+        "大量發票開立結果",
+        "=" * 60,
+        f"   開立成功: {result.issued}",
+        f"   補記 (已開立未記錄): {result.recovered}",
+        f"   略過 (checkpoint): {result.skipped}",
+        f"   資料驗證失敗: {result.invalid}",
+        f"   API 拒絕: {result.rejected}",
+        f"   重試後失敗: {result.failed}",
+        f"   重試次數: {result.retries}",
+        f"   耗時: {result.elapsed:.2f} 秒 ({rate:.1f} 筆/秒)",
+    ]
+    if result.errors:
+        lines.append("   錯誤碼: " + ', '.join(f'{code} x{count}' for code, count in sorted(result.errors.items())))
+    lines.append("=" * 60)
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Taiwan Invoice Skill - 大量發票開立 (ECPay)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+範例:
+  python bulk_issue.py orders.csv
+  python bulk_issue.py orders.jsonl --workers 50 --rate 20
+  python bulk_issue.py orders.csv --checkpoint month-end.log --fsync
+  python bulk_issue.py orders.csv --base-url http://127.0.0.1:8080
+        """
+    )
+    parser.add_argument('orders', type=Path, help='訂單檔案 (CSV / JSONL)')
+    parser.add_argument('--checkpoint', type=Path, default=None,
+                        help='checkpoint 檔案 (預設: <訂單檔名>.checkpoint.jsonl)')
+    parser.add_argument('--merchant-id', default=ECPayInvoiceService.TEST_MERCHANT_ID, help='商店代號')
+    parser.add_argument('--hash-key', default=ECPayInvoiceService.TEST_HASH_KEY, help='HashKey')
+    parser.add_argument('--hash-iv', default=ECPayInvoiceService.TEST_HASH_IV, help='HashIV')
+    parser.add_argument('--merchants', type=Path, default=None,
+                        help='多商店憑證 JSON ({"商店代號": ["HashKey", "HashIV"]})')
+    parser.add_argument('--prod', action='store_true', help='使用正式環境')
+    parser.add_argument('--base-url', default=None, help='覆寫 API 主機 (本機模擬伺服器)')
+    parser.add_argument('--workers', type=int, default=20, help='併發 worker 數 (預設: 20)')
+    parser.add_argument('--rate', type=float, default=10.0, help='每個商店每秒請求上限 (預設: 10)')
+    parser.add_argument('--burst', type=float, default=None, help='token bucket 容量 (預設: 同 --rate)')
+    parser.add_argument('--max-retries', type=int, default=3, help='最大重試次數 (預設: 3)')
+    parser.add_argument('--limit', type=int, default=None, help='最多處理幾筆訂單')
+    parser.add_argument('--fsync', action='store_true', help='checkpoint 每筆寫入後 fsync')
+    args = parser.parse_args()
+
+    if not args.orders.exists():
+        print(f"錯誤: 找不到訂單檔案 {args.orders}", file=sys.stderr)
+        return 1
+
+    if args.merchants:
+        with open(args.merchants, 'r', encoding='utf-8') as f:
+            merchants = {mid: tuple(creds) for mid, creds in json.load(f).items()}
+    else:
+        merchants = {args.merchant_id: (args.hash_key, args.hash_iv)}
+
+    checkpoint = args.checkpoint or args.orders.with_suffix('.checkpoint.jsonl')
+
+    issuer = BulkInvoiceIssuer(
+        merchants,
+        checkpoint_path=checkpoint,
+        default_merchant_id=args.merchant_id if args.merchant_id in merchants else None,
+        is_test=not args.prod,
+        base_url=args.base_url,
+        workers=args.workers,
+        rate=args.rate,
+        burst=args.burst,
+        max_retries=args.max_retries,
+        fsync=args.fsync,
+    )
+
+    result = asyncio.run(issuer.run(args.orders, limit=args.limit))
+    print(format_result(result))
+    print(f"checkpoint: {checkpoint}")
+
+    return 0 if result.ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - 精簡記錄類別 (__slots__)
+
+examples/ecpay-invoice-example.py 的 InvoiceIssueData / InvoiceIssueResponse 是一般
+@dataclass；大量開立或對帳時把一整天的發票留在記憶體中，每個實例的 __dict__
+與 InvoiceIssueResponse.raw 的解密結果 dict 佔了大部分 RSS。
+
+compact() 依原本的 dataclass 欄位產生對應的精簡類別:
+- slots=True，實例沒有 __dict__
+- 可選 frozen=True (不可變，可作為 dict key / set 成員)
+- raw 改存緊湊 JSON (payload bytes)，讀取 .raw 時才解碼，不快取
+- 少數固定值的欄位 (RtnMsg、TaxType 等) 以 sys.intern 共用字串
+
+使用範例:
+    from compact_records import InvoiceIssueResponseRecord
+
+    record = InvoiceIssueResponseRecord.from_record(service.issue_invoice(data))
+    record.raw['InvoiceNo']    # 需要時才解碼
+    record.to_record()         # 轉回原本的 InvoiceIssueResponse
+
+付款回呼的對應版本與 1M 筆記憶體量測見 taiwan-payment/scripts/compact_records.py
+"""
+
+import dataclasses
+import json
+import sys
+import urllib.parse
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from example_loader import load_example
+
+ENCODINGS = ('json', 'form')
+
+
+def encode_payload(raw: Dict[str, Any], encoding: str = 'json') -> bytes:
+    """
+    將 raw dict 編碼為 payload
+
+    Args:
+        raw: 原始回傳參數
+        encoding: 'json' 或 'form'
+
+    Returns:
+        UTF-8 bytes
+    """
+    if not raw:
+        return b''
+    if encoding == 'form':
+        return urllib.parse.urlencode(raw).encode('ascii')
+    return json.dumps(raw, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def decode_payload(payload: bytes, encoding: str = 'json') -> Dict[str, Any]:
+    """將 payload 解碼為 dict"""
+    if not payload:
+        return {}
+    if encoding == 'form':
+        return dict(urllib.parse.parse_qsl(payload.decode('utf-8'), keep_blank_values=True))
+    return json.loads(payload)
+
+
+@lru_cache(maxsize=None)
+def compact(cls: type, frozen: bool = False, encoding: str = 'json', name: Optional[str] = None,
+            intern_fields: Tuple[str, ...] = ()) -> type:
+    """
+    產生 dataclass 的精簡版本
+
+    Args:
+        cls: 原本的 dataclass
+        frozen: 是否不可變
+        encoding: raw 的編碼方式 ('json' / 'form')
+        name: 類別名稱 (預設為 Compact<原名稱> / Frozen<原名稱>)
+        intern_fields: 以 sys.intern 共用字串的欄位 (僅適合少數固定值的欄位)
+
+    Returns:
+        slots=True 的 dataclass；原類別有 raw 欄位時改為 payload 欄位與 raw 屬性
+
+    Raises:
+        ValueError: encoding 不支援
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f'不支援的編碼: {encoding}')
+
+    source_fields = [f for f in dataclasses.fields(cls) if f.name != 'raw']
+    has_raw = len(source_fields) != len(dataclasses.fields(cls))
+    field_names = tuple(f.name for f in source_fields)
+
+    specs = []
+    for f in source_fields:
+        options = {}
+        if f.default is not dataclasses.MISSING:
+            options['default'] = f.default
+        if f.default_factory is not dataclasses.MISSING:
+            options['default_factory'] = f.default_factory
+        specs.append((f.name, f.type, dataclasses.field(**options)))
+
+    namespace = {
+        '__module__': __name__,
+        '__doc__': f'{cls.__doc__ or cls.__name__} (精簡版)',
+        'source': cls,
+        'encoding': encoding,
+    }
+
+    if has_raw:
+        specs.append(('payload', bytes, dataclasses.field(default=b'', repr=False, compare=False)))
+
+        def raw(self) -> Dict[str, Any]:
+            """原始回傳參數 (每次存取時解碼)"""
+            return decode_payload(self.payload, encoding)
+
+        namespace['raw'] = property(raw)
+
+    def from_record(klass, record, payload: Optional[bytes] = None):
+        """
+        由原本的 dataclass 實例轉換
+
+        Args:
+            record: 原本的實例
+            payload: 已編碼的原始資料 (預設由 record.raw 編碼)
+        """
+        values = {n: getattr(record, n) for n in field_names}
+        if has_raw:
+            values['payload'] = payload if payload is not None else encode_payload(record.raw, encoding)
+        return klass(**values)
+
+    def from_payload(klass, payload: bytes, **values):
+        """直接以原始資料 (例如 POST body) 建立，不經過 dict"""
+        return klass(payload=payload, **values)
+
+    def to_record(self):
+        """轉回原本的 dataclass"""
+        values = {n: getattr(self, n) for n in field_names}
+        if has_raw:
+            values['raw'] = self.raw
+        return cls(**values)
+
+    if intern_fields:
+        def __post_init__(self):
+            for n in intern_fields:
+                value = getattr(self, n)
+                if type(value) is str:
+                    object.__setattr__(self, n, sys.intern(value))
+
+        namespace['__post_init__'] = __post_init__
+
+    namespace['from_record'] = classmethod(from_record)
+    if has_raw:
+        namespace['from_payload'] = classmethod(from_payload)
+    namespace['to_record'] = to_record
+
+    class_name = name or f"{'Frozen' if frozen else 'Compact'}{cls.__name__}"
+    return dataclasses.make_dataclass(class_name, specs, namespace=namespace, slots=True, frozen=frozen)
+
+
+ecpay = load_example('ecpay-invoice-example')
+
+InvoiceIssueRecord = compact(ecpay.InvoiceIssueData, name='InvoiceIssueRecord',
+                             intern_fields=('merchant_id', 'tax_type', 'carrier_type', 'donation', 'print',
+                                            'inv_type', 'vat'))
+InvoiceIssueResponseRecord = compact(ecpay.InvoiceIssueResponse, name='InvoiceIssueResponseRecord',
+                                     intern_fields=('rtn_msg',))
+FrozenInvoiceIssueResponseRecord = compact(ecpay.InvoiceIssueResponse, frozen=True,
+                                           name='FrozenInvoiceIssueResponseRecord', intern_fields=('rtn_msg',))
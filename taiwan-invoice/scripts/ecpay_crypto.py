@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - ECPay 電子發票 AES 加解密工具
+
+ECPay 電子發票的 Data 欄位格式: JSON → URL Encode → AES-128-CBC (PKCS7) → Base64
+
+與 ECPayInvoiceService._encrypt_aes / _decrypt_aes 輸出相容，差異在於:
+- HashKey / HashIV 只在建立時驗證與轉換一次，並依商店快取 (get_cipher)
+- URL Encode 使用預先建好的 256 項查表，取代 urllib.parse.quote 的逐字處理；
+  URL Decode 以 C 實作的 escape_decode 一次解完
+- 直接在 bytes 上補齊 / 移除 padding，Base64 使用 binascii，減少中間字串
+- JSON 使用緊湊格式 (不含多餘空白)，加密與編碼的資料量較小
+- 提供批次 API: encrypt_many / decrypt_many
+
+使用範例:
+    from ecpay_crypto import get_cipher
+
+    cipher = get_cipher('ejCk326UnaZWKisg', 'q9jcZX8Ib9LM8wYk')
+    data = cipher.encrypt({'MerchantID': '2000132', 'RelateNumber': 'ORD001'})
+    payload = cipher.decrypt(data)
+
+效能量測:
+    python ecpay_crypto.py --benchmark
+"""
+
+import argparse
+import binascii
+import codecs
+import json
+import sys
+import time
+import urllib.parse
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Union
+
+from Crypto.Cipher import AES
+
+BLOCK_SIZE = AES.block_size
+
+# urllib.parse.quote(data) 預設不編碼的字元 (含 safe='/')
+_SAFE_BYTES = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_.-~/'
+_QUOTE_TABLE = tuple(chr(b) if b in _SAFE_BYTES else f'%{b:02X}' for b in range(256))
+
+# 預先產生的 PKCS7 padding
+_PADDING = tuple(bytes([n]) * n for n in range(BLOCK_SIZE + 1))
+
+
+def url_encode(data: Union[str, bytes]) -> str:
+    """
+    URL Encode (輸出與 urllib.parse.quote(data) 相同)
+
+    Args:
+        data: 字串或 UTF-8 bytes
+
+    Returns:
+        編碼後字串
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    table = _QUOTE_TABLE
+    return ''.join([table[b] for b in data])
+
+
+def url_decode(data: bytes) -> bytes:
+    """
+    URL Decode (輸出與 urllib.parse.unquote_to_bytes(data) 相同)
+
+    將 %XX 轉為 \\xXX 後交給 C 實作的 escape_decode 一次解完；
+    資料本身含反斜線或有不合法的 % 序列時改用 urllib 逐段處理。
+    """
+    if b'\\' not in data:
+        try:
+            return codecs.escape_decode(data.replace(b'%', b'\\x'))[0]
+        except ValueError:
+            pass
+    return urllib.parse.unquote_to_bytes(data)
+
+
+class ECPayInvoiceCipher:
+    """
+    ECPay 電子發票 AES-128-CBC 加解密 (單一商店)
+
+    CBC 模式的 cipher 物件帶有鏈結狀態，無法跨訊息重複使用，
+    因此每則訊息仍建立一次 AES 物件，其餘前後處理皆以快取與查表完成。
+    """
+
+    def __init__(self, hash_key: Union[str, bytes], hash_iv: Union[str, bytes]):
+        """
+        Args:
+            hash_key: HashKey (16 bytes)
+            hash_iv: HashIV (16 bytes)
+
+        Raises:
+            ValueError: HashKey / HashIV 長度錯誤
+        """
+        key = hash_key.encode('utf-8') if isinstance(hash_key, str) else bytes(hash_key)
+        iv = hash_iv.encode('utf-8') if isinstance(hash_iv, str) else bytes(hash_iv)
+
+        if len(key) != 16:
+            raise ValueError(f'HashKey 必須為 16 bytes (目前 {len(key)})')
+        if len(iv) != 16:
+            raise ValueError(f'HashIV 必須為 16 bytes (目前 {len(iv)})')
+
+        self.hash_key = key
+        self.hash_iv = iv
+
+    def encrypt_text(self, text: str) -> str:
+        """
+        加密已序列化的 JSON 字串
+
+        Args:
+            text: JSON 字串
+
+        Returns:
+            Base64 編碼的加密字串
+        """
+        data = url_encode(text).encode('ascii')
+        data += _PADDING[BLOCK_SIZE - len(data) % BLOCK_SIZE]
+        encrypted = AES.new(self.hash_key, AES.MODE_CBC, self.hash_iv).encrypt(data)
+        return binascii.b2a_base64(encrypted, newline=False).decode('ascii')
+
+    def encrypt(self, payload: Dict[str, Any]) -> str:
+        """
+        序列化並加密 Data 內容
+
+        Args:
+            payload: Data 欄位內容 (加密前)
+
+        Returns:
+            Base64 編碼的加密字串
+        """
+        return self.encrypt_text(json.dumps(payload, ensure_ascii=False, separators=(',', ':')))
+
+    def decrypt_text(self, encrypted_data: Union[str, bytes]) -> str:
+        """
+        解密為 JSON 字串
+
+        Raises:
+            ValueError: Base64 或 padding 格式錯誤
+        """
+        encrypted = binascii.a2b_base64(encrypted_data)
+        if not encrypted or len(encrypted) % BLOCK_SIZE:
+            raise ValueError('加密資料長度錯誤')
+
+        decrypted = AES.new(self.hash_key, AES.MODE_CBC, self.hash_iv).decrypt(encrypted)
+        pad_len = decrypted[-1]
+        if not 0 < pad_len <= BLOCK_SIZE or decrypted[-pad_len:] != _PADDING[pad_len]:
+            raise ValueError('Padding 錯誤')
+
+        return url_decode(decrypted[:-pad_len]).decode('utf-8')
+
+    def decrypt(self, encrypted_data: Union[str, bytes]) -> Dict[str, Any]:
+        """
+        解密並解析 Data 內容
+
+        Raises:
+            ValueError: 解密或 JSON 解析失敗
+        """
+        return json.loads(self.decrypt_text(encrypted_data))
+
+    def encrypt_many(self, payloads: Iterable[Dict[str, Any]]) -> List[str]:
+        """批次加密"""
+        encrypt = self.encrypt
+        return [encrypt(payload) for payload in payloads]
+
+    def decrypt_many(self, encrypted: Iterable[Union[str, bytes]]) -> List[Dict[str, Any]]:
+        """批次解密"""
+        decrypt = self.decrypt
+        return [decrypt(data) for data in encrypted]
+
+
+@lru_cache(maxsize=256)
+def get_cipher(hash_key: str, hash_iv: str) -> ECPayInvoiceCipher:
+    """
+    取得 (快取的) 商店加解密物件
+
+    Args:
+        hash_key: HashKey
+        hash_iv: HashIV
+
+    Returns:
+        ECPayInvoiceCipher
+    """
+    return ECPayInvoiceCipher(hash_key, hash_iv)
+
+
+# ============================================================================
+# 效能量測
+# ============================================================================
+
+def _sample_payloads(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            'MerchantID': '2000132',
+            'RelateNumber': f'ORD{i:010d}',
+            'CustomerIdentifier': '0000000000',
+            'CustomerName': '王小明',
+            'CustomerAddr': '台北市信義區信義路五段7號',
+            'CustomerEmail': 'test@example.com',
+            'Print': '0',
+            'Donation': '0',
+            'TaxType': '1',
+            'SalesAmount': 3150,
+            'InvType': '07',
+            'Items': [
+                {'ItemName': f'商品{n}', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': 1050, 'ItemAmount': 1050}
+                for n in range(3)
+            ],
+            'TimeStamp': 1700000000,
+        }
+        for i in range(count)
+    ]
+
+
+def benchmark(count: int = 20000):
+    """比較 ECPayInvoiceService 原本的加解密與 ECPayInvoiceCipher"""
+    from example_loader import load_example
+
+    ecpay = load_example('ecpay-invoice-example')
+    service = ecpay.ECPayInvoiceService(
+        ecpay.ECPayInvoiceService.TEST_MERCHANT_ID,
+        ecpay.ECPayInvoiceService.TEST_HASH_KEY,
+        ecpay.ECPayInvoiceService.TEST_HASH_IV
+    )
+    cipher = get_cipher(ecpay.ECPayInvoiceService.TEST_HASH_KEY, ecpay.ECPayInvoiceService.TEST_HASH_IV)
+    payloads = _sample_payloads(count)
+
+    def timed(func, repeat: int = 3):
+        """取 repeat 次中最快的一次，降低 GC 與暖機造成的誤差"""
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - started)
+        return result, best
+
+    baseline_encrypted, baseline_enc = timed(
+        lambda: [service._encrypt_aes(json.dumps(p, ensure_ascii=False)) for p in payloads])
+    _, baseline_dec = timed(lambda: [service._decrypt_aes(e) for e in baseline_encrypted])
+
+    encrypted, fast_enc = timed(lambda: cipher.encrypt_many(payloads))
+    decrypted, fast_dec = timed(lambda: cipher.decrypt_many(encrypted))
+
+    # 相容性: 雙向互解
+    compatible = (
+        decrypted == payloads
+        and [service._decrypt_aes(e) for e in encrypted[:100]] == payloads[:100]
+        and cipher.decrypt_many(baseline_encrypted[:100]) == payloads[:100]
+    )
+
+    print("=" * 60)
+    print(f"ECPay 電子發票 AES 加解密效能 ({count} 筆)")
+    print("=" * 60)
+    print(f"\n   {'':<12} {'原本 (us/筆)':>14} {'cipher (us/筆)':>16} {'加速':>8}")
+    for name, before, after in (('加密', baseline_enc, fast_enc), ('解密', baseline_dec, fast_dec)):
+        print(f"   {name:<12} {before / count * 1e6:>14.1f} {after / count * 1e6:>16.1f} "
+              f"{before / after:>7.2f}x")
+    print(f"\n   相容性 (與 _encrypt_aes / _decrypt_aes 互解): {'[PASS]' if compatible else '[FAIL]'}")
+    print("=" * 60)
+
+    return 0 if compatible else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ECPay 電子發票 AES 加解密工具')
+    parser.add_argument('--benchmark', action='store_true', help='與原本實作比較效能')
+    parser.add_argument('--count', type=int, default=20000, help='量測筆數 (預設: 20000)')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        return benchmark(args.count)
+
+    parser.print_help()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
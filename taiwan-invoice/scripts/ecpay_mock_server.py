@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - ECPay 電子發票本機模擬伺服器
+
+以 asyncio 實作的最小 HTTP/1.1 伺服器 (支援 keep-alive)，
+模擬 ECPay B2CInvoice 的 Issue / Invalid / Allowance / GetIssue 端點，
+請求與回應皆使用與正式環境相同的 AES 加密格式。
+
+用於:
+- 不連外的整合測試
+- 量測 client 端吞吐量與連線重用情形 (connections / requests)
+
+使用範例:
+    python ecpay_mock_server.py --port 8080 --latency-ms 20
+
+    # 程式內使用
+    server = MockECPayInvoiceServer(latency=0.02)
+    await server.start()
+    print(server.url)
+    ...
+    await server.stop()
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from ecpay_crypto import get_cipher
+from example_loader import load_example
+
+ecpay = load_example('ecpay-invoice-example')
+ECPayInvoiceService = ecpay.ECPayInvoiceService
+
+
+class MockECPayInvoiceServer:
+    """ECPay 電子發票模擬伺服器"""
+
+    # RtnCode (對應 data/error-codes.csv)
+    RTN_SUCCESS = 1
+    RTN_PARAM_ERROR = 10000001
+    RTN_MERCHANT_ERROR = 10000003
+    RTN_DECRYPT_ERROR = 10000004
+    RTN_DUPLICATE_RELATE_NUMBER = 10000006
+    RTN_INVOICE_NOT_FOUND = 10000007
+    RTN_INVOICE_VOIDED = 10000008
+
+    def __init__(self, merchant_id: str = ECPayInvoiceService.TEST_MERCHANT_ID,
+                 hash_key: str = ECPayInvoiceService.TEST_HASH_KEY,
+                 hash_iv: str = ECPayInvoiceService.TEST_HASH_IV,
+                 host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 track: str = 'AB'):
+        """
+        Args:
+            merchant_id: 接受的商店代號
+            hash_key: HashKey
+            hash_iv: HashIV
+            host: 監聽位址
+            port: 監聽埠 (0 = 自動選擇)
+            latency: 每個請求的模擬處理延遲 (秒)
+            track: 發票字軌 (2 碼英文)
+        """
+        self.merchant_id = merchant_id
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.track = track
+
+        self.cipher = get_cipher(hash_key, hash_iv)
+        self.routes = {
+            '/B2CInvoice/Issue': self.handle_issue,
+            '/B2CInvoice/Invalid': self.handle_void,
+            '/B2CInvoice/Allowance': self.handle_allowance,
+            '/B2CInvoice/GetIssue': self.handle_query,
+        }
+
+        self.invoices: Dict[str, Dict] = {}  # InvoiceNo -> 發票資料
+        self.relate_numbers: Dict[str, str] = {}  # RelateNumber -> InvoiceNo
+        self.next_number = 0
+        self.allowance_seq = 0
+
+        # 統計
+        self.connections = 0
+        self.requests = 0
+
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        """伺服器 base URL"""
+        return f'http://{self.host}:{self.port}'
+
+    async def start(self):
+        """啟動伺服器"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """停止伺服器"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> 'MockECPayInvoiceServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def reset_stats(self):
+        """重設連線與請求計數"""
+        self.connections = 0
+        self.requests = 0
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        """讀取一個 HTTP 請求，連線關閉時回傳 None"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+
+        method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0))
+        body = await reader.readexactly(length) if length else b''
+        return method, path, headers, body
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """處理一條連線上的所有請求 (keep-alive)"""
+        self.connections += 1
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                self.requests += 1
+
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                status, response = self._dispatch(method, path, body)
+                payload = json.dumps(response, ensure_ascii=False).encode('utf-8')
+                keep_alive = headers.get('connection', '').lower() != 'close'
+
+                writer.write(
+                    f'HTTP/1.1 {status}\r\n'
+                    f'Content-Type: application/json; charset=utf-8\r\n'
+                    f'Content-Length: {len(payload)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+                    f'\r\n'.encode('latin-1') + payload
+                )
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[str, Dict]:
+        """路由請求並回傳 (HTTP 狀態, 回應 JSON)"""
+        handler = self.routes.get(path)
+        if method != 'POST' or handler is None:
+            return '404 Not Found', {'TransCode': 0, 'TransMsg': 'Not Found'}
+
+        try:
+            envelope = json.loads(body)
+            data = self.cipher.decrypt(envelope['Data'])
+        except (ValueError, KeyError, TypeError):
+            return '200 OK', self._envelope(self._rtn(self.RTN_DECRYPT_ERROR, '加密驗證失敗'))
+
+        if data.get('MerchantID') != self.merchant_id:
+            return '200 OK', self._envelope(self._rtn(self.RTN_MERCHANT_ERROR, '特店編號錯誤'))
+
+        return '200 OK', self._envelope(handler(data))
+
+    def _envelope(self, data: Dict) -> Dict:
+        """包成 ECPay 回應格式 (Data 加密)"""
+        return {
+            'MerchantID': self.merchant_id,
+            'RpHeader': {'Timestamp': int(time.time())},
+            'TransCode': 1,
+            'TransMsg': 'Success',
+            'Data': self.cipher.encrypt(data),
+        }
+
+    @staticmethod
+    def _rtn(code: int, message: str, **fields) -> Dict:
+        return {'RtnCode': code, 'RtnMsg': message, **fields}
+
+    # ------------------------------------------------------------------
+    # API 端點
+    # ------------------------------------------------------------------
+
+    def handle_issue(self, data: Dict) -> Dict:
+        """開立發票"""
+        relate_number = data.get('RelateNumber', '')
+        if not relate_number or not data.get('Items'):
+            return self._rtn(self.RTN_PARAM_ERROR, '參數錯誤')
+        if relate_number in self.relate_numbers:
+            return self._rtn(self.RTN_DUPLICATE_RELATE_NUMBER, 'RelateNumber 重複')
+
+        self.next_number += 1
+        invoice_no = f'{self.track}{self.next_number:08d}'
+        invoice = {
+            'InvoiceNo': invoice_no,
+            'InvoiceDate': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'RandomNumber': f'{random.randint(0, 9999):04d}',
+            'RelateNumber': relate_number,
+            'SalesAmount': data.get('SalesAmount', 0),
+            'Voided': False,
+            'RemainAllowance': data.get('SalesAmount', 0),
+        }
+        self.invoices[invoice_no] = invoice
+        self.relate_numbers[relate_number] = invoice_no
+
+        return self._rtn(
+            self.RTN_SUCCESS, '開立發票成功',
+            InvoiceNo=invoice_no,
+            InvoiceDate=invoice['InvoiceDate'],
+            RandomNumber=invoice['RandomNumber'],
+        )
+
+    def handle_void(self, data: Dict) -> Dict:
+        """作廢發票"""
+        invoice = self.invoices.get(data.get('InvoiceNo', ''))
+        if invoice is None:
+            return self._rtn(self.RTN_INVOICE_NOT_FOUND, '發票不存在')
+        if invoice['Voided']:
+            return self._rtn(self.RTN_INVOICE_VOIDED, '發票已作廢')
+
+        invoice['Voided'] = True
+        return self._rtn(self.RTN_SUCCESS, '作廢發票成功', InvoiceNo=invoice['InvoiceNo'])
+
+    def handle_allowance(self, data: Dict) -> Dict:
+        """開立折讓"""
+        invoice = self.invoices.get(data.get('InvoiceNo', ''))
+        if invoice is None:
+            return self._rtn(self.RTN_INVOICE_NOT_FOUND, '發票不存在')
+        if invoice['Voided']:
+            return self._rtn(self.RTN_INVOICE_VOIDED, '發票已作廢')
+
+        amount = data.get('AllowanceAmount', 0)
+        if amount <= 0 or amount > invoice['RemainAllowance']:
+            return self._rtn(self.RTN_PARAM_ERROR, '折讓金額錯誤')
+
+        invoice['RemainAllowance'] -= amount
+        self.allowance_seq += 1
+        return self._rtn(
+            self.RTN_SUCCESS, '開立折讓成功',
+            IA_Allow_No=f'{datetime.now():%Y%m%d}{self.allowance_seq:08d}',
+            IA_Invoice_No=invoice['InvoiceNo'],
+            IA_Date=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            IA_Remain_Allowance_Amt=invoice['RemainAllowance'],
+        )
+
+    def handle_query(self, data: Dict) -> Dict:
+        """查詢發票"""
+        invoice_no = self.relate_numbers.get(data.get('RelateNumber', ''))
+        if invoice_no is None:
+            return self._rtn(self.RTN_INVOICE_NOT_FOUND, '發票不存在')
+
+        invoice = self.invoices[invoice_no]
+        return self._rtn(
+            self.RTN_SUCCESS, '查詢成功',
+            IIS_Number=invoice['InvoiceNo'],
+            IIS_Relate_Number=invoice['RelateNumber'],
+            IIS_Create_Date=invoice['InvoiceDate'],
+            IIS_Random_Number=invoice['RandomNumber'],
+            IIS_Sales_Amount=invoice['SalesAmount'],
+            IIS_Invalid_Status='1' if invoice['Voided'] else '0',
+        )
+
+
+async def serve(host: str, port: int, latency: float):
+    """啟動伺服器直到中斷"""
+    async with MockECPayInvoiceServer(host=host, port=port, latency=latency) as server:
+        print(f"ECPay 模擬伺服器: {server.url}")
+        print("按 Ctrl+C 停止")
+        await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ECPay 電子發票本機模擬伺服器')
+    parser.add_argument('--host', default='127.0.0.1', help='監聽位址 (預設: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080, help='監聽埠 (預設: 8080)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='模擬處理延遲 (ms)')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.latency_ms / 1000))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,10 @@ Taiwan Invoice Skill - 系統化錯誤處理與自動重試機制
 - 錯誤分類與建議
 - 詳細日誌記錄
 - 錯誤碼查詢
+- 熔斷器 (依服務商 / 端點，服務商中斷時快速失敗)
+- 自適應併發限制 (AIMD，延遲或錯誤率上升時縮小同時請求數)
+- 重試支援 asyncio、退避抖動 (full / decorrelated) 與跨請求共用的重試預算
+- 錯誤遙測 (error_telemetry.py): 結構化事件、計數、日誌去重與 Prometheus 匯出，不阻塞請求
 
 使用範例:
     from error_handler import InvoiceErrorHandler, retry_on_error
@@ -18,44 +22,61 @@ Taiwan Invoice Skill - 系統化錯誤處理與自動重試機制
     def issue_invoice(data):
         # 發票開立邏輯
         pass
+
+    # 熔斷器 + 自適應併發限制 (多執行緒共用)
+    breakers = CircuitBreakerRegistry(handler)
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=20, latency_threshold=2.0)
+
+    @retry_on_error(max_retries=3, circuit_breaker=breakers.get('ecpay', 'Issue'), limiter=limiter)
+    def issue_invoice(data):
+        pass
+
+    # asyncio + 抖動 + 重試預算 (重試數不超過請求數的 10%)
+    budget = RetryBudget(ratio=0.1)
+
+    @retry_on_error(max_retries=3, jitter=JitterStrategy.FULL, retry_budget=budget)
+    async def issue_invoice_async(data):
+        pass
+
+    # 錯誤遙測: 重複的錯誤日誌彙總為 "錯誤碼 10000005 x 1,204 (最近 60 秒)"
+    telemetry = ErrorTelemetry(exporters=[PrometheusFileExporter('invoice-errors.prom')])
+    handler = InvoiceErrorHandler(telemetry=telemetry)
+
+    @retry_on_error(max_retries=3, handler=handler, telemetry=telemetry)
+    def issue_invoice(data):
+        pass
 """
 
+import asyncio
 import time
 import functools
 import logging
-from typing import Callable, Optional, Dict, List
-from dataclasses import dataclass
+import random
+import threading
+from typing import Any, Callable, Optional, Dict, FrozenSet, List, Mapping, Tuple
 from enum import Enum
 
+from error_registry import (
+    ErrorCategory, ErrorInfo, ErrorRegistry, GENERIC_ERRORS, RetryStrategy, get_error_registry,
+)
+from error_telemetry import ErrorTelemetry, PrometheusFileExporter  # noqa: F401  (re-export)
 
-class ErrorCategory(Enum):
-    """錯誤類別"""
-    VALIDATION = "validation"  # 驗證錯誤
-    AUTHENTICATION = "authentication"  # 認證錯誤
-    PERMISSION = "permission"  # 權限錯誤
-    BUSINESS_LOGIC = "business_logic"  # 業務邏輯錯誤
-    NETWORK = "network"  # 網路錯誤
-    SERVER = "server"  # 伺服器錯誤
-    UNKNOWN = "unknown"  # 未知錯誤
-
-
-class RetryStrategy(Enum):
-    """重試策略"""
-    NO_RETRY = "no_retry"  # 不重試
-    IMMEDIATE = "immediate"  # 立即重試
-    EXPONENTIAL_BACKOFF = "exponential_backoff"  # 指數退避
-    LINEAR_BACKOFF = "linear_backoff"  # 線性退避
 
+def error_code_of(error: BaseException) -> str:
+    """
+    例外的錯誤碼
 
-@dataclass
-class ErrorInfo:
-    """錯誤資訊"""
-    code: str
-    message: str
-    category: ErrorCategory
-    retry_strategy: RetryStrategy
-    suggestion: str
-    is_retryable: bool = False
+    優先使用例外的 error_code 屬性；沒有時將逾時與連線例外
+    (TimeoutError、ConnectionError 等 OSError) 視為 TIMEOUT_ERROR / NETWORK_ERROR。
+    """
+    error_code = getattr(error, 'error_code', None)
+    if error_code is not None:
+        return error_code
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+        return 'TIMEOUT_ERROR'
+    if isinstance(error, OSError):
+        return 'NETWORK_ERROR'
+    return 'UNKNOWN'
 
 
 class InvoiceErrorHandler:
@@ -63,6 +84,9 @@ class InvoiceErrorHandler:
     電子發票錯誤處理器
 
     提供系統化的錯誤分類、建議與重試策略
+
+    錯誤碼查詢使用行程共用的錯誤碼表 (data/error-codes.csv + 下列內建設定，見 get_invoice_error_registry)，
+    以 (服務商, 錯誤碼) 為 key，不同服務商的相同錯誤碼不會互相覆蓋。
     """
 
     # ECPay 錯誤碼對照表
@@ -74,7 +98,8 @@ class InvoiceErrorHandler:
             category=ErrorCategory.VALIDATION,
             retry_strategy=RetryStrategy.NO_RETRY,
             suggestion='發票開立成功',
-            is_retryable=False
+            is_retryable=False,
+            provider='ecpay'
         ),
 
         # 驗證錯誤 (不可重試)
@@ -84,7 +109,8 @@ class InvoiceErrorHandler:
             category=ErrorCategory.VALIDATION,
             retry_strategy=RetryStrategy.NO_RETRY,
             suggestion='訂單編號已使用，請使用新的 RelateNumber',
-            is_retryable=False
+            is_retryable=False,
+            provider='ecpay'
         ),
         '10000016': ErrorInfo(
             code='10000016',
@@ -92,7 +118,8 @@ class InvoiceErrorHandler:
             category=ErrorCategory.VALIDATION,
             retry_strategy=RetryStrategy.NO_RETRY,
             suggestion='檢查 B2C/B2B 金額計算，B2C 使用含稅價，B2B 需分拆未稅金額與稅額',
-            is_retryable=False
+            is_retryable=False,
+            provider='ecpay'
         ),
         '10000019': ErrorInfo(
             code='10000019',
@@ -100,7 +127,8 @@ class InvoiceErrorHandler:
             category=ErrorCategory.BUSINESS_LOGIC,
             retry_strategy=RetryStrategy.NO_RETRY,
             suggestion='B2B 發票請移除 CarrierType 和 LoveCode',
-            is_retryable=False
+            is_retryable=False,
+            provider='ecpay'
         ),
         '10000005': ErrorInfo(
             code='10000005',
@@ -108,7 +136,8 @@ class InvoiceErrorHandler:
             category=ErrorCategory.VALIDATION,
             retry_strategy=RetryStrategy.IMMEDIATE,
             suggestion='時間戳記超過 10 分鐘，請重新產生當前時間戳',
-            is_retryable=True
+            is_retryable=True,
+            provider='ecpay'
         ),
 
         # 認證錯誤 (可重試)
@@ -118,34 +147,12 @@ class InvoiceErrorHandler:
             category=ErrorCategory.AUTHENTICATION,
             retry_strategy=RetryStrategy.NO_RETRY,
             suggestion='檢查 HashKey 和 HashIV 是否正確',
-            is_retryable=False
+            is_retryable=False,
+            provider='ecpay'
         ),
 
-        # 網路/伺服器錯誤 (可重試)
-        'NETWORK_ERROR': ErrorInfo(
-            code='NETWORK_ERROR',
-            message='網路連線錯誤',
-            category=ErrorCategory.NETWORK,
-            retry_strategy=RetryStrategy.EXPONENTIAL_BACKOFF,
-            suggestion='網路連線失敗，系統將自動重試',
-            is_retryable=True
-        ),
-        'SERVER_ERROR': ErrorInfo(
-            code='SERVER_ERROR',
-            message='伺服器錯誤',
-            category=ErrorCategory.SERVER,
-            retry_strategy=RetryStrategy.EXPONENTIAL_BACKOFF,
-            suggestion='伺服器暫時無法回應，系統將自動重試',
-            is_retryable=True
-        ),
-        'TIMEOUT_ERROR': ErrorInfo(
-            code='TIMEOUT_ERROR',
-            message='請求逾時',
-            category=ErrorCategory.NETWORK,
-            retry_strategy=RetryStrategy.LINEAR_BACKOFF,
-            suggestion='請求逾時，系統將自動重試',
-            is_retryable=True
-        ),
+        # 網路/伺服器錯誤 (可重試，與服務商無關)
+        **{info.code: info for info in GENERIC_ERRORS},
     }
 
     # SmilePay 錯誤碼
@@ -156,7 +163,8 @@ class InvoiceErrorHandler:
             category=ErrorCategory.VALIDATION,
             retry_strategy=RetryStrategy.NO_RETRY,
             suggestion='檢查是否傳入 TotalAmount，商品金額總和需等於訂單金額',
-            is_retryable=False
+            is_retryable=False,
+            provider='smilepay'
         ),
         '-10084': ErrorInfo(
             code='-10084',
@@ -164,7 +172,8 @@ class InvoiceErrorHandler:
             category=ErrorCategory.VALIDATION,
             retry_strategy=RetryStrategy.NO_RETRY,
             suggestion='訂單編號限制 30 字元以內',
-            is_retryable=False
+            is_retryable=False,
+            provider='smilepay'
         ),
         '-10053': ErrorInfo(
             code='-10053',
@@ -172,7 +181,8 @@ class InvoiceErrorHandler:
             category=ErrorCategory.VALIDATION,
             retry_strategy=RetryStrategy.NO_RETRY,
             suggestion='驗證手機條碼格式 (/ 開頭 8 碼)',
-            is_retryable=False
+            is_retryable=False,
+            provider='smilepay'
         ),
     }
 
@@ -184,7 +194,8 @@ class InvoiceErrorHandler:
             category=ErrorCategory.VALIDATION,
             retry_strategy=RetryStrategy.NO_RETRY,
             suggestion='使用唯一訂單編號',
-            is_retryable=False
+            is_retryable=False,
+            provider='amego'
         ),
         '1007': ErrorInfo(
             code='1007',
@@ -192,7 +203,8 @@ class InvoiceErrorHandler:
             category=ErrorCategory.VALIDATION,
             retry_strategy=RetryStrategy.NO_RETRY,
             suggestion='檢查 DetailVat 設定，B2B 需設為 0',
-            is_retryable=False
+            is_retryable=False,
+            provider='amego'
         ),
         '1012': ErrorInfo(
             code='1012',
@@ -200,27 +212,36 @@ class InvoiceErrorHandler:
             category=ErrorCategory.BUSINESS_LOGIC,
             retry_strategy=RetryStrategy.NO_RETRY,
             suggestion='B2B 發票請移除載具與捐贈設定',
-            is_retryable=False
+            is_retryable=False,
+            provider='amego'
         ),
     }
 
-    def __init__(self, provider: str = 'ecpay', logger: Optional[logging.Logger] = None):
+    def __init__(self, provider: str = 'ecpay', logger: Optional[logging.Logger] = None,
+                 registry: Optional[ErrorRegistry] = None, telemetry: Optional[ErrorTelemetry] = None):
         """
         初始化錯誤處理器
 
         Args:
             provider: 服務商 ('ecpay', 'smilepay', 'amego')
             logger: 自訂 Logger
+            registry: 錯誤碼表 (預設為行程共用的 get_invoice_error_registry())
+            telemetry: 錯誤遙測；指定時 log_error 只記錄事件，日誌由遙測去重後輸出
         """
         self.provider = provider.lower()
         self.logger = logger or self._setup_logger()
+        self.registry = registry or get_invoice_error_registry()
+        self.telemetry = telemetry
+
+    @property
+    def all_errors(self) -> Mapping[str, ErrorInfo]:
+        """此服務商的錯誤碼對照表 (唯讀)"""
+        return self.registry.codes(self.provider)
 
-        # 合併錯誤碼對照表
-        self.all_errors = {
-            **self.ERROR_CODES,
-            **self.SMILEPAY_ERRORS,
-            **self.AMEGO_ERRORS
-        }
+    @classmethod
+    def builtin_errors(cls) -> Tuple[ErrorInfo, ...]:
+        """內建的錯誤碼設定 (覆寫 error-codes.csv 的分類與重試策略)"""
+        return (*cls.ERROR_CODES.values(), *cls.SMILEPAY_ERRORS.values(), *cls.AMEGO_ERRORS.values())
 
     def _setup_logger(self) -> logging.Logger:
         """設定預設 Logger"""
@@ -237,15 +258,16 @@ class InvoiceErrorHandler:
 
         return logger
 
-    def get_error_info(self, error_code: str) -> ErrorInfo:
+    def get_error_info(self, error_code: str, provider: Optional[str] = None) -> ErrorInfo:
         """
         取得錯誤資訊
 
         Args:
             error_code: 錯誤碼
+            provider: 服務商 (預設為此 handler 的服務商)
 
         Returns:
-            錯誤資訊
+            錯誤資訊 (未登錄的錯誤碼回傳共用的 UNKNOWN ErrorInfo)
 
         Example:
             >>> handler = InvoiceErrorHandler()
@@ -253,17 +275,7 @@ class InvoiceErrorHandler:
             >>> print(info.suggestion)
             檢查 B2C/B2B 金額計算
         """
-        return self.all_errors.get(
-            error_code,
-            ErrorInfo(
-                code=error_code,
-                message='未知錯誤',
-                category=ErrorCategory.UNKNOWN,
-                retry_strategy=RetryStrategy.NO_RETRY,
-                suggestion=f'錯誤碼 {error_code} 未記錄在系統中，請查閱官方文件',
-                is_retryable=False
-            )
-        )
+        return self.registry.get(error_code, provider or self.provider)
 
     def should_retry(self, error_code: str) -> bool:
         """
@@ -278,15 +290,35 @@ class InvoiceErrorHandler:
         error_info = self.get_error_info(error_code)
         return error_info.is_retryable
 
-    def log_error(self, error_code: str, context: Optional[Dict] = None):
+    def classify_exception(self, error: BaseException) -> ErrorInfo:
+        """
+        取得例外對應的錯誤資訊 (錯誤碼規則見 error_code_of)
+
+        Args:
+            error: 例外
+
+        Returns:
+            錯誤資訊
+        """
+        return self.get_error_info(error_code_of(error))
+
+    def log_error(self, error_code: str, context: Optional[Dict] = None, latency: Optional[float] = None,
+                  retry_count: int = 0, error_info: Optional[ErrorInfo] = None):
         """
         記錄錯誤
 
         Args:
             error_code: 錯誤碼
             context: 額外上下文資訊
+            latency: 請求耗時 (秒，僅遙測使用)
+            retry_count: 第幾次重試 (僅遙測使用)
+            error_info: 錯誤資訊 (錯誤碼表以外、呼叫端自行定義的錯誤碼；預設查詢錯誤碼表)
         """
-        error_info = self.get_error_info(error_code)
+        error_info = error_info or self.get_error_info(error_code)
+
+        if self.telemetry is not None:
+            self.telemetry.record(error_info, self.provider, latency, retry_count, context)
+            return
 
         log_message = f"[{self.provider.upper()}] 錯誤碼: {error_code} | {error_info.message}"
 
@@ -303,20 +335,596 @@ class InvoiceErrorHandler:
             self.logger.error(log_message)
 
 
+@functools.lru_cache(maxsize=None)
+def get_invoice_error_registry() -> ErrorRegistry:
+    """行程共用的發票錯誤碼表: data/error-codes.csv，以 InvoiceErrorHandler 內建設定覆寫"""
+    return get_error_registry(InvoiceErrorHandler.builtin_errors())
+
+
+# ============================================================================
+# 熔斷器
+# ============================================================================
+
+class CircuitState(Enum):
+    """熔斷器狀態"""
+    CLOSED = "closed"  # 正常送出請求
+    OPEN = "open"  # 熔斷中，直接拒絕
+    HALF_OPEN = "half_open"  # 試探中，只放行少量請求
+
+
+class CircuitOpenError(Exception):
+    """熔斷中，請求未送出"""
+
+    error_code = 'CIRCUIT_OPEN'
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f'{name} 熔斷中，{retry_after:.1f} 秒後再試')
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    熔斷器 (thread-safe)
+
+    - CLOSED: 連續 failure_threshold 次網路/伺服器錯誤 → OPEN
+    - OPEN: 直接丟出 CircuitOpenError，經過 recovery_timeout 秒 → HALF_OPEN
+    - HALF_OPEN: 放行 half_open_max_calls 個試探請求，全部成功 → CLOSED，任一失敗 → OPEN
+
+    是否計為失敗由 InvoiceErrorHandler 的錯誤類別決定 (預設 NETWORK / SERVER)；
+    驗證、業務邏輯等錯誤表示服務商有正常回應，視為成功。
+    """
+
+    def __init__(self, name: str = 'default', failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_max_calls: int = 1, handler: Optional[InvoiceErrorHandler] = None,
+                 trip_categories: FrozenSet[ErrorCategory] = frozenset({ErrorCategory.NETWORK, ErrorCategory.SERVER})):
+        """
+        Args:
+            name: 名稱 (通常為 '服務商:端點')
+            failure_threshold: 連續失敗幾次後熔斷
+            recovery_timeout: 熔斷後多久開始試探 (秒)
+            half_open_max_calls: 試探階段放行的請求數
+            handler: 錯誤分類用的 InvoiceErrorHandler
+            trip_categories: 計為失敗的錯誤類別
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.handler = handler or InvoiceErrorHandler(logger=logging.getLogger('CircuitBreaker'))
+        self.trip_categories = trip_categories
+
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._consecutive_failures = 0
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+        self._counters = {'calls': 0, 'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    @property
+    def state(self) -> CircuitState:
+        """目前狀態 (OPEN 超過 recovery_timeout 時回傳 HALF_OPEN)"""
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def _refresh(self):
+        if self._state == CircuitState.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = CircuitState.HALF_OPEN
+            self._half_open_calls = 0
+            self._half_open_successes = 0
+
+    def _open(self):
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._counters['opened'] += 1
+
+    def before_call(self):
+        """
+        送出請求前呼叫
+
+        Raises:
+            CircuitOpenError: 熔斷中，或試探名額已用完
+        """
+        with self._lock:
+            self._refresh()
+            if self._state == CircuitState.OPEN or (
+                    self._state == CircuitState.HALF_OPEN and self._half_open_calls >= self.half_open_max_calls):
+                self._counters['rejected'] += 1
+                retry_after = max(self.recovery_timeout - (time.monotonic() - self._opened_at), 0.0)
+                raise CircuitOpenError(self.name, retry_after)
+            if self._state == CircuitState.HALF_OPEN:
+                self._half_open_calls += 1
+            self._counters['calls'] += 1
+
+    def record_success(self):
+        """記錄成功 (含服務商回應的非網路/伺服器錯誤)"""
+        with self._lock:
+            self._counters['successes'] += 1
+            self._consecutive_failures = 0
+            if self._state == CircuitState.HALF_OPEN:
+                self._half_open_successes += 1
+                if self._half_open_successes >= self.half_open_max_calls:
+                    self._state = CircuitState.CLOSED
+
+    def record_failure(self):
+        """記錄網路/伺服器錯誤"""
+        with self._lock:
+            self._counters['failures'] += 1
+            self._consecutive_failures += 1
+            if self._state == CircuitState.HALF_OPEN or (
+                    self._state == CircuitState.CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self._open()
+
+    def record_cancelled(self):
+        """
+        請求被取消 (CancelledError、KeyboardInterrupt 等非 Exception)
+
+        不計為成功或失敗；HALF_OPEN 時歸還 before_call 佔用的試探名額，避免停在 HALF_OPEN。
+        """
+        with self._lock:
+            self._counters['calls'] -= 1
+            if self._state == CircuitState.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_outcome(self, error: Optional[BaseException] = None):
+        """依呼叫結果記錄: None = 成功、Exception = 依錯誤類別、其他 BaseException = 取消"""
+        if error is None:
+            self.record_success()
+        elif isinstance(error, Exception):
+            self.record_exception(error)
+        else:
+            self.record_cancelled()
+
+    def record_exception(self, error: BaseException) -> bool:
+        """
+        依錯誤類別記錄例外
+
+        Returns:
+            是否計為失敗
+        """
+        if self.handler.classify_exception(error).category in self.trip_categories:
+            self.record_failure()
+            return True
+        self.record_success()
+        return False
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        經由熔斷器呼叫 func
+
+        Raises:
+            CircuitOpenError: 熔斷中
+        """
+        self.before_call()
+        error = None
+        try:
+            return func(*args, **kwargs)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.record_outcome(error)
+
+    def metrics(self) -> Dict[str, Any]:
+        """狀態指標"""
+        with self._lock:
+            self._refresh()
+            retry_after = 0.0
+            if self._state == CircuitState.OPEN:
+                retry_after = max(self.recovery_timeout - (time.monotonic() - self._opened_at), 0.0)
+            return {
+                'state': self._state.value,
+                'consecutive_failures': self._consecutive_failures,
+                'retry_after': retry_after,
+                **self._counters,
+            }
+
+
+class CircuitBreakerRegistry:
+    """
+    依 (服務商, 端點) 取得熔斷器
+
+    同一服務商的不同端點分開熔斷 (例如查詢端點故障時不影響開立)。
+    """
+
+    def __init__(self, handler: Optional[InvoiceErrorHandler] = None, **breaker_options):
+        """
+        Args:
+            handler: 錯誤分類用的 InvoiceErrorHandler
+            **breaker_options: 傳給 CircuitBreaker 的參數
+        """
+        self.handler = handler
+        self.breaker_options = breaker_options
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, endpoint: str) -> CircuitBreaker:
+        """取得 (必要時建立) 熔斷器"""
+        name = f'{provider.lower()}:{endpoint}'
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(name)
+                if breaker is None:
+                    breaker = self._breakers[name] = CircuitBreaker(name, handler=self.handler,
+                                                                    **self.breaker_options)
+        return breaker
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """所有熔斷器的狀態指標"""
+        return {name: breaker.metrics() for name, breaker in list(self._breakers.items())}
+
+
+# ============================================================================
+# 自適應併發限制
+# ============================================================================
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD 併發限制 (thread-safe)
+
+    - 加法增加: 每個成功且延遲未超過 latency_threshold 的請求使上限 +1/上限
+      (約每一輪 "上限" 個請求 +1)
+    - 乘法減少: 網路/伺服器錯誤或延遲超過門檻時，上限乘以 backoff_ratio；
+      同一時間送出的請求只觸發一次減少，避免一波錯誤使上限直接降到最低
+
+    用法:
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=20, latency_threshold=2.0)
+        with limiter:
+            call_api()
+
+        # asyncio
+        started = await limiter.acquire_async()
+        try:
+            await call_api_async()
+        except Exception as e:
+            limiter.release(started, e)
+            raise
+        limiter.release(started)
+    """
+
+    def __init__(self, initial_limit: int = 10, min_limit: int = 1, max_limit: int = 100,
+                 latency_threshold: Optional[float] = None, backoff_ratio: float = 0.7,
+                 handler: Optional[InvoiceErrorHandler] = None,
+                 drop_categories: FrozenSet[ErrorCategory] = frozenset({ErrorCategory.NETWORK, ErrorCategory.SERVER})):
+        """
+        Args:
+            initial_limit: 初始併發上限
+            min_limit: 最小併發上限
+            max_limit: 最大併發上限
+            latency_threshold: 延遲門檻 (秒)，超過視為壅塞；None = 只看錯誤
+            backoff_ratio: 壅塞時上限的縮減比例
+            handler: 錯誤分類用的 InvoiceErrorHandler
+            drop_categories: 視為壅塞的錯誤類別
+        """
+        if not 0 < backoff_ratio < 1:
+            raise ValueError('backoff_ratio 必須介於 0 與 1 之間')
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError('需滿足 1 <= min_limit <= initial_limit <= max_limit')
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_threshold = latency_threshold
+        self.backoff_ratio = backoff_ratio
+        self.handler = handler or InvoiceErrorHandler(logger=logging.getLogger('AdaptiveConcurrencyLimiter'))
+        self.drop_categories = drop_categories
+
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._latency_ewma: Optional[float] = None
+        self._condition = threading.Condition()
+        self._async_waiters: List[asyncio.Future] = []
+        self._counters = {'successes': 0, 'drops': 0, 'decreases': 0, 'timeouts': 0}
+        self._local = threading.local()
+
+    @property
+    def limit(self) -> int:
+        """目前併發上限"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """進行中的請求數"""
+        return self._in_flight
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[float]:
+        """
+        取得執行名額 (名額用完時等待)
+
+        Args:
+            timeout: 最長等待秒數，None = 不限
+
+        Returns:
+            開始時間 (傳給 release)；逾時回傳 None
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._in_flight < int(self._limit), timeout):
+                self._counters['timeouts'] += 1
+                return None
+            self._in_flight += 1
+            return time.monotonic()
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> Optional[float]:
+        """
+        acquire() 的 coroutine 版本 (等待時不阻塞事件迴圈)
+
+        Args:
+            timeout: 最長等待秒數，None = 不限
+
+        Returns:
+            開始時間 (傳給 release)；逾時回傳 None
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            with self._condition:
+                if self._in_flight < int(self._limit):
+                    self._in_flight += 1
+                    return time.monotonic()
+                waiter = loop.create_future()
+                self._async_waiters.append(waiter)
+
+            remaining = None if deadline is None else deadline - loop.time()
+            try:
+                if remaining is not None and remaining <= 0:
+                    raise asyncio.TimeoutError
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                with self._condition:
+                    self._counters['timeouts'] += 1
+                return None
+
+    def release(self, started: float, error: Optional[BaseException] = None):
+        """
+        歸還名額並依結果調整上限
+
+        Args:
+            started: acquire() 回傳的開始時間
+            error: 請求失敗時的例外 (非 Exception 的 BaseException 視為取消，只歸還名額)
+        """
+        now = time.monotonic()
+        latency = now - started
+        cancelled = error is not None and not isinstance(error, Exception)
+        dropped = (error is not None and not cancelled
+                   and self.handler.classify_exception(error).category in self.drop_categories)
+        congested = dropped or (self.latency_threshold is not None and latency > self.latency_threshold)
+
+        with self._condition:
+            self._in_flight -= 1
+            # 取消的請求 (CancelledError 等) 只歸還名額，不影響上限與延遲統計
+            if not cancelled:
+                self._latency_ewma = (latency if self._latency_ewma is None
+                                      else 0.9 * self._latency_ewma + 0.1 * latency)
+                if congested:
+                    self._counters['drops'] += 1
+                    # 只有在上一次縮減之後才送出的請求會再觸發縮減
+                    if started >= self._last_decrease:
+                        self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+                        self._last_decrease = now
+                        self._counters['decreases'] += 1
+                else:
+                    self._counters['successes'] += 1
+                    self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+
+        for waiter in waiters:
+            waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+
+    def __enter__(self) -> 'AdaptiveConcurrencyLimiter':
+        started = self.acquire()
+        self._local.__dict__.setdefault('started', []).append(started)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release(self._local.started.pop(), exc)
+
+    def metrics(self) -> Dict[str, Any]:
+        """狀態指標"""
+        with self._condition:
+            return {
+                'limit': int(self._limit),
+                'in_flight': self._in_flight,
+                'latency_ewma': self._latency_ewma,
+                **self._counters,
+            }
+
+
+# ============================================================================
+# 重試
+# ============================================================================
+
+class JitterStrategy(Enum):
+    """退避抖動 (避免多個 client 在同一次故障後同步重試)"""
+    NONE = "none"  # 不抖動
+    FULL = "full"  # 0 ~ 退避時間 均勻分佈
+    DECORRELATED = "decorrelated"  # 基準 ~ 上次等待 × 3 均勻分佈
+
+
+class RetryBudget:
+    """
+    重試預算 (token bucket，thread-safe)
+
+    每個請求存入 ratio 個 token，每次重試取出 1 個；另外每秒補充 min_retries_per_second 個，
+    讓低流量時仍可重試。重試數因此不超過 ratio × 請求數 + min_retries_per_second × 秒數，
+    服務商故障時不會因重試而把流量放大數倍。多個裝飾的函數可共用同一個預算。
+    """
+
+    def __init__(self, ratio: float = 0.1, min_retries_per_second: float = 1.0, max_tokens: float = 10.0):
+        """
+        Args:
+            ratio: 重試數佔請求數的比例上限
+            min_retries_per_second: 每秒固定補充的重試額度
+            max_tokens: token 上限 (可累積的重試額度)
+        """
+        if ratio < 0 or min_retries_per_second < 0 or max_tokens < 1:
+            raise ValueError('ratio、min_retries_per_second 不可為負數，max_tokens 至少為 1')
+
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.max_tokens = max_tokens
+
+        self._lock = threading.Lock()
+        self._tokens = min(max_tokens, min_retries_per_second)
+        self._updated = time.monotonic()
+        self._counters = {'requests': 0, 'retries': 0, 'exhausted': 0}
+
+    def _refill(self, amount: float = 0.0):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens,
+                           self._tokens + amount + (now - self._updated) * self.min_retries_per_second)
+        self._updated = now
+
+    def record_request(self):
+        """記錄一次請求 (不含重試)"""
+        with self._lock:
+            self._counters['requests'] += 1
+            self._refill(self.ratio)
+
+    def try_acquire(self) -> bool:
+        """取得一次重試額度"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self._counters['retries'] += 1
+                return True
+            self._counters['exhausted'] += 1
+            return False
+
+    def metrics(self) -> Dict[str, Any]:
+        """狀態指標"""
+        with self._lock:
+            self._refill()
+            return {'tokens': self._tokens, **self._counters}
+
+
+def backoff_delay(strategy: RetryStrategy, retry_count: int, backoff_factor: float = 2.0,
+                  jitter: JitterStrategy = JitterStrategy.NONE, previous: Optional[float] = None,
+                  max_delay: float = 60.0) -> float:
+    """
+    計算重試等待秒數
+
+    Args:
+        strategy: 重試策略 (IMMEDIATE = 0；LINEAR_BACKOFF = backoff_factor × 次數；
+                  其他 = backoff_factor ** retry_count)
+        retry_count: 已重試次數 (第一次重試為 0)
+        backoff_factor: 退避倍數
+        jitter: 抖動方式
+        previous: 上次等待秒數 (DECORRELATED 使用)
+        max_delay: 等待秒數上限
+
+    Returns:
+        等待秒數
+    """
+    if strategy == RetryStrategy.IMMEDIATE:
+        return 0.0
+    if strategy == RetryStrategy.LINEAR_BACKOFF:
+        base, delay = backoff_factor, backoff_factor * (retry_count + 1)
+    else:
+        base, delay = 1.0, backoff_factor ** retry_count
+
+    if jitter == JitterStrategy.FULL:
+        delay = random.uniform(0, delay)
+    elif jitter == JitterStrategy.DECORRELATED:
+        delay = random.uniform(base, max(previous or base, base) * 3)
+    return min(delay, max_delay)
+
+
+def _guarded_call(func: Callable, args: tuple, kwargs: dict, circuit_breaker: Optional[CircuitBreaker],
+                  limiter: Optional[AdaptiveConcurrencyLimiter]) -> Any:
+    """經由熔斷器與併發限制呼叫 func，並回報結果 (取消或中斷時一樣歸還名額)"""
+    if circuit_breaker is not None:
+        circuit_breaker.before_call()
+    started = limiter.acquire() if limiter is not None else None
+
+    error = None
+    try:
+        return func(*args, **kwargs)
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        if limiter is not None:
+            limiter.release(started, error)
+        if circuit_breaker is not None:
+            circuit_breaker.record_outcome(error)
+
+
+async def _guarded_call_async(func: Callable, args: tuple, kwargs: dict,
+                              circuit_breaker: Optional[CircuitBreaker],
+                              limiter: Optional[AdaptiveConcurrencyLimiter]) -> Any:
+    """_guarded_call 的 coroutine 版本 (CancelledError 時歸還名額並撤回熔斷器的試探)"""
+    if circuit_breaker is not None:
+        circuit_breaker.before_call()
+    try:
+        started = await limiter.acquire_async() if limiter is not None else None
+    except BaseException:
+        # 等待名額時被取消: 尚未送出請求
+        if circuit_breaker is not None:
+            circuit_breaker.record_cancelled()
+        raise
+
+    error = None
+    try:
+        return await func(*args, **kwargs)
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        if limiter is not None:
+            limiter.release(started, error)
+        if circuit_breaker is not None:
+            circuit_breaker.record_outcome(error)
+
+
+# 使用錯誤遙測時，retry_on_error 不再逐次輸出日誌
+_NULL_LOGGER = logging.getLogger('retry_decorator.null')
+_NULL_LOGGER.addHandler(logging.NullHandler())
+_NULL_LOGGER.propagate = False
+_NULL_LOGGER.disabled = True
+
+
 def retry_on_error(
     max_retries: int = 3,
     backoff_factor: float = 2.0,
     retryable_errors: Optional[List[str]] = None,
-    logger: Optional[logging.Logger] = None
+    logger: Optional[logging.Logger] = None,
+    circuit_breaker: Optional[CircuitBreaker] = None,
+    limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+    jitter: JitterStrategy = JitterStrategy.NONE,
+    max_delay: float = 60.0,
+    retry_budget: Optional[RetryBudget] = None,
+    handler: Optional[InvoiceErrorHandler] = None,
+    telemetry: Optional[ErrorTelemetry] = None
 ) -> Callable:
     """
-    自動重試裝飾器 (指數退避)
+    自動重試裝飾器 (同步函數與 coroutine 函數皆可)
+
+    是否重試與等待方式依錯誤碼的 ErrorInfo 決定: is_retryable 為 False 時不重試，
+    retry_strategy 為 IMMEDIATE 時立即重試、LINEAR_BACKOFF 線性退避、其他指數退避。
+    coroutine 函數以 asyncio.sleep 等待，不阻塞事件迴圈。
 
     Args:
         max_retries: 最大重試次數
-        backoff_factor: 退避倍數 (每次重試等待時間 = backoff_factor ** retry_count)
-        retryable_errors: 可重試的錯誤碼清單
+        backoff_factor: 退避倍數 (指數退避等待時間 = backoff_factor ** retry_count)
+        retryable_errors: 可重試的錯誤碼清單 (指定時取代 ErrorInfo.is_retryable 的判斷)
         logger: 自訂 Logger
+        circuit_breaker: 熔斷器；熔斷中直接丟出 CircuitOpenError，不再等待重試
+        limiter: 自適應併發限制，每次呼叫 (含重試) 都佔用一個名額
+        jitter: 退避抖動方式 (建議 FULL 或 DECORRELATED)
+        max_delay: 單次等待秒數上限
+        retry_budget: 重試預算 (可跨函數共用)；額度用完時直接丟出原本的例外
+        handler: 錯誤碼對照用的 InvoiceErrorHandler
+        telemetry: 錯誤遙測；指定時每次失敗記錄為事件 (含耗時與重試次數)，不再逐次輸出日誌
 
     Returns:
         裝飾器函數
@@ -326,50 +934,97 @@ def retry_on_error(
         ... def issue_invoice(data):
         ...     # 發票開立邏輯
         ...     pass
-    """
-    if retryable_errors is None:
-        retryable_errors = ['10000005', 'NETWORK_ERROR', 'SERVER_ERROR', 'TIMEOUT_ERROR']
 
+        >>> budget = RetryBudget(ratio=0.1)
+        >>> @retry_on_error(max_retries=3, jitter=JitterStrategy.FULL, retry_budget=budget)
+        ... async def issue_invoice_async(data):
+        ...     pass
+    """
     if logger is None:
         logger = logging.getLogger('retry_decorator')
         logger.setLevel(logging.INFO)
 
-    def decorator(func: Callable) -> Callable:
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            last_exception = None
+    if handler is None:
+        handler = InvoiceErrorHandler(logger=logger)
+
+    def plan_retry(error: Exception, retry_count: int, previous: Optional[float],
+                   latency: float) -> Optional[float]:
+        """回傳等待秒數；None 表示不重試"""
+        info = handler.classify_exception(error)
+        strategy = info.retry_strategy
+        if telemetry is not None:
+            telemetry.record(info, handler.provider, latency, retry_count)
+        log = logger if telemetry is None else _NULL_LOGGER
+
+        # 檢查是否可重試
+        if retryable_errors is None:
+            retryable = info.is_retryable
+        else:
+            retryable = info.code in retryable_errors
+            if strategy == RetryStrategy.NO_RETRY:
+                strategy = RetryStrategy.EXPONENTIAL_BACKOFF
 
-            for retry_count in range(max_retries + 1):
-                try:
-                    return func(*args, **kwargs)
+        if not retryable:
+            log.error(f"錯誤不可重試: {info.code} - {str(error)}")
+            return None
 
-                except Exception as e:
-                    last_exception = e
+        # 已達最大重試次數
+        if retry_count >= max_retries:
+            log.error(f"已達最大重試次數 ({max_retries})，放棄重試")
+            return None
 
-                    # 檢查是否可重試
-                    error_code = getattr(e, 'error_code', 'UNKNOWN')
+        # 已熔斷: 不佔用執行緒等待退避
+        if circuit_breaker is not None and circuit_breaker.state == CircuitState.OPEN:
+            log.error(f"{circuit_breaker.name} 已熔斷，放棄重試")
+            return None
 
-                    if error_code not in retryable_errors:
-                        logger.error(f"錯誤不可重試: {error_code} - {str(e)}")
-                        raise
+        if retry_budget is not None and not retry_budget.try_acquire():
+            log.error(f"重試預算已用完，放棄重試 ({info.code})")
+            return None
 
-                    # 已達最大重試次數
-                    if retry_count >= max_retries:
-                        logger.error(f"已達最大重試次數 ({max_retries})，放棄重試")
-                        raise
+        wait_time = backoff_delay(strategy, retry_count, backoff_factor, jitter, previous, max_delay)
 
-                    # 計算等待時間 (指數退避)
-                    wait_time = backoff_factor ** retry_count
+        log.warning(
+            f"第 {retry_count + 1}/{max_retries} 次重試失敗 ({info.code}), "
+            f"{wait_time:.1f} 秒後重試..."
+        )
+        return wait_time
 
-                    logger.warning(
-                        f"第 {retry_count + 1}/{max_retries} 次重試失敗 ({error_code}), "
-                        f"{wait_time:.1f} 秒後重試..."
-                    )
+    def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if retry_budget is not None:
+                    retry_budget.record_request()
+                wait_time = None
+
+                for retry_count in range(max_retries + 1):
+                    started = time.perf_counter()
+                    try:
+                        return await _guarded_call_async(func, args, kwargs, circuit_breaker, limiter)
+                    except Exception as e:
+                        wait_time = plan_retry(e, retry_count, wait_time, time.perf_counter() - started)
+                        if wait_time is None:
+                            raise
+                        await asyncio.sleep(wait_time)
+
+            return async_wrapper
 
-                    time.sleep(wait_time)
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if retry_budget is not None:
+                retry_budget.record_request()
+            wait_time = None
 
-            # 如果所有重試都失敗
-            raise last_exception
+            for retry_count in range(max_retries + 1):
+                started = time.perf_counter()
+                try:
+                    return _guarded_call(func, args, kwargs, circuit_breaker, limiter)
+                except Exception as e:
+                    wait_time = plan_retry(e, retry_count, wait_time, time.perf_counter() - started)
+                    if wait_time is None:
+                        raise
+                    time.sleep(wait_time)
 
         return wrapper
     return decorator
@@ -410,7 +1065,7 @@ if __name__ == '__main__':
     @retry_on_error(max_retries=3, backoff_factor=1.5)
     def flaky_api_call():
         """模擬不穩定的 API 呼叫"""
-        nonlocal attempt
+        global attempt
         attempt += 1
 
         print(f"第 {attempt} 次呼叫...")
@@ -429,6 +1084,27 @@ if __name__ == '__main__':
     except Exception as e:
         print(f"\n✗ API 呼叫失敗: {str(e)}")
 
+    # 範例 4: 熔斷器
+    print("\n=== 範例 4: 熔斷器 ===\n")
+
+    breakers = CircuitBreakerRegistry(handler, failure_threshold=3, recovery_timeout=30)
+    breaker = breakers.get('ecpay', 'Issue')
+
+    @retry_on_error(max_retries=0, circuit_breaker=breaker)
+    def outage_api_call():
+        """模擬服務商中斷"""
+        raise ConnectionError("連線被拒")
+
+    for i in range(5):
+        try:
+            outage_api_call()
+        except CircuitOpenError as e:
+            print(f"第 {i + 1} 次: 未送出 ({e})")
+        except ConnectionError as e:
+            print(f"第 {i + 1} 次: {e}")
+
+    print(f"\n熔斷器狀態: {breakers.metrics()}")
+
     print("\n" + "="*60)
     print("範例執行完畢!")
     print("="*60)
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - 錯誤遙測 (結構化事件、計數、日誌去重、Prometheus 匯出)
+
+InvoiceErrorHandler.log_error 每次都組出含 context 的完整日誌字串，服務商中斷時每分鐘
+數萬行幾乎相同的日誌會塞滿日誌管線。ErrorTelemetry 改為:
+
+- 結構化事件 (服務商、錯誤碼、類別、延遲、重試次數) 寫入固定大小的環狀緩衝區
+- 依 (服務商, 錯誤碼) 累計次數，並以每秒分桶計算滑動視窗內的發生率
+- 日誌去重: 每個 (服務商, 錯誤碼) 每個視窗只輸出第一筆完整日誌，其餘於視窗結束時彙總為
+  "[ECPAY] 錯誤碼 10000005 x 1,204 (最近 60 秒)"；可另外依比例抽樣輸出
+- 匯出 hook: 由背景執行緒定期呼叫，例如 PrometheusFileExporter 寫出 Prometheus 文字格式
+
+record() 只把事件放進佇列 (不取鎖、不格式化字串、不做 I/O)；計數、日誌與匯出都在背景
+執行緒進行，不會阻塞請求。佇列超過 max_pending 時丟棄事件並計入 dropped。
+
+使用範例:
+    from error_handler import InvoiceErrorHandler, retry_on_error
+    from error_telemetry import ErrorTelemetry, PrometheusFileExporter
+
+    telemetry = ErrorTelemetry(exporters=[PrometheusFileExporter('/var/lib/node_exporter/invoice.prom')])
+    handler = InvoiceErrorHandler('ecpay', telemetry=telemetry)
+    handler.log_error('10000005', context={'relate_number': 'ORD123'}, latency=0.35)
+
+    @retry_on_error(max_retries=3, handler=handler, telemetry=telemetry)
+    def issue_invoice(data):
+        pass
+
+    print(telemetry.rate('ecpay', '10000005'), telemetry.top(5))
+    telemetry.close()
+"""
+
+import logging
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from error_registry import ErrorCategory, ErrorInfo
+
+# 匯出 hook: 收到 ErrorTelemetry，於背景執行緒呼叫
+Exporter = Callable[['ErrorTelemetry'], None]
+
+
+@dataclass(frozen=True)
+class ErrorEvent:
+    """單次錯誤事件"""
+    timestamp: float
+    provider: str
+    info: ErrorInfo
+    latency: Optional[float] = None  # 請求耗時 (秒)
+    retry_count: int = 0  # 第幾次重試 (0 = 第一次呼叫)
+    context: Optional[Dict[str, Any]] = None  # 只保留參考，輸出日誌時才格式化
+
+    @property
+    def code(self) -> str:
+        return self.info.code
+
+    @property
+    def category(self) -> ErrorCategory:
+        return self.info.category
+
+
+class _ErrorStats:
+    """單一 (服務商, 錯誤碼) 的累計值 (只在背景執行緒更新)"""
+
+    __slots__ = ('info', 'total', 'retries', 'latency_sum', 'latency_count', 'buckets',
+                 'window_start', 'window_count', 'suppressed', 'last_context')
+
+    def __init__(self, info: ErrorInfo):
+        self.info = info
+        self.total = 0
+        self.retries = 0
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.buckets: Deque[List[int]] = deque()  # [秒, 次數]
+        self.window_start = 0.0
+        self.window_count = 0  # 目前日誌視窗內的事件數 (含已輸出完整日誌的第一筆與抽樣)
+        self.suppressed = 0  # 其中未輸出完整日誌的事件數
+        self.last_context: Optional[Dict[str, Any]] = None
+
+    def add(self, event: ErrorEvent):
+        self.total += 1
+        if event.retry_count:
+            self.retries += 1
+        if event.latency is not None:
+            self.latency_sum += event.latency
+            self.latency_count += 1
+
+        second = int(event.timestamp)
+        if self.buckets and self.buckets[-1][0] == second:
+            self.buckets[-1][1] += 1
+        else:
+            self.buckets.append([second, 1])
+
+    def prune(self, now: float, window: float):
+        cutoff = now - window
+        while self.buckets and self.buckets[0][0] < cutoff:
+            self.buckets.popleft()
+
+    def count(self, now: float, window: float) -> int:
+        cutoff = now - window
+        return sum(count for second, count in self.buckets if second >= cutoff)
+
+
+class ErrorTelemetry:
+    """
+    錯誤遙測
+
+    多個 InvoiceErrorHandler / retry_on_error 可共用同一個實例。
+    background=False 時不建立背景執行緒，由呼叫端以 flush() 彙整 (測試或批次工具使用)。
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None, window_seconds: float = 60.0,
+                 ring_size: int = 10000, max_pending: int = 100000, sample_rate: float = 0.0,
+                 exporters: Iterable[Exporter] = (), export_interval: float = 15.0,
+                 flush_interval: float = 0.5, background: bool = True):
+        """
+        Args:
+            logger: 去重後的日誌輸出對象
+            window_seconds: 發生率與日誌去重的視窗秒數
+            ring_size: 環狀緩衝區保留的最近事件數
+            max_pending: 背景執行緒尚未處理的事件上限 (超過時丟棄)
+            sample_rate: 視窗內重複的事件仍輸出完整日誌的比例 (0 = 只輸出第一筆)
+            exporters: 匯出 hook
+            export_interval: 匯出間隔秒數
+            flush_interval: 背景執行緒彙整間隔秒數
+            background: 是否建立背景執行緒
+        """
+        self.logger = logger or logging.getLogger('InvoiceErrorTelemetry')
+        self.window_seconds = window_seconds
+        self.max_pending = max_pending
+        self.sample_rate = sample_rate
+        self.exporters: List[Exporter] = list(exporters)
+        self.export_interval = export_interval
+        self.flush_interval = flush_interval
+
+        self.events: Deque[ErrorEvent] = deque(maxlen=ring_size)
+        self.dropped = 0  # 近似值 (多執行緒同時丟棄時可能少計)
+
+        self._pending: 'queue.SimpleQueue[ErrorEvent]' = queue.SimpleQueue()
+        self._stats: Dict[Tuple[str, str], _ErrorStats] = {}
+        self._stats_lock = threading.Lock()  # 只在背景執行緒與查詢之間使用
+        self._flush_lock = threading.Lock()
+        self._last_export = time.monotonic()
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name='invoice-error-telemetry', daemon=True)
+            self._thread.start()
+
+    # ------------------------------------------------------------------
+    # 請求路徑
+    # ------------------------------------------------------------------
+
+    def record(self, info: ErrorInfo, provider: Optional[str] = None, latency: Optional[float] = None,
+               retry_count: int = 0, context: Optional[Dict[str, Any]] = None) -> Optional[ErrorEvent]:
+        """
+        記錄錯誤事件 (不阻塞)
+
+        Args:
+            info: 錯誤資訊
+            provider: 服務商 (預設為 info.provider)
+            latency: 請求耗時 (秒)
+            retry_count: 第幾次重試
+            context: 額外上下文資訊
+
+        Returns:
+            事件；佇列已滿而丟棄時為 None
+        """
+        if self._pending.qsize() >= self.max_pending:
+            self.dropped += 1
+            return None
+        event = ErrorEvent(time.time(), provider or info.provider, info, latency, retry_count, context)
+        self.events.append(event)
+        self._pending.put(event)
+        return event
+
+    # ------------------------------------------------------------------
+    # 背景彙整
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+                if self.exporters and time.monotonic() - self._last_export >= self.export_interval:
+                    self.export()
+            except Exception:
+                self.logger.exception('錯誤遙測彙整失敗')
+
+    def flush(self, now: Optional[float] = None) -> int:
+        """
+        彙整佇列中的事件、輸出去重後的日誌
+
+        Args:
+            now: 目前時間 (測試用)
+
+        Returns:
+            本次處理的事件數
+        """
+        with self._flush_lock:
+            processed = 0
+            while True:
+                try:
+                    event = self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                self._aggregate(event)
+                processed += 1
+            self._close_windows(time.time() if now is None else now)
+            return processed
+
+    def _aggregate(self, event: ErrorEvent):
+        key = (event.provider, event.code)
+        with self._stats_lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _ErrorStats(event.info)
+            stats.add(event)
+
+        if stats.window_start == 0.0 or event.timestamp - stats.window_start >= self.window_seconds:
+            self._emit_summary(event.provider, stats)
+            stats.window_start = event.timestamp
+            stats.window_count = 1
+            self._log_event(event)
+            return
+
+        stats.window_count += 1
+        stats.last_context = event.context
+        if self.sample_rate and random.random() < self.sample_rate:
+            self._log_event(event)
+        else:
+            stats.suppressed += 1
+
+    def _close_windows(self, now: float):
+        """視窗結束時輸出彙總，並移除視窗外的分桶"""
+        with self._stats_lock:
+            items = list(self._stats.items())
+        for (provider, _), stats in items:
+            if stats.window_start and now - stats.window_start >= self.window_seconds:
+                self._emit_summary(provider, stats)
+                stats.window_start = 0.0
+            stats.prune(now, self.window_seconds)
+
+    def _level(self, info: ErrorInfo) -> int:
+        """日誌等級 (同 InvoiceErrorHandler.log_error)"""
+        if info.category in (ErrorCategory.NETWORK, ErrorCategory.SERVER):
+            return logging.WARNING
+        if info.is_retryable:
+            return logging.INFO
+        return logging.ERROR
+
+    def _log_event(self, event: ErrorEvent):
+        info = event.info
+        message = f"[{event.provider.upper()}] 錯誤碼: {info.code} | {info.message}"
+        if event.retry_count:
+            message += f" | 重試: {event.retry_count}"
+        if event.latency is not None:
+            message += f" | 耗時: {event.latency * 1000:.0f} ms"
+        if event.context:
+            message += f" | 上下文: {event.context}"
+        message += f" | 建議: {info.suggestion}"
+        self.logger.log(self._level(info), message)
+
+    def _emit_summary(self, provider: str, stats: _ErrorStats):
+        """有未輸出的事件時彙總整個視窗 (次數含已輸出完整日誌的事件)"""
+        if not stats.suppressed:
+            return
+        info = stats.info
+        message = (f"[{provider.upper()}] 錯誤碼 {info.code} x {stats.window_count:,} "
+                   f"(最近 {self.window_seconds:.0f} 秒) | {info.message}")
+        if stats.last_context:
+            message += f" | 最後上下文: {stats.last_context}"
+        self.logger.log(self._level(info), message)
+        stats.suppressed = 0
+        stats.window_count = 0
+        stats.last_context = None
+
+    # ------------------------------------------------------------------
+    # 查詢與匯出
+    # ------------------------------------------------------------------
+
+    def count(self, provider: str, code: str) -> int:
+        """累計次數 (已彙整的事件)"""
+        with self._stats_lock:
+            stats = self._stats.get((provider.lower(), str(code)))
+            return stats.total if stats else 0
+
+    def rate(self, provider: str, code: str, window: Optional[float] = None,
+             now: Optional[float] = None) -> float:
+        """滑動視窗內每秒發生次數 (window 不超過 window_seconds)"""
+        window = min(window or self.window_seconds, self.window_seconds)
+        now = time.time() if now is None else now
+        with self._stats_lock:
+            stats = self._stats.get((provider.lower(), str(code)))
+            return stats.count(now, window) / window if stats else 0.0
+
+    def top(self, n: int = 10, now: Optional[float] = None) -> List[Tuple[str, str, int]]:
+        """視窗內發生最多的 (服務商, 錯誤碼, 次數)"""
+        now = time.time() if now is None else now
+        with self._stats_lock:
+            counts = [(provider, code, stats.count(now, self.window_seconds))
+                      for (provider, code), stats in self._stats.items()]
+        return sorted((c for c in counts if c[2]), key=lambda c: -c[2])[:n]
+
+    def recent(self, n: int = 100) -> List[ErrorEvent]:
+        """環狀緩衝區中最近的 n 筆事件"""
+        events = list(self.events)
+        return events[-n:]
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """各 (服務商, 錯誤碼) 的累計值"""
+        now = time.time() if now is None else now
+        with self._stats_lock:
+            return {
+                key: {
+                    'category': stats.info.category.value,
+                    'total': stats.total,
+                    'retries': stats.retries,
+                    'latency_sum': stats.latency_sum,
+                    'latency_count': stats.latency_count,
+                    'rate': stats.count(now, self.window_seconds) / self.window_seconds,
+                }
+                for key, stats in self._stats.items()
+            }
+
+    def export(self):
+        """呼叫所有匯出 hook (單一 hook 失敗不影響其他 hook)"""
+        self._last_export = time.monotonic()
+        for exporter in self.exporters:
+            try:
+                exporter(self)
+            except Exception:
+                self.logger.exception(f'錯誤遙測匯出失敗: {exporter!r}')
+
+    def close(self):
+        """停止背景執行緒，彙整剩餘事件並匯出"""
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._flush_lock, self._stats_lock:
+            for (provider, _), stats in self._stats.items():
+                self._emit_summary(provider, stats)
+        if self.exporters:
+            self.export()
+
+    def __enter__(self) -> 'ErrorTelemetry':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(telemetry: ErrorTelemetry, prefix: str = 'invoice') -> str:
+    """
+    Prometheus 文字格式
+
+    Args:
+        telemetry: 錯誤遙測
+        prefix: 指標名稱前綴
+    """
+    snapshot = telemetry.snapshot()
+    metrics = (
+        ('errors_total', 'counter', '錯誤次數', 'total'),
+        ('error_retries_total', 'counter', '重試時發生的錯誤次數', 'retries'),
+        ('error_rate', 'gauge', f'最近 {telemetry.window_seconds:.0f} 秒每秒錯誤次數', 'rate'),
+        ('error_latency_seconds_sum', 'counter', '錯誤請求耗時總和', 'latency_sum'),
+        ('error_latency_seconds_count', 'counter', '有耗時資料的錯誤請求數', 'latency_count'),
+    )
+
+    lines = []
+    for name, kind, help_text, field in metrics:
+        lines.append(f'# HELP {prefix}_{name} {help_text}')
+        lines.append(f'# TYPE {prefix}_{name} {kind}')
+        for (provider, code), stats in sorted(snapshot.items()):
+            labels = f'provider="{_label(provider)}",code="{_label(code)}",category="{stats["category"]}"'
+            lines.append(f'{prefix}_{name}{{{labels}}} {stats[field]}')
+
+    lines.append(f'# HELP {prefix}_error_events_dropped_total 佇列已滿而丟棄的事件數')
+    lines.append(f'# TYPE {prefix}_error_events_dropped_total counter')
+    lines.append(f'{prefix}_error_events_dropped_total {telemetry.dropped}')
+    return '\n'.join(lines) + '\n'
+
+
+class PrometheusFileExporter:
+    """
+    將 Prometheus 文字格式寫入檔案 (供 node_exporter textfile collector 讀取)
+
+    先寫入同目錄的暫存檔再 os.replace，讀取端不會讀到寫到一半的檔案。
+    """
+
+    def __init__(self, path: str, prefix: str = 'invoice'):
+        self.path = path
+        self.prefix = prefix
+
+    def __call__(self, telemetry: ErrorTelemetry):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.telemetry-', suffix='.prom')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(prometheus_text(telemetry, self.prefix))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def __repr__(self) -> str:
+        return f'PrometheusFileExporter({self.path!r})'
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+
+    from error_handler import InvoiceErrorHandler
+
+    handler = InvoiceErrorHandler('ecpay')
+    with ErrorTelemetry(window_seconds=60, background=False) as telemetry:
+        timestamp_expired = handler.get_error_info('10000005')
+        network = handler.get_error_info('NETWORK_ERROR')
+        for i in range(1204):
+            telemetry.record(timestamp_expired, 'ecpay', latency=0.2, context={'relate_number': f'ORD{i:05d}'})
+        for i in range(30):
+            telemetry.record(network, 'ecpay', retry_count=1)
+        telemetry.flush()
+
+        print(f"\n10000005: {telemetry.count('ecpay', '10000005')} 次，{telemetry.rate('ecpay', '10000005'):.1f} 次/秒")
+        print(f"最多: {telemetry.top(3)}\n")
+        print(prometheus_text(telemetry))
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - 範例模組載入
+
+examples/ 目錄下的範例檔名含連字號 (例如 ecpay-invoice-example.py)，
+無法直接 import，統一由此載入並快取，讓 scripts/ 下的工具可以共用
+範例中的資料結構與加解密實作。
+
+使用範例:
+    from example_loader import load_example
+
+    ecpay = load_example('ecpay-invoice-example')
+    service = ecpay.ECPayInvoiceService('2000132', 'ejCk326UnaZWKisg', 'q9jcZX8Ib9LM8wYk')
+"""
+
+import sys
+import importlib.util
+from functools import lru_cache
+from pathlib import Path
+from types import ModuleType
+
+EXAMPLES_DIR = Path(__file__).parent.parent / 'examples'
+
+
+@lru_cache(maxsize=None)
+def load_example(name: str) -> ModuleType:
+    """
+    載入範例模組
+
+    Args:
+        name: 範例檔名 (不含 .py)
+
+    Returns:
+        範例模組
+
+    Raises:
+        FileNotFoundError: 範例檔案不存在
+    """
+    path = EXAMPLES_DIR / f'{name}.py'
+    if not path.exists():
+        raise FileNotFoundError(f'找不到範例檔案: {path}')
+
+    # 範例之間也會互相載入，已載入的模組直接沿用以免類別重複定義
+    module_name = name.replace('-', '_')
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+
+    # dataclass 需要在 sys.modules 中找到模組
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+
+    return module
@@ -239,6 +239,16 @@ import urllib.parse
 from typing import Dict, Any, Optional, List
 from dataclasses import dataclass
 
+try:
+    # taiwan-invoice/scripts/http_transport.py: 依 base URL 共用連線池 (keep-alive)，連線 / 讀取逾時分開設定
+    from http_transport import get_default_transport
+except ImportError:
+    import requests
+
+    def get_default_transport():
+        """未附帶 http_transport.py 時直接使用 requests 模組"""
+        return requests
+
 @dataclass
 class InvoiceIssueData:
     order_id: str
@@ -272,8 +282,20 @@ class {class_name}InvoiceService:
     TEST_MERCHANT_ID = '{test_merchant_id}'
 {test_credentials_py}
 
-    def __init__(self, is_prod: bool = False):
+    def __init__(self, is_prod: bool = False, transport: Optional[Any] = None):
+        """
+        Args:
+            is_prod: 是否為正式環境
+            transport: HTTP transport (http_transport.SyncTransport)，多個服務可共用同一個連線池；
+                       未指定時使用 get_default_transport()
+        """
         self.api_base_url = self.PROD_URL if is_prod else self.TEST_URL
+        self.transport = transport or get_default_transport()
+
+    def _post(self, endpoint: str, **kwargs):
+        """經由 transport 送出 API 請求 (未指定 timeout 時為 30 秒，transport 為 requests 模組時也不會無限等待)"""
+        kwargs.setdefault('timeout', 30)
+        return self.transport.post(f"{{self.api_base_url}}{{endpoint}}", **kwargs)
 
     def issue_invoice(self, merchant_id: str, hash_key: str, hash_iv: str,
                       data: InvoiceIssueData) -> InvoiceIssueResponse:
@@ -291,7 +313,7 @@ class {class_name}InvoiceService:
 {issue_fields_py}
         }}
 
-        # TODO: 實作加密/簽章和 API 請求
+        # TODO: 實作加密/簽章，以 self._post('{issue_endpoint}', ...) 送出
         # {auth_method}
 
         return InvoiceIssueResponse(
@@ -314,7 +336,7 @@ class {class_name}InvoiceService:
             "Reason": reason,
         }}
 
-        # TODO: 實作 API 請求
+        # TODO: 以 self._post('{void_endpoint}', ...) 送出
 
         return {{"success": True, "msg": "發票作廢成功"}}
 
@@ -337,7 +359,8 @@ class {class_name}InvoiceService:
         B2B: TaxAmount = 稅額, SalesAmount = 未稅
         """
         if is_b2b:
-            tax_amount = round(total_amount - (total_amount / 1.05))
+            # round(total_amount - total_amount / 1.05) = round(total_amount / 21)，整數運算避免浮點誤差
+            tax_amount = (total_amount * 2 + 21) // 42
             sales_amount = total_amount - tax_amount
             return {{"sales_amount": sales_amount, "tax_amount": tax_amount, "total_amount": total_amount}}
         else:
@@ -669,6 +692,8 @@ def generate_service(provider: str, lang: str = 'typescript', output_dir: str =
     print(f"1. 檢查生成的程式碼")
     print(f"2. 完成 TODO 標記的部分")
     print(f"3. 整合到專案中")
+    if lang == 'python':
+        print(f"4. 一併複製 scripts/http_transport.py (共用連線池)，或以 transport 參數注入")
 
 
 def main():
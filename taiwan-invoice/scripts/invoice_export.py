@@ -0,0 +1,682 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - 發票期別匯出 (CSV / JSONL / MIG XML)
+
+稽核與上傳財政部平台需要匯出一個雙月期別內開立的所有發票與折讓，資料量可達數百萬筆。
+匯出器逐筆寫出，記憶體用量與資料量無關:
+
+- 來源: 已開立發票 (InvoiceIssueData + InvoiceIssueResponse) 與折讓 (InvoiceAllowanceData +
+  折讓單號 / 日期)；可由匯出的 JSONL (read_records) 或 invoice_outbox 的 SQLite (outbox_records) 讀取
+- 格式:
+    csv     每個商品明細一列 (沒有明細的發票一列)，含發票 / 折讓共用欄位
+    jsonl   每張發票 / 折讓一行，可再以 read_records 讀回
+    mig     MIG 4.0 F0401 (開立) / G0401 (折讓) 欄位配置，以 <InvoiceExport> 包住多張；
+            上傳前請以平台提供的 XSD 驗證
+- 壓縮: 輸出路徑以 .gz 結尾時寫出 gzip
+- 平行: export_parallel() 將期別依日期切成多段，各段由 worker 寫入暫存分割檔，
+  再依日期順序串接 (gzip 分割檔直接串接為多 member 的 gzip 檔，不需解壓)
+
+使用範例:
+    from invoice_export import Seller, export, export_parallel, read_records, JsonlSource
+    from invoice_tracks import Period
+
+    period = Period.parse('11302')
+    export(read_records('issued.jsonl'), 'export-11302.csv.gz', 'csv', period=period)
+    export_parallel(JsonlSource(['issued.jsonl']), 'export-11302.xml.gz', 'mig', period,
+                    seller=Seller('12345678', '範例股份有限公司'), workers=4)
+
+用法:
+    python invoice_export.py issued.jsonl -o export-11302.xml.gz --format mig --period 11302 \\
+        --seller-id 12345678 --seller-name 範例股份有限公司 --workers 4
+    python invoice_export.py invoice-outbox.db -o export-11302.csv --period 11302
+"""
+
+import csv
+import dataclasses
+import gzip
+import io
+import json
+import shutil
+import sqlite3
+import tempfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, ClassVar, Dict, IO, Iterable, Iterator, List, Optional, Tuple, Union
+
+from example_loader import load_example
+from invoice_tracks import Period
+from tax_calculator import get_tax_calculator
+
+example = load_example('ecpay-invoice-example')
+InvoiceIssueData = example.InvoiceIssueData
+InvoiceAllowanceData = example.InvoiceAllowanceData
+InvoiceIssueResponse = example.InvoiceIssueResponse
+
+FORMATS = ('csv', 'jsonl', 'mig')
+EXECUTORS = ('thread', 'process')
+
+F0401_NAMESPACE = 'urn:GEINV:eInvoiceMessage:F0401:4.0'
+G0401_NAMESPACE = 'urn:GEINV:eInvoiceMessage:G0401:4.0'
+
+# ECPay CarrierType → MIG 載具類別號碼
+MIG_CARRIER_TYPES = {
+    '1': 'EJ0113',  # 綠界會員載具
+    '2': 'CQ0001',  # 自然人憑證
+    '3': '3J0002',  # 手機條碼
+}
+
+CSV_COLUMNS = (
+    'kind', 'merchant_id', 'number', 'date', 'invoice_no', 'invoice_date', 'relate_number', 'random_number',
+    'buyer_identifier', 'buyer_name', 'tax_type', 'sales_amount', 'tax_amount', 'total_amount',
+    'item_seq', 'item_name', 'item_count', 'item_word', 'item_price', 'item_tax_type', 'item_amount',
+)
+
+
+B2C_IDENTIFIER = '0000000000'
+
+# SQLite 中與 _parse_day 相同的日期正規化 ('2024/01/15 10:00:00' → '2024-01-15 10:00:00')
+SQL_INVOICE_DATE = "replace(invoice_date, '/', '-')"
+
+
+def _parse_day(text: str) -> date:
+    """'2024-01-15 10:00:00' / '2024/01/15' → date"""
+    return date.fromisoformat(str(text)[:10].replace('/', '-'))
+
+
+@dataclass
+class Seller:
+    """賣方 (MIG 的 Seller；ECPay 的 MerchantID 不是統一編號)"""
+    identifier: str = ''
+    name: str = ''
+
+
+@dataclass
+class IssuedInvoice:
+    """已開立的發票"""
+    kind: ClassVar[str] = 'invoice'
+    data: Any  # InvoiceIssueData
+    response: Any  # InvoiceIssueResponse
+
+    @property
+    def day(self) -> date:
+        return _parse_day(self.response.invoice_date)
+
+
+@dataclass
+class IssuedAllowance:
+    """
+    已開立的折讓
+
+    InvoiceAllowanceData 沒有買方統編；buyer_identifier 取自原發票的 customer_identifier
+    (空白或 '0000000000' 為 B2C)，決定 MIG 的買方與折讓金額是否拆出稅額。
+    """
+    kind: ClassVar[str] = 'allowance'
+    data: Any  # InvoiceAllowanceData
+    allowance_no: str
+    allowance_date: str  # 'YYYY-MM-DD HH:MM:SS'
+    buyer_identifier: str = ''
+
+    @classmethod
+    def of(cls, invoice: IssuedInvoice, data: Any, allowance_no: str, allowance_date: str) -> 'IssuedAllowance':
+        """原發票的折讓 (帶入原發票的買方)"""
+        return cls(data, allowance_no, allowance_date, invoice.data.customer_identifier or '')
+
+    @property
+    def day(self) -> date:
+        return _parse_day(self.allowance_date)
+
+    @property
+    def invoice_type(self) -> str:
+        return 'B2B' if self.buyer_identifier not in ('', B2C_IDENTIFIER) else 'B2C'
+
+
+Record = Union[IssuedInvoice, IssuedAllowance]
+
+
+def record_to_dict(record: Record) -> Dict[str, Any]:
+    """發票 / 折讓 → JSON 物件 (read_records 的格式)"""
+    # 淺複製即可 (只用於序列化)；dataclasses.asdict 的深複製在大量匯出時佔大部分時間
+    if isinstance(record, IssuedInvoice):
+        response = dict(vars(record.response))
+        response.pop('raw', None)
+        return {'kind': record.kind, 'data': vars(record.data), 'response': response}
+    return {'kind': record.kind, 'data': vars(record.data), 'allowance_no': record.allowance_no,
+            'allowance_date': record.allowance_date, 'buyer_identifier': record.buyer_identifier}
+
+
+def record_from_dict(row: Dict[str, Any]) -> Record:
+    """
+    JSON 物件 → 發票 / 折讓
+
+    Raises:
+        ValueError: kind 不是 invoice / allowance
+    """
+    kind = row.get('kind')
+    if kind == IssuedInvoice.kind:
+        return IssuedInvoice(InvoiceIssueData(**row['data']), InvoiceIssueResponse(**row['response']))
+    if kind == IssuedAllowance.kind:
+        return IssuedAllowance(InvoiceAllowanceData(**row['data']), row['allowance_no'], row['allowance_date'],
+                               row.get('buyer_identifier', ''))
+    raise ValueError(f'不支援的紀錄類型: {kind}')
+
+
+def _open_text(path: Path, mode: str) -> IO:
+    if path.suffix == '.gz':
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def read_records(path: Union[str, Path]) -> Iterator[Record]:
+    """串流讀取 JSONL (可為 .gz)"""
+    with _open_text(Path(path), 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield record_from_dict(json.loads(line))
+
+
+def outbox_records(path: Union[str, Path], start: Optional[date] = None,
+                   end: Optional[date] = None) -> Iterator[IssuedInvoice]:
+    """
+    串流讀取 invoice_outbox 中已開立的發票
+
+    Args:
+        path: outbox SQLite 檔
+        start: 開立日期下限 (含)
+        end: 開立日期上限 (不含)
+
+    invoice_date 是平台回傳的原字串 ('YYYY-MM-DD ...' 或 'YYYY/MM/DD ...')，
+    比較與排序前先將 '/' 正規化為 '-' (同 read_records 的 _parse_day)。
+    """
+    query = 'SELECT payload, invoice_no, invoice_date, random_number FROM outbox WHERE status = ?'
+    params: List[Any] = ['issued']
+    if start is not None:
+        query += f' AND {SQL_INVOICE_DATE} >= ?'
+        params.append(start.isoformat())
+    if end is not None:
+        query += f' AND {SQL_INVOICE_DATE} < ?'
+        params.append(end.isoformat())
+
+    db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = db.execute(query + f' ORDER BY {SQL_INVOICE_DATE}, id', params)
+        for payload, invoice_no, invoice_date, random_number in rows:
+            yield IssuedInvoice(
+                InvoiceIssueData(**json.loads(payload)),
+                InvoiceIssueResponse(success=True, invoice_number=invoice_no, invoice_date=invoice_date,
+                                     random_number=random_number or '', rtn_code=1),
+            )
+    finally:
+        db.close()
+
+
+class JsonlSource:
+    """
+    export_parallel 的來源: JSONL 檔 (依日期過濾)
+
+    每個分段都會讀取全部檔案；資料已依日期分檔時可只列出對應的檔案。
+    """
+
+    def __init__(self, paths: Iterable[Union[str, Path]]):
+        self.paths = [Path(path) for path in paths]
+
+    def __call__(self, start: date, end: date) -> Iterator[Record]:
+        for path in self.paths:
+            for record in read_records(path):
+                if start <= record.day < end:
+                    yield record
+
+
+class OutboxSource:
+    """export_parallel 的來源: invoice_outbox 的 SQLite (以開立日期範圍查詢)"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def __call__(self, start: date, end: date) -> Iterator[Record]:
+        return outbox_records(self.path, start, end)
+
+
+# ============================================================================
+# 格式
+# ============================================================================
+
+def _amounts(data: Any) -> Tuple[int, int, int, int, int]:
+    """(應稅銷售額, 零稅率銷售額, 免稅銷售額, 稅額, 總計)"""
+    tax_type = str(data.tax_type)
+    total = data.total_amount or data.sales_amount + data.tax_amount
+    if tax_type == '9':
+        sums = {'1': 0, '2': 0, '3': 0}
+        for item in data.items:
+            key = str(item.get('ItemTaxType', '1'))
+            sums[key if key in sums else '1'] += int(item.get('ItemAmount', 0))
+        return sums['1'], sums['2'], sums['3'], data.tax_amount, total
+    if tax_type == '2':
+        return 0, data.sales_amount, 0, data.tax_amount, total
+    if tax_type == '3':
+        return 0, 0, data.sales_amount, data.tax_amount, total
+    return data.sales_amount, 0, 0, data.tax_amount, total
+
+
+def _item_tax_type(data: Any, item: Dict[str, Any]) -> str:
+    return str(item.get('ItemTaxType') or (data.tax_type if str(data.tax_type) != '9' else '1'))
+
+
+class CsvFormat:
+    """CSV: 每個商品明細一列"""
+    name = 'csv'
+
+    def __init__(self, seller: Optional[Seller] = None):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def _flush(self) -> str:
+        text = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return text
+
+    def header(self) -> str:
+        self._writer.writerow(CSV_COLUMNS)
+        return self._flush()
+
+    def render(self, record: Record) -> str:
+        data = record.data
+        if isinstance(record, IssuedInvoice):
+            response = record.response
+            common = [record.kind, data.merchant_id, response.invoice_number, response.invoice_date,
+                      response.invoice_number, response.invoice_date, data.relate_number, response.random_number,
+                      data.customer_identifier, data.customer_name, data.tax_type, data.sales_amount,
+                      data.tax_amount, data.total_amount]
+        else:
+            common = [record.kind, data.merchant_id, record.allowance_no, record.allowance_date,
+                      data.invoice_no, data.invoice_date, '', '', record.buyer_identifier, data.customer_name, '',
+                      '', '', data.allowance_amount]
+        if not data.items:
+            self._writer.writerow(common + [''] * 7)
+        for seq, item in enumerate(data.items, 1):
+            tax_type = _item_tax_type(data, item) if isinstance(record, IssuedInvoice) else item.get('ItemTaxType', '')
+            self._writer.writerow(common + [
+                seq, item.get('ItemName', ''), item.get('ItemCount', ''), item.get('ItemWord', ''),
+                item.get('ItemPrice', ''), tax_type, item.get('ItemAmount', ''),
+            ])
+        return self._flush()
+
+    def footer(self) -> str:
+        return ''
+
+
+class JsonlFormat:
+    """JSONL: 每張發票 / 折讓一行"""
+    name = 'jsonl'
+
+    def __init__(self, seller: Optional[Seller] = None):
+        pass
+
+    def header(self) -> str:
+        return ''
+
+    def render(self, record: Record) -> str:
+        return json.dumps(record_to_dict(record), ensure_ascii=False) + '\n'
+
+    def footer(self) -> str:
+        return ''
+
+
+def _sub(parent: ET.Element, tag: str, text: Any = None) -> ET.Element:
+    element = ET.SubElement(parent, tag)
+    if text is not None:
+        element.text = str(text)
+    return element
+
+
+def _party(parent: ET.Element, tag: str, identifier: str, name: str):
+    party = _sub(parent, tag)
+    _sub(party, 'Identifier', identifier)
+    _sub(party, 'Name', name)
+
+
+class MigFormat:
+    """MIG 4.0 F0401 / G0401 欄位配置"""
+    name = 'mig'
+
+    def __init__(self, seller: Optional[Seller] = None):
+        self.seller = seller or Seller()
+        self.calculator = get_tax_calculator()
+
+    def header(self) -> str:
+        return '<?xml version="1.0" encoding="UTF-8"?>\n<InvoiceExport>\n'
+
+    def footer(self) -> str:
+        return '</InvoiceExport>\n'
+
+    def render(self, record: Record) -> str:
+        element = self._invoice(record) if isinstance(record, IssuedInvoice) else self._allowance(record)
+        return ET.tostring(element, encoding='unicode') + '\n'
+
+    def _invoice(self, record: IssuedInvoice) -> ET.Element:
+        data, response = record.data, record.response
+        root = ET.Element('Invoice', xmlns=F0401_NAMESPACE)
+
+        main = _sub(root, 'Main')
+        _sub(main, 'InvoiceNumber', response.invoice_number)
+        _sub(main, 'InvoiceDate', record.day.strftime('%Y%m%d'))
+        _sub(main, 'InvoiceTime', str(response.invoice_date)[11:19] or '00:00:00')
+        _party(main, 'Seller', self.seller.identifier, self.seller.name)
+        _party(main, 'Buyer', data.customer_identifier or B2C_IDENTIFIER, data.customer_name)
+        _sub(main, 'InvoiceType', data.inv_type)
+        _sub(main, 'DonateMark', data.donation)
+        if data.carrier_type:
+            _sub(main, 'CarrierType', MIG_CARRIER_TYPES.get(str(data.carrier_type), data.carrier_type))
+            _sub(main, 'CarrierId1', data.carrier_num)
+            _sub(main, 'CarrierId2', data.carrier_num)
+        _sub(main, 'PrintMark', 'Y' if data.print == '1' else 'N')
+        if data.donation == '1':
+            _sub(main, 'NPOBAN', data.love_code)
+        _sub(main, 'RandomNumber', response.random_number)
+
+        details = _sub(root, 'Details')
+        for seq, item in enumerate(data.items, 1):
+            product = _sub(details, 'ProductItem')
+            _sub(product, 'Description', item.get('ItemName', ''))
+            _sub(product, 'Quantity', item.get('ItemCount', 0))
+            _sub(product, 'Unit', item.get('ItemWord', ''))
+            _sub(product, 'UnitPrice', item.get('ItemPrice', 0))
+            _sub(product, 'TaxType', _item_tax_type(data, item))
+            _sub(product, 'Amount', item.get('ItemAmount', 0))
+            _sub(product, 'SequenceNumber', f'{seq:03d}')
+
+        sales, zero_tax, free_tax, tax, total = _amounts(data)
+        amount = _sub(root, 'Amount')
+        _sub(amount, 'SalesAmount', sales)
+        _sub(amount, 'FreeTaxSalesAmount', free_tax)
+        _sub(amount, 'ZeroTaxSalesAmount', zero_tax)
+        _sub(amount, 'TaxType', data.tax_type)
+        _sub(amount, 'TaxRate', f'{data.tax_rate / 100:g}' if str(data.tax_type) in ('1', '4', '9') else '0')
+        _sub(amount, 'TaxAmount', tax)
+        _sub(amount, 'TotalAmount', total)
+        return root
+
+    def _allowance(self, record: IssuedAllowance) -> ET.Element:
+        data = record.data
+        root = ET.Element('Allowance', xmlns=G0401_NAMESPACE)
+
+        main = _sub(root, 'Main')
+        _sub(main, 'AllowanceNumber', record.allowance_no)
+        _sub(main, 'AllowanceDate', record.day.strftime('%Y%m%d'))
+        _party(main, 'Seller', self.seller.identifier, self.seller.name)
+        _party(main, 'Buyer', record.buyer_identifier or B2C_IDENTIFIER, data.customer_name)
+        _sub(main, 'AllowanceType', '2')  # 2 = 賣方開立折讓證明單
+
+        details = _sub(root, 'Details')
+        original_date = _parse_day(data.invoice_date).strftime('%Y%m%d')
+        invoice_type = record.invoice_type  # B2C 折讓金額為含稅、不拆稅額 (同原發票)
+        total_sales = total_tax = 0
+        for seq, item in enumerate(data.items, 1):
+            tax_type = str(item.get('ItemTaxType', '1'))
+            item_amount = int(item.get('ItemAmount', 0))
+            split = self.calculator.split(item_amount, invoice_type, tax_type if tax_type in ('1', '2', '3') else '1')
+            total_sales += split.sales_amount
+            total_tax += split.tax_amount
+            product = _sub(details, 'ProductItem')
+            _sub(product, 'OriginalInvoiceDate', original_date)
+            _sub(product, 'OriginalInvoiceNumber', data.invoice_no)
+            _sub(product, 'OriginalSequenceNumber', f'{seq:03d}')
+            _sub(product, 'OriginalDescription', item.get('ItemName', ''))
+            _sub(product, 'Quantity', item.get('ItemCount', 0))
+            _sub(product, 'Unit', item.get('ItemWord', ''))
+            _sub(product, 'UnitPrice', item.get('ItemPrice', 0))
+            _sub(product, 'Amount', split.sales_amount)
+            _sub(product, 'Tax', split.tax_amount)
+            _sub(product, 'AllowanceSequenceNumber', f'{seq:03d}')
+            _sub(product, 'TaxType', tax_type)
+
+        amount = _sub(root, 'Amount')
+        _sub(amount, 'TaxAmount', total_tax)
+        _sub(amount, 'TotalAmount', total_sales)
+        return root
+
+
+FORMAT_CLASSES = {'csv': CsvFormat, 'jsonl': JsonlFormat, 'mig': MigFormat}
+
+
+def format_of(path: Union[str, Path]) -> str:
+    """依副檔名判斷格式 (.csv / .jsonl / .xml，可加 .gz)"""
+    suffixes = [suffix.lower() for suffix in Path(path).suffixes if suffix.lower() != '.gz']
+    suffix = suffixes[-1] if suffixes else ''
+    if suffix == '.xml':
+        return 'mig'
+    if suffix in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+
+# ============================================================================
+# 匯出
+# ============================================================================
+
+@dataclass
+class ExportResult:
+    """匯出統計"""
+    invoices: int = 0
+    allowances: int = 0
+    items: int = 0
+    skipped: int = 0  # 不在期別內
+    total_amount: int = 0  # 發票總計 (不扣折讓)
+    allowance_amount: int = 0
+
+    def add(self, other: 'ExportResult'):
+        for name in (f.name for f in dataclasses.fields(self)):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def __str__(self) -> str:
+        return (f'發票 {self.invoices:,} 張 (明細 {self.items:,} 筆，總計 {self.total_amount:,})，'
+                f'折讓 {self.allowances:,} 張 (金額 {self.allowance_amount:,})，期別外略過 {self.skipped:,} 筆')
+
+
+class ExportWriter:
+    """
+    逐筆寫出匯出檔
+
+    fragment=True 時不寫入檔頭 / 檔尾 (export_parallel 的分割檔)。
+    """
+
+    def __init__(self, path: Union[str, Path], fmt: str = 'jsonl', seller: Optional[Seller] = None,
+                 compress: Optional[bool] = None, fragment: bool = False):
+        """
+        Args:
+            path: 輸出路徑
+            fmt: csv / jsonl / mig
+            seller: 賣方 (MIG 使用)
+            compress: 是否 gzip (預設依副檔名 .gz 判斷)
+            fragment: 不寫入檔頭 / 檔尾
+        """
+        if fmt not in FORMAT_CLASSES:
+            raise ValueError(f'不支援的格式: {fmt} (可用: {", ".join(FORMATS)})')
+
+        self.path = Path(path)
+        self.format = FORMAT_CLASSES[fmt](seller)
+        self.fragment = fragment
+        self.result = ExportResult()
+        compress = self.path.suffix == '.gz' if compress is None else compress
+        self._file = (gzip.open(self.path, 'wt', encoding='utf-8', newline='', compresslevel=6) if compress
+                      else open(self.path, 'w', encoding='utf-8', newline=''))
+        if not fragment:
+            self._file.write(self.format.header())
+
+    def write(self, record: Record):
+        self._file.write(self.format.render(record))
+        data = record.data
+        self.result.items += len(data.items)
+        if isinstance(record, IssuedInvoice):
+            self.result.invoices += 1
+            self.result.total_amount += data.total_amount or data.sales_amount + data.tax_amount
+        else:
+            self.result.allowances += 1
+            self.result.allowance_amount += data.allowance_amount
+
+    def write_many(self, records: Iterable[Record], start: Optional[date] = None, end: Optional[date] = None):
+        """寫出 [start, end) 內的紀錄，範圍外的計入 skipped"""
+        for record in records:
+            if (start is None or record.day >= start) and (end is None or record.day < end):
+                self.write(record)
+            else:
+                self.result.skipped += 1
+
+    def close(self):
+        if not self.fragment:
+            self._file.write(self.format.footer())
+        self._file.close()
+
+    def __enter__(self) -> 'ExportWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def export(records: Iterable[Record], path: Union[str, Path], fmt: Optional[str] = None,
+           period: Optional[Period] = None, seller: Optional[Seller] = None,
+           compress: Optional[bool] = None) -> ExportResult:
+    """
+    匯出 (單一執行緒)
+
+    Args:
+        records: 發票 / 折讓
+        path: 輸出路徑 (.gz 結尾時壓縮)
+        fmt: csv / jsonl / mig (預設依副檔名判斷)
+        period: 只匯出此期別 (None = 全部)
+        seller: 賣方 (MIG 使用)
+        compress: 是否 gzip (預設依副檔名判斷)
+    """
+    with ExportWriter(path, fmt or format_of(path), seller, compress) as writer:
+        writer.write_many(records, period.start if period else None, period.end if period else None)
+    return writer.result
+
+
+def partition_days(start: date, end: date, partitions: int) -> List[Tuple[date, date]]:
+    """將 [start, end) 依日期切成最多 partitions 段 (各段天數相差最多 1 天)"""
+    days = (end - start).days
+    partitions = max(1, min(partitions, days))
+    ranges = []
+    for index in range(partitions):
+        lower = start + timedelta(days=days * index // partitions)
+        upper = start + timedelta(days=days * (index + 1) // partitions)
+        ranges.append((lower, upper))
+    return ranges
+
+
+def _export_partition(source: Callable[[date, date], Iterable[Record]], part: Path, fmt: str,
+                      seller: Optional[Seller], compress: bool, start: date, end: date) -> ExportResult:
+    """worker: 匯出一段日期到分割檔"""
+    with ExportWriter(part, fmt, seller, compress, fragment=True) as writer:
+        writer.write_many(source(start, end), start, end)
+    return writer.result
+
+
+def _write_text(output: IO, text: str, compress: bool):
+    if text:
+        data = text.encode('utf-8')
+        output.write(gzip.compress(data, compresslevel=6) if compress else data)
+
+
+def export_parallel(source: Callable[[date, date], Iterable[Record]], path: Union[str, Path],
+                    fmt: Optional[str] = None, period: Optional[Period] = None, seller: Optional[Seller] = None,
+                    workers: int = 4, partitions: Optional[int] = None, executor: str = 'process',
+                    compress: Optional[bool] = None, start: Optional[date] = None,
+                    end: Optional[date] = None) -> ExportResult:
+    """
+    依日期分段平行匯出，再依日期順序合併
+
+    Args:
+        source: source(start, end) 回傳 [start, end) 內的紀錄 (process 模式需可 pickle，
+                例如 JsonlSource / OutboxSource)
+        path: 輸出路徑
+        fmt: csv / jsonl / mig (預設依副檔名判斷)
+        period: 期別 (或以 start / end 指定日期範圍)
+        seller: 賣方 (MIG 使用)
+        workers: worker 數
+        partitions: 分段數 (預設 workers * 2)
+        executor: thread 或 process
+        compress: 是否 gzip (預設依副檔名判斷)
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f'不支援的 executor: {executor} (可用: {", ".join(EXECUTORS)})')
+    if period is not None:
+        start, end = period.start, period.end
+    if start is None or end is None or start >= end:
+        raise ValueError('需指定 period 或 start < end')
+
+    path = Path(path)
+    fmt = fmt or format_of(path)
+    if fmt not in FORMAT_CLASSES:
+        raise ValueError(f'不支援的格式: {fmt} (可用: {", ".join(FORMATS)})')
+    compress = path.suffix == '.gz' if compress is None else compress
+    ranges = partition_days(start, end, partitions or workers * 2)
+
+    result = ExportResult()
+    pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    with tempfile.TemporaryDirectory(prefix='invoice-export-', dir=path.parent) as work_dir:
+        parts = [Path(work_dir) / f'part-{index:04d}' for index in range(len(ranges))]
+        with pool_class(max_workers=workers) as pool:
+            futures = [pool.submit(_export_partition, source, part, fmt, seller, compress, lower, upper)
+                       for part, (lower, upper) in zip(parts, ranges)]
+            for future in futures:
+                result.add(future.result())
+
+        # 合併: 檔頭 + 分割檔 (依日期順序) + 檔尾；gzip 以多個 member 串接
+        layout = FORMAT_CLASSES[fmt](seller)
+        with open(path, 'wb') as output:
+            _write_text(output, layout.header(), compress)
+            for part in parts:
+                with open(part, 'rb') as f:
+                    shutil.copyfileobj(f, output, 1024 * 1024)
+            _write_text(output, layout.footer(), compress)
+    return result
+
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='匯出期別內的發票與折讓 (CSV / JSONL / MIG XML)')
+    parser.add_argument('sources', nargs='+', type=Path, help='JSONL 紀錄檔 (可為 .gz) 或 invoice_outbox 的 .db')
+    parser.add_argument('-o', '--output', type=Path, required=True, help='輸出路徑 (.gz 結尾時壓縮)')
+    parser.add_argument('--format', choices=FORMATS, help='輸出格式 (預設依副檔名)')
+    parser.add_argument('--period', help='期別代碼，例如 11302 (113 年 1-2 月)')
+    parser.add_argument('--seller-id', default='', help='賣方統一編號 (MIG)')
+    parser.add_argument('--seller-name', default='', help='賣方名稱 (MIG)')
+    parser.add_argument('--workers', type=int, default=1, help='平行 worker 數 (需指定 --period)')
+    parser.add_argument('--executor', choices=EXECUTORS, default='process')
+    args = parser.parse_args()
+
+    period = Period.parse(args.period) if args.period else None
+    seller = Seller(args.seller_id, args.seller_name)
+    databases = [path for path in args.sources if path.suffix == '.db']
+    if databases and len(args.sources) > 1:
+        parser.error('outbox .db 只能單獨指定')
+
+    started = time.perf_counter()
+    if args.workers > 1:
+        if period is None:
+            parser.error('--workers 需搭配 --period')
+        source = OutboxSource(databases[0]) if databases else JsonlSource(args.sources)
+        result = export_parallel(source, args.output, args.format, period, seller, workers=args.workers,
+                                 executor=args.executor)
+    else:
+        if databases:
+            records = outbox_records(databases[0], period.start if period else None, period.end if period else None)
+        else:
+            records = (record for path in args.sources for record in read_records(path))
+        result = export(records, args.output, args.format, period, seller)
+
+    print(f'{result}\n輸出: {args.output} ({time.perf_counter() - started:.1f} 秒)')
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
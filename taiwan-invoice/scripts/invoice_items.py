@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - 商品明細金額彙總與尾差分配
+
+呼叫端原本需自行讓 ItemAmount 合計對上 SalesAmount / TaxAmount，數百筆明細、混合課稅的
+訂單容易出現 10000016 金額計算錯誤。ItemAggregator 由商品數量與單價計算:
+
+- 每筆 ItemAmount (含稅或未稅) 與 B2B 的 ItemTax
+- 發票的 SalesAmount / ZeroTaxSalesAmount / FreeTaxSalesAmount / TaxAmount / TotalAmount
+- 四捨五入的尾差以最大餘數法分配: 先取每筆的整數部分，剩下的 1 元依小數部分由大到小
+  補給各品項 (小數相同時較前面的品項優先)，結果固定且合計必定相符
+- 混合課稅 (TaxType 9): 應稅、零稅率、免稅分別彙總，只有應稅部分計算稅額
+
+金額以整數運算 (數量與單價的小數轉為整數倍數)，不經過浮點數；尾差分配以 quickselect
+選出補 1 元的品項，整體為線性時間。大量開立時以 stream() 逐筆處理訂單。
+
+使用範例:
+    from invoice_items import ItemAggregator, LineItem
+
+    aggregator = ItemAggregator()
+    amounts = aggregator.aggregate([
+        LineItem('商品A', 3, 33),
+        LineItem('商品B', 1, 100, tax_type='3'),     # 免稅
+    ], b2b=True)
+    payload.update(amounts.to_ecpay())               # SalesAmount / TaxAmount / Items ...
+    assert not validate_ecpay(amounts.to_ecpay(), b2b=True)
+
+    for result in aggregator.stream(read_orders(path)):
+        if result.error:
+            print(result.order['relate_number'], result.error)
+"""
+
+import json
+import random
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from fractions import Fraction
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from tax_calculator import TaxCalculator, get_tax_calculator, tax_of
+
+Number = Union[int, Decimal, str, float]
+
+B2C_IDENTIFIER = '0000000000'
+
+# 商品課稅別 (ItemTaxType)
+TAXABLE, ZERO_RATED, EXEMPT = '1', '2', '3'
+ITEM_TAX_TYPES = (TAXABLE, ZERO_RATED, EXEMPT)
+
+# 10000016: 金額計算錯誤
+AMOUNT_ERROR = '10000016'
+
+
+def _scaled(value: Number) -> Tuple[int, int]:
+    """
+    數值 → (整數, 小數位數)，例如 Decimal('1.25') → (125, 2)
+
+    Raises:
+        ValueError: 非數值、非有限數或負數
+    """
+    if isinstance(value, bool):
+        raise ValueError(f'數量 / 單價必須為數字: {value!r}')
+    if isinstance(value, int):
+        scaled = (value, 0)
+    else:
+        try:
+            number = value if isinstance(value, Decimal) else Decimal(repr(value) if isinstance(value, float)
+                                                                      else str(value).strip())
+        except InvalidOperation:
+            raise ValueError(f'數量 / 單價必須為數字: {value!r}')
+        if not number.is_finite():
+            raise ValueError(f'數量 / 單價必須為有限數: {value!r}')
+        exponent = number.as_tuple().exponent
+        scaled = (int(number), 0) if exponent >= 0 else (int(number.scaleb(-exponent)), -exponent)
+    if scaled[0] < 0:
+        raise ValueError(f'數量 / 單價不可為負數: {value!r}')
+    return scaled
+
+
+def _round_half_up(numerator: int, denominator: int) -> int:
+    """四捨五入 numerator / denominator (非負數)"""
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def _json_number(value: Number) -> Union[int, float, str]:
+    """ECPay 參數以 JSON 送出: 整數值轉 int，小數轉 float"""
+    if isinstance(value, (int, float)):
+        return value
+    number = value if isinstance(value, Decimal) else Decimal(str(value))
+    return int(number) if number == number.to_integral_value() else float(number)
+
+
+def _kth_largest(keys: List[int], k: int) -> int:
+    """第 k 大的值 (keys 不重複；quickselect，期望線性時間)"""
+    rng = random.Random(k)
+    while True:
+        pivot = keys[rng.randrange(len(keys))]
+        higher = [key for key in keys if key > pivot]
+        if len(higher) >= k:
+            keys = higher
+        elif len(higher) + 1 == k:
+            return pivot
+        else:
+            k -= len(higher) + 1
+            keys = [key for key in keys if key < pivot]
+
+
+def allocate_largest_remainder(numerators: Sequence[int], denominator: int, total: int) -> List[int]:
+    """
+    最大餘數法: 將 numerators[i] / denominator 分配為整數，合計等於 total
+
+    先取每筆的整數部分，差額依餘數由大到小各補 1 (餘數相同時索引較小者優先)。
+
+    Args:
+        numerators: 各筆的分子 (非負數)
+        denominator: 共同分母 (正數)
+        total: 分配後的合計，需介於整數部分合計與其加上筆數之間
+
+    Raises:
+        ValueError: total 超出可分配範圍
+    """
+    n = len(numerators)
+    floors: List[int] = []
+    keys: List[int] = []
+    for index, numerator in enumerate(numerators):
+        floor, remainder = divmod(numerator, denominator)
+        floors.append(floor)
+        # 餘數相同時索引小者 key 較大；key 不重複
+        keys.append(remainder * n + (n - 1 - index))
+
+    residue = total - sum(floors)
+    if residue < 0 or residue > n:
+        raise ValueError(f'無法分配: 合計 {total}，整數部分合計 {total - residue}，共 {n} 筆')
+    if residue:
+        threshold = _kth_largest(keys, residue)
+        for index, key in enumerate(keys):
+            if key >= threshold:
+                floors[index] += 1
+    return floors
+
+
+@dataclass(frozen=True)
+class LineItem:
+    """商品明細 (單價預設為含稅價)"""
+    name: str
+    count: Number
+    price: Number
+    tax_type: str = TAXABLE  # ItemTaxType: 1=應稅, 2=零稅率, 3=免稅
+    word: str = '個'
+    remark: str = ''
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LineItem':
+        """由 ECPay Items 格式 (ItemName / ItemCount / ItemPrice ...) 或 snake_case 欄位建立"""
+        def pick(*keys, default=None):
+            for key in keys:
+                if data.get(key) not in (None, ''):
+                    return data[key]
+            return default
+
+        return cls(
+            name=str(pick('ItemName', 'name', default='商品')),
+            count=pick('ItemCount', 'count', default=1),
+            price=pick('ItemPrice', 'price', default=0),
+            tax_type=str(pick('ItemTaxType', 'tax_type', default=TAXABLE)),
+            word=str(pick('ItemWord', 'word', default='個')),
+            remark=str(pick('ItemRemark', 'remark', default='')),
+        )
+
+
+@dataclass(frozen=True)
+class AllocatedItem:
+    """分配後的商品明細"""
+    name: str
+    count: Number
+    price: Decimal  # ItemPrice (B2B 為未稅單價)
+    amount: int  # ItemAmount (B2C 含稅，B2B 未稅)
+    tax: int  # ItemTax (B2C 為 0)
+    tax_type: str
+    word: str = '個'
+    remark: str = ''
+
+    def to_ecpay(self, b2b: bool) -> Dict[str, Any]:
+        """ECPay Items 格式"""
+        item = {
+            'ItemName': self.name,
+            'ItemCount': _json_number(self.count),
+            'ItemWord': self.word,
+            'ItemPrice': _json_number(self.price),
+            'ItemTaxType': self.tax_type,
+            'ItemAmount': self.amount,
+        }
+        if b2b:
+            item['ItemTax'] = self.tax
+        if self.remark:
+            item['ItemRemark'] = self.remark
+        return item
+
+
+@dataclass(frozen=True)
+class InvoiceAmounts:
+    """
+    發票金額
+
+    sales_amount 為應稅銷售額 (B2C 含稅、B2B 未稅)；
+    sales_amount + zero_tax_sales_amount + free_tax_sales_amount + tax_amount = total_amount
+    """
+    b2b: bool
+    tax_type: str  # TaxType: 1 / 2 / 3，或 9 (混合)
+    sales_amount: int
+    zero_tax_sales_amount: int
+    free_tax_sales_amount: int
+    tax_amount: int
+    total_amount: int
+    items: Tuple[AllocatedItem, ...]
+
+    def ecpay_items(self) -> List[Dict[str, Any]]:
+        return [item.to_ecpay(self.b2b) for item in self.items]
+
+    def to_ecpay(self) -> Dict[str, Any]:
+        """
+        ECPay 開立參數的金額欄位
+
+        B2C: SalesAmount 為全部品項的含稅合計；B2B: 另有 TaxAmount / TotalAmount，
+        混合課稅時另有 ZeroTaxSalesAmount / FreeTaxSalesAmount。
+        """
+        if not self.b2b:
+            return {'TaxType': self.tax_type, 'SalesAmount': self.total_amount, 'Items': self.ecpay_items()}
+
+        payload = {
+            'TaxType': self.tax_type,
+            'SalesAmount': self.sales_amount,
+            'TaxAmount': self.tax_amount,
+            'TotalAmount': self.total_amount,
+            'Items': self.ecpay_items(),
+        }
+        if self.tax_type == '9':
+            payload['ZeroTaxSalesAmount'] = self.zero_tax_sales_amount
+            payload['FreeTaxSalesAmount'] = self.free_tax_sales_amount
+        return payload
+
+
+@dataclass(frozen=True)
+class OrderAmounts:
+    """stream() 的單筆結果"""
+    order: Dict[str, Any]
+    amounts: Optional[InvoiceAmounts]
+    error: str = ''
+
+
+class ItemAggregator:
+    """商品明細彙總 (無狀態，可多執行緒共用)"""
+
+    def __init__(self, calculator: Optional[TaxCalculator] = None, prices_include_tax: bool = True):
+        """
+        Args:
+            calculator: 稅額計算 (預設為 get_tax_calculator()，稅率來自 tax-rules.csv)
+            prices_include_tax: 單價是否含稅 (False 僅適用 B2B: 依未稅小計合計計算稅額)
+        """
+        self.calculator = calculator or get_tax_calculator()
+        self.prices_include_tax = prices_include_tax
+        self.tax_rate: Fraction = self.calculator.rule('B2B', TAXABLE).tax_rate
+
+    def aggregate(self, items: Iterable[Union[LineItem, Dict[str, Any]]], b2b: bool = False) -> InvoiceAmounts:
+        """
+        計算一張發票的商品明細與金額
+
+        Args:
+            items: 商品明細 (LineItem 或 ECPay Items 格式的 dict；dict 中的 ItemAmount 會重新計算)
+            b2b: 是否為 B2B (三聯式)
+
+        Raises:
+            ValueError: 無商品、數量 / 單價錯誤、不支援的課稅別
+        """
+        lines = [item if isinstance(item, LineItem) else LineItem.from_dict(item) for item in items]
+        if not lines:
+            raise ValueError('商品明細不可為空')
+        if not b2b and not self.prices_include_tax:
+            raise ValueError('B2C 發票單價必須為含稅價')
+
+        groups: Dict[str, List[int]] = {}
+        for index, line in enumerate(lines):
+            if line.tax_type not in ITEM_TAX_TYPES:
+                raise ValueError(f'不支援的商品課稅別: {line.name} ItemTaxType={line.tax_type}')
+            groups.setdefault(line.tax_type, []).append(index)
+
+        amounts = [0] * len(lines)
+        taxes = [0] * len(lines)
+        totals = {TAXABLE: 0, ZERO_RATED: 0, EXEMPT: 0}
+        tax_amount = 0
+        for tax_type, indexes in groups.items():
+            group_total, group_tax = self._allocate_group(
+                [lines[i] for i in indexes], indexes, amounts, taxes, b2b and tax_type == TAXABLE)
+            totals[tax_type] = group_total
+            tax_amount += group_tax
+
+        allocated = tuple(
+            AllocatedItem(
+                name=line.name,
+                count=line.count,
+                price=self._unit_price(line, amounts[i], b2b),
+                amount=amounts[i],
+                tax=taxes[i],
+                tax_type=line.tax_type,
+                word=line.word,
+                remark=line.remark,
+            )
+            for i, line in enumerate(lines)
+        )
+        return InvoiceAmounts(
+            b2b=b2b,
+            tax_type=next(iter(groups)) if len(groups) == 1 else '9',
+            sales_amount=totals[TAXABLE],
+            zero_tax_sales_amount=totals[ZERO_RATED],
+            free_tax_sales_amount=totals[EXEMPT],
+            tax_amount=tax_amount,
+            total_amount=sum(totals.values()) + tax_amount,
+            items=allocated,
+        )
+
+    def _allocate_group(self, lines: List[LineItem], indexes: List[int], amounts: List[int], taxes: List[int],
+                        split_tax: bool) -> Tuple[int, int]:
+        """
+        同一課稅別的品項: 寫入 amounts / taxes，回傳 (ItemAmount 合計, 稅額)
+        """
+        scaled = []
+        scale = 0
+        for line in lines:
+            count, count_scale = _scaled(line.count)
+            price, price_scale = _scaled(line.price)
+            scaled.append((count * price, count_scale + price_scale))
+            scale = max(scale, count_scale + price_scale)
+        numerators = [value * 10 ** (scale - s) for value, s in scaled]
+        denominator = 10 ** scale
+
+        exact_total = _round_half_up(sum(numerators), denominator)
+        line_amounts = allocate_largest_remainder(numerators, denominator, exact_total)
+
+        if not split_tax:
+            line_taxes = [0] * len(lines)
+            group_total, group_tax = exact_total, 0
+        elif self.prices_include_tax:
+            # 含稅合計 → 稅額，再依含稅小計比例分配未稅金額
+            group_tax = tax_of(exact_total, self.tax_rate)
+            group_total = exact_total - group_tax
+            gross = line_amounts
+            line_amounts = (allocate_largest_remainder([g * group_total for g in gross], exact_total, group_total)
+                            if exact_total else [0] * len(lines))
+            line_taxes = [g - a for g, a in zip(gross, line_amounts)]
+        else:
+            # 未稅合計 × 稅率，稅額依未稅小計比例分配
+            group_total = exact_total
+            group_tax = _round_half_up(group_total * self.tax_rate.numerator, self.tax_rate.denominator)
+            line_taxes = (allocate_largest_remainder([a * group_tax for a in line_amounts], group_total, group_tax)
+                          if group_total else [0] * len(lines))
+
+        for index, amount, tax in zip(indexes, line_amounts, line_taxes):
+            amounts[index] = amount
+            taxes[index] = tax
+        return group_total, group_tax
+
+    def _unit_price(self, line: LineItem, amount: int, b2b: bool) -> Decimal:
+        """ItemPrice: 原單價；B2B 含稅單價時改為 未稅小計 / 數量 (小數 4 位)"""
+        price = line.price if isinstance(line.price, Decimal) else Decimal(str(line.price))
+        if not b2b or not self.prices_include_tax or line.tax_type != TAXABLE:
+            return price
+        count = line.count if isinstance(line.count, Decimal) else Decimal(str(line.count))
+        if not count:
+            return Decimal(0)
+        unit = (Decimal(amount) / count).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+        return unit.quantize(Decimal(1)) if unit == unit.to_integral_value() else unit.normalize()
+
+    def stream(self, orders: Iterable[Dict[str, Any]]) -> Iterator[OrderAmounts]:
+        """
+        逐筆彙總訂單 (大量開立用，一次只處理一筆訂單)
+
+        訂單格式同 bulk_issue.py: items (陣列或 JSON 字串)、customer_identifier (8 碼統編為 B2B)；
+        有 total_amount 時檢查與計算結果相符。單筆錯誤以 OrderAmounts.error 回報，不中斷串流。
+        """
+        for order in orders:
+            try:
+                items = order.get('items')
+                if isinstance(items, str):
+                    items = json.loads(items) if items.strip() else []
+                identifier = str(order.get('customer_identifier') or B2C_IDENTIFIER).strip()
+                amounts = self.aggregate(items or [], b2b=identifier != B2C_IDENTIFIER)
+                expected = order.get('total_amount')
+                if expected not in (None, '') and int(expected) != amounts.total_amount:
+                    raise ValueError(f'商品明細合計 {amounts.total_amount} 與 total_amount {expected} 不符')
+            except (ValueError, TypeError) as e:
+                yield OrderAmounts(order, None, str(e))
+                continue
+            yield OrderAmounts(order, amounts)
+
+
+def validate_ecpay(payload: Dict[str, Any], b2b: bool, tax_rate: Fraction = Fraction(1, 20)) -> List[str]:
+    """
+    依 ECPay 開立規則檢查金額欄位 (送出前預先發現 10000016)
+
+    - 每筆 ItemAmount 與 ItemCount × ItemPrice 四捨五入相差不超過 1 元 (尾差分配)
+    - TaxType 9 時每筆需有 ItemTaxType；其他 TaxType 時品項課稅別需一致
+    - B2C: ItemAmount 合計 (含零稅率 / 免稅品項) = SalesAmount，不另填 ZeroTaxSalesAmount / FreeTaxSalesAmount
+    - B2B: 各課稅別 ItemAmount 合計 = SalesAmount / ZeroTaxSalesAmount / FreeTaxSalesAmount，
+      銷售額合計 + TaxAmount = TotalAmount，ItemTax 合計 = TaxAmount，
+      TaxAmount 與 SalesAmount × 稅率 相差不超過 1 元
+
+    Returns:
+        錯誤訊息 (空 list 表示通過)
+    """
+    errors: List[str] = []
+
+    def fail(message: str):
+        errors.append(f'{AMOUNT_ERROR} 金額計算錯誤: {message}')
+
+    items = payload.get('Items') or []
+    if not items:
+        fail('商品明細不可為空')
+        return errors
+
+    tax_type = str(payload.get('TaxType', TAXABLE))
+    sums = {TAXABLE: 0, ZERO_RATED: 0, EXEMPT: 0}
+    item_tax = 0
+    for number, item in enumerate(items, 1):
+        item_type = str(item.get('ItemTaxType') or (tax_type if tax_type != '9' else ''))
+        if tax_type == '9' and item_type not in ITEM_TAX_TYPES:
+            fail(f'第 {number} 筆: 混合課稅需填 ItemTaxType')
+            continue
+        if tax_type != '9' and item_type != tax_type:
+            fail(f'第 {number} 筆: ItemTaxType {item_type} 與 TaxType {tax_type} 不符')
+            continue
+        try:
+            count, count_scale = _scaled(item.get('ItemCount', 0))
+            price, price_scale = _scaled(item.get('ItemPrice', 0))
+            amount = int(item.get('ItemAmount'))
+        except (TypeError, ValueError):
+            fail(f'第 {number} 筆: ItemCount / ItemPrice / ItemAmount 格式錯誤')
+            continue
+        expected = _round_half_up(count * price, 10 ** (count_scale + price_scale))
+        if abs(expected - amount) > 1:
+            fail(f'第 {number} 筆: ItemAmount {amount} ≠ ItemCount × ItemPrice ({expected})')
+        sums[item_type] += amount
+        item_tax += int(item.get('ItemTax') or 0)
+
+    sales = int(payload.get('SalesAmount') or 0)
+    if not b2b:
+        if sum(sums.values()) != sales:
+            fail(f'ItemAmount 合計 {sum(sums.values())} ≠ SalesAmount {sales}')
+        if int(payload.get('ZeroTaxSalesAmount') or 0) or int(payload.get('FreeTaxSalesAmount') or 0):
+            fail('B2C 的零稅率 / 免稅品項計入 SalesAmount，不另填 ZeroTaxSalesAmount / FreeTaxSalesAmount')
+        return errors
+
+    zero = int(payload.get('ZeroTaxSalesAmount') or 0)
+    free = int(payload.get('FreeTaxSalesAmount') or 0)
+    tax = int(payload.get('TaxAmount') or 0)
+    total = int(payload.get('TotalAmount') or 0)
+    for label, actual, declared in (('SalesAmount', sums[TAXABLE], sales),
+                                    ('ZeroTaxSalesAmount', sums[ZERO_RATED], zero),
+                                    ('FreeTaxSalesAmount', sums[EXEMPT], free)):
+        if actual != declared:
+            fail(f'ItemAmount 合計 {actual} ≠ {label} {declared}')
+    if sales + zero + free + tax != total:
+        fail(f'銷售額 {sales + zero + free} + TaxAmount {tax} ≠ TotalAmount {total}')
+    if any('ItemTax' in item for item in items) and item_tax != tax:
+        fail(f'ItemTax 合計 {item_tax} ≠ TaxAmount {tax}')
+    if abs(_round_half_up(sales * tax_rate.numerator, tax_rate.denominator) - tax) > 1:
+        fail(f'TaxAmount {tax} 與 SalesAmount × {float(tax_rate):.0%} 不符')
+    return errors
+
+
+if __name__ == '__main__':
+    aggregator = ItemAggregator()
+    cart = [
+        LineItem('商品A', 3, Decimal('33.3')),
+        LineItem('商品B', 7, Decimal('14.29')),
+        LineItem('農產品', 2, 125, tax_type=EXEMPT, word='箱'),
+    ]
+    for b2b in (False, True):
+        amounts = aggregator.aggregate(cart, b2b=b2b)
+        payload = amounts.to_ecpay()
+        print(f"{'B2B' if b2b else 'B2C'}: {json.dumps(payload, ensure_ascii=False, indent=2)}")
+        print(f"  驗證: {validate_ecpay(payload, b2b) or '通過'}\n")
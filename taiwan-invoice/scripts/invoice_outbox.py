@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - 發票 outbox (離線優先開立)
+
+結帳時不再同步等待加值中心: 驗證後的 InvoiceIssueData 寫入本機 SQLite 佇列 (WAL，預設 synchronous=FULL)
+即回應，由背景 uploader 送出。加值中心變慢或暫時無法連線時，結帳延遲只剩一次本機磁碟寫入。
+
+- 佇列: 以 (merchant_id, relate_number) 為唯一鍵，重複寫入同一訂單回傳既有的 id
+- 順序: 同一商店依寫入順序逐張送出，前一張重試中時後面的發票等待 (發票號碼依訂單順序配發)；
+  不同商店併發送出，同時處理的商店數受 workers 限制
+- 重試: 依 InvoiceErrorHandler 的錯誤分類，可重試的錯誤以指數退避重新排程，
+  不可重試的錯誤標記為 rejected，超過 max_retries 標記為 failed；未設定服務的商店其發票標記為 rejected
+- uploader 的 SQLite 讀寫在 asyncio.to_thread 執行，磁碟 fsync 不會卡住 event loop
+- 當機: 送出中當機的發票維持 pending，重送時若回傳 RelateNumber 重複 (10000006)，
+  以 query_invoice 查回既有發票並標記為 issued
+- 指標: 各狀態筆數、各商店待送筆數、最舊待送發票的等待秒數、最近 60 秒的寫入 / 送出速率，
+  可輸出 Prometheus 文字格式
+
+使用範例:
+    from invoice_outbox import InvoiceOutbox, OutboxUploader
+
+    outbox = InvoiceOutbox('invoice-outbox.db')
+    outbox.enqueue(invoice_data)                     # 結帳: 只寫入本機
+
+    uploader = OutboxUploader(outbox, {'2000132': service}, workers=10)
+    await uploader.run(stop_event)                   # 背景: 持續送出
+    print(outbox.stats())
+
+用法:
+    python invoice_outbox.py invoice-outbox.db       # 顯示佇列狀態
+"""
+
+import asyncio
+import collections
+import dataclasses
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, List, Mapping, Optional, Union
+
+from error_handler import InvoiceErrorHandler, error_code_of
+from error_registry import ErrorCategory, ErrorInfo, RetryStrategy
+from example_loader import load_example
+from presubmit import PresubmitChecker
+
+PENDING = 'pending'
+ISSUED = 'issued'
+REJECTED = 'rejected'
+FAILED = 'failed'
+STATUSES = (PENDING, ISSUED, REJECTED, FAILED)
+
+# RelateNumber 重複: 上次送出已開立但結果未寫回 (例如程式中斷)
+RTN_DUPLICATE_RELATE_NUMBER = 10000006
+
+# 商店代號沒有對應的服務 (outbox 專用，不屬於錯誤碼表)
+NO_SERVICE_ERROR = ErrorInfo(
+    code='NO_SERVICE',
+    message='未設定商店服務',
+    category=ErrorCategory.AUTHENTICATION,
+    retry_strategy=RetryStrategy.NO_RETRY,
+    suggestion='此商店代號沒有對應的服務設定 (金鑰)，請確認設定後以 requeue(REJECTED) 重新排入',
+    is_retryable=False
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    merchant_id TEXT NOT NULL,
+    relate_number TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    rtn_code TEXT,
+    rtn_msg TEXT,
+    invoice_no TEXT,
+    invoice_date TEXT,
+    random_number TEXT,
+    UNIQUE (merchant_id, relate_number)
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, merchant_id, id);
+CREATE INDEX IF NOT EXISTS outbox_issued ON outbox (status, invoice_date);
+"""
+
+
+@dataclass(frozen=True)
+class OutboxEntry:
+    """佇列中的一張發票"""
+    id: int
+    merchant_id: str
+    relate_number: str
+    payload: Dict[str, Any]
+    attempts: int
+    created_at: float
+
+
+@dataclass
+class OutboxStats:
+    """佇列指標"""
+    counts: Dict[str, int]
+    pending_by_merchant: Dict[str, int]
+    oldest_pending_age: float  # 秒 (沒有待送發票時為 0)
+    enqueue_rate: float  # 最近 window 秒的寫入速率 (張/秒)
+    drain_rate: float  # 最近 window 秒的完成速率 (issued + rejected + failed，張/秒)
+
+    @property
+    def depth(self) -> int:
+        return self.counts.get(PENDING, 0)
+
+    def prometheus_text(self, prefix: str = 'invoice') -> str:
+        """Prometheus 文字格式"""
+        lines = [f'# TYPE {prefix}_outbox_entries gauge']
+        for status in STATUSES:
+            lines.append(f'{prefix}_outbox_entries{{status="{status}"}} {self.counts.get(status, 0)}')
+        lines.append(f'# TYPE {prefix}_outbox_pending gauge')
+        for merchant_id, count in sorted(self.pending_by_merchant.items()):
+            lines.append(f'{prefix}_outbox_pending{{merchant_id="{merchant_id}"}} {count}')
+        lines.append(f'# TYPE {prefix}_outbox_oldest_pending_seconds gauge')
+        lines.append(f'{prefix}_outbox_oldest_pending_seconds {self.oldest_pending_age:.3f}')
+        lines.append(f'# TYPE {prefix}_outbox_enqueue_rate gauge')
+        lines.append(f'{prefix}_outbox_enqueue_rate {self.enqueue_rate:.3f}')
+        lines.append(f'# TYPE {prefix}_outbox_drain_rate gauge')
+        lines.append(f'{prefix}_outbox_drain_rate {self.drain_rate:.3f}')
+        return '\n'.join(lines) + '\n'
+
+    def __str__(self) -> str:
+        counts = '，'.join(f'{status} {self.counts.get(status, 0):,}' for status in STATUSES)
+        return (f'{counts}｜最舊待送 {self.oldest_pending_age:.1f} 秒｜'
+                f'寫入 {self.enqueue_rate:.1f} 張/秒，送出 {self.drain_rate:.1f} 張/秒')
+
+
+class _RateWindow:
+    """最近 window 秒的事件速率"""
+
+    def __init__(self, window: float):
+        self.window = window
+        self._events: Deque[float] = collections.deque()
+
+    def add(self, now: float, count: int = 1):
+        self._events.extend([now] * count)
+        self._prune(now)
+
+    def rate(self, now: float) -> float:
+        self._prune(now)
+        return len(self._events) / self.window
+
+    def _prune(self, now: float):
+        cutoff = now - self.window
+        while self._events and self._events[0] < cutoff:
+            self._events.popleft()
+
+
+class InvoiceOutbox:
+    """
+    發票 outbox (SQLite 持久佇列)
+
+    可由多個執行緒共用 (內部以鎖保護同一個連線)；同一個資料庫檔只應由一個 uploader 送出。
+    """
+
+    def __init__(self, path: Union[str, Path], synchronous: str = 'FULL',
+                 presubmit: Optional[PresubmitChecker] = None,
+                 invoice_factory: Optional[Callable[..., Any]] = None, rate_window: float = 60.0):
+        """
+        Args:
+            path: SQLite 檔案路徑
+            synchronous: SQLite synchronous 設定 (FULL: 每次寫入 fsync；NORMAL: 較快，斷電可能遺失最後幾筆)
+            presubmit: 寫入前的規則檢查 (預設 PresubmitChecker())
+            invoice_factory: 由 payload dict 還原開立資料 (預設為範例的 InvoiceIssueData)
+            rate_window: 速率指標的時間窗 (秒)
+        """
+        if synchronous.upper() not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+            raise ValueError(f'不支援的 synchronous: {synchronous}')
+
+        self.path = Path(path)
+        self.presubmit = presubmit or PresubmitChecker()
+        self.invoice_factory = invoice_factory or load_example('ecpay-invoice-async-example').InvoiceIssueData
+        self._lock = threading.Lock()
+        self._enqueued = _RateWindow(rate_window)
+        self._completed = _RateWindow(rate_window)
+
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(f'PRAGMA synchronous={synchronous.upper()}')
+        self._db.executescript(SCHEMA)
+
+    def _validate(self, invoice: Any) -> Dict[str, Any]:
+        violations = self.presubmit.check(invoice)
+        if violations:
+            raise ValueError('; '.join(str(violation) for violation in violations))
+        return dataclasses.asdict(invoice)
+
+    def enqueue(self, invoice: Any) -> int:
+        """
+        寫入一張發票 (結帳時呼叫)
+
+        Returns:
+            佇列 id (同一商店的同一 RelateNumber 重複寫入時回傳既有的 id)
+
+        Raises:
+            ValueError: 送出前規則檢查未通過
+        """
+        return self.enqueue_many([invoice])[0]
+
+    def enqueue_many(self, invoices: Iterable[Any]) -> List[int]:
+        """
+        以單一交易寫入多張發票 (全部通過檢查才寫入)
+
+        Raises:
+            ValueError: 任一張送出前規則檢查未通過
+        """
+        rows = [(invoice.merchant_id, invoice.relate_number, self._validate(invoice)) for invoice in invoices]
+        now = time.time()
+        ids = []
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                for merchant_id, relate_number, payload in rows:
+                    cursor = self._db.execute(
+                        'INSERT OR IGNORE INTO outbox (merchant_id, relate_number, payload, created_at, updated_at) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        (merchant_id, relate_number, json.dumps(payload, ensure_ascii=False), now, now))
+                    if cursor.rowcount:
+                        ids.append(cursor.lastrowid)
+                    else:
+                        ids.append(self._db.execute(
+                            'SELECT id FROM outbox WHERE merchant_id = ? AND relate_number = ?',
+                            (merchant_id, relate_number)).fetchone()[0])
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._enqueued.add(now, len(rows))
+        return ids
+
+    def pending_merchants(self) -> List[str]:
+        """有待送發票的商店"""
+        with self._lock:
+            rows = self._db.execute('SELECT DISTINCT merchant_id FROM outbox WHERE status = ?', (PENDING,))
+            return [row[0] for row in rows]
+
+    def next_batch(self, merchant_id: str, limit: int = 100, now: Optional[float] = None) -> List[OutboxEntry]:
+        """
+        商店依寫入順序的下一批待送發票
+
+        遇到尚未到重試時間的發票即停止 (後面的發票不會越過它先送出)。
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT id, merchant_id, relate_number, payload, attempts, created_at, next_attempt_at '
+                'FROM outbox WHERE status = ? AND merchant_id = ? ORDER BY id LIMIT ?',
+                (PENDING, merchant_id, limit)).fetchall()
+        batch = []
+        for row in rows:
+            if row[6] > now:
+                break
+            batch.append(OutboxEntry(row[0], row[1], row[2], json.loads(row[3]), row[4], row[5]))
+        return batch
+
+    def invoice(self, entry: OutboxEntry) -> Any:
+        """還原開立資料"""
+        return self.invoice_factory(**entry.payload)
+
+    def _update(self, entry_id: int, status: str, completed: bool, **fields):
+        now = time.time()
+        fields.update(status=status, updated_at=now)
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        with self._lock:
+            self._db.execute(f'UPDATE outbox SET {columns} WHERE id = ?', (*fields.values(), entry_id))
+            if completed:
+                self._completed.add(now)
+
+    def mark_issued(self, entry: OutboxEntry, invoice_no: str = '', invoice_date: str = '',
+                    random_number: str = ''):
+        """開立成功"""
+        self._update(entry.id, ISSUED, True, attempts=entry.attempts + 1, invoice_no=invoice_no,
+                     invoice_date=invoice_date, random_number=random_number, rtn_code=None, rtn_msg=None)
+
+    def mark_retry(self, entry: OutboxEntry, rtn_code: str, rtn_msg: str, delay: float):
+        """可重試的錯誤: delay 秒後再送"""
+        self._update(entry.id, PENDING, False, attempts=entry.attempts + 1, next_attempt_at=time.time() + delay,
+                     rtn_code=rtn_code, rtn_msg=rtn_msg)
+
+    def mark_failed(self, entry: OutboxEntry, status: str, rtn_code: str, rtn_msg: str):
+        """不再重試 (status 為 rejected 或 failed)"""
+        if status not in (REJECTED, FAILED):
+            raise ValueError(f'status 必須為 {REJECTED} 或 {FAILED}: {status}')
+        self._update(entry.id, status, True, attempts=entry.attempts + 1, rtn_code=rtn_code, rtn_msg=rtn_msg)
+
+    def requeue(self, status: str = FAILED) -> int:
+        """將 failed (或 rejected) 的發票重新排入佇列，回傳筆數"""
+        with self._lock:
+            cursor = self._db.execute(
+                'UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = 0, updated_at = ? WHERE status = ?',
+                (PENDING, time.time(), status))
+            return cursor.rowcount
+
+    def get(self, merchant_id: str, relate_number: str) -> Optional[Dict[str, Any]]:
+        """查詢一張發票的狀態與開立結果"""
+        with self._lock:
+            cursor = self._db.execute('SELECT * FROM outbox WHERE merchant_id = ? AND relate_number = ?',
+                                      (merchant_id, relate_number))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip((column[0] for column in cursor.description), row))
+
+    def stats(self) -> OutboxStats:
+        """佇列指標"""
+        now = time.time()
+        with self._lock:
+            counts = dict(self._db.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall())
+            by_merchant = dict(self._db.execute(
+                'SELECT merchant_id, COUNT(*) FROM outbox WHERE status = ? GROUP BY merchant_id', (PENDING,)
+            ).fetchall())
+            oldest = self._db.execute('SELECT MIN(created_at) FROM outbox WHERE status = ?', (PENDING,)).fetchone()[0]
+            return OutboxStats(
+                counts={status: counts.get(status, 0) for status in STATUSES},
+                pending_by_merchant=by_merchant,
+                oldest_pending_age=now - oldest if oldest is not None else 0.0,
+                enqueue_rate=self._enqueued.rate(now),
+                drain_rate=self._completed.rate(now),
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+@dataclass
+class UploadResult:
+    """uploader 執行統計"""
+    issued: int = 0
+    recovered: int = 0  # 上次已開立但結果未寫回，查詢後補記
+    rejected: int = 0
+    failed: int = 0
+    retries: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+
+
+class OutboxUploader:
+    """
+    背景送出 outbox 中的發票
+
+    services 的值需提供 async issue_invoice(data) (回應含 success / rtn_code / rtn_msg / invoice_number)，
+    例如 examples/ecpay-invoice-async-example.py 的 AsyncECPayInvoiceService；
+    提供 async query_invoice(relate_number) 時可補記當機前已開立的發票。
+    """
+
+    def __init__(self, outbox: InvoiceOutbox, services: Union[Mapping[str, Any], Callable[[str], Any]],
+                 handler: Optional[InvoiceErrorHandler] = None, workers: int = 10, max_retries: int = 5,
+                 backoff_factor: float = 1.0, max_backoff: float = 300.0, batch_size: int = 100,
+                 poll_interval: float = 1.0):
+        """
+        Args:
+            outbox: 發票 outbox
+            services: {商店代號: 服務} 或 商店代號 → 服務 的函式
+            handler: 錯誤分類器
+            workers: 同時送出的商店數上限
+            max_retries: 可重試錯誤的最大重試次數
+            backoff_factor: 重試等待秒數 = backoff_factor * 2 ** 已嘗試次數
+            max_backoff: 重試等待秒數上限
+            batch_size: 每次從佇列讀取的筆數
+            poll_interval: 輪詢佇列的間隔 (秒)
+        """
+        if workers <= 0:
+            raise ValueError('workers 必須大於 0')
+
+        self.outbox = outbox
+        self._services = services
+        self.handler = handler or InvoiceErrorHandler(provider='ecpay')
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.result = UploadResult()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _service(self, merchant_id: str) -> Any:
+        if callable(self._services) and not isinstance(self._services, Mapping):
+            return self._services(merchant_id)
+        service = self._services.get(merchant_id)
+        if service is None:
+            raise ValueError(f'未設定商店服務: {merchant_id}')
+        return service
+
+    async def run(self, stop: Optional[asyncio.Event] = None, until_empty: bool = False) -> UploadResult:
+        """
+        持續送出，直到 stop 被設定 (或 until_empty 時佇列清空)
+
+        Args:
+            stop: 停止訊號
+            until_empty: 所有發票都不再是 pending 時結束 (會等待重試排程)
+        """
+        self._semaphore = asyncio.Semaphore(self.workers)
+        active: Dict[str, asyncio.Task] = {}
+        try:
+            while not (stop and stop.is_set()):
+                for merchant_id in await asyncio.to_thread(self.outbox.pending_merchants):
+                    task = active.get(merchant_id)
+                    if task is None or task.done():
+                        active[merchant_id] = asyncio.create_task(self._drain_merchant(merchant_id))
+                running = [task for task in active.values() if not task.done()]
+                if until_empty and not running and not await asyncio.to_thread(self.outbox.pending_merchants):
+                    break
+                waiters = running + ([asyncio.ensure_future(stop.wait())] if stop else [])
+                if waiters:
+                    await asyncio.wait(waiters, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    await asyncio.sleep(self.poll_interval)
+                if stop:
+                    for waiter in waiters[len(running):]:
+                        waiter.cancel()
+        finally:
+            for task in active.values():
+                task.cancel()
+            await asyncio.gather(*active.values(), return_exceptions=True)
+        return self.result
+
+    async def drain(self) -> UploadResult:
+        """送出直到佇列清空 (批次作業 / 測試用)"""
+        return await self.run(until_empty=True)
+
+    async def _drain_merchant(self, merchant_id: str):
+        """依序送出一個商店的發票；遇到需要重試的發票即結束，等下次輪詢"""
+        async with self._semaphore:
+            while True:
+                batch = await asyncio.to_thread(self.outbox.next_batch, merchant_id, self.batch_size)
+                if not batch:
+                    return
+                for entry in batch:
+                    if not await self._submit(entry):
+                        return
+
+    async def _submit(self, entry: OutboxEntry) -> bool:
+        """
+        送出一張發票
+
+        Returns:
+            是否已有結果 (False 表示排程重試，同商店後面的發票需等待)
+        """
+        started = time.perf_counter()
+        try:
+            service = self._service(entry.merchant_id)
+        except Exception as e:
+            # 設定錯誤重試也不會成功: 標記為 rejected，讓同商店其他發票與 drain() 能結束
+            code = NO_SERVICE_ERROR.code
+            self.handler.log_error(code, context={'merchant_id': entry.merchant_id,
+                                                  'relate_number': entry.relate_number, 'error': str(e)},
+                                   error_info=NO_SERVICE_ERROR)
+            await asyncio.to_thread(self.outbox.mark_failed, entry, REJECTED, code, str(e))
+            self.result.errors[code] = self.result.errors.get(code, 0) + 1
+            self.result.rejected += 1
+            return True
+
+        try:
+            response = await service.issue_invoice(self.outbox.invoice(entry))
+        except Exception as e:
+            code, message = error_code_of(e), str(e)
+        else:
+            if response.success:
+                await asyncio.to_thread(self.outbox.mark_issued, entry, response.invoice_number,
+                                        response.invoice_date, response.random_number)
+                self.result.issued += 1
+                return True
+            if response.rtn_code == RTN_DUPLICATE_RELATE_NUMBER and await self._recover(service, entry):
+                return True
+            code = str(response.rtn_code) if response.rtn_code else 'SERVER_ERROR'
+            message = response.rtn_msg or response.error_message
+
+        self.result.errors[code] = self.result.errors.get(code, 0) + 1
+        retryable = self.handler.should_retry(code)
+        self.handler.log_error(code, context={'merchant_id': entry.merchant_id, 'relate_number': entry.relate_number},
+                               latency=time.perf_counter() - started, retry_count=entry.attempts)
+        if retryable and entry.attempts < self.max_retries:
+            delay = min(self.max_backoff, self.backoff_factor * 2 ** entry.attempts)
+            await asyncio.to_thread(self.outbox.mark_retry, entry, code, message, delay)
+            self.result.retries += 1
+            return False
+
+        status = FAILED if retryable else REJECTED
+        await asyncio.to_thread(self.outbox.mark_failed, entry, status, code, message)
+        setattr(self.result, status, getattr(self.result, status) + 1)
+        return True
+
+    async def _recover(self, service: Any, entry: OutboxEntry) -> bool:
+        """RelateNumber 重複時查詢既有發票，補記為 issued"""
+        if not hasattr(service, 'query_invoice'):
+            return False
+        try:
+            query = await service.query_invoice(entry.relate_number)
+        except Exception:
+            return False
+        if query.get('RtnCode') != 1:
+            return False
+        await asyncio.to_thread(self.outbox.mark_issued, entry, query.get('IIS_Number', ''),
+                                query.get('IIS_Create_Date', ''), query.get('IIS_Random_Number', ''))
+        self.result.recovered += 1
+        return True
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='發票 outbox 狀態')
+    parser.add_argument('database', type=Path, help='outbox SQLite 檔')
+    parser.add_argument('--prometheus', action='store_true', help='以 Prometheus 文字格式輸出')
+    args = parser.parse_args()
+
+    outbox = InvoiceOutbox(args.database)
+    stats = outbox.stats()
+    print(stats.prometheus_text() if args.prometheus else stats)
+    outbox.close()
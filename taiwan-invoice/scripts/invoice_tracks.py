@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - 發票字軌配號
+
+在本機由已取得的字軌區間配發發票號碼，開立資料 (含 InvoiceNo、RandomNumber) 可預先組好並簽章，
+再由背景批次上傳，不必每張發票都同步等待加值中心配號。
+
+- 字軌區間: 依期別 (民國年 + 雙月期) 載入，欄位同 ECPay 字軌查詢的回傳
+  (InvoiceYear / InvoiceTerm / InvoiceHeader / InvoiceStart / InvoiceEnd)，每本 50 號
+- 配號: 以鎖保護的整數計數器依字軌順序配發，不會重複
+- 防當機: 每次預留 block_size 個號碼並將已預留的最後一個號碼寫入狀態檔 (暫存檔 + fsync + os.replace)；
+  重新啟動時從已預留的號碼之後開始。當機時最多跳過 block_size 個號碼，不會重複配號；
+  正常 close() 時只記錄實際配發到的號碼
+- 用量: 依期別統計已配發 / 剩餘號碼
+- RandomNumber: 配號時一併以 secrets 產生 4 碼隨機碼
+
+同一狀態檔同時只能由一個行程使用 (支援 fcntl 的系統會以檔案鎖保護)。
+
+字軌檔 (CSV 表頭或 JSON 陣列的 key):
+    InvoiceYear,InvoiceTerm,InvoiceHeader,InvoiceStart,InvoiceEnd
+    113,1,AB,00000000,00000049
+
+使用範例:
+    from invoice_tracks import InvoiceNumberAllocator, load_ranges
+
+    with InvoiceNumberAllocator('tracks.state.json', load_ranges('tracks.csv')) as allocator:
+        number = allocator.allocate()       # AllocatedNumber(invoice_no='AB00000000', random_number='4821', ...)
+        print(allocator.usage())
+
+用法:
+    python invoice_tracks.py tracks.csv --state tracks.state.json
+"""
+
+import bisect
+import csv
+import json
+import os
+import secrets
+import tempfile
+import threading
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+# 每本發票 50 號，字軌區間以本為單位
+BOOKLET_SIZE = 50
+
+
+class TrackExhaustedError(Exception):
+    """期別的字軌號碼已用完"""
+
+    error_code = 'TRACK_EXHAUSTED'
+
+    def __init__(self, period: 'Period'):
+        super().__init__(f'{period} 的字軌號碼已用完')
+        self.period = period
+
+
+@dataclass(frozen=True, order=True)
+class Period:
+    """發票期別 (民國年 + 雙月期，term 1 = 1-2 月 ... 6 = 11-12 月)"""
+    year: int
+    term: int
+
+    def __post_init__(self):
+        if not 1 <= self.term <= 6:
+            raise ValueError(f'InvoiceTerm 必須為 1 ~ 6: {self.term}')
+
+    @classmethod
+    def of(cls, day: date) -> 'Period':
+        """日期所屬的期別"""
+        return cls(day.year - 1911, (day.month + 1) // 2)
+
+    @property
+    def code(self) -> str:
+        """期別代碼 (民國年 + 期末月份，例如 11302 = 113 年 1-2 月)"""
+        return f'{self.year:03d}{self.term * 2:02d}'
+
+    @classmethod
+    def parse(cls, code: str) -> 'Period':
+        """由期別代碼建立 (例如 '11302')"""
+        if len(code) != 5 or not code.isdigit() or int(code[3:]) % 2:
+            raise ValueError(f'期別代碼格式錯誤 (民國年 3 碼 + 雙數月份 2 碼): {code}')
+        return cls(int(code[:3]), int(code[3:]) // 2)
+
+    @property
+    def start(self) -> date:
+        """期別第一天"""
+        return date(self.year + 1911, self.term * 2 - 1, 1)
+
+    @property
+    def end(self) -> date:
+        """下一期第一天 (不含)"""
+        return date(self.year + 1912, 1, 1) if self.term == 6 else date(self.year + 1911, self.term * 2 + 1, 1)
+
+    def __str__(self) -> str:
+        return f'{self.year} 年 {self.term * 2 - 1:02d}-{self.term * 2:02d} 月'
+
+
+@dataclass(frozen=True)
+class TrackRange:
+    """一段字軌區間 (InvoiceStart ~ InvoiceEnd，含兩端)"""
+    period: Period
+    header: str
+    start: int
+    end: int
+
+    def __post_init__(self):
+        if len(self.header) != 2 or not self.header.isascii() or not self.header.isalpha() \
+                or not self.header.isupper():
+            raise ValueError(f'字軌必須為 2 碼大寫英文: {self.header}')
+        if not 0 <= self.start <= self.end <= 99999999:
+            raise ValueError(f'字軌號碼區間錯誤: {self.start} ~ {self.end}')
+        if self.start % BOOKLET_SIZE or (self.end + 1) % BOOKLET_SIZE:
+            raise ValueError(f'字軌區間必須以 {BOOKLET_SIZE} 號為單位: {self.label}')
+
+    @classmethod
+    def from_dict(cls, row: Dict[str, Any]) -> 'TrackRange':
+        """由 ECPay 字軌查詢格式 (或相同表頭的 CSV 列) 建立"""
+        return cls(
+            period=Period(int(row['InvoiceYear']), int(row['InvoiceTerm'])),
+            header=str(row['InvoiceHeader']).strip().upper(),
+            start=int(row['InvoiceStart']),
+            end=int(row['InvoiceEnd']),
+        )
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start + 1
+
+    @property
+    def label(self) -> str:
+        return f'{self.header}{self.start:08d}-{self.header}{self.end:08d}'
+
+    def number(self, index: int) -> str:
+        """區間內第 index 個號碼"""
+        return f'{self.header}{self.start + index:08d}'
+
+
+@dataclass(frozen=True)
+class AllocatedNumber:
+    """配發的發票號碼"""
+    invoice_no: str
+    period: Period
+    random_number: str
+
+    def as_payload(self) -> Dict[str, str]:
+        return {'InvoiceNo': self.invoice_no, 'RandomNumber': self.random_number}
+
+
+@dataclass(frozen=True)
+class TrackUsage:
+    """期別用量"""
+    period: Period
+    capacity: int
+    allocated: int
+
+    @property
+    def remaining(self) -> int:
+        return self.capacity - self.allocated
+
+    @property
+    def ratio(self) -> float:
+        return self.allocated / self.capacity if self.capacity else 1.0
+
+    def __str__(self) -> str:
+        return f'{self.period}: 已配發 {self.allocated:,} / {self.capacity:,} ({self.ratio:.1%})，剩餘 {self.remaining:,}'
+
+
+def load_ranges(path: Union[str, Path]) -> List[TrackRange]:
+    """讀取字軌檔 (CSV 或 JSON 陣列)"""
+    path = Path(path)
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        rows = json.load(f) if path.suffix.lower() == '.json' else list(csv.DictReader(f))
+    return [TrackRange.from_dict(row) for row in rows]
+
+
+class _PeriodTrack:
+    """一個期別的字軌 (依字軌與起號排序後連續編號)"""
+
+    def __init__(self, period: Period, ranges: List[TrackRange]):
+        self.period = period
+        self.ranges = sorted(ranges, key=lambda r: (r.header, r.start))
+        for previous, current in zip(self.ranges, self.ranges[1:]):
+            if previous.header == current.header and current.start <= previous.end:
+                raise ValueError(f'字軌區間重疊: {previous.label} / {current.label}')
+        self.offsets: List[int] = []
+        total = 0
+        for track in self.ranges:
+            self.offsets.append(total)
+            total += track.size
+        self.capacity = total
+        self.next = 0  # 下一個要配發的序號
+        self.reserved = 0  # 已寫入狀態檔的預留上限 (不含)
+
+    def number(self, offset: int) -> str:
+        index = bisect.bisect_right(self.offsets, offset) - 1
+        return self.ranges[index].number(offset - self.offsets[index])
+
+    def offset_after(self, invoice_no: str) -> int:
+        """invoice_no (含) 之前的號碼數，即之後的第一個序號"""
+        header, value = invoice_no[:2], int(invoice_no[2:])
+        count = 0
+        for track in self.ranges:
+            if (track.header, track.end) <= (header, value):
+                count += track.size
+            elif (track.header, track.start) <= (header, value):
+                count += value - track.start + 1
+        return count
+
+
+class InvoiceNumberAllocator:
+    """
+    發票字軌配號器
+
+    Example:
+        >>> allocator = InvoiceNumberAllocator('tracks.state.json', load_ranges('tracks.csv'))
+        >>> allocator.allocate(date(2024, 1, 15)).invoice_no
+        'AB00000000'
+        >>> allocator.close()
+    """
+
+    def __init__(self, state_path: Union[str, Path], ranges: Iterable[TrackRange], block_size: int = 100,
+                 fsync: bool = True):
+        """
+        Args:
+            state_path: 狀態檔路徑 (記錄各期別已預留的最後一個號碼)
+            ranges: 字軌區間
+            block_size: 每次預留的號碼數 (越大寫檔越少，當機時可能跳過的號碼越多)
+            fsync: 寫入狀態檔後 fsync
+        """
+        if block_size <= 0:
+            raise ValueError('block_size 必須大於 0')
+
+        self.state_path = Path(state_path)
+        self.block_size = block_size
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._closed = False
+
+        by_period: Dict[Period, List[TrackRange]] = {}
+        for track in ranges:
+            by_period.setdefault(track.period, []).append(track)
+        self._tracks = {period: _PeriodTrack(period, tracks) for period, tracks in by_period.items()}
+
+        self._lock_file = self._acquire_file_lock()
+        self._state: Dict[str, str] = self._load_state()
+        for track in self._tracks.values():
+            last = self._state.get(track.period.code)
+            if last:
+                track.next = track.reserved = track.offset_after(last)
+
+    def _acquire_file_lock(self):
+        if not HAS_FCNTL:
+            return None
+        handle = open(f'{self.state_path}.lock', 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            raise RuntimeError(f'狀態檔已被其他行程使用: {self.state_path}')
+        return handle
+
+    def _load_state(self) -> Dict[str, str]:
+        if not self.state_path.exists():
+            return {}
+        with open(self.state_path, encoding='utf-8') as f:
+            return dict(json.load(f).get('periods', {}))
+
+    def _write_state(self):
+        directory = self.state_path.parent
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tracks-', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'periods': self._state}, f, ensure_ascii=False, indent=2)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, self.state_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _track(self, period: Period) -> _PeriodTrack:
+        track = self._tracks.get(period)
+        if track is None:
+            raise ValueError(f'沒有 {period} 的字軌')
+        return track
+
+    def _reserve(self, track: _PeriodTrack, count: int):
+        """預留號碼並寫入狀態檔 (呼叫端持有鎖)"""
+        reserved = min(track.capacity, track.next + max(count, self.block_size))
+        self._state[track.period.code] = track.number(reserved - 1)
+        self._write_state()
+        track.reserved = reserved
+
+    def allocate(self, day: Optional[date] = None) -> AllocatedNumber:
+        """
+        配發一個發票號碼
+
+        Args:
+            day: 發票日期 (預設今天)
+
+        Raises:
+            ValueError: 沒有該期別的字軌，或配號器已關閉
+            TrackExhaustedError: 字軌號碼已用完
+        """
+        return self.allocate_many(1, day)[0]
+
+    def allocate_many(self, count: int, day: Optional[date] = None) -> List[AllocatedNumber]:
+        """
+        一次配發 count 個連續序號的發票號碼 (批次預先開立)
+
+        Raises:
+            ValueError: count 不是正整數、沒有該期別的字軌，或配號器已關閉
+            TrackExhaustedError: 剩餘號碼不足 (不會配發任何號碼)
+        """
+        if isinstance(count, bool) or not isinstance(count, int) or count <= 0:
+            raise ValueError(f'count 必須為正整數: {count}')
+        period = Period.of(day or date.today())
+        track = self._track(period)
+        with self._lock:
+            if self._closed:
+                raise ValueError('配號器已關閉')
+            if track.next + count > track.capacity:
+                raise TrackExhaustedError(period)
+            if track.next + count > track.reserved:
+                self._reserve(track, count)
+            first = track.next
+            track.next += count
+        return [AllocatedNumber(track.number(offset), period, f'{secrets.randbelow(10000):04d}')
+                for offset in range(first, first + count)]
+
+    def usage(self, period: Optional[Period] = None) -> Union[TrackUsage, List[TrackUsage]]:
+        """
+        期別用量
+
+        Args:
+            period: 期別 (未指定時回傳所有期別，依期別排序)
+        """
+        if period is not None:
+            track = self._track(period)
+            return TrackUsage(period, track.capacity, track.next)
+        return [TrackUsage(track.period, track.capacity, track.next)
+                for track in sorted(self._tracks.values(), key=lambda t: t.period)]
+
+    def close(self):
+        """寫入實際配發到的最後一個號碼 (未配發的預留號碼下次仍可使用) 並釋放檔案鎖"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            changed = False
+            for track in self._tracks.values():
+                if track.next < track.reserved:
+                    if track.next:
+                        self._state[track.period.code] = track.number(track.next - 1)
+                    else:
+                        self._state.pop(track.period.code, None)
+                    track.reserved = track.next
+                    changed = True
+            if changed:
+                self._write_state()
+            if self._lock_file is not None:
+                self._lock_file.close()
+
+    def __enter__(self) -> 'InvoiceNumberAllocator':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='發票字軌用量')
+    parser.add_argument('tracks', type=Path, help='字軌檔 (CSV / JSON)')
+    parser.add_argument('--state', type=Path, default=Path('tracks.state.json'), help='狀態檔')
+    args = parser.parse_args()
+
+    with InvoiceNumberAllocator(args.state, load_ranges(args.tracks)) as allocator:
+        for item in allocator.usage():
+            print(item)
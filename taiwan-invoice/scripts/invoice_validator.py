@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - 買受人與載具驗證 (data/carrier-types.csv)
+
+開立前在本機檢查 InvoiceIssueData，必定被加值中心退件的資料不必浪費一次 API 往返:
+
+- 統一編號: 8 碼數字 + 檢查碼 (權數 1,2,1,2,1,2,4,1，各乘積位數和可被 5 整除；
+  第 7 碼為 7 時，和加 1 可被 5 整除亦可)
+- 載具: 手機條碼 (CarrierType 3)、自然人憑證 (CarrierType 2) 依 carrier-types.csv 的 validation_regex
+- 捐贈碼: 同上 (donate 列)
+- 欄位組合: B2B 不可使用載具或捐贈、有載具或捐贈時不可列印、列印時需有買受人名稱與地址
+
+正規表示式在 import 時編譯一次；validate_many() 批次驗證，回傳每一列的錯誤清單。
+
+使用範例:
+    from invoice_validator import is_valid_ubn, validate_issue_data, validate_many
+
+    is_valid_ubn('80129529')                 # True
+    validate_issue_data(invoice_data)        # [] 表示通過
+    for row, errors in zip(rows, validate_many(rows)):
+        ...
+"""
+
+import csv
+import functools
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Pattern
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+DEFAULT_CSV = DATA_DIR / 'carrier-types.csv'
+
+B2C_IDENTIFIERS = ('', '0000000000')
+
+# 統一編號檢查碼權數
+UBN_WEIGHTS = (1, 2, 1, 2, 1, 2, 4, 1)
+
+# ECPay CarrierType 代碼 → carrier-types.csv 的 carrier_type (1 = 綠界載具，無固定格式)
+CARRIER_CODES: Dict[str, Optional[str]] = {
+    '1': None,
+    '2': 'citizen',
+    '3': 'mobile',
+}
+
+_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+def load_patterns(path: Path = DEFAULT_CSV) -> Dict[str, Pattern]:
+    """
+    讀取 carrier-types.csv 並編譯 validation_regex，以 carrier_type 為 key
+
+    比對一律用 fullmatch: 規則中的 $ 會匹配結尾的換行，.match 會讓 '/ABC+123\\n' 通過。
+    """
+    patterns = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            regex = (row.get('validation_regex') or '').strip()
+            if regex:
+                patterns[row['carrier_type'].strip()] = re.compile(regex)
+    return patterns
+
+
+PATTERNS: Dict[str, Pattern] = load_patterns()
+
+
+@functools.lru_cache(maxsize=65536)
+def is_valid_ubn(identifier: str) -> bool:
+    """
+    統一編號檢查碼驗證
+
+    Example:
+        >>> is_valid_ubn('80129529')
+        True
+        >>> is_valid_ubn('80129528')
+        False
+    """
+    if len(identifier) != 8 or not identifier.isascii() or not identifier.isdigit():
+        return False
+    total = 0
+    for digit, weight in zip(identifier, UBN_WEIGHTS):
+        product = int(digit) * weight
+        total += product // 10 + product % 10
+    return total % 5 == 0 or (identifier[6] == '7' and (total + 1) % 5 == 0)
+
+
+def is_valid_carrier(carrier_type: str, carrier_num: str) -> bool:
+    """載具號碼格式驗證 (CarrierType 1 / 2 / 3)"""
+    if carrier_type not in CARRIER_CODES:
+        return False
+    name = CARRIER_CODES[carrier_type]
+    return name is None or bool(PATTERNS[name].fullmatch(carrier_num))
+
+
+def is_valid_love_code(love_code: str) -> bool:
+    """捐贈碼格式驗證"""
+    return bool(PATTERNS['donate'].fullmatch(love_code))
+
+
+def _text(value: Any) -> str:
+    return '' if value is None else str(value).strip()
+
+
+def validate_issue_data(data: Any) -> List[str]:
+    """
+    驗證一筆發票開立資料的買受人、載具、捐贈與列印欄位
+
+    Args:
+        data: InvoiceIssueData 或相同欄位名稱的 dict (例如 bulk_issue.py 的訂單)
+
+    Returns:
+        錯誤訊息清單 (空清單表示通過)
+    """
+    if isinstance(data, dict):
+        get = data.get
+    else:
+        def get(name, default=None):
+            return getattr(data, name, default)
+
+    errors = []
+
+    relate_number = _text(get('relate_number'))
+    if not relate_number:
+        errors.append('relate_number 必填')
+    elif len(relate_number) > 30:
+        errors.append(f'relate_number 超過 30 字元: {relate_number}')
+
+    identifier = _text(get('customer_identifier'))
+    is_b2b = identifier not in B2C_IDENTIFIERS
+    if is_b2b and not is_valid_ubn(identifier):
+        errors.append(f'customer_identifier 統一編號格式或檢查碼錯誤: {identifier}')
+
+    carrier_type = _text(get('carrier_type'))
+    carrier_num = _text(get('carrier_num'))
+    donation = _text(get('donation')) or '0'
+    love_code = _text(get('love_code'))
+    print_flag = _text(get('print')) or '0'
+
+    if carrier_type:
+        if carrier_type not in CARRIER_CODES:
+            errors.append(f'carrier_type 不支援: {carrier_type}')
+        elif not is_valid_carrier(carrier_type, carrier_num):
+            errors.append(f'carrier_num 格式錯誤 (CarrierType {carrier_type}): {carrier_num}')
+    elif carrier_num:
+        errors.append('carrier_num 有值時必須指定 carrier_type')
+
+    if donation not in ('0', '1'):
+        errors.append(f'donation 必須為 0 或 1: {donation}')
+    elif donation == '1' and not is_valid_love_code(love_code):
+        errors.append(f'love_code 格式錯誤 (3 ~ 7 碼數字): {love_code}')
+
+    if print_flag not in ('0', '1'):
+        errors.append(f'print 必須為 0 或 1: {print_flag}')
+    elif print_flag == '1':
+        if carrier_type or donation == '1':
+            errors.append('使用載具或捐贈時 print 必須為 0')
+        if not _text(get('customer_name')) or not _text(get('customer_addr')):
+            errors.append('列印發票時 customer_name 與 customer_addr 必填')
+
+    if is_b2b and (carrier_type or donation == '1'):
+        errors.append('B2B 發票不可使用載具或捐贈')
+
+    email = _text(get('customer_email'))
+    if email and not _EMAIL.fullmatch(email):
+        errors.append(f'customer_email 格式錯誤: {email}')
+
+    return errors
+
+
+def validate_many(rows: Iterable[Any]) -> List[List[str]]:
+    """
+    批次驗證
+
+    Args:
+        rows: InvoiceIssueData 或 dict
+
+    Returns:
+        與 rows 順序相同的錯誤清單
+    """
+    return [validate_issue_data(row) for row in rows]
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    from bulk_issue import read_orders
+
+    parser = argparse.ArgumentParser(description='開立前驗證訂單檔 (CSV / JSONL)')
+    parser.add_argument('orders', type=Path, help='訂單檔 (欄位同 bulk_issue.py)')
+    args = parser.parse_args()
+
+    invalid = 0
+    for line, errors in enumerate(validate_many(read_orders(args.orders)), 1):
+        if errors:
+            invalid += 1
+            print(f"第 {line} 筆: {'; '.join(errors)}")
+    print(f"\n{invalid} 筆資料有誤")
+    sys.exit(1 if invalid else 0)
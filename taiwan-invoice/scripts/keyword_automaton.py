@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Aho-Corasick 多關鍵字比對器
+
+recommend.py 將推薦規則、服務商詞彙與反模式關鍵字編譯為單一自動機，
+查詢字串只需掃描一次即可取得所有命中的規則。
+
+taiwan-invoice / taiwan-payment / taiwan-logistics 各自保留一份相同的檔案
+(每個技能需可獨立安裝)，修改時請同步更新三份；test[-_]recommend 會檢查三份內容一致。
+
+使用範例:
+    from keyword_automaton import KeywordAutomaton
+
+    automaton = KeywordAutomaton()
+    automaton.add('超商', 'cvs')
+    automaton.add('超商取貨', 'pickup')
+    automaton.build()
+    automaton.scan('超商取貨付款')    # {'cvs', 'pickup'}
+"""
+
+from collections import deque
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class KeywordAutomaton:
+    """Aho-Corasick 多關鍵字比對器 (重疊的關鍵字也會全部命中)"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, Any]]] = [[]]
+
+    def add(self, keyword: str, payload: Any) -> None:
+        """加入關鍵字與命中時回傳的資料"""
+        if not keyword:
+            return
+
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(keyword), payload))
+
+    def build(self) -> 'KeywordAutomaton':
+        """建立 failure link (BFS)"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+        return self
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """掃描文字，依結束位置逐一產生 (start, end, payload)"""
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, payload in self._output[state]:
+                yield end - length, end, payload
+
+    def scan(self, text: str) -> set:
+        """回傳所有命中的 payload (去除重複)"""
+        return {payload for _, _, payload in self.iter_matches(text)}
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - 多商店金鑰管理與服務實例快取
+
+examples/ 的服務類別 (ECPayInvoiceService)
+一次只綁定一組商店金鑰。平台代收多個子商店時，若每個請求都重新建立服務物件，
+每次都要重新編碼 HashKey / HashIV、組 API 網址。
+
+MerchantRegistry 負責:
+- 從本機檔案 (JSON / CSV) 或環境變數一次載入所有商店金鑰
+- 依 (provider, merchant_id, environment) 發放快取的服務實例 (thread-safe)
+- LRU 淘汰: 超過 capacity 時移除最久未使用的實例
+- 熱重載: 檔案更新 (金鑰輪替) 時只淘汰金鑰有變動或被移除的商店
+- 每個商店的使用統計 (取用次數、建立次數、淘汰次數、最後使用時間)
+
+金鑰檔格式 (JSON):
+    {"merchants": [
+        {"provider": "ecpay", "merchant_id": "3002607",
+         "hash_key": "pwFHCqoQZGmho4w6", "hash_iv": "EkRm7iFT261dpevs", "environment": "test"}
+    ]}
+
+CSV 欄位相同: provider,merchant_id,hash_key,hash_iv,environment
+
+使用範例:
+    from merchant_registry import MerchantRegistry
+
+    registry = MerchantRegistry('merchants.json')
+    service = registry.get('ecpay', '2000132')
+    response = service.issue_invoice(data)
+
+    registry = MerchantRegistry.from_env()     # TAIWAN_INVOICE_MERCHANTS=檔案路徑或 JSON
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from example_loader import load_example
+
+ENVIRONMENTS = ('test', 'production')
+ENV_VAR = 'TAIWAN_INVOICE_MERCHANTS'
+
+RegistryKey = Tuple[str, str, str]
+
+
+@dataclass(frozen=True)
+class MerchantCredentials:
+    """單一商店的金鑰"""
+    provider: str
+    merchant_id: str
+    hash_key: str = field(repr=False)
+    hash_iv: str = field(repr=False)
+    environment: str = 'test'
+
+    @property
+    def key(self) -> RegistryKey:
+        return (self.provider, self.merchant_id, self.environment)
+
+    @property
+    def is_production(self) -> bool:
+        return self.environment == 'production'
+
+
+@dataclass
+class MerchantUsage:
+    """單一商店的使用統計"""
+    requests: int = 0
+    builds: int = 0
+    evictions: int = 0
+    last_used: float = 0.0
+
+
+def _example_factory(example: str, class_name: str, test_flag: bool = False) -> Callable[[MerchantCredentials], Any]:
+    """
+    以範例服務類別建立實例 (merchant_id, hash_key, hash_iv, 環境旗標)
+
+    test_flag: 第 4 個參數為 is_test / test_mode (True = 測試環境) 而非 is_production
+    """
+    def factory(credentials: MerchantCredentials) -> Any:
+        cls = getattr(load_example(example), class_name)
+        flag = not credentials.is_production if test_flag else credentials.is_production
+        return cls(credentials.merchant_id, credentials.hash_key, credentials.hash_iv, flag)
+    return factory
+
+
+PROVIDERS: Dict[str, Callable[[MerchantCredentials], Any]] = {
+    'ecpay': _example_factory('ecpay-invoice-example', 'ECPayInvoiceService', test_flag=True),
+}
+
+
+def parse_credentials(records: Iterable[Dict[str, Any]]) -> Dict[RegistryKey, MerchantCredentials]:
+    """
+    驗證並轉換金鑰記錄
+
+    Raises:
+        ValueError: 缺少欄位、environment 不正確或重複的商店
+    """
+    result: Dict[RegistryKey, MerchantCredentials] = {}
+    for index, record in enumerate(records, 1):
+        missing = [name for name in ('provider', 'merchant_id', 'hash_key', 'hash_iv') if not record.get(name)]
+        if missing:
+            raise ValueError(f'第 {index} 筆商店設定缺少欄位: {", ".join(missing)}')
+
+        environment = (record.get('environment') or 'test').strip().lower()
+        if environment not in ENVIRONMENTS:
+            raise ValueError(f'第 {index} 筆商店設定 environment 錯誤: {environment}')
+
+        credentials = MerchantCredentials(
+            provider=str(record['provider']).strip().lower(),
+            merchant_id=str(record['merchant_id']).strip(),
+            hash_key=str(record['hash_key']),
+            hash_iv=str(record['hash_iv']),
+            environment=environment,
+        )
+        if credentials.key in result:
+            raise ValueError(f'商店設定重複: {credentials.key}')
+        result[credentials.key] = credentials
+    return result
+
+
+def load_credentials(path: Union[str, Path]) -> Dict[RegistryKey, MerchantCredentials]:
+    """
+    讀取金鑰檔 (.json / .csv)
+
+    Raises:
+        ValueError: 檔案格式錯誤
+    """
+    path = Path(path)
+    if path.suffix.lower() == '.csv':
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            return parse_credentials(csv.DictReader(f))
+
+    data = json.loads(path.read_text(encoding='utf-8'))
+    if isinstance(data, dict):
+        data = data.get('merchants', [])
+    if not isinstance(data, list):
+        raise ValueError(f'金鑰檔格式錯誤: {path}')
+    return parse_credentials(data)
+
+
+class MerchantRegistry:
+    """
+    商店金鑰與服務實例快取
+
+    所有公開方法皆可在多執行緒中呼叫。服務實例本身只保存金鑰與網址，
+    由多個執行緒共用同一實例是安全的。
+    """
+
+    def __init__(
+        self,
+        source: Union[str, Path, Iterable[Dict[str, Any]], None] = None,
+        capacity: int = 256,
+        reload_interval: float = 1.0,
+        providers: Optional[Dict[str, Callable[[MerchantCredentials], Any]]] = None,
+    ):
+        """
+        Args:
+            source: 金鑰檔路徑，或金鑰記錄 list (不支援熱重載)
+            capacity: 最多快取的服務實例數
+            reload_interval: 檢查金鑰檔是否更新的最短間隔秒數 (0 = 每次取用都檢查)
+            providers: 額外或覆寫的 provider → 工廠函式
+
+        Raises:
+            ValueError: capacity 小於 1 或金鑰設定錯誤
+        """
+        if capacity < 1:
+            raise ValueError('capacity 必須大於 0')
+
+        self.capacity = capacity
+        self.reload_interval = reload_interval
+        self.providers = dict(PROVIDERS)
+        self.providers.update(providers or {})
+
+        self._lock = threading.RLock()
+        self._services: 'OrderedDict[RegistryKey, Any]' = OrderedDict()
+        self._usage: Dict[RegistryKey, MerchantUsage] = {}
+        self._path: Optional[Path] = None
+        self._mtime: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self._credentials: Dict[RegistryKey, MerchantCredentials] = {}
+        self.last_error: Optional[Exception] = None
+
+        if isinstance(source, (str, Path)):
+            self._path = Path(source)
+            self.reload(force=True)
+        elif source is not None:
+            self._credentials = parse_credentials(source)
+
+    @classmethod
+    def from_env(cls, var: str = ENV_VAR, **kwargs) -> 'MerchantRegistry':
+        """
+        由環境變數建立 (值為金鑰檔路徑，或以 [ / { 開頭的 JSON)
+
+        Raises:
+            KeyError: 環境變數未設定
+        """
+        value = os.environ[var].strip()
+        if value[:1] in ('[', '{'):
+            data = json.loads(value)
+            return cls(data.get('merchants', []) if isinstance(data, dict) else data, **kwargs)
+        return cls(value, **kwargs)
+
+    def register_provider(self, name: str, factory: Callable[[MerchantCredentials], Any]):
+        """註冊自訂 provider 的服務工廠"""
+        with self._lock:
+            self.providers[name] = factory
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        金鑰檔有更新時重新載入
+
+        金鑰有變動或已移除的商店，其快取實例會被淘汰；未變動的保留。
+        載入失敗時保留原本的金鑰並拋出例外。
+
+        Returns:
+            是否重新載入
+        """
+        if self._path is None:
+            return False
+
+        with self._lock:
+            self._checked_at = time.monotonic()
+            stat = self._path.stat()
+            mtime = (stat.st_mtime_ns, stat.st_size)
+            if not force and mtime == self._mtime:
+                return False
+
+            credentials = load_credentials(self._path)
+            for key in list(self._services):
+                if credentials.get(key) != self._credentials.get(key):
+                    self._evict(key)
+            self._credentials = credentials
+            self._mtime = mtime
+            return True
+
+    def _maybe_reload(self):
+        """
+        取用時的自動檢查；輪替過程中檔案暫時不存在或格式錯誤時沿用原本的金鑰，
+        錯誤記錄在 last_error
+        """
+        if self._path is None or time.monotonic() - self._checked_at < self.reload_interval:
+            return
+        try:
+            self.reload()
+            self.last_error = None
+        except (OSError, ValueError) as e:
+            self.last_error = e
+
+    def _evict(self, key: RegistryKey):
+        del self._services[key]
+        self._usage[key].evictions += 1
+
+    def credentials(self, provider: str, merchant_id: str, environment: str = 'test') -> MerchantCredentials:
+        """
+        取得商店金鑰
+
+        Raises:
+            KeyError: 商店未設定
+        """
+        with self._lock:
+            self._maybe_reload()
+            try:
+                return self._credentials[(provider, merchant_id, environment)]
+            except KeyError:
+                raise KeyError(f'未設定商店: {provider} / {merchant_id} ({environment})') from None
+
+    def get(self, provider: str, merchant_id: str, environment: str = 'test') -> Any:
+        """
+        取得 (快取的) 服務實例
+
+        Raises:
+            KeyError: 商店或 provider 未設定
+        """
+        key = (provider, merchant_id, environment)
+        with self._lock:
+            self._maybe_reload()
+            service = self._services.get(key)
+            built = service is None
+            if built:
+                credentials = self.credentials(provider, merchant_id, environment)
+                factory = self.providers.get(provider)
+                if factory is None:
+                    raise KeyError(f'不支援的 provider: {provider}')
+                service = self._services[key] = factory(credentials)
+            else:
+                self._services.move_to_end(key)
+
+            usage = self._usage.get(key)
+            if usage is None:
+                usage = self._usage[key] = MerchantUsage()
+            usage.requests += 1
+            usage.builds += built
+            usage.last_used = time.time()
+
+            if len(self._services) > self.capacity:
+                self._evict(next(iter(self._services)))
+            return service
+
+    def merchants(self) -> List[MerchantCredentials]:
+        """列出所有已設定的商店"""
+        with self._lock:
+            self._maybe_reload()
+            return list(self._credentials.values())
+
+    def usage(self) -> Dict[RegistryKey, MerchantUsage]:
+        """各商店使用統計 (副本)"""
+        with self._lock:
+            return {key: MerchantUsage(**vars(usage)) for key, usage in self._usage.items()}
+
+    def __len__(self) -> int:
+        """目前快取的服務實例數"""
+        return len(self._services)
+
+    def __contains__(self, key: RegistryKey) -> bool:
+        return key in self._services
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - 送出前規則檢查
+
+error-codes.csv / troubleshooting.csv 中有許多錯誤是必然發生的 (RelateNumber 重複、打統編使用載具、
+金額驗算不符、TimeStamp 逾時...)，原本要加密並經過一次 HTTP 往返才會由加值中心回報。
+PresubmitChecker 在送出前於本機檢查 InvoiceIssueData / InvoiceAllowanceData / InvoiceVoidData，
+回傳預測的錯誤碼 (Violation)，呼叫端可直接略過必定失敗的請求。
+
+ECPay 規則:
+    開立  10000006 RelateNumber 重複 (本行程最近成功開立的訂單)
+          10000005 本機時鐘與伺服器相差超過 10 分鐘 (observe_server_time 估計)
+          10000011 統一編號格式或檢查碼錯誤
+          10000018 / 10000019 / 10000020 載具與捐贈、打統編使用載具、打統編捐贈
+          10000016 金額驗算 (invoice_items.validate_ecpay)
+          10000001 其他欄位 (RelateNumber 長度、載具號碼、捐贈碼、列印)
+    折讓  10000008 發票已作廢、10000010 折讓金額超過發票金額、10000016 明細合計不符、10000001 欄位格式
+    作廢  10000008 發票已作廢、10000009 發票已折讓
+
+最近送出的 RelateNumber / 發票號碼以固定容量的 LRU 保存 (結果精確；Bloom filter 的誤判
+會擋下從未送出的訂單，因此不採用)。只有 record() 登錄的資料會參與重複檢查。
+
+使用範例:
+    from presubmit import PresubmitChecker
+
+    checker = PresubmitChecker()
+    violations = checker.check(invoice_data)
+    if violations:
+        print(violations[0])        # [ECPAY] 10000019 打統編不可使用載具: ...
+    else:
+        response = service.issue_invoice(invoice_data)
+        if response.success:
+            checker.record(invoice_data, invoice_no=response.invoice_number)
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Iterable, List, Optional, Tuple
+
+from error_handler import get_invoice_error_registry
+from error_registry import ErrorInfo, ErrorRegistry
+from invoice_items import validate_ecpay
+from invoice_validator import B2C_IDENTIFIERS, CARRIER_CODES, is_valid_carrier, is_valid_love_code, is_valid_ubn
+
+# ECPay TimeStamp 容許誤差 (秒)
+TIMESTAMP_TOLERANCE = 600
+
+_INVOICE_NO = re.compile(r'^[A-Z]{2}\d{8}$')
+_INVOICE_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+
+@dataclass(frozen=True)
+class Violation:
+    """預測的 API 錯誤"""
+    provider: str
+    code: str
+    detail: str
+    info: ErrorInfo
+
+    def __str__(self) -> str:
+        return f'[{self.provider.upper()}] {self.code} {self.info.message}: {self.detail}'
+
+
+@dataclass(frozen=True)
+class Rule:
+    """一條送出前檢查規則 (check 通過時回傳 None，否則回傳說明)"""
+    code: str
+    check: Callable[[Any, 'PresubmitChecker'], Optional[str]]
+
+
+@dataclass(frozen=True)
+class RuleSet:
+    """一種資料類別的規則 (以 marker 欄位判斷資料類別)"""
+    provider: str
+    marker: str
+    rules: Tuple[Rule, ...]
+
+
+@dataclass
+class _InvoiceState:
+    """已開立發票的狀態 (折讓 / 作廢檢查用)"""
+    total_amount: Optional[int] = None
+    allowance_amount: int = 0
+    voided: bool = False
+
+
+class RecentKeys:
+    """最近使用的 key (LRU，容量固定)"""
+
+    def __init__(self, capacity: int = 100_000):
+        if capacity <= 0:
+            raise ValueError('capacity 必須大於 0')
+        self.capacity = capacity
+        self._items: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key: Hashable, value: Any = True):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def _text(value: Any) -> str:
+    return '' if value is None else str(value).strip()
+
+
+def _is_b2b(data: Any) -> bool:
+    return _text(data.customer_identifier) not in B2C_IDENTIFIERS
+
+
+def _has_carrier(data: Any) -> bool:
+    return bool(_text(data.carrier_type) or _text(data.carrier_num))
+
+
+def _donates(data: Any) -> bool:
+    return _text(data.donation) == '1'
+
+
+# ============================================================================
+# ECPay 開立
+# ============================================================================
+
+def _duplicate_relate_number(data, checker) -> Optional[str]:
+    if (data.merchant_id, data.relate_number) in checker.issued:
+        return f'RelateNumber {data.relate_number} 已於本行程開立'
+    return None
+
+
+def _clock_skew(data, checker) -> Optional[str]:
+    if abs(checker.clock_offset) > TIMESTAMP_TOLERANCE:
+        return f'本機時鐘與伺服器相差 {checker.clock_offset:+.0f} 秒'
+    return None
+
+
+def _buyer_identifier(data, checker) -> Optional[str]:
+    identifier = _text(data.customer_identifier)
+    if _is_b2b(data) and not is_valid_ubn(identifier):
+        return f'CustomerIdentifier {identifier} 格式或檢查碼錯誤'
+    return None
+
+
+def _carrier_and_donation(data, checker) -> Optional[str]:
+    if _has_carrier(data) and _donates(data):
+        return f'CarrierType {data.carrier_type} 與 Donation=1 同時存在'
+    return None
+
+
+def _b2b_carrier(data, checker) -> Optional[str]:
+    if _is_b2b(data) and _has_carrier(data):
+        return f'CarrierType {data.carrier_type}'
+    return None
+
+
+def _b2b_donation(data, checker) -> Optional[str]:
+    if _is_b2b(data) and _donates(data):
+        return f'LoveCode {data.love_code}'
+    return None
+
+
+def _issue_amounts(data, checker) -> Optional[str]:
+    payload = {
+        'TaxType': data.tax_type,
+        'SalesAmount': data.sales_amount,
+        'TaxAmount': data.tax_amount,
+        'TotalAmount': data.total_amount,
+        'ZeroTaxSalesAmount': getattr(data, 'zero_tax_sales_amount', 0),
+        'FreeTaxSalesAmount': getattr(data, 'free_tax_sales_amount', 0),
+        'Items': data.items,
+    }
+    errors = validate_ecpay(payload, b2b=_is_b2b(data))
+    return '; '.join(error.split(': ', 1)[-1] for error in errors) or None
+
+
+def _issue_fields(data, checker) -> Optional[str]:
+    errors = []
+    relate_number = _text(data.relate_number)
+    if not relate_number or len(relate_number) > 30:
+        errors.append('RelateNumber 必填且不可超過 30 字元')
+    carrier_type = _text(data.carrier_type)
+    if carrier_type and (carrier_type not in CARRIER_CODES
+                         or not is_valid_carrier(carrier_type, _text(data.carrier_num))):
+        errors.append(f'CarrierNum 格式錯誤: {data.carrier_num}')
+    if _donates(data) and not is_valid_love_code(_text(data.love_code)):
+        errors.append(f'LoveCode 格式錯誤: {data.love_code}')
+    if _text(data.print) == '1' and (_has_carrier(data) or _donates(data)):
+        errors.append('使用載具或捐贈時 Print 必須為 0')
+    return '; '.join(errors) or None
+
+
+# ============================================================================
+# ECPay 折讓 / 作廢
+# ============================================================================
+
+def _allowance_voided(data, checker) -> Optional[str]:
+    state = checker.invoices.get(data.invoice_no)
+    if state is not None and state.voided:
+        return f'發票 {data.invoice_no} 已作廢，不可折讓'
+    return None
+
+
+def _allowance_exceeds(data, checker) -> Optional[str]:
+    state = checker.invoices.get(data.invoice_no)
+    if state is None or state.total_amount is None:
+        return None
+    remaining = state.total_amount - state.allowance_amount
+    if data.allowance_amount > remaining:
+        return f'折讓 {data.allowance_amount} 超過發票 {data.invoice_no} 可折讓金額 {remaining}'
+    return None
+
+
+def _allowance_items(data, checker) -> Optional[str]:
+    if not data.items:
+        return None
+    try:
+        item_total = sum(int(item.get('ItemAmount', 0)) for item in data.items)
+    except (TypeError, ValueError):
+        return 'ItemAmount 格式錯誤'
+    if item_total != data.allowance_amount:
+        return f'ItemAmount 合計 {item_total} ≠ AllowanceAmount {data.allowance_amount}'
+    return None
+
+
+def _allowance_fields(data, checker) -> Optional[str]:
+    errors = []
+    if not _INVOICE_NO.match(_text(data.invoice_no)):
+        errors.append(f'InvoiceNo 格式錯誤: {data.invoice_no}')
+    if not _INVOICE_DATE.match(_text(data.invoice_date)):
+        errors.append(f'InvoiceDate 格式錯誤: {data.invoice_date}')
+    if isinstance(data.allowance_amount, bool) or not isinstance(data.allowance_amount, int) \
+            or data.allowance_amount <= 0:
+        errors.append(f'AllowanceAmount 必須為正整數: {data.allowance_amount}')
+    notify = _text(data.allowance_notify)
+    if notify in ('E', 'A') and not _text(data.notify_mail):
+        errors.append(f'AllowanceNotify={notify} 時 NotifyMail 必填')
+    if notify in ('S', 'A') and not _text(data.notify_phone):
+        errors.append(f'AllowanceNotify={notify} 時 NotifyPhone 必填')
+    return '; '.join(errors) or None
+
+
+def _void_voided(data, checker) -> Optional[str]:
+    state = checker.invoices.get(data.invoice_no)
+    if state is not None and state.voided:
+        return f'發票 {data.invoice_no} 已作廢'
+    return None
+
+
+def _void_has_allowance(data, checker) -> Optional[str]:
+    state = checker.invoices.get(data.invoice_no)
+    if state is not None and state.allowance_amount:
+        return f'發票 {data.invoice_no} 已折讓 {state.allowance_amount} 元，需先作廢折讓'
+    return None
+
+
+ECPAY_RULES: Tuple[RuleSet, ...] = (
+    RuleSet('ecpay', 'customer_identifier', (
+        Rule('10000006', _duplicate_relate_number),
+        Rule('10000005', _clock_skew),
+        Rule('10000011', _buyer_identifier),
+        Rule('10000018', _carrier_and_donation),
+        Rule('10000019', _b2b_carrier),
+        Rule('10000020', _b2b_donation),
+        Rule('10000016', _issue_amounts),
+        Rule('10000001', _issue_fields),
+    )),
+    RuleSet('ecpay', 'allowance_amount', (
+        Rule('10000005', _clock_skew),
+        Rule('10000008', _allowance_voided),
+        Rule('10000010', _allowance_exceeds),
+        Rule('10000016', _allowance_items),
+        Rule('10000001', _allowance_fields),
+    )),
+    RuleSet('ecpay', 'reason', (
+        Rule('10000005', _clock_skew),
+        Rule('10000008', _void_voided),
+        Rule('10000009', _void_has_allowance),
+    )),
+)
+
+
+class PresubmitChecker:
+    """
+    送出前規則檢查 (不做任何 I/O)
+
+    check() 回傳預測的錯誤；送出成功後以 record() 登錄，供之後的重複開立、
+    折讓金額與作廢狀態檢查使用。
+    """
+
+    def __init__(self, rule_sets: Iterable[RuleSet] = ECPAY_RULES, registry: Optional[ErrorRegistry] = None,
+                 capacity: int = 100_000):
+        """
+        Args:
+            rule_sets: 規則 (依序以 marker 欄位比對資料類別)
+            registry: 錯誤碼表 (預設同 InvoiceErrorHandler: error-codes.csv 以內建設定覆寫)
+            capacity: 保留最近幾筆 RelateNumber 與發票號碼
+        """
+        self.rule_sets = tuple(rule_sets)
+        self.registry = registry or get_invoice_error_registry()
+        self.issued = RecentKeys(capacity)
+        self.invoices = RecentKeys(capacity)
+        self.clock_offset = 0.0
+
+    def rule_set(self, data: Any) -> RuleSet:
+        """
+        取得資料類別對應的規則
+
+        Raises:
+            TypeError: 沒有對應的規則
+        """
+        for rule_set in self.rule_sets:
+            if hasattr(data, rule_set.marker):
+                return rule_set
+        raise TypeError(f'沒有 {type(data).__name__} 的送出前規則')
+
+    def check(self, data: Any) -> List[Violation]:
+        """
+        檢查一筆資料
+
+        Returns:
+            預測的錯誤 (依規則順序；空 list 表示通過)
+        """
+        rule_set = self.rule_set(data)
+        violations = []
+        for rule in rule_set.rules:
+            detail = rule.check(data, self)
+            if detail:
+                info = self.registry.get(rule.code, rule_set.provider)
+                violations.append(Violation(rule_set.provider, rule.code, detail, info))
+        return violations
+
+    def check_many(self, rows: Iterable[Any]) -> List[List[Violation]]:
+        """批次檢查，回傳與 rows 順序相同的結果"""
+        return [self.check(row) for row in rows]
+
+    def record(self, data: Any, invoice_no: Optional[str] = None):
+        """
+        登錄送出成功的資料
+
+        Args:
+            data: InvoiceIssueData / InvoiceAllowanceData / InvoiceVoidData
+            invoice_no: 開立成功時回傳的發票號碼 (供折讓 / 作廢檢查)
+        """
+        marker = self.rule_set(data).marker
+        if marker == 'customer_identifier':
+            self.issued.put((data.merchant_id, data.relate_number))
+            if invoice_no:
+                self.invoices.put(invoice_no, _InvoiceState(total_amount=data.total_amount or data.sales_amount))
+            return
+
+        state = self.invoices.get(data.invoice_no)
+        if state is None:
+            state = _InvoiceState()
+            self.invoices.put(data.invoice_no, state)
+        if marker == 'allowance_amount':
+            state.allowance_amount += data.allowance_amount
+        else:
+            state.voided = True
+
+    def observe_server_time(self, server_time: float, local_time: Optional[float] = None):
+        """
+        以伺服器時間 (例如回應的 Date 標頭) 估計本機時鐘誤差
+
+        Args:
+            server_time: 伺服器 Unix 時間
+            local_time: 收到回應時的本機時間 (預設為現在)
+        """
+        self.clock_offset = (time.time() if local_time is None else local_time) - server_time
+
@@ -10,8 +10,11 @@ import csv
 import os
 import sys
 import argparse
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Tuple
 
+from keyword_automaton import KeywordAutomaton
+
 # 取得 data 目錄路徑
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), 'data')
@@ -60,25 +63,8 @@ RECOMMENDATION_RULES = {
     '捐贈': [('ECPay', 1, '捐贈功能完整')],
 }
 
-# 反模式警告
-ANTI_PATTERNS = {
-    'ECPay': [
-        ('無技術資源', '加密流程較複雜，需要一定技術能力'),
-        ('極簡整合', '如果只需最簡單整合，SmilePay 可能更適合'),
-    ],
-    'SmilePay': [
-        ('高交易量', '大型電商建議使用 ECPay 以確保穩定性'),
-        ('複雜需求', 'API 功能相對基本，複雜需求可能受限'),
-        ('b2b', 'B2B 發票功能較少文檔'),
-    ],
-    'Amego': [
-        ('市佔', '市佔率相對較低'),
-        ('社群', '社群支援與範例相對較少'),
-        ('穩定', '如果穩定性是首要考量，ECPay 更保險'),
-    ],
-}
-
 
+@lru_cache(maxsize=None)
 def load_providers() -> List[Dict[str, str]]:
     """載入加值中心資料"""
     filepath = os.path.join(DATA_DIR, 'providers.csv')
@@ -90,6 +76,7 @@ def load_providers() -> List[Dict[str, str]]:
         return list(reader)
 
 
+@lru_cache(maxsize=None)
 def load_reasoning_rules() -> List[Dict[str, str]]:
     """載入推理規則"""
     filepath = os.path.join(DATA_DIR, 'reasoning.csv')
@@ -101,65 +88,112 @@ def load_reasoning_rules() -> List[Dict[str, str]]:
         return list(reader)
 
 
-def analyze_requirements(query: str) -> Dict[str, Tuple[int, List[str]]]:
+@lru_cache(maxsize=None)
+def load_anti_patterns() -> List[Dict[str, str]]:
+    """載入反模式關鍵字"""
+    filepath = os.path.join(DATA_DIR, 'anti-patterns.csv')
+    if not os.path.exists(filepath):
+        return []
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        return list(reader)
+
+
+@lru_cache(maxsize=None)
+def build_automaton() -> KeywordAutomaton:
     """
-    分析使用者需求，計算各加值中心分數
+    編譯所有規則為單一自動機
+
+    payload 格式:
+        ('rule', index)     reasoning.csv 第 index 列 (scenario / use_cases 命中)
+        ('keyword', key)    RECOMMENDATION_RULES 關鍵字
+        ('anti', index)     anti-patterns.csv 第 index 列
+    """
+    automaton = KeywordAutomaton()
+
+    for index, rule in enumerate(load_reasoning_rules()):
+        words = rule.get('scenario', '').lower().split() + rule.get('use_cases', '').lower().split()
+        for word in words:
+            automaton.add(word, ('rule', index))
+
+    for keyword in RECOMMENDATION_RULES:
+        automaton.add(keyword.lower(), ('keyword', keyword))
+
+    for index, pattern in enumerate(load_anti_patterns()):
+        automaton.add(pattern.get('keyword', '').lower(), ('anti', index))
+
+    return automaton.build()
+
+
+def scan_query(query: str) -> Tuple[Dict[str, Tuple[int, List[str]]], Dict[str, List[str]]]:
+    """
+    單次掃描查詢，同時計算各加值中心分數與反模式警告
 
     Returns:
-        Dict[provider, (score, reasons)]
+        (Dict[provider, (score, reasons)], Dict[provider, warnings])
     """
-    query_lower = query.lower()
+    hits = build_automaton().scan(query.lower())
 
     scores = {
         'ECPay': (0, []),
         'SmilePay': (0, []),
         'Amego': (0, []),
     }
+    warnings = {provider: [] for provider in scores}
 
-    # 從 reasoning.csv 載入規則
-    reasoning_rules = load_reasoning_rules()
+    # 從 reasoning.csv 規則累計分數，命中規則的 anti_patterns 作為注意事項
     confidence_weights = {'HIGH': 3, 'MEDIUM': 2, 'LOW': 1}
+    for index, rule in enumerate(load_reasoning_rules()):
+        if ('rule', index) not in hits:
+            continue
 
-    for rule in reasoning_rules:
-        scenario = rule.get('scenario', '').lower()
-        use_cases = rule.get('use_cases', '').lower()
+        provider = rule.get('recommended_provider', '')
+        if provider not in scores:
+            continue
 
-        # 檢查場景或使用案例是否匹配查詢
-        scenario_words = scenario.replace(' ', '')
-        if any(word in query_lower for word in scenario.split()) or \
-           any(word in query_lower for word in use_cases.split()):
-            provider = rule.get('recommended_provider', '')
-            confidence = rule.get('confidence', 'LOW')
-            reason = rule.get('reason', '')
+        reason = rule.get('reason', '')
+        weight = confidence_weights.get(rule.get('confidence', 'LOW'), 1)
+        current_score, reasons = scores[provider]
+        if reason and reason not in reasons:
+            scores[provider] = (current_score + weight, reasons + [reason])
 
-            if provider in scores:
-                weight = confidence_weights.get(confidence, 1)
-                current_score, reasons = scores[provider]
-                if reason and reason not in reasons:
-                    scores[provider] = (current_score + weight, reasons + [reason])
+        caveat = rule.get('anti_patterns', '')
+        if caveat and caveat not in warnings[provider]:
+            warnings[provider].append(caveat)
 
     # 根據關鍵字累計分數 (fallback)
     for keyword, rules in RECOMMENDATION_RULES.items():
-        if keyword.lower() in query_lower:
-            for provider, weight, reason in rules:
-                current_score, reasons = scores[provider]
-                if reason not in reasons:
-                    scores[provider] = (current_score + weight, reasons + [reason])
+        if ('keyword', keyword) not in hits:
+            continue
+        for provider, weight, reason in rules:
+            current_score, reasons = scores[provider]
+            if reason not in reasons:
+                scores[provider] = (current_score + weight, reasons + [reason])
 
-    return scores
+    # 反模式關鍵字
+    for index, pattern in enumerate(load_anti_patterns()):
+        provider = pattern.get('provider', '')
+        warning = pattern.get('warning', '')
+        if ('anti', index) in hits and provider in warnings and warning not in warnings[provider]:
+            warnings[provider].append(warning)
 
+    return scores, warnings
 
-def get_anti_pattern_warnings(query: str, recommended: str) -> List[str]:
-    """取得反模式警告"""
-    query_lower = query.lower()
-    warnings = []
 
-    if recommended in ANTI_PATTERNS:
-        for keyword, warning in ANTI_PATTERNS[recommended]:
-            if keyword.lower() in query_lower:
-                warnings.append(warning)
+def analyze_requirements(query: str) -> Dict[str, Tuple[int, List[str]]]:
+    """
+    分析使用者需求，計算各加值中心分數
+
+    Returns:
+        Dict[provider, (score, reasons)]
+    """
+    return scan_query(query)[0]
+
 
-    return warnings
+def get_anti_pattern_warnings(query: str, recommended: str) -> List[str]:
+    """取得反模式警告"""
+    return scan_query(query)[1].get(recommended, [])
 
 
 def recommend(query: str, verbose: bool = False) -> Dict[str, Any]:
@@ -174,7 +208,7 @@ def recommend(query: str, verbose: bool = False) -> Dict[str, Any]:
         推薦結果
     """
     providers = load_providers()
-    scores = analyze_requirements(query)
+    scores, provider_warnings = scan_query(query)
 
     # 排序取得推薦順序
     sorted_providers = sorted(
@@ -184,8 +218,7 @@ def recommend(query: str, verbose: bool = False) -> Dict[str, Any]:
     )
 
     # 建立結果
-    recommended = sorted_providers[0][0]
-    recommended_score, recommended_reasons = sorted_providers[0]
+    recommended, (recommended_score, recommended_reasons) = sorted_providers[0]
 
     # 如果沒有匹配任何關鍵字，給預設推薦
     if recommended_score == 0:
@@ -201,7 +234,7 @@ def recommend(query: str, verbose: bool = False) -> Dict[str, Any]:
             break
 
     # 取得警告
-    warnings = get_anti_pattern_warnings(query, recommended)
+    warnings = list(provider_warnings.get(recommended, []))
 
     result = {
         'query': query,
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - 電子發票加值中心本機沙箱 (壓力測試用)
+
+ECPay / SmilePay / Amego 的測試環境不能拿來做壓力測試。此沙箱以 asyncio 實作
+最小 HTTP/1.1 伺服器 (keep-alive)，依 references/*.md 與 data/operations.csv
+模擬各加值中心端點的加密、簽章與回應格式，並可設定:
+
+- 回應延遲分佈 (fixed / uniform / normal / lognormal / exponential)
+- 依比例注入加值中心錯誤碼 (取自 data/error-codes.csv)、HTTP 503 或直接斷線
+- 每個商店的請求速率上限 (token bucket，超過時回應 429 + Retry-After)
+
+模擬的端點:
+    ECPay     /B2CInvoice/Issue|Invalid|Allowance|GetIssue   AES 加密 JSON (沿用 ecpay_mock_server.py)
+    SmilePay  /api_test/SPEinvoice_Storage.asp               Grvc + Verify_key 驗證、金額驗算，回應 XML
+              /api_test/SPEinvoice_Storage_Modify.asp        作廢發票 (types=Cancel)
+    Amego     /json/f0401                                    sign = md5(data + time + App Key)、time ±60 秒
+              /json/f0501                                    作廢發票
+
+使用範例:
+    python sandbox_server.py --port 8092 --latency lognormal:30,0.5 --error-rate 0.02 --rate-limit 50
+
+    # 程式內使用
+    async with InvoiceSandbox(SandboxPolicy(latency=LatencyModel.parse('normal:20,5'))) as sandbox:
+        service = AsyncECPayInvoiceService(merchant_id, hash_key, hash_iv, base_url=sandbox.url)
+        ...
+        print(sandbox.stats)
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from ecpay_mock_server import ECPayInvoiceService, MockECPayInvoiceServer
+from sandbox_core import (
+    LatencyModel, ProviderSandbox, Response, Route, SandboxPolicy, SandboxThread, add_policy_arguments, build_policy,
+)
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+
+# error-codes.csv 中成功的 category
+SUCCESS_CATEGORY = '成功'
+
+# 沙箱預設接受的商店
+#   ecpay:    {MerchantID: (HashKey, HashIV)}
+#   smilepay: {Grvc: (Verify_key,)}
+#   amego:    {統一編號: (App Key,)}
+DEFAULT_MERCHANTS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    'ecpay': {ECPayInvoiceService.TEST_MERCHANT_ID: (ECPayInvoiceService.TEST_HASH_KEY,
+                                                      ECPayInvoiceService.TEST_HASH_IV)},
+    'smilepay': {'SEI1000034': ('9D73935693EE0237FABA6AB744E48661',)},
+    'amego': {'12345678': ('sHeq7t8G1wiQvhAuIM27',)},
+}
+
+# Amego time 參數容許誤差 (秒)
+AMEGO_TIME_TOLERANCE = 60
+
+
+# ============================================================================
+# 錯誤碼
+# ============================================================================
+
+@lru_cache(maxsize=None)
+def load_error_codes() -> Dict[str, Tuple[Tuple[str, str], ...]]:
+    """
+    讀取 data/error-codes.csv 中非成功的錯誤碼
+
+    Returns:
+        provider (ecpay / smilepay / amego) → ((code, message_zh), ...)
+    """
+    codes: Dict[str, list] = {}
+    with open(DATA_DIR / 'error-codes.csv', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row['category'] != SUCCESS_CATEGORY:
+                codes.setdefault(row['provider'].lower(), []).append((row['code'], row['message_zh']))
+    return {provider: tuple(items) for provider, items in codes.items()}
+
+
+# ============================================================================
+# 電子發票加值中心
+# ============================================================================
+
+def amego_sign(data: str, timestamp: str, app_key: str) -> str:
+    """Amego sign: md5(data JSON 字串 + time + App Key)"""
+    return hashlib.md5(f'{data}{timestamp}{app_key}'.encode('utf-8')).hexdigest()
+
+
+class InvoiceSandbox(ProviderSandbox):
+    """ECPay / SmilePay / Amego 電子發票沙箱"""
+
+    ECPAY_PATHS = ('/B2CInvoice/Issue', '/B2CInvoice/Invalid', '/B2CInvoice/Allowance', '/B2CInvoice/GetIssue')
+
+    def __init__(self, policy: Optional[SandboxPolicy] = None, host: str = '127.0.0.1', port: int = 0,
+                 merchants: Optional[Dict[str, Dict[str, Tuple[str, ...]]]] = None, track: str = 'AB'):
+        """
+        Args:
+            policy: 延遲、錯誤注入與限流設定
+            host: 監聽位址
+            port: 監聽埠 (0 = 自動選擇)
+            merchants: 接受的商店 (格式見 DEFAULT_MERCHANTS)
+            track: 發票字軌 (2 碼英文)
+        """
+        super().__init__(policy, host, port)
+        self.merchants = merchants or DEFAULT_MERCHANTS
+        self.track = track
+        self.invoices: Dict[Tuple[str, str, str], Dict] = {}  # (provider, 商店, 發票號碼) → 發票
+        self.order_ids: Dict[Tuple[str, str, str], str] = {}  # (provider, 商店, 自訂編號) → 發票號碼
+        self.next_number = 0
+
+        # ECPay 的加解密與端點邏輯沿用 MockECPayInvoiceServer (不啟動其 HTTP 伺服器)
+        self._ecpay = {mid: MockECPayInvoiceServer(mid, *keys, track=track)
+                       for mid, keys in self.merchants.get('ecpay', {}).items()}
+
+        for path in self.ECPAY_PATHS:
+            self.routes[path] = Route('ecpay', partial(self.ecpay_api, path), 'MerchantID')
+        self.routes.update({
+            '/api_test/SPEinvoice_Storage.asp': Route('smilepay', self.smilepay_issue, 'Grvc'),
+            '/api_test/SPEinvoice_Storage_Modify.asp': Route('smilepay', self.smilepay_modify, 'Grvc'),
+            '/json/f0401': Route('amego', self.amego_issue, 'invoice'),
+            '/json/f0501': Route('amego', self.amego_void, 'invoice'),
+        })
+
+    def _issue_number(self, provider: str, merchant: str, order_id: str) -> Dict:
+        """配發發票號碼並記錄"""
+        self.next_number += 1
+        now = datetime.now()
+        invoice = {
+            'InvoiceNumber': f'{self.track}{self.next_number:08d}',
+            'RandomNumber': f'{self._rng.randint(0, 9999):04d}',
+            'InvoiceDate': f'{now:%Y/%m/%d}',
+            'InvoiceTime': f'{now:%H:%M:%S}',
+            'Timestamp': int(now.timestamp()),
+            'OrderId': order_id,
+            'Voided': False,
+        }
+        self.invoices[(provider, merchant, invoice['InvoiceNumber'])] = invoice
+        if order_id:
+            self.order_ids[(provider, merchant, order_id)] = invoice['InvoiceNumber']
+        return invoice
+
+    def parse_fields(self, query: str, body: bytes) -> Dict[str, Any]:
+        """ECPay 以 JSON 信封傳送 (MerchantID / RqHeader / Data)，其餘為表單"""
+        if body[:1] != b'{':
+            return super().parse_fields(query, body)
+        fields = super().parse_fields(query, b'')
+        try:
+            fields.update(json.loads(body))
+        except ValueError:
+            pass
+        return fields
+
+    def error_codes(self) -> Dict[str, Tuple[Tuple[str, str], ...]]:
+        return load_error_codes()
+
+    def error_response(self, provider: str, code: str, message: str) -> Response:
+        if provider == 'ecpay':
+            server = next(iter(self._ecpay.values()))
+            return Response.json(server._envelope(server._rtn(int(code), message)))
+        if provider == 'smilepay':
+            return self._smilepay_xml({'Status': code, 'Desc': message})
+        return Response.json({'code': int(code), 'msg': message})
+
+    # ------------------------------------------------------------------
+    # ECPay
+    # ------------------------------------------------------------------
+
+    def ecpay_api(self, path: str, fields: Dict[str, Any]) -> Response:
+        """B2CInvoice: 解密 Data 後交給 MockECPayInvoiceServer 的端點處理"""
+        server = self._ecpay.get(fields.get('MerchantID', ''))
+        if server is None:
+            return self.error_response('ecpay', str(MockECPayInvoiceServer.RTN_MERCHANT_ERROR), '特店編號錯誤')
+        try:
+            data = server.cipher.decrypt(fields['Data'])
+        except (ValueError, KeyError, TypeError):
+            return Response.json(server._envelope(server._rtn(server.RTN_DECRYPT_ERROR, '加密驗證失敗')))
+        if data.get('MerchantID') != server.merchant_id:
+            return Response.json(server._envelope(server._rtn(server.RTN_MERCHANT_ERROR, '特店編號錯誤')))
+        return Response.json(server._envelope(server.routes[path](data)))
+
+    # ------------------------------------------------------------------
+    # SmilePay
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _smilepay_xml(values: Dict[str, Any]) -> Response:
+        body = ''.join(f'<{name}>{escape(str(value))}</{name}>' for name, value in values.items())
+        return Response.text(f'<?xml version="1.0" encoding="utf-8"?><SmilePayEinvoice>{body}</SmilePayEinvoice>',
+                             'text/xml; charset=utf-8')
+
+    def _smilepay_verify(self, fields: Dict[str, str]) -> Optional[Response]:
+        grvc, verify_key = fields.get('Grvc', ''), fields.get('Verify_key', '')
+        if not grvc or not verify_key:
+            return self.error_response('smilepay', '-1001', '商家帳號缺少參數')
+        keys = self.merchants.get('smilepay', {}).get(grvc)
+        if keys is None or not hmac.compare_digest(keys[0], verify_key):
+            return self.error_response('smilepay', '-10011', '查無商家帳號')
+        return None
+
+    def smilepay_issue(self, fields: Dict[str, str]) -> Response:
+        """SPEinvoice_Storage: 驗算明細與總金額後開立發票 (GET / POST 皆可)"""
+        error = self._smilepay_verify(fields)
+        if error is not None:
+            return error
+        if not fields.get('InvoiceDate') or not fields.get('InvoiceTime'):
+            return self.error_response('smilepay', '-10031', '缺少開立日期(InvoiceDate、InvoiceTime)')
+
+        # 除 AllAmount 外的明細欄位以 | 分隔，各欄位項目數必須相同
+        columns: List[List[str]] = [fields.get(name, '').split('|')
+                                    for name in ('Description', 'Quantity', 'UnitPrice', 'Amount')]
+        if len({len(column) for column in columns}) != 1 or not columns[0][0]:
+            return self.error_response('smilepay', '-10061', '商品各項目數量不符')
+        try:
+            quantities = [float(q) for q in columns[1]]
+            prices = [float(p) for p in columns[2]]
+            amounts = [float(a) for a in columns[3]]
+            total = float(fields.get('AllAmount', fields.get('ALLAmount', '')))
+        except ValueError:
+            return self.error_response('smilepay', '-10064', '商品金額(UnitPrice、Amount)內容錯誤')
+        if any(round(q * p) != round(a) for q, p, a in zip(quantities, prices, amounts)):
+            return self.error_response('smilepay', '-10065', '商品小計(UnitPrice、Amount)驗算錯誤')
+        if round(sum(amounts)) != round(total):
+            return self.error_response('smilepay', '-10066', '商品總金額驗算錯誤')
+
+        grvc, data_id = fields['Grvc'], fields.get('data_id', '')
+        if data_id and ('smilepay', grvc, data_id) in self.order_ids:
+            return self.error_response('smilepay', '-10072', '自訂發票編號重複')
+
+        invoice = self._issue_number('smilepay', grvc, data_id)
+        return self._smilepay_xml({
+            'Status': 0,
+            'Desc': '',
+            'Grvc': grvc,
+            'orderno': fields.get('orderid', ''),
+            'data_id': data_id,
+            'InvoiceNumber': invoice['InvoiceNumber'],
+            'RandomNumber': invoice['RandomNumber'],
+            'InvoiceDate': invoice['InvoiceDate'],
+            'InvoiceTime': invoice['InvoiceTime'],
+            'InvoiceType': 'B2C2B' if fields.get('Buyer_id') else 'B2C',
+            'CarrierID': fields.get('CarrierID', ''),
+        })
+
+    def smilepay_modify(self, fields: Dict[str, str]) -> Response:
+        """SPEinvoice_Storage_Modify: 目前支援 types=Cancel (作廢發票)"""
+        error = self._smilepay_verify(fields)
+        if error is not None:
+            return error
+        invoice = self.invoices.get(('smilepay', fields['Grvc'], fields.get('InvoiceNumber', '')))
+        if invoice is None:
+            return self.error_response('smilepay', '-2001', '(InvoiceNumber)格式錯誤')
+        if fields.get('types') != 'Cancel' or invoice['Voided']:
+            return self.error_response('smilepay', '-2008', '發票目前狀態不允許執行該動作')
+
+        invoice['Voided'] = True
+        now = datetime.now()
+        return self._smilepay_xml({
+            'Status': 0,
+            'Desc': '',
+            'Types': 'Cancel',
+            'Grvc': fields['Grvc'],
+            'InvoiceNumber': invoice['InvoiceNumber'],
+            'CancelDate': f'{now:%Y/%m/%d}',
+            'CancelTime': f'{now:%H:%M:%S}',
+        })
+
+    # ------------------------------------------------------------------
+    # Amego
+    # ------------------------------------------------------------------
+
+    def _amego_decode(self, fields: Dict[str, str]):
+        """驗證 time 與 sign 並解析 data，回傳 (統一編號, data) 或 (None, 錯誤回應)"""
+        invoice = fields.get('invoice', '')
+        keys = self.merchants.get('amego', {}).get(invoice)
+        if keys is None:
+            return None, self.error_response('amego', '4', '統一編號不存在')
+        timestamp, data = fields.get('time', ''), fields.get('data', '')
+        if not timestamp.isdigit() or abs(time.time() - int(timestamp)) > AMEGO_TIME_TOLERANCE:
+            return None, self.error_response('amego', '3', '時間戳記誤差過大')
+        if not hmac.compare_digest(amego_sign(data, timestamp, keys[0]), fields.get('sign', '').lower()):
+            return None, self.error_response('amego', '2', '簽章驗證失敗')
+        try:
+            return invoice, json.loads(data)
+        except ValueError:
+            return None, self.error_response('amego', '1', '參數錯誤')
+
+    def amego_issue(self, fields: Dict[str, str]) -> Response:
+        """f0401: 開立發票 (自動配號)"""
+        merchant, data = self._amego_decode(fields)
+        if merchant is None:
+            return data
+        if not isinstance(data, dict) or not data.get('OrderId'):
+            return self.error_response('amego', '1', '參數錯誤')
+        if str(data.get('BuyerName', '')).strip('0') == '':
+            return self.error_response('amego', '1004', 'BuyerName 不可為空或無效值')
+        if not data.get('ProductItem'):
+            return self.error_response('amego', '1005', '商品明細不可為空')
+        if ('amego', merchant, data['OrderId']) in self.order_ids:
+            return self.error_response('amego', '1002', 'OrderId 已存在')
+
+        invoice = self._issue_number('amego', merchant, data['OrderId'])
+        return Response.json({
+            'code': 0,
+            'msg': '',
+            'invoice_number': invoice['InvoiceNumber'],
+            'invoice_time': invoice['Timestamp'],
+            'random_number': invoice['RandomNumber'],
+        })
+
+    def amego_void(self, fields: Dict[str, str]) -> Response:
+        """f0501: 作廢發票 (可一次多張，任一張失敗則全部不作廢)"""
+        merchant, data = self._amego_decode(fields)
+        if merchant is None:
+            return data
+        if not isinstance(data, list) or not data:
+            return self.error_response('amego', '1', '參數錯誤')
+
+        invoices = []
+        for item in data:
+            invoice = self.invoices.get(('amego', merchant, str(item.get('CancelInvoiceNumber', ''))))
+            if invoice is None:
+                return self.error_response('amego', '100', '發票號碼不存在')
+            if invoice['Voided']:
+                return self.error_response('amego', '101', '發票已作廢')
+            invoices.append(invoice)
+        for invoice in invoices:
+            invoice['Voided'] = True
+        return Response.json({'code': 0, 'msg': ''})
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+async def serve(args):
+    """啟動沙箱直到中斷"""
+    async with InvoiceSandbox(build_policy(args), args.host, args.port) as sandbox:
+        print(f"電子發票沙箱: {sandbox.url}")
+        for path, route in sandbox.routes.items():
+            print(f"   {route.provider:<9} {path}")
+        print("按 Ctrl+C 停止")
+        await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='電子發票加值中心本機沙箱')
+    parser.add_argument('--host', default='127.0.0.1', help='監聽位址 (預設: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8092, help='監聽埠 (預設: 8092)')
+    add_policy_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
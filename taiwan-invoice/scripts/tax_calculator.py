@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Taiwan Invoice Skill - 發票稅額計算 (data/tax-rules.csv)
+
+含稅總額 → 銷售額 + 稅額。稅率由 tax-rules.csv 讀取，以分數做整數運算，不經過浮點數:
+
+    稅額 = 四捨五入(總額 × 稅率 / (1 + 稅率))    # 5%: 四捨五入(總額 / 21)
+    銷售額 = 總額 - 稅額                          # 恆有 銷售額 + 稅額 = 總額
+
+結果與原本的 round(total - total / 1.05) 相同 (總額 / 21 的小數部分不會剛好是 0.5，
+四捨五入與 round 的銀行家捨入一致)，但任意大的金額都不會有浮點誤差。
+
+- B2C (二聯式): 金額為含稅價，稅額 = 0
+- B2B (三聯式) 應稅 / 特種稅率: 拆分銷售額與稅額
+- 零稅率 / 免稅: 稅額 = 0
+- 混合 (TaxType 9): B2B 應稅、零稅率、免稅分別加總，只有應稅部分計算稅額；
+  B2C 的 SalesAmount 為全部品項含稅合計，不另列零稅率 / 免稅銷售額
+
+大量計算 (例如月結數百萬筆 B2B 訂單) 使用 split_many()，安裝 NumPy 時以向量運算處理，
+否則以 array 模組處理。
+
+使用範例:
+    from tax_calculator import TaxCalculator, calculate_b2b_amounts
+
+    calculate_b2b_amounts(1050)
+    # {'sales_amount': 1000, 'tax_amount': 50, 'total_amount': 1050}
+
+    calculator = TaxCalculator()
+    calculator.split(1250, 'B2B', '4')                  # 特種稅率 25%
+    calculator.split_mixed(1050, exempt=500)            # 混合: 應稅 1050 + 免稅 500
+    sales, tax = calculator.split_many([1050, 99, 10000])
+"""
+
+import csv
+import functools
+from array import array
+from dataclasses import dataclass
+from decimal import Decimal
+from fractions import Fraction
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+DEFAULT_CSV = DATA_DIR / 'tax-rules.csv'
+
+# TaxType 代碼 ↔ tax-rules.csv 的 tax_type
+TAX_TYPES: Dict[str, str] = {
+    '1': '應稅',
+    '2': '零稅率',
+    '3': '免稅',
+    '4': '特種稅率',
+    '9': '混合',
+}
+
+Amount = Union[int, Decimal]
+
+
+@dataclass(frozen=True)
+class TaxRule:
+    """tax-rules.csv 的一列"""
+    invoice_type: str  # 'B2C' / 'B2B'
+    tax_type: str  # TaxType 代碼
+    tax_rate: Fraction  # 0.05 → 1/20
+    price_includes_tax: bool  # item_price_type 為 含稅
+
+    @property
+    def splits_tax(self) -> bool:
+        """是否需要由總額拆出稅額 (B2B 且稅率大於 0)"""
+        return self.invoice_type == 'B2B' and self.tax_rate > 0
+
+
+@dataclass(frozen=True)
+class TaxSplit:
+    """稅額計算結果 (銷售額 + 零稅率銷售額 + 免稅銷售額 + 稅額 = 總額)"""
+    sales_amount: int
+    tax_amount: int
+    total_amount: int
+    zero_tax_sales_amount: int = 0
+    free_tax_sales_amount: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        """同 ECPayInvoiceService.calculate_b2b_amounts 的回傳格式"""
+        result = {
+            'sales_amount': self.sales_amount,
+            'tax_amount': self.tax_amount,
+            'total_amount': self.total_amount,
+        }
+        if self.zero_tax_sales_amount or self.free_tax_sales_amount:
+            result['zero_tax_sales_amount'] = self.zero_tax_sales_amount
+            result['free_tax_sales_amount'] = self.free_tax_sales_amount
+        return result
+
+
+def _to_int(amount: Amount) -> int:
+    """
+    金額轉整數 (新台幣以元為單位)
+
+    Raises:
+        ValueError: 非整數金額或負數
+    """
+    if isinstance(amount, bool):
+        raise ValueError(f'金額必須為整數: {amount!r}')
+    if isinstance(amount, int):
+        value = amount
+    elif isinstance(amount, Decimal) and amount == amount.to_integral_value():
+        value = int(amount)
+    else:
+        raise ValueError(f'金額必須為整數: {amount!r}')
+    if value < 0:
+        raise ValueError(f'金額不可為負數: {amount!r}')
+    return value
+
+
+@functools.lru_cache(maxsize=None)
+def _tax_share(rate: Fraction) -> Tuple[int, int]:
+    """含稅總額中稅額的比例 稅率 / (1 + 稅率)，回傳 (分子, 分母)"""
+    share = rate / (1 + rate)
+    return share.numerator, share.denominator
+
+
+def tax_of(total: Amount, rate: Fraction) -> int:
+    """
+    含稅總額中的稅額: 四捨五入(總額 × 稅率 / (1 + 稅率))
+
+    Args:
+        total: 含稅總額
+        rate: 稅率
+
+    Raises:
+        ValueError: 非整數金額或負數
+    """
+    total = _to_int(total)
+    numerator, denominator = _tax_share(rate)
+    # 四捨五入: floor(x + 1/2) = floor((2 × 總額 × n + d) / 2d)
+    return (2 * total * numerator + denominator) // (2 * denominator)
+
+
+def load_tax_rules(path: Path = DEFAULT_CSV) -> Dict[Tuple[str, str], TaxRule]:
+    """讀取 tax-rules.csv，以 (B2C/B2B, TaxType 代碼) 為 key"""
+    codes = {name: code for code, name in TAX_TYPES.items()}
+    rules = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            code = codes.get(row['tax_type'].strip())
+            if code is None:
+                continue
+            rule = TaxRule(
+                invoice_type=row['invoice_type'].strip().upper(),
+                tax_type=code,
+                tax_rate=Fraction(Decimal(row['tax_rate'].strip() or '0')),
+                price_includes_tax=row.get('item_price_type', '').strip() == '含稅',
+            )
+            rules[(rule.invoice_type, rule.tax_type)] = rule
+    return rules
+
+
+class TaxCalculator:
+    """依 tax-rules.csv 計算銷售額與稅額"""
+
+    def __init__(self, rules: Optional[Dict[Tuple[str, str], TaxRule]] = None):
+        """
+        Args:
+            rules: 稅務規則 (預設讀取 data/tax-rules.csv)
+        """
+        self.rules = rules if rules is not None else load_tax_rules()
+
+    def rule(self, invoice_type: str, tax_type: str = '1') -> TaxRule:
+        """
+        取得稅務規則
+
+        Args:
+            invoice_type: 'B2C' 或 'B2B'
+            tax_type: TaxType 代碼 (1=應稅, 2=零稅率, 3=免稅, 4=特種稅率, 9=混合)
+
+        Raises:
+            ValueError: tax-rules.csv 沒有對應的規則
+        """
+        rule = self.rules.get((invoice_type.upper(), str(tax_type)))
+        if rule is None:
+            raise ValueError(f'不支援的發票類型 / 課稅別: {invoice_type} TaxType={tax_type}')
+        return rule
+
+    def split(self, total: Amount, invoice_type: str = 'B2B', tax_type: str = '1') -> TaxSplit:
+        """
+        含稅總額 → 銷售額 + 稅額
+
+        Args:
+            total: 含稅總額 (整數或整數值的 Decimal)
+            invoice_type: 'B2C' 或 'B2B'
+            tax_type: TaxType 代碼 (混合請用 split_mixed)
+
+        Raises:
+            ValueError: 非整數金額、負數或不支援的課稅別
+        """
+        if str(tax_type) == '9':
+            raise ValueError('混合課稅 (TaxType 9) 請使用 split_mixed()')
+        rule = self.rule(invoice_type, tax_type)
+        total = _to_int(total)
+        tax = tax_of(total, rule.tax_rate) if rule.splits_tax else 0
+        return TaxSplit(sales_amount=total - tax, tax_amount=tax, total_amount=total)
+
+    def split_mixed(self, taxable: Amount, zero_rated: Amount = 0, exempt: Amount = 0,
+                    invoice_type: str = 'B2B') -> TaxSplit:
+        """
+        混合課稅 (TaxType 9): 只有應稅部分計算稅額
+
+        B2B 另列 ZeroTaxSalesAmount / FreeTaxSalesAmount；B2C 的 SalesAmount 為全部品項含稅合計
+        (同 ItemAggregator 與 ECPay B2C 開立參數)，零稅率 / 免稅銷售額為 0。
+
+        Args:
+            taxable: 應稅商品含稅總額
+            zero_rated: 零稅率商品總額
+            exempt: 免稅商品總額
+            invoice_type: 'B2C' 或 'B2B'
+
+        Raises:
+            ValueError: 非整數金額或負數
+        """
+        rule = self.rule(invoice_type, '9')
+        # 應稅部分沿用應稅 (TaxType 1) 的稅率
+        taxable_part = self.split(taxable, invoice_type, '1')
+        zero_rated, exempt = _to_int(zero_rated), _to_int(exempt)
+        if rule.invoice_type == 'B2C':
+            total = taxable_part.total_amount + zero_rated + exempt
+            return TaxSplit(sales_amount=total, tax_amount=0, total_amount=total)
+        return TaxSplit(
+            sales_amount=taxable_part.sales_amount,
+            tax_amount=taxable_part.tax_amount,
+            total_amount=taxable_part.total_amount + zero_rated + exempt,
+            zero_tax_sales_amount=zero_rated,
+            free_tax_sales_amount=exempt,
+        )
+
+    def split_many(self, totals: Iterable[int], invoice_type: str = 'B2B', tax_type: str = '1'):
+        """
+        批次計算: 含稅總額陣列 → (銷售額陣列, 稅額陣列)
+
+        Args:
+            totals: 含稅總額 (list / array / numpy.ndarray)
+            invoice_type: 'B2C' 或 'B2B'
+            tax_type: TaxType 代碼 (不含 9)
+
+        Returns:
+            (sales, tax)；安裝 NumPy 時為 int64 ndarray，否則為 array('q')
+
+        Raises:
+            ValueError: 含負數或不支援的課稅別
+        """
+        if str(tax_type) == '9':
+            raise ValueError('混合課稅 (TaxType 9) 請使用 split_mixed()')
+        rule = self.rule(invoice_type, tax_type)
+        rate = rule.tax_rate if rule.splits_tax else Fraction(0)
+        return split_totals(totals, rate)
+
+
+def _int_values(totals: Iterable[Any]) -> array:
+    """
+    金額序列 → array('q')，非整數金額丟出 ValueError (不截斷小數)
+
+    Raises:
+        ValueError: 非整數金額、負數或超過 int64 範圍
+    """
+    if not isinstance(totals, (list, tuple, array)):
+        totals = list(totals)
+    try:
+        return array('q', totals)
+    except TypeError:
+        pass  # float / Decimal 等: 逐筆檢查，整數值的 Decimal 可用
+    except OverflowError:
+        raise ValueError('金額過大，請改用 TaxCalculator.split()')
+    try:
+        return array('q', [_to_int(total) for total in totals])
+    except OverflowError:
+        raise ValueError('金額過大，請改用 TaxCalculator.split()')
+
+
+def split_totals(totals: Iterable[int], rate: Fraction):
+    """
+    批次計算稅額 (公式同 tax_of)
+
+    Returns:
+        (sales, tax)；安裝 NumPy 時為 int64 ndarray，否則為 array('q')
+
+    Raises:
+        ValueError: 含非整數 (float、非整數值的 Decimal) 或負數，或金額過大 (int64 運算可能溢位)
+    """
+    numerator, denominator = _tax_share(rate)
+
+    if HAS_NUMPY:
+        values = np.asarray(totals)
+        if values.dtype.kind == 'O' or not values.size:
+            # Python int / Decimal 混合 (或空陣列): 逐筆檢查後轉為 int64
+            values = np.array(_int_values(values.ravel().tolist()), dtype=np.int64)
+        elif values.dtype.kind not in 'iu':
+            raise ValueError(f'金額必須為整數: dtype={values.dtype}')
+        elif values.dtype.kind == 'u' and values.max() >= 2 ** 63:
+            raise ValueError('金額過大，請改用 TaxCalculator.split()')
+        values = values.astype(np.int64, copy=False)
+        if values.size and values.min() < 0:
+            raise ValueError('金額不可為負數')
+        if values.size and int(values.max()) * 2 * max(numerator, 1) + denominator >= 2 ** 63:
+            raise ValueError('金額過大，請改用 TaxCalculator.split()')
+        tax = (2 * numerator * values + denominator) // (2 * denominator)
+        return values - tax, tax
+
+    values = totals if isinstance(totals, array) and totals.typecode == 'q' else _int_values(totals)
+    if values and min(values) < 0:
+        raise ValueError('金額不可為負數')
+    if not numerator:
+        return array('q', values), array('q', bytes(len(values) * values.itemsize))
+    n2, d, d2 = 2 * numerator, denominator, 2 * denominator
+    tax = array('q', [(n2 * v + d) // d2 for v in values])
+    return array('q', [v - t for v, t in zip(values, tax)]), tax
+
+
+_default_calculator: Optional[TaxCalculator] = None
+
+
+def get_tax_calculator() -> TaxCalculator:
+    """行程共用的 TaxCalculator (第一次呼叫時讀取 tax-rules.csv)"""
+    global _default_calculator
+    if _default_calculator is None:
+        _default_calculator = TaxCalculator()
+    return _default_calculator
+
+
+def calculate_b2b_amounts(total_amount: Amount) -> Dict[str, int]:
+    """
+    B2B 應稅發票金額 (含稅總額 → 未稅金額 + 稅額)
+
+    Example:
+        >>> calculate_b2b_amounts(1050)
+        {'sales_amount': 1000, 'tax_amount': 50, 'total_amount': 1050}
+    """
+    return get_tax_calculator().split(total_amount, 'B2B', '1').as_dict()
+
+
+if __name__ == '__main__':
+    calculator = get_tax_calculator()
+    print(f"NumPy: {'已安裝' if HAS_NUMPY else '未安裝 (使用 array)'}\n")
+    for (invoice_type, tax_type), rule in sorted(calculator.rules.items()):
+        if tax_type == '9':
+            result = calculator.split_mixed(1050, exempt=500, invoice_type=invoice_type)
+        else:
+            result = calculator.split(1050, invoice_type, tax_type)
+        print(f"  {invoice_type} {TAX_TYPES[tax_type]:<4} 稅率 {float(rule.tax_rate):>5.0%}  {result.as_dict()}")
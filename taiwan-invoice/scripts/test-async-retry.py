@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+重試裝飾器測試 (error_handler.retry_on_error)
+
+驗證:
+- coroutine 函數以 asyncio.sleep 重試，不阻塞事件迴圈
+- 依 ErrorInfo 的 retry_strategy 決定等待方式 (IMMEDIATE / LINEAR / EXPONENTIAL)，
+  is_retryable 為 False 的錯誤碼不重試
+- full / decorrelated 抖動打散同一次故障後的重試時間
+- 重試預算: 重試數不超過請求數的固定比例，可跨函數共用
+- asyncio 下的熔斷器與自適應併發限制
+- 呼叫被取消 (asyncio.wait_for 逾時) 時歸還併發名額，熔斷器不會停在 HALF_OPEN
+
+使用方法:
+    python test-async-retry.py
+"""
+
+import asyncio
+import logging
+import statistics
+import sys
+import time
+from typing import List
+
+from error_handler import (
+    AdaptiveConcurrencyLimiter, CircuitBreaker, CircuitOpenError, JitterStrategy, RetryBudget, RetryStrategy,
+    backoff_delay, retry_on_error,
+)
+
+# 測試時不輸出重試日誌
+QUIET_LOGGER = logging.getLogger('test-async-retry')
+QUIET_LOGGER.addHandler(logging.NullHandler())
+QUIET_LOGGER.propagate = False
+
+
+def api_error(code: str) -> Exception:
+    """帶 error_code 的例外 (同 error_handler.py 範例)"""
+    error = Exception(f'API 錯誤 {code}')
+    error.error_code = code
+    return error
+
+
+def test_strategies(check):
+    """依 ErrorInfo 決定是否重試與等待方式"""
+    check('IMMEDIATE / LINEAR_BACKOFF / EXPONENTIAL_BACKOFF 等待秒數',
+          [backoff_delay(RetryStrategy.IMMEDIATE, n) for n in range(3)] == [0, 0, 0]
+          and [backoff_delay(RetryStrategy.LINEAR_BACKOFF, n) for n in range(3)] == [2, 4, 6]
+          and [backoff_delay(RetryStrategy.EXPONENTIAL_BACKOFF, n) for n in range(3)] == [1, 2, 4]
+          and backoff_delay(RetryStrategy.EXPONENTIAL_BACKOFF, 10, max_delay=30) == 30)
+
+    calls = []
+
+    @retry_on_error(max_retries=3, backoff_factor=10, logger=QUIET_LOGGER)
+    def timestamp_expired():
+        calls.append(1)
+        if len(calls) < 3:
+            raise api_error('10000005')  # TimeStamp 逾時: IMMEDIATE
+        return 'ok'
+
+    started = time.perf_counter()
+    result = timestamp_expired()
+    check(f'IMMEDIATE 錯誤碼立即重試 (backoff_factor=10，耗時 {(time.perf_counter() - started) * 1000:.1f} ms)',
+          result == 'ok' and len(calls) == 3 and time.perf_counter() - started < 0.5)
+
+    calls.clear()
+
+    @retry_on_error(max_retries=3, logger=QUIET_LOGGER)
+    def amount_error():
+        calls.append(1)
+        raise api_error('10000016')  # 金額計算錯誤: 不可重試
+
+    try:
+        amount_error()
+    except Exception:
+        pass
+    check('is_retryable=False 的錯誤碼不重試', len(calls) == 1)
+
+    calls.clear()
+
+    @retry_on_error(max_retries=2, retryable_errors=['10000016'], max_delay=0.01, logger=QUIET_LOGGER)
+    def forced():
+        calls.append(1)
+        raise api_error('10000016')
+
+    try:
+        forced()
+    except Exception:
+        pass
+    check('retryable_errors 指定時取代 ErrorInfo 的判斷', len(calls) == 3)
+
+
+def test_jitter(check):
+    """抖動分佈"""
+    clients = 200
+    none = {backoff_delay(RetryStrategy.EXPONENTIAL_BACKOFF, 2) for _ in range(clients)}
+    full = [backoff_delay(RetryStrategy.EXPONENTIAL_BACKOFF, 2, jitter=JitterStrategy.FULL) for _ in range(clients)]
+    check(f'未抖動時 {clients} 個 client 同時重試 ({len(none)} 個時間點)', none == {4.0})
+    check(f'FULL: 0 ~ 4 秒均勻分佈 (平均 {statistics.mean(full):.2f})',
+          all(0 <= d <= 4 for d in full) and 1.6 < statistics.mean(full) < 2.4 and len(set(full)) == clients)
+
+    previous, delays = None, []
+    for n in range(8):
+        previous = backoff_delay(RetryStrategy.EXPONENTIAL_BACKOFF, n, jitter=JitterStrategy.DECORRELATED,
+                                 previous=previous, max_delay=20)
+        delays.append(previous)
+    bounded = all(1 <= d <= 20 for d in delays) and all(
+        d <= max(p, 1) * 3 for p, d in zip([1.0] + delays, delays))
+    check(f'DECORRELATED: 基準 ~ 上次 × 3，不超過 max_delay ({", ".join(f"{d:.1f}" for d in delays)})', bounded)
+
+
+def test_budget(check):
+    """重試預算"""
+    budget = RetryBudget(ratio=0.1, min_retries_per_second=0, max_tokens=10)
+    attempts = {'issue': 0, 'void': 0}
+
+    def make(name: str):
+        @retry_on_error(max_retries=3, retry_budget=budget, logger=QUIET_LOGGER)
+        def call():
+            attempts[name] += 1
+            raise api_error('10000005')
+        return call
+
+    issue, void = make('issue'), make('void')
+    for i in range(1000):
+        try:
+            (issue if i % 2 else void)()
+        except Exception:
+            pass
+
+    metrics = budget.metrics()
+    retries = sum(attempts.values()) - 1000
+    check(f'重試數不超過請求數的 10% (1000 個請求，重試 {retries} 次；無預算時為 3000 次)',
+          retries == metrics['retries'] and 90 <= retries <= 100 and metrics['exhausted'] > 0)
+
+    budget = RetryBudget(ratio=0, min_retries_per_second=50, max_tokens=10)
+    while budget.try_acquire():
+        pass
+    time.sleep(0.1)
+    refilled = sum(budget.try_acquire() for _ in range(10))
+    check(f'min_retries_per_second 依時間補充 (0.1 秒補充 {refilled} 次)', 4 <= refilled <= 8)
+
+
+async def test_async(check):
+    """coroutine 函數的重試、熔斷與併發限制"""
+    attempts = {}
+
+    @retry_on_error(max_retries=3, jitter=JitterStrategy.FULL, max_delay=0.05, logger=QUIET_LOGGER)
+    async def issue(order: int):
+        attempts[order] = attempts.get(order, 0) + 1
+        if attempts[order] < 3:
+            raise ConnectionError('connection reset')
+        return order
+
+    ticks = 0
+
+    async def heartbeat():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.005)
+
+    beat = asyncio.ensure_future(heartbeat())
+    started = time.perf_counter()
+    results = await asyncio.gather(*(issue(i) for i in range(50)))
+    elapsed = time.perf_counter() - started
+    beat.cancel()
+    check(f'coroutine 以 asyncio.sleep 重試 (50 筆 × 2 次重試，{elapsed * 1000:.0f} ms，心跳 {ticks} 次)',
+          asyncio.iscoroutinefunction(issue) and results == list(range(50))
+          and set(attempts.values()) == {3} and elapsed < 0.5 and ticks >= 5)
+
+    breaker = CircuitBreaker('ecpay:Issue', failure_threshold=2, recovery_timeout=60)
+    sent = []
+
+    @retry_on_error(max_retries=5, max_delay=0.01, circuit_breaker=breaker, logger=QUIET_LOGGER)
+    async def outage():
+        sent.append(1)
+        raise asyncio.TimeoutError()
+
+    errors = []
+    for _ in range(3):
+        try:
+            await outage()
+        except (asyncio.TimeoutError, CircuitOpenError) as e:
+            errors.append(type(e).__name__)
+    check(f'asyncio 熔斷後快速失敗 (送出 {len(sent)} 次，{errors})',
+          len(sent) == 2 and errors[-1] == 'CircuitOpenError')
+
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=3, max_limit=3)
+    peak = 0
+
+    @retry_on_error(max_retries=0, limiter=limiter, logger=QUIET_LOGGER)
+    async def limited():
+        nonlocal peak
+        peak = max(peak, limiter.in_flight)
+        await asyncio.sleep(0.005)
+
+    await asyncio.gather(*(limited() for _ in range(40)))
+    check(f'acquire_async 限制併發 (峰值 {peak}，上限 3)',
+          peak == 3 and limiter.in_flight == 0 and limiter.metrics()['successes'] == 40)
+
+    held = [await limiter.acquire_async() for _ in range(3)]
+    timed_out = await limiter.acquire_async(timeout=0.01)
+    waiter = asyncio.ensure_future(limiter.acquire_async(timeout=1))
+    await asyncio.sleep(0.01)
+    limiter.release(held.pop())
+    woke = await waiter
+    check('acquire_async 逾時回傳 None，名額歸還時喚醒等待者', timed_out is None and woke is not None)
+
+
+async def test_cancellation(check):
+    """取消的呼叫歸還名額與試探名額"""
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=2)
+    breaker = CircuitBreaker('ecpay:Issue', failure_threshold=1, recovery_timeout=0.05)
+    delay = {'seconds': 1.0}
+
+    @retry_on_error(max_retries=0, limiter=limiter, circuit_breaker=breaker, logger=QUIET_LOGGER)
+    async def slow():
+        await asyncio.sleep(delay['seconds'])
+        return 'ok'
+
+    for _ in range(2):
+        try:
+            await asyncio.wait_for(slow(), 0.01)
+        except asyncio.TimeoutError:
+            pass
+    delay['seconds'] = 0
+    try:
+        result = await asyncio.wait_for(slow(), 0.5)
+    except asyncio.TimeoutError:
+        result = None
+    check(f'wait_for 逾時 2 次 (上限 2) 後名額已歸還 (in_flight {limiter.in_flight})，下一次呼叫不會卡住',
+          result == 'ok' and limiter.in_flight == 0 and limiter.limit == 2)
+
+    @retry_on_error(max_retries=0, circuit_breaker=breaker, logger=QUIET_LOGGER)
+    async def failing():
+        raise ConnectionError('connection reset')
+
+    try:
+        await failing()
+    except ConnectionError:
+        pass
+    await asyncio.sleep(0.06)
+    state_before = breaker.state.value
+    delay['seconds'] = 1.0
+    try:
+        await asyncio.wait_for(slow(), 0.01)
+    except asyncio.TimeoutError:
+        pass
+    delay['seconds'] = 0
+    try:
+        probe = await slow()
+    except CircuitOpenError:
+        probe = None
+    check(f'HALF_OPEN 的試探被取消後可再試探並關閉 ({state_before} → {breaker.state.value})',
+          state_before == 'half_open' and probe == 'ok' and breaker.state.value == 'closed')
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("重試裝飾器測試")
+    print("=" * 60 + "\n")
+
+    test_strategies(check)
+    test_jitter(check)
+    test_budget(check)
+    asyncio.run(test_async(check))
+    asyncio.run(test_cancellation(check))
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+大量發票開立管線測試 (bulk_issue.py)
+
+以本機模擬伺服器驗證:
+- CSV / JSONL 串流讀取、驗證與 B2B 稅額拆分 (含應稅 + 免稅混合的購物車)
+- 格式錯誤的 JSONL 行與資料錯誤的訂單記錄為 invalid，不中斷執行
+- 重新執行時略過 checkpoint 已記錄的訂單
+- 中斷後 (已開立未記錄) 重跑不會重複開立
+- 每個商店的 token bucket 限速
+- 網路錯誤依 InvoiceErrorHandler 分類重試
+
+需要: pip install aiohttp pycryptodome requests
+
+使用方法:
+    python test-bulk-issue.py
+    python test-bulk-issue.py --count 5000 --workers 50
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import socket
+import sys
+import tempfile
+from pathlib import Path
+from typing import List
+
+from bulk_issue import BulkInvoiceIssuer, CheckpointLog, build_invoice, ECPayInvoiceService
+from error_handler import InvoiceErrorHandler
+from ecpay_mock_server import MockECPayInvoiceServer
+from invoice_items import ItemAggregator, LineItem, validate_ecpay
+from presubmit import PresubmitChecker
+from tax_calculator import get_tax_calculator
+
+MERCHANTS = {ECPayInvoiceService.TEST_MERCHANT_ID: (ECPayInvoiceService.TEST_HASH_KEY, ECPayInvoiceService.TEST_HASH_IV)}
+
+# 測試時不輸出錯誤日誌
+QUIET_LOGGER = logging.getLogger('test-bulk-issue')
+QUIET_LOGGER.addHandler(logging.NullHandler())
+QUIET_LOGGER.propagate = False
+
+
+def write_csv(path: Path, count: int, prefix: str, invalid: int = 0, b2b_every: int = 10):
+    """產生測試訂單 CSV (最後 invalid 筆金額錯誤)"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['relate_number', 'customer_identifier', 'customer_name',
+                                               'customer_email', 'total_amount', 'item_name'])
+        writer.writeheader()
+        for i in range(count):
+            writer.writerow({
+                'relate_number': f'{prefix}{i:06d}',
+                'customer_identifier': '80129529' if i % b2b_every == 0 else '',
+                'customer_name': '測試客戶',
+                'customer_email': 'test@example.com',
+                'total_amount': 'abc' if i >= count - invalid else 100 + i,
+                'item_name': '測試商品',
+            })
+
+
+def write_jsonl(path: Path, count: int, prefix: str):
+    """產生測試訂單 JSONL"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            order = {
+                'relate_number': f'{prefix}{i:06d}',
+                'customer_email': 'test@example.com',
+                'total_amount': 300,
+                'items': [
+                    {'ItemName': 'A', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': 100, 'ItemAmount': 100},
+                    {'ItemName': 'B', 'ItemCount': 2, 'ItemWord': '個', 'ItemPrice': 100, 'ItemAmount': 200},
+                ],
+            }
+            f.write(json.dumps(order, ensure_ascii=False) + '\n')
+
+
+def make_issuer(checkpoint: Path, base_url: str, **kwargs) -> BulkInvoiceIssuer:
+    options = {'workers': 20, 'rate': 10000, 'backoff_factor': 0,
+               'handler': InvoiceErrorHandler(provider='ecpay', logger=QUIET_LOGGER)}
+    options.update(kwargs)
+    return BulkInvoiceIssuer(MERCHANTS, checkpoint_path=checkpoint, base_url=base_url, **options)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def run_tests(tmp: Path, count: int, workers: int) -> List[str]:
+    failures = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    # 金額計算
+    service = ECPayInvoiceService(ECPayInvoiceService.TEST_MERCHANT_ID, ECPayInvoiceService.TEST_HASH_KEY,
+                                  ECPayInvoiceService.TEST_HASH_IV)
+    b2b = build_invoice({'relate_number': 'X1', 'customer_identifier': '80129529', 'total_amount': 1050},
+                        ECPayInvoiceService.TEST_MERCHANT_ID, service)
+    check('B2B 金額拆分 (1050 = 1000 + 50)', (b2b.sales_amount, b2b.tax_amount) == (1000, 50))
+    try:
+        build_invoice({'relate_number': 'X2', 'total_amount': 100, 'items': [{'ItemAmount': 90}]},
+                      ECPayInvoiceService.TEST_MERCHANT_ID, service)
+        check('商品小計不符時拒絕', False)
+    except ValueError:
+        check('商品小計不符時拒絕', True)
+
+    # B2B 混合課稅: 應稅 1050 (含稅) + 免稅 500
+    mixed_order = {'relate_number': 'X3', 'customer_identifier': '80129529', 'total_amount': 1550, 'items': [
+        {'ItemName': '應稅商品', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': 1050, 'ItemTaxType': '1'},
+        {'ItemName': '免稅商品', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': 500, 'ItemTaxType': '3'},
+    ]}
+    mixed = build_invoice(mixed_order, ECPayInvoiceService.TEST_MERCHANT_ID, service)
+    payload = service._build_issue_payload(mixed)
+    check('B2B 混合課稅 (應稅 1000 + 稅 50 + 免稅 500 = 1550)',
+          (mixed.tax_type, mixed.sales_amount, mixed.tax_amount, mixed.free_tax_sales_amount,
+           mixed.zero_tax_sales_amount, mixed.total_amount) == ('9', 1000, 50, 500, 0, 1550)
+          and (payload['FreeTaxSalesAmount'], payload['ZeroTaxSalesAmount']) == (500, 0))
+    check('B2B 混合課稅通過送出前規則檢查', PresubmitChecker().check(mixed) == [])
+
+    # B2C 混合課稅: 應稅 550 (含稅) + 免稅 500，SalesAmount 為全部品項含稅合計，不另填免稅銷售額
+    b2c_mixed = build_invoice({'relate_number': 'X4', 'total_amount': 1050, 'items': [
+        {'ItemName': '應稅商品', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': 550, 'ItemTaxType': '1'},
+        {'ItemName': '免稅商品', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': 500, 'ItemTaxType': '3'},
+    ]}, ECPayInvoiceService.TEST_MERCHANT_ID, service)
+    payload = service._build_issue_payload(b2c_mixed)
+    aggregated = ItemAggregator().aggregate([LineItem('應稅商品', 1, 550, tax_type='1'),
+                                             LineItem('免稅商品', 1, 500, tax_type='3')], b2b=False).to_ecpay()
+    split = get_tax_calculator().split_mixed(550, exempt=500, invoice_type='B2C')
+    check('B2C 混合課稅: tax-rules.csv / split_mixed / to_ecpay / build_invoice 一致 (SalesAmount 1050，無免稅欄位)',
+          (b2c_mixed.tax_type, b2c_mixed.sales_amount, b2c_mixed.tax_amount, b2c_mixed.free_tax_sales_amount,
+           b2c_mixed.total_amount) == ('9', 1050, 0, 0, 1050)
+          and 'FreeTaxSalesAmount' not in payload and 'FreeTaxSalesAmount' not in aggregated
+          and aggregated['SalesAmount'] == payload['SalesAmount'] == split.sales_amount == split.total_amount
+          and split.free_tax_sales_amount == 0)
+    check('B2C 混合課稅通過送出前規則檢查，另填 FreeTaxSalesAmount 時拒絕',
+          PresubmitChecker().check(b2c_mixed) == [] and not validate_ecpay(aggregated, b2b=False)
+          and validate_ecpay(dict(aggregated, FreeTaxSalesAmount=500), b2b=False) != [])
+
+    async with MockECPayInvoiceServer() as server:
+        # CSV 完整執行
+        orders = tmp / 'orders.csv'
+        checkpoint = tmp / 'orders.checkpoint.jsonl'
+        write_csv(orders, count, 'CSV', invalid=2)
+        result = await make_issuer(checkpoint, server.url, workers=workers).run(orders)
+        check(f'CSV 開立 {count - 2} 筆 ({result.processed / result.elapsed:.0f} 筆/秒)',
+              result.issued == count - 2 and result.invalid == 2)
+        check('伺服器發票數一致', len(server.invoices) == count - 2)
+
+        mixed_orders = tmp / 'mixed.jsonl'
+        mixed_orders.write_text(json.dumps(mixed_order, ensure_ascii=False) + '\n', encoding='utf-8')
+        result = await make_issuer(tmp / 'mixed.checkpoint.jsonl', server.url).run(mixed_orders)
+        check('B2B 混合課稅訂單開立成功', result.issued == 1 and not result.errors)
+
+        # 壞資料: 格式錯誤的行、非物件、欄位型別錯誤，只記錄該筆為 invalid
+        bad_orders = tmp / 'bad.jsonl'
+        bad_orders.write_text('\n'.join([
+            json.dumps({'relate_number': 'BAD001', 'total_amount': 100}),
+            '{"relate_number": "BAD002", "total_amount": ',
+            '["BAD003", 100]',
+            json.dumps({'relate_number': 'BAD004', 'total_amount': 100, 'items': 5}),
+            json.dumps({'relate_number': 'BAD005', 'total_amount': 100}),
+        ]) + '\n', encoding='utf-8')
+        bad_checkpoint = tmp / 'bad.checkpoint.jsonl'
+        result = await make_issuer(bad_checkpoint, server.url).run(bad_orders)
+        with open(bad_checkpoint, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        invalid = [r for r in records if r['status'] == 'invalid']
+        check('壞資料不中斷執行 (開立 2 / invalid 3)', (result.issued, result.invalid) == (2, 3) and not result.ok)
+        check('checkpoint 記錄壞資料的行號與原因',
+              [r.get('line') for r in invalid] == [2, 3, None]
+              and invalid[2]['relate_number'] == 'BAD004' and invalid[2]['error'].startswith('TypeError'))
+
+        # 重新執行: 全部略過
+        server.reset_stats()
+        result = await make_issuer(checkpoint, server.url, workers=workers).run(orders)
+        check('重跑略過已開立訂單', result.skipped == count - 2 and result.issued == 0 and server.requests == 0)
+
+        # 中斷模擬: 先處理一部分，再於伺服器直接開立幾筆 (已開立但 checkpoint 未寫入)
+        orders = tmp / 'orders.jsonl'
+        checkpoint = tmp / 'orders-jsonl.checkpoint.jsonl'
+        write_jsonl(orders, 100, 'JSONL')
+        result = await make_issuer(checkpoint, server.url).run(orders, limit=40)
+        check('limit 只處理前 40 筆', result.issued == 40)
+
+        for i in range(40, 50):
+            server.handle_issue({'RelateNumber': f'JSONL{i:06d}', 'Items': [{}], 'SalesAmount': 300})
+        with open(checkpoint, 'a', encoding='utf-8') as f:
+            f.write('{"merchant_id": "2000132", "relate_nu')  # 寫到一半的殘行
+
+        result = await make_issuer(checkpoint, server.url).run(orders)
+        check('中斷後重跑 (略過 40 / 補記 10 / 開立 50)',
+              (result.skipped, result.recovered, result.issued) == (40, 10, 50))
+        check('未重複開立', sum(1 for r in server.relate_numbers if r.startswith('JSONL')) == 100)
+        check('殘行後的紀錄可讀回', len(CheckpointLog(checkpoint).completed) == 100)
+
+        # 限速: 100 筆、每秒 200 筆、容量 1 → 約 0.5 秒
+        orders = tmp / 'rate.csv'
+        write_csv(orders, 100, 'RATE')
+        result = await make_issuer(tmp / 'rate.checkpoint.jsonl', server.url, rate=200, burst=1).run(orders)
+        check(f'token bucket 限速 ({result.elapsed:.2f} 秒)', result.issued == 100 and result.elapsed >= 0.45)
+
+    # 網路錯誤: 可重試，重試後仍失敗
+    orders = tmp / 'down.csv'
+    write_csv(orders, 5, 'DOWN')
+    result = await make_issuer(tmp / 'down.checkpoint.jsonl', f'http://127.0.0.1:{free_port()}',
+                               max_retries=2).run(orders)
+    check('網路錯誤重試後記錄為 failed', result.failed == 5 and result.retries == 10
+          and result.errors.get('NETWORK_ERROR') == 15)
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='大量發票開立管線測試')
+    parser.add_argument('--count', type=int, default=1000, help='CSV 測試訂單數 (預設: 1000)')
+    parser.add_argument('--workers', type=int, default=20, help='worker 數 (預設: 20)')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("大量發票開立管線測試")
+    print("=" * 60 + "\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        failures = asyncio.run(run_tests(Path(tmp), args.count, args.workers))
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
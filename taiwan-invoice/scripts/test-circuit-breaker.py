@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+熔斷器與自適應併發限制測試 (error_handler.py)
+
+驗證:
+- CLOSED → OPEN → HALF_OPEN → CLOSED 狀態轉換，試探名額
+- 只有 NETWORK / SERVER 類別的錯誤會觸發熔斷
+- 依 (服務商, 端點) 分開熔斷
+- retry_on_error 於熔斷後快速失敗，不佔用執行緒等待退避
+- AIMD: 錯誤與高延遲縮小上限、成功時逐步放大，同一波錯誤只縮減一次
+- 多執行緒下進行中的請求數不超過上限
+並模擬服務商中斷期間，有無熔斷器時實際送到服務商的請求數。
+
+使用方法:
+    python test-circuit-breaker.py
+"""
+
+import logging
+import sys
+import threading
+import time
+from typing import List
+
+from error_handler import (
+    AdaptiveConcurrencyLimiter, CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError, CircuitState,
+    InvoiceErrorHandler, retry_on_error,
+)
+
+# 測試時不輸出重試日誌
+QUIET_LOGGER = logging.getLogger('test-circuit-breaker')
+QUIET_LOGGER.addHandler(logging.NullHandler())
+QUIET_LOGGER.propagate = False
+
+
+def api_error(code: str) -> Exception:
+    """帶 error_code 的例外 (同 error_handler.py 範例)"""
+    error = Exception(f'API 錯誤 {code}')
+    error.error_code = code
+    return error
+
+
+def rejected(breaker: CircuitBreaker) -> bool:
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        return True
+    return False
+
+
+def test_circuit_breaker(check):
+    """熔斷器狀態轉換"""
+    breaker = CircuitBreaker('ecpay:Issue', failure_threshold=3, recovery_timeout=0.1, half_open_max_calls=1)
+
+    for _ in range(10):
+        breaker.before_call()
+        breaker.record_exception(api_error('10000016'))
+    check('驗證錯誤 (服務商有回應) 不觸發熔斷', breaker.state == CircuitState.CLOSED)
+
+    for code in ('SERVER_ERROR', 'NETWORK_ERROR'):
+        breaker.before_call()
+        breaker.record_exception(api_error(code))
+    breaker.before_call()
+    breaker.record_exception(TimeoutError('read timeout'))
+    try:
+        breaker.before_call()
+        error = None
+    except CircuitOpenError as e:
+        error = e
+    check('連續 3 次網路/伺服器錯誤後熔斷，丟出 CircuitOpenError',
+          breaker.state == CircuitState.OPEN and error is not None and error.error_code == 'CIRCUIT_OPEN'
+          and 0 < error.retry_after <= 0.1)
+
+    time.sleep(0.12)
+    check('recovery_timeout 後進入 HALF_OPEN', breaker.state == CircuitState.HALF_OPEN)
+    breaker.before_call()
+    check('HALF_OPEN 只放行 half_open_max_calls 個試探請求', rejected(breaker))
+    breaker.record_failure()
+    check('試探失敗重新熔斷', breaker.state == CircuitState.OPEN and rejected(breaker))
+
+    time.sleep(0.12)
+    breaker.before_call()
+    breaker.record_success()
+    metrics = breaker.metrics()
+    check(f'試探成功恢復 CLOSED (opened={metrics["opened"]}, rejected={metrics["rejected"]})',
+          breaker.state == CircuitState.CLOSED and metrics['opened'] == 2 and metrics['rejected'] == 3
+          and metrics['consecutive_failures'] == 0)
+
+    registry = CircuitBreakerRegistry(InvoiceErrorHandler(logger=QUIET_LOGGER), failure_threshold=1)
+    issue, query = registry.get('ECPay', 'Issue'), registry.get('ecpay', 'GetIssue')
+    issue.before_call()
+    issue.record_failure()
+    check('依 (服務商, 端點) 分開熔斷',
+          registry.get('ecpay', 'Issue') is issue and rejected(issue) and not rejected(query)
+          and {k: v['state'] for k, v in registry.metrics().items()}
+          == {'ecpay:Issue': 'open', 'ecpay:GetIssue': 'closed'})
+
+
+def test_retry_integration(check):
+    """retry_on_error 與熔斷器、併發限制"""
+    breaker = CircuitBreaker('amego:f0401', failure_threshold=1, recovery_timeout=60)
+    calls = []
+
+    @retry_on_error(max_retries=5, logger=QUIET_LOGGER, circuit_breaker=breaker)
+    def issue():
+        calls.append(1)
+        raise api_error('SERVER_ERROR')
+
+    started = time.perf_counter()
+    try:
+        issue()
+    except Exception as e:
+        first = e
+    elapsed = time.perf_counter() - started
+    try:
+        issue()
+    except Exception as e:
+        second = e
+    check(f'熔斷後停止重試，不等待退避 ({elapsed * 1000:.1f} ms，送出 {len(calls)} 次)',
+          len(calls) == 1 and elapsed < 0.5 and getattr(first, 'error_code', '') == 'SERVER_ERROR'
+          and isinstance(second, CircuitOpenError))
+
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=10)
+
+    @retry_on_error(max_retries=0, logger=QUIET_LOGGER, limiter=limiter)
+    def duplicate():
+        raise api_error('10000006')
+
+    for _ in range(5):
+        try:
+            duplicate()
+        except Exception:
+            pass
+    check('業務錯誤不縮小併發上限', limiter.limit == 10 and limiter.in_flight == 0
+          and limiter.metrics()['decreases'] == 0)
+
+
+def test_limiter(check):
+    """AIMD 併發限制"""
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=20, min_limit=2, max_limit=50)
+    for _ in range(5):
+        limiter.release(limiter.acquire(), ConnectionError('refused'))
+    check(f'連續錯誤乘法減少 (20 × 0.7^5 → {limiter.limit})', limiter.limit == 3)
+    for _ in range(5):
+        limiter.release(limiter.acquire(), ConnectionError('refused'))
+    check('不低於 min_limit', limiter.limit == 2)
+
+    for _ in range(100):
+        limiter.release(limiter.acquire())
+    check(f'成功時加法增加 (100 次成功後上限 {limiter.limit})', 10 <= limiter.limit <= 20)
+
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=10)
+    permits = [limiter.acquire() for _ in range(10)]
+    timed_out = limiter.acquire(timeout=0.01) is None
+    for started in permits:
+        limiter.release(started, api_error('NETWORK_ERROR'))
+    check(f'同一波錯誤只縮減一次 (上限 10 → {limiter.limit})，名額用完時 acquire 逾時',
+          limiter.limit == 7 and timed_out and limiter.metrics()['drops'] == 10)
+
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=10, latency_threshold=0.01)
+    with limiter:
+        time.sleep(0.02)
+    check('延遲超過門檻縮小上限', limiter.limit == 7 and limiter.metrics()['latency_ewma'] >= 0.02)
+
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=4)
+    peak, lock = [0], threading.Lock()
+
+    def worker():
+        for _ in range(10):
+            with limiter:
+                with lock:
+                    peak[0] = max(peak[0], limiter.in_flight)
+                time.sleep(0.001)
+
+    workers = [threading.Thread(target=worker) for _ in range(16)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    metrics = limiter.metrics()
+    check(f'16 執行緒下進行中請求數不超過上限 (峰值 {peak[0]})',
+          peak[0] <= 4 and metrics['in_flight'] == 0 and metrics['successes'] == 160)
+
+
+def simulate_outage(check, threads: int = 8, calls: int = 50):
+    """服務商中斷期間實際送出的請求數"""
+    def run(breaker) -> int:
+        sent = [0]
+        lock = threading.Lock()
+
+        @retry_on_error(max_retries=0, logger=QUIET_LOGGER, circuit_breaker=breaker)
+        def provider():
+            with lock:
+                sent[0] += 1
+            time.sleep(0.001)
+            raise ConnectionError('connection refused')
+
+        def worker():
+            for _ in range(calls):
+                try:
+                    provider()
+                except (ConnectionError, CircuitOpenError):
+                    pass
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        return sent[0]
+
+    without = run(None)
+    breaker = CircuitBreaker('smilepay:Storage', failure_threshold=5, recovery_timeout=60)
+    with_breaker = run(breaker)
+    print(f"\n   中斷期間 {threads} 執行緒 × {calls} 次呼叫: "
+          f"無熔斷器送出 {without} 次，有熔斷器送出 {with_breaker} 次")
+    check('熔斷後請求不再送到服務商', with_breaker < threads + 5 and breaker.metrics()['rejected'] > 0)
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("熔斷器與自適應併發限制測試")
+    print("=" * 60 + "\n")
+
+    test_circuit_breaker(check)
+    test_retry_integration(check)
+    test_limiter(check)
+    simulate_outage(check)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
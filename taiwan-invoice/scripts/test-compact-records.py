@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+精簡記錄類別測試 (compact_records.py)
+
+驗證:
+- InvoiceIssueRecord / InvoiceIssueResponseRecord: from_record → to_record 與原本的 dataclass 相等，
+  raw 延遲解碼後相同
+- 實例沒有 __dict__；frozen 版本不可修改、可作為 set 成員
+- intern_fields 的字串在不同實例間共用
+
+需要: pip install pycryptodome requests
+
+使用方法:
+    python test-compact-records.py
+"""
+
+import dataclasses
+import sys
+from typing import List
+
+from compact_records import (
+    FrozenInvoiceIssueResponseRecord, InvoiceIssueRecord, InvoiceIssueResponseRecord, decode_payload, ecpay,
+    encode_payload,
+)
+
+
+def issue_data(relate_number: str):
+    return ecpay.InvoiceIssueData(
+        merchant_id='2000132', relate_number=relate_number, customer_identifier='80129529',
+        customer_name='王小明', customer_addr='台北市', customer_phone='', customer_email='test@example.com',
+        sales_amount=1000, tax_type='9', tax_amount=50, total_amount=1550, free_tax_sales_amount=500,
+        items=[{'ItemName': '應稅商品', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': 1000, 'ItemTaxType': '1',
+                'ItemAmount': 1000},
+               {'ItemName': '免稅商品', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': 500, 'ItemTaxType': '3',
+                'ItemAmount': 500}])
+
+
+def response(invoice_no: str):
+    return ecpay.InvoiceIssueResponse(
+        success=True, invoice_number=invoice_no, invoice_date='2024-01-15 10:00:00', random_number='1234',
+        rtn_code=1, rtn_msg=''.join(['開立', '成功']),
+        raw={'RtnCode': 1, 'InvoiceNo': invoice_no, 'Note': 'a&b=c 100%'})
+
+
+def test_roundtrip(check):
+    """與原本的 dataclass 互轉"""
+    data = issue_data('ORD001')
+    record = InvoiceIssueRecord.from_record(data)
+    check('InvoiceIssueRecord: to_record() 與原本相等 (含商品明細與混合課稅金額)', record.to_record() == data)
+
+    original = response('AB00000001')
+    compacted = InvoiceIssueResponseRecord.from_record(original)
+    check('InvoiceIssueResponseRecord: raw 延遲解碼後相同',
+          compacted.raw == original.raw and compacted.to_record() == original
+          and decode_payload(encode_payload(original.raw)) == original.raw)
+
+
+def test_layout(check):
+    """slots / frozen / intern"""
+    check('實例沒有 __dict__', not hasattr(InvoiceIssueRecord.from_record(issue_data('ORD001')), '__dict__'))
+
+    a = FrozenInvoiceIssueResponseRecord.from_record(response('AB00000001'))
+    b = FrozenInvoiceIssueResponseRecord.from_record(response('AB00000002'))
+    same = FrozenInvoiceIssueResponseRecord.from_record(response('AB00000001'))
+    try:
+        a.invoice_number = 'AB00000003'
+        immutable = False
+    except dataclasses.FrozenInstanceError:
+        immutable = True
+    check('frozen 不可修改、可作為 set 成員', immutable and len({a, b, same}) == 2)
+    check('intern_fields 的字串共用', a.rtn_msg is b.rtn_msg)
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("精簡記錄類別測試")
+    print("=" * 60 + "\n")
+
+    test_roundtrip(check)
+    test_layout(check)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+ECPay 電子發票 AES 加解密測試 (ecpay_crypto.py)
+
+驗證:
+- url_encode 與 urllib.parse.quote 相同 (全部 256 個 byte 與文件範例的 JSON)
+- url_decode 與 urllib.parse.unquote_to_bytes 相同 (含小寫 hex、不合法的 % 序列、反斜線)
+- encrypt_text 的輸出與範例 ECPayInvoiceService._encrypt_aes 逐字相同 (跨 AES 區塊邊界的各種長度)，
+  兩邊互相解密得到原本的資料
+- Base64 / 長度 / padding 錯誤與 HashKey 長度錯誤丟出 ValueError
+- get_cipher 依金鑰快取
+
+需要: pip install pycryptodome requests
+
+使用方法:
+    python test-ecpay-crypto.py
+"""
+
+import base64
+import json
+import sys
+import urllib.parse
+from typing import List
+
+from Crypto.Cipher import AES
+
+from ecpay_crypto import ECPayInvoiceCipher, get_cipher, url_decode, url_encode
+from example_loader import load_example
+
+ecpay = load_example('ecpay-invoice-example')
+Service = ecpay.ECPayInvoiceService
+
+HASH_KEY = Service.TEST_HASH_KEY
+HASH_IV = Service.TEST_HASH_IV
+
+# ECPay 電子發票文件「加密方式」的範例資料與 URL Encode 結果
+DOC_DATA = '{"Name":"Test","ID":"A123456789"}'
+DOC_URL_ENCODED = '%7B%22Name%22%3A%22Test%22%2C%22ID%22%3A%22A123456789%22%7D'
+
+
+def test_url_encoding(check):
+    """URL Encode / Decode"""
+    every_byte = bytes(range(256))
+    check('url_encode 與 quote 相同 (256 個 byte)',
+          url_encode(every_byte) == urllib.parse.quote(every_byte)
+          and all(url_encode(bytes([b])) == urllib.parse.quote(bytes([b])) for b in range(256)))
+    check('文件範例 JSON 的 URL Encode', url_encode(DOC_DATA) == DOC_URL_ENCODED)
+    check('中文以 UTF-8 編碼 (大寫 hex)', url_encode('王') == '%E7%8E%8B')
+
+    samples = [b'%7B%22a%22%7D', b'%e7%8e%8b', b'100%', b'%4', b'%zz%41', b'a\\x41%41', b'plain~/._-', b'']
+    mismatched = [s for s in samples if url_decode(s) != urllib.parse.unquote_to_bytes(s)]
+    check(f'url_decode 與 unquote_to_bytes 相同 ({len(samples) - len(mismatched)}/{len(samples)})',
+          not mismatched)
+
+
+def test_compatibility(check):
+    """與範例實作相容"""
+    service = Service(Service.TEST_MERCHANT_ID, HASH_KEY, HASH_IV)
+    cipher = ECPayInvoiceCipher(HASH_KEY, HASH_IV)
+
+    # 長度跨越多個 AES 區塊邊界 (URL Encode 後剛好 16 的倍數時補一整個區塊)
+    texts = [DOC_DATA, '', 'a' * 16, 'a' * 15, '王' * 5, 'x~y/z\\w "q" 100%', *('b' * n for n in range(1, 40))]
+    check(f'encrypt_text 與 _encrypt_aes 逐字相同 ({len(texts)} 種長度)',
+          all(cipher.encrypt_text(text) == service._encrypt_aes(text) for text in texts))
+
+    decrypted = AES.new(HASH_KEY.encode(), AES.MODE_CBC, HASH_IV.encode()).decrypt(
+        base64.b64decode(cipher.encrypt_text(DOC_DATA)))
+    pad_len = 16 - len(DOC_URL_ENCODED) % 16
+    check('解密後為 URL Encode 的資料 + PKCS7 padding',
+          decrypted == DOC_URL_ENCODED.encode() + bytes([pad_len]) * pad_len)
+
+    payload = {'MerchantID': '2000132', 'RelateNumber': 'ORD001', 'CustomerName': '王小明',
+               'Items': [{'ItemName': '咖啡 (大杯) ~ 50% off', 'ItemAmount': 100}], 'InvoiceRemark': 'a\\b/c'}
+    check('範例加密的資料可由 cipher.decrypt 解密',
+          cipher.decrypt(service._encrypt_aes(json.dumps(payload))) == payload)
+    check('cipher.encrypt 的資料可由範例 _decrypt_aes 解密',
+          service._decrypt_aes(cipher.encrypt(payload)) == payload)
+    check('批次 API 與逐筆結果相同',
+          cipher.decrypt_many(cipher.encrypt_many([payload, {'n': 1}])) == [payload, {'n': 1}])
+
+
+def test_errors(check):
+    """錯誤處理"""
+    cipher = ECPayInvoiceCipher(HASH_KEY, HASH_IV)
+    raw = AES.new(HASH_KEY.encode(), AES.MODE_CBC, HASH_IV.encode()).encrypt(b'%7B%7D' + b'\x05' * 10)
+    bad_padding = base64.b64encode(raw).decode()
+    cases = {
+        'padding 錯誤': bad_padding,
+        '長度不是 16 的倍數': base64.b64encode(b'x' * 20).decode(),
+        '空資料': '',
+        'Base64 格式錯誤': 'not base64!',
+    }
+    failed = []
+    for name, data in cases.items():
+        try:
+            cipher.decrypt(data)
+            failed.append(name)
+        except ValueError:
+            pass
+    check(f'解密錯誤丟出 ValueError ({len(cases) - len(failed)}/{len(cases)})', not failed)
+
+    rejected = 0
+    for key, iv in ((HASH_KEY[:15], HASH_IV), (HASH_KEY, HASH_IV + 'x')):
+        try:
+            ECPayInvoiceCipher(key, iv)
+        except ValueError:
+            rejected += 1
+    check('HashKey / HashIV 不是 16 bytes 丟出 ValueError', rejected == 2)
+    check('get_cipher 依金鑰快取', get_cipher(HASH_KEY, HASH_IV) is get_cipher(HASH_KEY, HASH_IV))
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("ECPay 電子發票 AES 加解密測試")
+    print("=" * 60 + "\n")
+
+    test_url_encoding(check)
+    test_compatibility(check)
+    test_errors(check)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
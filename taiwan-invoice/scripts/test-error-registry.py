@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+錯誤碼表測試 (error_registry.py / error_handler.py)
+
+驗證:
+- 不同服務商相同的錯誤碼 (Amego 1 與 ECPay 1) 各自獨立
+- error_handler.py 內建的分類與重試設定覆寫 CSV 內容
+- 多個 InvoiceErrorHandler 共用同一份錯誤碼表，all_errors 為唯讀
+- 未登錄的錯誤碼回傳同一個 ErrorInfo
+- taiwan-payment 的 error_registry.py 副本與此份相同 (模組說明除外)
+
+使用方法:
+    python test-error-registry.py
+"""
+
+import ast
+import logging
+import sys
+from pathlib import Path
+from typing import List
+
+from error_handler import ErrorCategory, InvoiceErrorHandler, RetryStrategy, get_invoice_error_registry
+from error_registry import get_error_registry
+
+# 測試時不輸出日誌
+QUIET_LOGGER = logging.getLogger('test-error-registry')
+QUIET_LOGGER.addHandler(logging.NullHandler())
+QUIET_LOGGER.propagate = False
+
+# error_registry.py 有副本的技能
+REGISTRY_SKILLS = ('taiwan-invoice', 'taiwan-payment')
+
+
+def registry_code(path: Path) -> str:
+    """模組說明 (各技能的使用範例不同) 之後的程式碼"""
+    source = path.read_text(encoding='utf-8')
+    docstring = ast.parse(source).body[0]
+    return '\n'.join(source.splitlines()[docstring.end_lineno:])
+
+
+def registry_copy_mismatches() -> List[str]:
+    """
+    error_registry.py 在 taiwan-invoice / taiwan-payment 各有一份，模組說明以外的內容必須相同
+
+    Returns:
+        內容不同的技能目錄 (技能單獨安裝、找不到其他副本時為空)
+    """
+    scripts_dir = Path(__file__).resolve().parent
+    code = registry_code(scripts_dir / 'error_registry.py')
+    mismatched = []
+    for skill in REGISTRY_SKILLS:
+        copy = scripts_dir.parent.parent / skill / 'scripts' / 'error_registry.py'
+        if copy.exists() and registry_code(copy) != code:
+            mismatched.append(skill)
+    return mismatched
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("錯誤碼表測試")
+    print("=" * 60 + "\n")
+
+    ecpay = InvoiceErrorHandler('ecpay', QUIET_LOGGER)
+    amego = InvoiceErrorHandler('amego', QUIET_LOGGER)
+    check(f"錯誤碼 1: ECPay '{ecpay.get_error_info('1').message}'，Amego '{amego.get_error_info('1').message}'",
+          ecpay.get_error_info('1').provider == 'ecpay' and amego.get_error_info('1').provider == 'amego'
+          and ecpay.get_error_info('1') is not amego.get_error_info('1'))
+
+    timestamp = ecpay.get_error_info('10000005')
+    check('內建設定覆寫 CSV (10000005 立即重試)',
+          timestamp.retry_strategy == RetryStrategy.IMMEDIATE and timestamp.is_retryable)
+
+    check('CSV 中未內建的錯誤碼同樣可查詢',
+          all(info.category != ErrorCategory.UNKNOWN for info in get_error_registry() if info.provider))
+
+    smilepay = InvoiceErrorHandler('smilepay', QUIET_LOGGER)
+    check('多個 handler 共用同一份錯誤碼表',
+          ecpay.registry is amego.registry is smilepay.registry is get_invoice_error_registry())
+    check('查詢指定服務商時不會查到其他服務商的錯誤碼',
+          ecpay.get_error_info('-10066').category == ErrorCategory.UNKNOWN
+          and ecpay.get_error_info('-10066', 'smilepay').provider == 'smilepay')
+
+    try:
+        ecpay.all_errors['NEW'] = timestamp
+        mutated = True
+    except TypeError:
+        mutated = False
+    check('all_errors 為唯讀', not mutated and 'NETWORK_ERROR' in ecpay.all_errors)
+
+    check('未登錄的錯誤碼回傳同一個 ErrorInfo',
+          ecpay.get_error_info('UNLISTED') is amego.get_error_info('UNLISTED'))
+
+    mismatched = registry_copy_mismatches()
+    check(f'各技能的 error_registry.py 副本相同 {mismatched or ""}', not mismatched)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
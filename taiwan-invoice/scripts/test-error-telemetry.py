@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+錯誤遙測測試 (error_telemetry.py)
+
+驗證:
+- record() 不取鎖: 背景彙整進行中 (鎖被佔用) 時仍立即返回
+- 日誌去重: 同一 (服務商, 錯誤碼) 每個視窗只輸出一筆，視窗結束時彙總 "x 1,204" (抽樣輸出的事件也計入次數)
+- 依 (服務商, 錯誤碼) 累計次數與滑動視窗發生率
+- 環狀緩衝區與待處理佇列有上限，超過時丟棄並計入 dropped
+- InvoiceErrorHandler.log_error / retry_on_error 指定 telemetry 時只記錄事件
+- 背景執行緒定期呼叫匯出 hook，PrometheusFileExporter 寫出文字格式
+並比較服務商中斷期間有無遙測時輸出的日誌行數。
+
+使用方法:
+    python test-error-telemetry.py
+"""
+
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import List
+
+from error_handler import InvoiceErrorHandler, retry_on_error
+from error_telemetry import ErrorTelemetry, PrometheusFileExporter, prometheus_text
+
+
+class ListHandler(logging.Handler):
+    """收集日誌訊息"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages: List[str] = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def capture_logger(name: str):
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = ListHandler()
+    logger.handlers = [handler]
+    return logger, handler.messages
+
+
+def api_error(code: str) -> Exception:
+    """帶 error_code 的例外 (同 error_handler.py 範例)"""
+    error = Exception(f'API 錯誤 {code}')
+    error.error_code = code
+    return error
+
+
+HANDLER = InvoiceErrorHandler('ecpay', capture_logger('test-error-telemetry.handler')[0])
+TIMESTAMP_EXPIRED = HANDLER.get_error_info('10000005')
+NETWORK_ERROR = HANDLER.get_error_info('NETWORK_ERROR')
+
+
+def test_dedup(check):
+    """日誌去重、計數與發生率"""
+    logger, messages = capture_logger('test-error-telemetry.dedup')
+    telemetry = ErrorTelemetry(logger, window_seconds=60, background=False)
+    for i in range(1204):
+        telemetry.record(TIMESTAMP_EXPIRED, 'ecpay', latency=0.2, context={'relate_number': f'ORD{i:05d}'})
+    for _ in range(30):
+        telemetry.record(NETWORK_ERROR, 'ecpay', retry_count=1)
+    now = time.time()
+    telemetry.flush(now)
+    check(f'視窗內每個錯誤碼只輸出第一筆完整日誌 ({len(messages)} 行 / 1234 個事件)',
+          len(messages) == 2 and 'ORD00000' in messages[0])
+
+    check(f"累計次數與發生率 ({telemetry.rate('ecpay', '10000005', now=now):.1f} 次/秒)",
+          telemetry.count('ECPay', '10000005') == 1204
+          and abs(telemetry.rate('ecpay', '10000005', now=now) - 1204 / 60) < 0.01
+          and abs(telemetry.rate('ecpay', '10000005', window=10, now=now) - 120.4) < 0.01
+          and telemetry.top(1, now=now) == [('ecpay', '10000005', 1204)])
+
+    telemetry.flush(now + 61)
+    summary = [m for m in messages if 'x 1,204' in m]
+    check(f'視窗結束時彙總重複的日誌 ({summary[0] if summary else messages[-1]})',
+          len(summary) == 1 and '(最近 60 秒)' in summary[0] and 'ORD01203' in summary[0]
+          and any('NETWORK_ERROR x 30' in m for m in messages))
+
+    check('視窗外的分桶移除，累計次數保留',
+          telemetry.rate('ecpay', '10000005', now=now + 61) == 0 and telemetry.count('ecpay', '10000005') == 1204)
+
+    logger, messages = capture_logger('test-error-telemetry.sample')
+    telemetry = ErrorTelemetry(logger, sample_rate=1.0, background=False)
+    for _ in range(10):
+        telemetry.record(TIMESTAMP_EXPIRED, 'ecpay')
+    telemetry.flush()
+    check('sample_rate=1.0 時全部輸出', len(messages) == 10)
+
+    logger, messages = capture_logger('test-error-telemetry.sampled-summary')
+    telemetry = ErrorTelemetry(logger, window_seconds=60, sample_rate=0.3, background=False)
+    random.seed(7)
+    for _ in range(200):
+        telemetry.record(TIMESTAMP_EXPIRED, 'ecpay')
+    now = time.time()
+    telemetry.flush(now)
+    logged = len(messages)
+    telemetry.flush(now + 61)
+    check(f'抽樣輸出的事件也計入彙總次數 (完整日誌 {logged} 行，{messages[-1].split(" | ")[0]})',
+          1 < logged < 200 and 'x 200 ' in messages[-1])
+
+
+def test_bounds(check):
+    """不阻塞與上限"""
+    telemetry = ErrorTelemetry(capture_logger('test-error-telemetry.bounds')[0], ring_size=100,
+                               max_pending=1000, background=False)
+    elapsed = []
+
+    def producer():
+        started = time.perf_counter()
+        for _ in range(5000):
+            telemetry.record(TIMESTAMP_EXPIRED, 'ecpay', latency=0.1)
+        elapsed.append(time.perf_counter() - started)
+
+    # 模擬背景執行緒正在彙整 / 匯出 (佔用所有鎖)
+    with telemetry._flush_lock, telemetry._stats_lock:
+        thread = threading.Thread(target=producer)
+        thread.start()
+        thread.join(timeout=5)
+    finished = not thread.is_alive()
+    check(f'彙整中 record() 仍立即返回 (5000 次 {elapsed[0] * 1000 if elapsed else 0:.1f} ms)',
+          finished and elapsed[0] < 1.0)
+    check(f'待處理佇列超過上限時丟棄 (dropped={telemetry.dropped})，環狀緩衝區保留最近 100 筆',
+          telemetry.dropped == 4000 and len(telemetry.events) == 100 and len(telemetry.recent(10)) == 10)
+    check('丟棄前的事件全部彙整', telemetry.flush() == 1000 and telemetry.count('ecpay', '10000005') == 1000)
+
+
+def test_integration(check):
+    """InvoiceErrorHandler / retry_on_error"""
+    handler_logger, handler_messages = capture_logger('test-error-telemetry.integration')
+    telemetry_logger, telemetry_messages = capture_logger('test-error-telemetry.integration.telemetry')
+    telemetry = ErrorTelemetry(telemetry_logger, background=False)
+    handler = InvoiceErrorHandler('amego', handler_logger, telemetry=telemetry)
+
+    for _ in range(100):
+        handler.log_error('1', context={'invoice_number': 'AB12345678'}, latency=0.05)
+    check('log_error 指定 telemetry 時不直接輸出日誌',
+          not handler_messages and len(telemetry.events) == 100 and telemetry.events[0].code == '1'
+          and telemetry.events[0].provider == 'amego')
+
+    calls = []
+
+    @retry_on_error(max_retries=2, max_delay=0.001, logger=handler_logger, handler=handler, telemetry=telemetry)
+    def flaky():
+        calls.append(1)
+        time.sleep(0.002)
+        raise api_error('SERVER_ERROR')
+
+    try:
+        flaky()
+    except Exception:
+        pass
+    telemetry.flush()
+    events = [e for e in telemetry.recent() if e.code == 'SERVER_ERROR']
+    check('retry_on_error 每次失敗記錄事件 (含耗時與重試次數)，不逐次輸出日誌',
+          len(calls) == 3 and [e.retry_count for e in events] == [0, 1, 2]
+          and all(e.latency >= 0.002 for e in events) and not handler_messages
+          and telemetry.snapshot()[('amego', 'SERVER_ERROR')]['retries'] == 2)
+
+
+def test_export(check):
+    """背景執行緒與 Prometheus 匯出"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'invoice.prom')
+        telemetry = ErrorTelemetry(capture_logger('test-error-telemetry.export')[0], flush_interval=0.01,
+                                   exporters=[PrometheusFileExporter(path)], export_interval=0.02)
+        for _ in range(50):
+            telemetry.record(NETWORK_ERROR, 'smilepay', latency=1.5)
+        time.sleep(0.2)
+        exported = os.path.exists(path)
+        telemetry.close()
+
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        check('背景執行緒彙整並定期呼叫匯出 hook', exported and telemetry.count('smilepay', 'NETWORK_ERROR') == 50)
+        check('Prometheus 文字格式',
+              'invoice_errors_total{provider="smilepay",code="NETWORK_ERROR",category="network"} 50' in text
+              and 'invoice_error_latency_seconds_sum{provider="smilepay",code="NETWORK_ERROR",category="network"} 75.0'
+              in text and '# TYPE invoice_error_rate gauge' in text and os.listdir(tmp) == ['invoice.prom'])
+
+    telemetry = ErrorTelemetry(capture_logger('test-error-telemetry.label')[0], background=False)
+    telemetry.record(HANDLER.get_error_info('a"b\\c'), 'ecpay')
+    telemetry.flush()
+    check('label 值跳脫引號與反斜線', 'code="a\\"b\\\\c"' in prometheus_text(telemetry))
+
+
+def simulate_outage(check, errors: int = 10000):
+    """服務商中斷期間的日誌行數"""
+    logger, plain = capture_logger('test-error-telemetry.plain')
+    handler = InvoiceErrorHandler('ecpay', logger)
+    started = time.perf_counter()
+    for i in range(errors):
+        handler.log_error('NETWORK_ERROR', context={'relate_number': f'ORD{i:06d}', 'url': 'https://einvoice'})
+    plain_elapsed = time.perf_counter() - started
+
+    telemetry_logger, deduplicated = capture_logger('test-error-telemetry.deduplicated')
+    telemetry = ErrorTelemetry(telemetry_logger, background=False)
+    handler = InvoiceErrorHandler('ecpay', logger, telemetry=telemetry)
+    started = time.perf_counter()
+    for i in range(errors):
+        handler.log_error('NETWORK_ERROR', context={'relate_number': f'ORD{i:06d}', 'url': 'https://einvoice'})
+    telemetry_elapsed = time.perf_counter() - started
+    telemetry.close()
+
+    print(f"\n   中斷期間 {errors} 次錯誤: log_error 輸出 {len(plain)} 行 ({plain_elapsed * 1000:.0f} ms)，"
+          f"遙測輸出 {len(deduplicated)} 行 (請求端 {telemetry_elapsed * 1000:.0f} ms)")
+    check('遙測將重複的日誌彙總為 2 行', len(plain) == errors and len(deduplicated) == 2)
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("錯誤遙測測試")
+    print("=" * 60 + "\n")
+
+    test_dedup(check)
+    test_bounds(check)
+    test_integration(check)
+    test_export(check)
+    simulate_outage(check)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
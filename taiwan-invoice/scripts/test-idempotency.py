@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+冪等層測試 (idempotency.py)
+
+驗證:
+- 結果依 TTL 過期、超過 max_entries 時移除最早到期的紀錄、重新開啟後仍有效
+- 同步: 多個執行緒同時以同一 key 呼叫只執行一次，例外傳給所有等待者且不快取
+- 回傳 None 的呼叫也會快取
+- asyncio: 同一 key 的並行呼叫合併為一次，不同 key 各自執行；SQLite 讀寫不阻塞 event loop
+- 多個程序共用同一個 SQLite 檔: 以 claim 互斥只執行一次，持有者當機時 lease 到期後可被接手
+- IdempotentInvoiceService 只快取成功的回應，重複開立不再送出
+- 透過模擬伺服器: 並行重複開立只送出一次；快取遺失後重送遇到 10000006 時查回既有發票
+並量測快取命中的耗時。
+
+使用方法:
+    python test-idempotency.py
+"""
+
+import asyncio
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+from ecpay_mock_server import MockECPayInvoiceServer
+from example_loader import load_example
+from idempotency import IdempotencyGuard, IdempotencyStore, IdempotentInvoiceService
+
+async_example = load_example('ecpay-invoice-async-example')
+InvoiceIssueData = async_example.InvoiceIssueData
+InvoiceIssueResponse = async_example.InvoiceIssueResponse
+ECPayInvoiceService = async_example.ECPayInvoiceService
+
+MERCHANT_ID = ECPayInvoiceService.TEST_MERCHANT_ID
+
+
+def invoice(relate_number: str) -> InvoiceIssueData:
+    return InvoiceIssueData(
+        merchant_id=MERCHANT_ID, relate_number=relate_number, customer_identifier='0000000000',
+        customer_name='王小明', customer_addr='', customer_phone='', customer_email='test@example.com',
+        sales_amount=100, total_amount=100,
+        items=[{'ItemName': '商品', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': 100,
+                'ItemTaxType': '1', 'ItemAmount': 100}])
+
+
+class SyncService:
+    """同步服務: 第一次呼叫回傳 first_rtn_code (預設成功)"""
+
+    def __init__(self, first_rtn_code: int = 1, latency: float = 0.0):
+        self.first_rtn_code = first_rtn_code
+        self.latency = latency
+        self.calls = 0
+
+    def issue_invoice(self, data) -> InvoiceIssueResponse:
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.calls == 1 and self.first_rtn_code != 1:
+            return InvoiceIssueResponse(success=False, rtn_code=self.first_rtn_code, rtn_msg='錯誤')
+        return InvoiceIssueResponse(success=True, invoice_number=f'AB{self.calls:08d}',
+                                    invoice_date='2024-01-15 10:00:00', random_number='1234', rtn_code=1)
+
+
+def test_store(check, tmp: Path):
+    """結果儲存"""
+    path = tmp / 'store.db'
+    store = IdempotencyStore(path, ttl=10, max_entries=3)
+    store.put(MERCHANT_ID, 'ORD001', {'invoice_no': 'AB00000001'}, now=100)
+    check('put / get', store.get(MERCHANT_ID, 'ORD001', now=105) == {'invoice_no': 'AB00000001'}
+          and store.get('other', 'ORD001', now=105) is None)
+    check('超過 TTL 視為不存在', store.get(MERCHANT_ID, 'ORD001', now=110) is None)
+
+    for number in range(2, 6):
+        store.put(MERCHANT_ID, f'ORD00{number}', number, now=100 + number)
+    check(f'超過 max_entries 移除最早到期的紀錄 (剩 {len(store)} 筆)',
+          len(store) == 3 and store.get(MERCHANT_ID, 'ORD002', now=106) is None
+          and store.get(MERCHANT_ID, 'ORD005', now=106) == 5)
+    check('evict() 移除已過期紀錄', store.evict(now=114) == 2 and len(store) == 1)
+    store.close()
+
+    reopened = IdempotencyStore(path, ttl=10, max_entries=3)
+    check('重新開啟後仍有效', len(reopened) == 1 and reopened.get(MERCHANT_ID, 'ORD005', now=106) == 5)
+    reopened.close()
+
+
+def test_sync_single_flight(check):
+    """同步 single-flight"""
+    guard = IdempotencyGuard(IdempotencyStore())
+    calls = []
+    results = []
+
+    def slow(value):
+        calls.append(value)
+        time.sleep(0.05)
+        return value
+
+    threads = [threading.Thread(target=lambda: results.append(guard.call(MERCHANT_ID, 'ORD001', slow, 'A')))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    check(f'8 個執行緒同時呼叫只執行 1 次 (合併 {guard.stats.coalesced} 次)',
+          calls == ['A'] and results == ['A'] * 8 and guard.stats.coalesced == 7)
+    check('完成後回傳快取結果', guard.call(MERCHANT_ID, 'ORD001', slow, 'B') == 'A' and calls == ['A'])
+
+    errors = []
+
+    def failing():
+        calls.append('fail')
+        time.sleep(0.05)
+        raise ConnectionError('API 連線失敗')
+
+    def attempt():
+        try:
+            guard.call(MERCHANT_ID, 'ORD002', failing)
+        except ConnectionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=attempt) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    check('例外傳給所有等待者', len(errors) == 4 and calls.count('fail') == 1)
+    check('例外不快取，下一次重新呼叫', guard.call(MERCHANT_ID, 'ORD002', slow, 'C') == 'C')
+
+    nothing = []
+    for _ in range(3):
+        guard.call(MERCHANT_ID, 'ORD003', lambda: nothing.append(1))
+    check('回傳 None 的呼叫也快取 (只執行 1 次)', nothing == [1] and guard.stats.hits >= 2)
+
+
+class SlowStore(IdempotencyStore):
+    """每次讀寫阻塞 20 ms (模擬磁碟 fsync 或鎖競爭)"""
+
+    def _slow(self, name: str, *args, **kwargs):
+        time.sleep(0.02)
+        return getattr(super(), name)(*args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        return self._slow('get', *args, **kwargs)
+
+    def put(self, *args, **kwargs):
+        return self._slow('put', *args, **kwargs)
+
+    def claim(self, *args, **kwargs):
+        return self._slow('claim', *args, **kwargs)
+
+    def release(self, *args, **kwargs):
+        return self._slow('release', *args, **kwargs)
+
+
+async def loop_ticks(coroutine) -> int:
+    """執行 coroutine 期間 event loop 每 5 ms 的計時器觸發次數 (store 阻塞 event loop 時接近 0)"""
+    ticks = 0
+    task = asyncio.ensure_future(coroutine)
+    while not task.done():
+        await asyncio.sleep(0.005)
+        ticks += 1
+    await task
+    return ticks
+
+
+def test_async_single_flight(check):
+    """asyncio single-flight"""
+    guard = IdempotencyGuard(IdempotencyStore())
+    calls = []
+
+    async def slow(value):
+        calls.append(value)
+        await asyncio.sleep(0.02)
+        return value
+
+    async def scenario():
+        same = await asyncio.gather(*(guard.acall(MERCHANT_ID, 'ORD001', slow, 'A') for _ in range(20)))
+        distinct = await asyncio.gather(*(guard.acall(MERCHANT_ID, f'ORD{n:03d}', slow, n) for n in range(2, 6)))
+        return same, distinct
+
+    same, distinct = asyncio.run(scenario())
+    check(f'20 個並行呼叫只執行 1 次 (合併 {guard.stats.coalesced} 次)',
+          same == ['A'] * 20 and calls.count('A') == 1 and guard.stats.coalesced == 19)
+    check('不同 key 各自執行', distinct == [2, 3, 4, 5] and len(calls) == 5)
+
+    slow_guard = IdempotencyGuard(SlowStore())
+    ticks = asyncio.run(loop_ticks(slow_guard.acall(MERCHANT_ID, 'ORD001', slow, 'A')))
+    check(f'store 讀寫在 worker thread 執行，event loop 不被阻塞 (5 次 × 20 ms 期間計時器觸發 {ticks} 次)',
+          ticks >= 10)
+
+
+def test_cross_process(check, tmp: Path):
+    """多個程序共用 SQLite (以各自的連線與 guard 模擬)"""
+    path = tmp / 'shared.db'
+    guards = [IdempotencyGuard(IdempotencyStore(path), poll_interval=0.01) for _ in range(3)]
+    calls = []
+    results = []
+
+    def slow(worker):
+        calls.append(worker)
+        time.sleep(0.05)
+        return worker
+
+    threads = [threading.Thread(target=lambda n=n: results.append(guards[n % 3].call(MERCHANT_ID, 'ORD001', slow, n)))
+               for n in range(9)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    waited = sum(guard.stats.waited for guard in guards)
+    check(f'3 個程序同時處理同一 key 只執行 1 次 (等待其他程序 {waited} 次)',
+          len(calls) == 1 and results == [calls[0]] * 9 and waited >= 1)
+
+    store = guards[0].store
+    check('claim 持有中無法取得，lease 到期後可接手',
+          store.claim(MERCHANT_ID, 'ORD002', lease=10, now=100)
+          and not guards[1].store.claim(MERCHANT_ID, 'ORD002', lease=10, now=105)
+          and guards[1].store.claim(MERCHANT_ID, 'ORD002', lease=10, now=111))
+    for guard in guards:
+        guard.store.close()
+
+
+def test_invoice_service(check):
+    """IdempotentInvoiceService (同步服務)"""
+    service = SyncService()
+    idempotent = IdempotentInvoiceService(service, IdempotencyStore())
+    first = idempotent.issue_invoice(invoice('ORD001'))
+    second = idempotent.issue_invoice(invoice('ORD001'))
+    check('重複開立回傳快取的回應，只送出 1 次',
+          service.calls == 1 and second == first and isinstance(second, InvoiceIssueResponse))
+
+    service = SyncService(first_rtn_code=10000016)
+    idempotent = IdempotentInvoiceService(service, IdempotencyStore())
+    failed = idempotent.issue_invoice(invoice('ORD002'))
+    retried = idempotent.issue_invoice(invoice('ORD002'))
+    check('失敗的回應不快取', not failed.success and retried.success and service.calls == 2)
+
+
+async def test_mock_server(check):
+    """模擬伺服器"""
+    async with MockECPayInvoiceServer(latency=0.01) as server:
+        service = async_example.AsyncECPayInvoiceService(
+            merchant_id=MERCHANT_ID,
+            hash_key=ECPayInvoiceService.TEST_HASH_KEY,
+            hash_iv=ECPayInvoiceService.TEST_HASH_IV,
+            base_url=server.url,
+        )
+        try:
+            idempotent = IdempotentInvoiceService(service, IdempotencyStore())
+            responses = await asyncio.gather(*(idempotent.issue_invoice(invoice('ORD001')) for _ in range(10)))
+            numbers = {response.invoice_number for response in responses}
+            check(f'並行重複開立只送出 1 次 (請求 {server.requests} 次)',
+                  server.requests == 1 and len(server.invoices) == 1 and len(numbers) == 1
+                  and all(response.success for response in responses))
+
+            # 快取遺失 (例如換一台機器): 重送回應 10000006，查回同一張發票
+            fresh = IdempotentInvoiceService(service, IdempotencyStore())
+            recovered = await fresh.issue_invoice(invoice('ORD001'))
+            check(f'10000006 時查回既有發票 ({recovered.invoice_number})',
+                  recovered.success and recovered.invoice_number in numbers and len(server.invoices) == 1)
+        finally:
+            await service.close()
+
+
+def benchmark(tmp: Path):
+    """快取命中耗時"""
+    store = IdempotencyStore(tmp / 'bench.db', max_entries=100_000)
+    guard = IdempotencyGuard(store)
+    for n in range(10_000):
+        guard.call(MERCHANT_ID, f'ORD{n:06d}', lambda: {'invoice_no': f'AB{n:08d}'})
+
+    started = time.perf_counter()
+    for n in range(10_000):
+        guard.call(MERCHANT_ID, f'ORD{n:06d}', lambda: None)
+    elapsed = time.perf_counter() - started
+    print(f"\n[效能] 快取命中 10,000 次: {elapsed * 1000:.1f} ms ({elapsed / 10_000 * 1e6:.1f} μs/次)")
+    store.close()
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("冪等層測試")
+    print("=" * 60 + "\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        test_store(check, tmp)
+        test_sync_single_flight(check)
+        test_async_single_flight(check)
+        test_cross_process(check, tmp)
+        test_invoice_service(check)
+        asyncio.run(test_mock_server(check))
+        benchmark(tmp)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
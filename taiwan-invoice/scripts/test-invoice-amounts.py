@@ -6,6 +6,8 @@
     python test-invoice-amounts.py
 """
 
+from tax_calculator import get_tax_calculator
+
 
 def calculate_b2c_amounts(total_amount: int):
     """
@@ -25,16 +27,15 @@ def calculate_b2b_amounts(total_amount: int):
     """
     B2B (三聯式) 金額計算
     - 需分拆未稅金額與稅額
-    - 稅率 5%
+    - 稅率 5% (tax_calculator.py，依 data/tax-rules.csv)
     """
-    tax_amount = round(total_amount - (total_amount / 1.05))
-    sales_amount = total_amount - tax_amount
+    split = get_tax_calculator().split(total_amount, 'B2B', '1')
 
     return {
         'type': 'B2B',
-        'salesAmount': sales_amount,
-        'taxAmount': tax_amount,
-        'totalAmount': total_amount,
+        'salesAmount': split.sales_amount,
+        'taxAmount': split.tax_amount,
+        'totalAmount': split.total_amount,
     }
 
 
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+ECPay asyncio 發票 client 測試與吞吐量量測
+
+以本機模擬伺服器 (ecpay_mock_server.py) 驗證
+examples/ecpay-invoice-async-example.py 的功能，並比較:
+- 每張發票各自建立連線 (等同原本每次 requests.post)
+- 共用連線池 + 併發上限
+
+另驗證 iter_issue 以 generator 逐張取用 (同時進行的請求數不超過上限)。
+
+需要: pip install aiohttp pycryptodome requests
+
+使用方法:
+    python test-invoice-async.py
+    python test-invoice-async.py --count 5000 --concurrency 100 --latency-ms 20
+    python test-invoice-async.py --skip-benchmark
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from typing import List
+
+from example_loader import load_example
+from ecpay_mock_server import MockECPayInvoiceServer
+from http_transport import AsyncTransport, TransportConfig
+
+async_example = load_example('ecpay-invoice-async-example')
+AsyncECPayInvoiceService = async_example.AsyncECPayInvoiceService
+ECPayInvoiceService = async_example.ECPayInvoiceService
+InvoiceIssueData = async_example.InvoiceIssueData
+InvoiceVoidData = async_example.InvoiceVoidData
+InvoiceAllowanceData = async_example.InvoiceAllowanceData
+
+
+def make_invoice(relate_number: str, amount: int = 1050) -> InvoiceIssueData:
+    """建立 B2C 測試發票"""
+    return InvoiceIssueData(
+        merchant_id=ECPayInvoiceService.TEST_MERCHANT_ID,
+        relate_number=relate_number,
+        customer_identifier='0000000000',
+        customer_name='王小明',
+        customer_addr='台北市信義區',
+        customer_phone='0912345678',
+        customer_email='test@example.com',
+        sales_amount=amount,
+        total_amount=amount,
+        items=[
+            {'ItemName': '商品A', 'ItemCount': 1, 'ItemWord': '個',
+             'ItemPrice': amount, 'ItemTaxType': '1', 'ItemAmount': amount}
+        ]
+    )
+
+
+def make_service(server: MockECPayInvoiceServer, **kwargs) -> AsyncECPayInvoiceService:
+    """建立指向模擬伺服器的 client"""
+    return AsyncECPayInvoiceService(
+        merchant_id=ECPayInvoiceService.TEST_MERCHANT_ID,
+        hash_key=ECPayInvoiceService.TEST_HASH_KEY,
+        hash_iv=ECPayInvoiceService.TEST_HASH_IV,
+        base_url=server.url,
+        **kwargs
+    )
+
+
+async def test_operations(server: MockECPayInvoiceServer) -> List[str]:
+    """驗證開立、重複開立、查詢、折讓、作廢，回傳失敗項目"""
+    failures = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    async with make_service(server, max_concurrency=10) as service:
+        response = await service.issue_invoice(make_invoice('ASYNC-TEST-001'))
+        check('開立發票', response.success and len(response.invoice_number) == 10)
+
+        duplicate = await service.issue_invoice(make_invoice('ASYNC-TEST-001'))
+        check('重複 RelateNumber 回傳錯誤', not duplicate.success
+              and duplicate.rtn_code == MockECPayInvoiceServer.RTN_DUPLICATE_RELATE_NUMBER)
+
+        query = await service.query_invoice('ASYNC-TEST-001')
+        check('查詢發票', query.get('RtnCode') == 1 and query.get('IIS_Number') == response.invoice_number)
+
+        missing = await service.query_invoice('ASYNC-TEST-404')
+        check('查詢不存在的發票', missing.get('RtnCode') == MockECPayInvoiceServer.RTN_INVOICE_NOT_FOUND)
+
+        allowance = await service.issue_allowance(InvoiceAllowanceData(
+            merchant_id=ECPayInvoiceService.TEST_MERCHANT_ID,
+            invoice_no=response.invoice_number,
+            invoice_date=response.invoice_date,
+            customer_name='王小明',
+            allowance_amount=50,
+            items=[{'ItemName': '商品A', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': 50, 'ItemAmount': 50}]
+        ))
+        check('開立折讓', allowance.get('RtnCode') == 1 and allowance.get('IA_Remain_Allowance_Amt') == 1000)
+
+        void_data = InvoiceVoidData(
+            merchant_id=ECPayInvoiceService.TEST_MERCHANT_ID,
+            invoice_no=response.invoice_number,
+            invoice_date=response.invoice_date,
+            reason='訂單取消'
+        )
+        voided = await service.void_invoice(void_data)
+        check('作廢發票', voided.get('RtnCode') == 1)
+
+        voided_again = await service.void_invoice(void_data)
+        check('重複作廢回傳錯誤', voided_again.get('RtnCode') == MockECPayInvoiceServer.RTN_INVOICE_VOIDED)
+
+        server.reset_stats()
+        invoices = [make_invoice(f'ASYNC-BATCH-{i:04d}') for i in range(200)]
+        responses = await service.issue_many(invoices)
+        numbers = {r.invoice_number for r in responses if not isinstance(r, Exception) and r.success}
+        check('併發開立 200 張 (號碼不重複)', len(numbers) == 200)
+        check(f'連線重用 ({server.connections} 條連線 / {server.requests} 個請求)',
+              server.connections <= service.max_concurrency)
+
+        # 串流開立: generator 逐張取用，同時進行的請求數不超過 max_concurrency
+        pulled = 0
+
+        def generate(count: int):
+            nonlocal pulled
+            for i in range(count):
+                pulled += 1
+                yield make_invoice(f'ASYNC-STREAM-{i:04d}')
+
+        first_pulled = None
+        indexes = []
+        async for index, data, response in service.iter_issue(generate(300)):
+            if first_pulled is None:
+                first_pulled = pulled
+            if (not isinstance(response, Exception) and response.success
+                    and data.relate_number == f'ASYNC-STREAM-{index:04d}'):
+                indexes.append(index)
+        check(f'iter_issue 逐張取用 (第一筆完成時已取 {first_pulled} 張，上限 {service.max_concurrency})',
+              first_pulled <= service.max_concurrency and sorted(indexes) == list(range(300)))
+
+        ordered = await service.issue_many(make_invoice(f'ASYNC-ORDER-{i:04d}') for i in range(20))
+        check('issue_many 接受 generator，回應依輸入順序',
+              [r.invoice_number for r in ordered]
+              == [server.relate_numbers.get(f'ASYNC-ORDER-{i:04d}') for i in range(20)])
+
+    # 注入共用的 AsyncTransport: 兩個 client 共用同一個連線池
+    server.reset_stats()
+    async with AsyncTransport(TransportConfig(pool_maxsize=10)) as transport:
+        first = make_service(server, transport=transport)
+        second = make_service(server, transport=transport)
+        responses = await asyncio.gather(*(
+            (first if i % 2 else second).issue_invoice(make_invoice(f'ASYNC-SHARED-{i:04d}')) for i in range(100)))
+        check(f'共用 transport ({server.connections} 條連線 / {server.requests} 個請求)',
+              all(r.success for r in responses) and server.connections <= 10
+              and transport.pools() == (server.url.lower(),))
+
+    # 傳輸層錯誤與非 JSON 回應一律轉為 ConnectionError
+    class BrokenTransport:
+        def __init__(self, error: Exception = None):
+            self.error = error
+
+        async def post(self, url, **kwargs):
+            if self.error is not None:
+                raise self.error
+            return self
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            raise ValueError('Expecting value: line 1 column 1 (char 0)')
+
+    converted = []
+    for error in (None, asyncio.TimeoutError(), OSError('connection reset'), RuntimeError('bug')):
+        try:
+            await make_service(server, transport=BrokenTransport(error)).issue_invoice(make_invoice('ASYNC-BROKEN'))
+            converted.append(False)
+        except ConnectionError as e:
+            converted.append(e.__cause__ is not None)
+        except RuntimeError:
+            converted.append('bug')
+    check('逾時、連線錯誤、非 JSON 回應轉為 ConnectionError，程式錯誤不轉換',
+          converted == [True, True, True, 'bug'])
+
+    return failures
+
+
+async def benchmark(server: MockECPayInvoiceServer, count: int, concurrency: int, baseline_count: int):
+    """比較每次新建連線與共用連線池的吞吐量"""
+    prefix = f'BENCH-{int(time.time())}'
+
+    # 基準: 每張發票各自建立 session，等同原本每次 requests.post
+    server.reset_stats()
+    started = time.perf_counter()
+    for i in range(baseline_count):
+        async with make_service(server) as service:
+            await service.issue_invoice(make_invoice(f'{prefix}-B{i:06d}'))
+    baseline_elapsed = time.perf_counter() - started
+    baseline_connections = server.connections
+
+    # 共用連線池 + 併發
+    server.reset_stats()
+    invoices = [make_invoice(f'{prefix}-P{i:06d}') for i in range(count)]
+    async with make_service(server, max_concurrency=concurrency, max_connections=concurrency) as service:
+        started = time.perf_counter()
+        responses = await service.issue_many(invoices)
+        pooled_elapsed = time.perf_counter() - started
+    failed = sum(1 for r in responses if isinstance(r, Exception) or not r.success)
+
+    baseline_qps = baseline_count / baseline_elapsed if baseline_elapsed > 0 else 0.0
+    pooled_qps = count / pooled_elapsed if pooled_elapsed > 0 else 0.0
+
+    print(f"\n   {'模式':<22} {'張數':>7} {'連線數':>7} {'張/秒':>10}")
+    print(f"   {'每次新建連線 (循序)':<20} {baseline_count:>7} {baseline_connections:>7} {baseline_qps:>10.1f}")
+    print(f"   {f'連線池 (併發 {concurrency})':<20} {count:>7} {server.connections:>7} {pooled_qps:>10.1f}")
+    if baseline_qps:
+        print(f"\n   加速: {pooled_qps / baseline_qps:.1f}x，失敗: {failed} 張")
+
+    return failed
+
+
+async def run(args) -> int:
+    async with MockECPayInvoiceServer(latency=args.latency_ms / 1000) as server:
+        print("=" * 60)
+        print("ECPay asyncio 發票 client 測試")
+        print("=" * 60)
+        print(f"\n模擬伺服器: {server.url} (延遲 {args.latency_ms:g} ms)\n")
+
+        failures = await test_operations(server)
+
+        if not args.skip_benchmark:
+            print("\n吞吐量量測:")
+            failed = await benchmark(server, args.count, args.concurrency, args.baseline_count)
+            if failed:
+                failures.append('benchmark')
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ECPay asyncio 發票 client 測試')
+    parser.add_argument('--count', type=int, default=2000, help='併發開立張數 (預設: 2000)')
+    parser.add_argument('--concurrency', type=int, default=50, help='併發上限 (預設: 50)')
+    parser.add_argument('--baseline-count', type=int, default=200, help='基準 (每次新建連線) 張數 (預設: 200)')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='模擬伺服器延遲 (預設: 5 ms)')
+    parser.add_argument('--skip-benchmark', action='store_true', help='只執行功能測試')
+    args = parser.parse_args()
+
+    return asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+發票期別匯出測試 (invoice_export.py)
+
+驗證:
+- 期別代碼換算日期範圍 (Period.parse / start / end)
+- CSV 每個商品明細一列、JSONL 可讀回原本的資料、MIG XML 可解析且欄位正確 (F0401 / G0401)
+- 只匯出期別內的發票與折讓
+- gzip 輸出解壓後與未壓縮相同
+- 平行模式 (thread / process) 依日期分段後合併，結果與單一執行緒相同 (含 gzip 多 member 串接)
+- G0401 折讓的買方與稅額拆分依原發票 (B2B 拆出稅額、B2C 含稅不拆)
+- 由 invoice_outbox 的 SQLite 匯出已開立的發票 (平台回傳 'YYYY/MM/DD' 的開立日期亦依日期過濾)
+- 資料量放大 4 倍時記憶體峰值不隨之成長
+並量測各格式的匯出速度。
+
+使用方法:
+    python test-invoice-export.py
+"""
+
+import gzip
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterator, List
+
+from invoice_export import (
+    F0401_NAMESPACE, G0401_NAMESPACE, InvoiceAllowanceData, InvoiceIssueData, InvoiceIssueResponse,
+    IssuedAllowance, IssuedInvoice, JsonlSource, OutboxSource, Seller, export, export_parallel,
+    partition_days, read_records, record_to_dict,
+)
+from invoice_outbox import InvoiceOutbox
+from invoice_tracks import Period
+
+PERIOD = Period.parse('11302')
+SELLER = Seller('12345678', '範例股份有限公司')
+
+
+def make_records(count: int, seed: int = 1) -> Iterator:
+    """依日期排序的發票與折讓 (每 10 張發票一張折讓，頭尾各有一天在期別外)"""
+    rng = random.Random(seed)
+    start = datetime(2023, 12, 31, 9)
+    span = (PERIOD.end - date(2023, 12, 31)).days + 1
+    for n in range(count):
+        moment = start + timedelta(seconds=span * 86400 * n // count)
+        items = [{'ItemName': f'商品{i}', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': price,
+                  'ItemTaxType': '1', 'ItemAmount': price}
+                 for i, price in enumerate(rng.choices((50, 120, 399, 1050), k=rng.randint(1, 3)))]
+        sales = sum(item['ItemAmount'] for item in items)
+        b2b = n % 7 == 0
+        tax = round(sales * 0.05) if b2b else 0  # B2B 明細為未稅價
+        data = InvoiceIssueData(
+            merchant_id='2000132', relate_number=f'ORD{n:08d}',
+            customer_identifier='80129529' if b2b else '0000000000', customer_name='王小明',
+            customer_addr='', customer_phone='', customer_email='test@example.com',
+            sales_amount=sales, tax_amount=tax, total_amount=sales + tax,
+            carrier_type='' if b2b else '3', carrier_num='' if b2b else '/ABC1234',
+            items=items)
+        invoice_no = f'AB{n:08d}'
+        invoice = IssuedInvoice(data, InvoiceIssueResponse(
+            success=True, invoice_number=invoice_no, invoice_date=moment.strftime('%Y-%m-%d %H:%M:%S'),
+            random_number=f'{n % 10000:04d}', rtn_code=1))
+        yield invoice
+        if n % 10 == 9:
+            yield IssuedAllowance.of(
+                invoice, InvoiceAllowanceData(merchant_id='2000132', invoice_no=invoice_no,
+                                     invoice_date=moment.strftime('%Y-%m-%d'), customer_name='王小明',
+                                     allowance_amount=items[0]['ItemAmount'], items=items[:1]),
+                f'{moment:%Y%m%d}{n:08d}', moment.strftime('%Y-%m-%d %H:%M:%S'))
+
+
+def write_jsonl(path: Path, records) -> Path:
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record_to_dict(record), ensure_ascii=False) + '\n')
+    return path
+
+
+def test_period(check):
+    """期別"""
+    check('11302 → 2024-01-01 ~ 2024-03-01，11312 → 2024-11-01 ~ 2025-01-01',
+          PERIOD.start == date(2024, 1, 1) and PERIOD.end == date(2024, 3, 1)
+          and Period.parse('11312').end == date(2025, 1, 1) and Period.parse('11312').start == date(2024, 11, 1))
+    rejected = 0
+    for code in ('11301', '1132', 'abcde', '11314'):
+        try:
+            Period.parse(code)
+        except ValueError:
+            rejected += 1
+    check(f'期別代碼格式錯誤丟出 ValueError ({rejected}/4)', rejected == 4)
+    ranges = partition_days(PERIOD.start, PERIOD.end, 8)
+    check('partition_days 連續且涵蓋整個期別',
+          len(ranges) == 8 and ranges[0][0] == PERIOD.start and ranges[-1][1] == PERIOD.end
+          and all(a[1] == b[0] for a, b in zip(ranges, ranges[1:])))
+
+
+def test_formats(check, tmp: Path):
+    """三種格式"""
+    records = list(make_records(500))
+    inside = [record for record in records if PERIOD.start <= record.day < PERIOD.end]
+    invoices = [record for record in inside if isinstance(record, IssuedInvoice)]
+    allowances = [record for record in inside if isinstance(record, IssuedAllowance)]
+
+    result = export(records, tmp / 'out.csv', period=PERIOD)
+    with open(tmp / 'out.csv', encoding='utf-8') as f:
+        rows = f.read().splitlines()
+    check(f'CSV 每個明細一列 ({len(rows) - 1:,} 列)',
+          len(rows) - 1 == sum(len(record.data.items) for record in inside) and rows[0].startswith('kind,'))
+    check(f'只匯出期別內 ({result})',
+          result.invoices == len(invoices) and result.allowances == len(allowances)
+          and result.skipped == len(records) - len(inside) and result.skipped > 0)
+
+    export(records, tmp / 'out.jsonl', period=PERIOD)
+    check('JSONL 讀回與原本相同',
+          [record_to_dict(record) for record in read_records(tmp / 'out.jsonl')]
+          == [record_to_dict(record) for record in inside])
+
+    export(records, tmp / 'out.xml', period=PERIOD, seller=SELLER)
+    root = ET.parse(tmp / 'out.xml').getroot()
+    parsed_invoices = root.findall(f'{{{F0401_NAMESPACE}}}Invoice')
+    parsed_allowances = root.findall(f'{{{G0401_NAMESPACE}}}Allowance')
+    check(f'MIG XML 可解析 (F0401 {len(parsed_invoices)} 張，G0401 {len(parsed_allowances)} 張)',
+          len(parsed_invoices) == len(invoices) and len(parsed_allowances) == len(allowances))
+
+    ns = {'f': F0401_NAMESPACE, 'g': G0401_NAMESPACE}
+    first, element = invoices[0], parsed_invoices[0]
+    check('F0401 欄位 (號碼、日期、賣方、載具、明細、總計)',
+          element.findtext('f:Main/f:InvoiceNumber', namespaces=ns) == first.response.invoice_number
+          and element.findtext('f:Main/f:InvoiceDate', namespaces=ns) == first.day.strftime('%Y%m%d')
+          and element.findtext('f:Main/f:Seller/f:Identifier', namespaces=ns) == '12345678'
+          and element.findtext('f:Main/f:CarrierType', namespaces=ns) == '3J0002'
+          and len(element.findall('f:Details/f:ProductItem', namespaces=ns)) == len(first.data.items)
+          and element.findtext('f:Amount/f:TotalAmount', namespaces=ns) == str(first.data.total_amount))
+    allowance = parsed_allowances[0]
+    check('G0401 稅額 + 未稅金額 = 折讓金額',
+          int(allowance.findtext('g:Amount/g:TaxAmount', namespaces=ns))
+          + int(allowance.findtext('g:Amount/g:TotalAmount', namespaces=ns)) == allowances[0].data.allowance_amount
+          and allowance.findtext('g:Details/g:ProductItem/g:OriginalInvoiceNumber', namespaces=ns)
+          == allowances[0].data.invoice_no)
+
+    by_type = {}
+    for record, element in zip(allowances, parsed_allowances):
+        by_type.setdefault(record.invoice_type, (record, element))
+    b2b, b2b_element = by_type['B2B']
+    b2c, b2c_element = by_type['B2C']
+    check('G0401 B2B 折讓: 買方為原發票統編、拆出稅額',
+          b2b_element.findtext('g:Main/g:Buyer/g:Identifier', namespaces=ns) == '80129529'
+          and int(b2b_element.findtext('g:Amount/g:TaxAmount', namespaces=ns)) > 0)
+    check('G0401 B2C 折讓: 買方 0000000000、含稅金額不拆稅額',
+          b2c_element.findtext('g:Main/g:Buyer/g:Identifier', namespaces=ns) == '0000000000'
+          and b2c_element.findtext('g:Amount/g:TaxAmount', namespaces=ns) == '0'
+          and b2c_element.findtext('g:Amount/g:TotalAmount', namespaces=ns) == str(b2c.data.allowance_amount))
+
+    same = True
+    for name in ('out.csv', 'out.jsonl', 'out.xml'):
+        export(records, tmp / f'{name}.gz', period=PERIOD, seller=SELLER)
+        with gzip.open(tmp / f'{name}.gz', 'rb') as f:
+            same = same and f.read() == (tmp / name).read_bytes()
+    check('gzip 輸出解壓後與未壓縮相同', same)
+
+
+def test_parallel(check, tmp: Path):
+    """平行匯出"""
+    source = JsonlSource([write_jsonl(tmp / 'source.jsonl', make_records(2000))])
+    for name in ('par.csv', 'par.jsonl', 'par.xml'):
+        export(read_records(tmp / 'source.jsonl'), tmp / f'seq-{name}', period=PERIOD, seller=SELLER)
+
+    for executor in ('thread', 'process'):
+        same = True
+        for name in ('par.csv', 'par.jsonl', 'par.xml.gz'):
+            output = tmp / f'{executor}-{name}'
+            result = export_parallel(source, output, period=PERIOD, seller=SELLER, workers=2, partitions=7,
+                                     executor=executor)
+            expected = (tmp / f"seq-{name.replace('.gz', '')}").read_bytes()
+            actual = gzip.open(output).read() if name.endswith('.gz') else output.read_bytes()
+            same = same and actual == expected
+        check(f'{executor} 平行匯出與單一執行緒相同 (CSV / JSONL / MIG gzip，{result.invoices:,} 張)', same)
+    check('暫存分割檔已清除', not any(path.name.startswith('invoice-export-') for path in tmp.iterdir()))
+
+
+def test_outbox(check, tmp: Path):
+    """由 outbox 匯出"""
+    outbox = InvoiceOutbox(tmp / 'outbox.db')
+    records = [record for record in make_records(60) if isinstance(record, IssuedInvoice)]
+    outbox.enqueue_many(record.data for record in records)
+    for entry in outbox.next_batch('2000132', limit=len(records)):
+        n = int(entry.relate_number[3:])
+        response = records[n].response
+        # 平台也可能回傳 'YYYY/MM/DD HH:MM:SS'
+        invoice_date = response.invoice_date.replace('-', '/') if n % 2 else response.invoice_date
+        outbox.mark_issued(entry, response.invoice_number, invoice_date, response.random_number)
+    outbox.close()
+
+    result = export_parallel(OutboxSource(tmp / 'outbox.db'), tmp / 'outbox.jsonl', period=PERIOD, workers=2)
+    exported = list(read_records(tmp / 'outbox.jsonl'))
+    expected = [record for record in records if PERIOD.start <= record.day < PERIOD.end]
+    check(f"由 outbox 匯出已開立的發票 ({result.invoices} 張，含 'YYYY/MM/DD' 日期)",
+          [record.response.invoice_number for record in exported]
+          == [record.response.invoice_number for record in expected]
+          and exported[0].data.items == expected[0].data.items)
+
+
+def peak_memory(tmp: Path, count: int) -> int:
+    tracemalloc.start()
+    export(make_records(count), tmp / 'memory.xml.gz', period=PERIOD, seller=SELLER)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def test_memory(check, tmp: Path):
+    """記憶體"""
+    small, large = peak_memory(tmp, 2000), peak_memory(tmp, 8000)
+    check(f'記憶體峰值 2,000 筆 {small / 1024:.0f} KB、8,000 筆 {large / 1024:.0f} KB', large < small * 1.5)
+
+
+def benchmark(tmp: Path):
+    """匯出速度"""
+    print("\n[效能] 匯出 20,000 張發票 (含折讓)")
+    records = list(make_records(20_000))
+    for name in ('bench.csv', 'bench.jsonl', 'bench.xml', 'bench.xml.gz'):
+        started = time.perf_counter()
+        result = export(records, tmp / name, seller=SELLER)
+        elapsed = time.perf_counter() - started
+        print(f"   {name:<14} {elapsed:.2f} 秒 ({(result.invoices + result.allowances) / elapsed:,.0f} 張/秒，"
+              f"{(tmp / name).stat().st_size / 1024 / 1024:.1f} MB)")
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("發票期別匯出測試")
+    print("=" * 60 + "\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        test_period(check)
+        test_formats(check, tmp)
+        test_parallel(check, tmp)
+        test_outbox(check, tmp)
+        test_memory(check, tmp)
+        benchmark(tmp)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+商品明細彙總測試 (invoice_items.py)
+
+驗證:
+- 尾差以最大餘數法分配，結果固定 (餘數相同時前面的品項優先)
+- 隨機購物車 (1 ~ 300 筆、小數單價 / 數量、混合課稅)，B2C / B2B、含稅 / 未稅單價:
+  明細合計與 SalesAmount / TaxAmount / TotalAmount 相符，且通過 ECPay 金額規則檢查
+- 單一品項的 B2B 稅額與 tax_calculator 相同
+- validate_ecpay 發現竄改的金額 (10000016)
+- stream() 逐筆處理訂單，單筆錯誤不中斷
+- 處理時間與明細筆數成線性
+
+使用方法:
+    python test-invoice-items.py
+"""
+
+import random
+import sys
+import time
+from decimal import Decimal
+from typing import List
+
+from invoice_items import (
+    EXEMPT, TAXABLE, ZERO_RATED, ItemAggregator, LineItem, allocate_largest_remainder, validate_ecpay,
+)
+from tax_calculator import calculate_b2b_amounts
+
+AGGREGATOR = ItemAggregator()
+
+
+def random_cart(rng: random.Random, lines: int, mixed: bool) -> List[LineItem]:
+    cart = []
+    for i in range(lines):
+        price = Decimal(rng.randrange(1, 500000)) / (100 if rng.random() < 0.5 else 1)
+        count = rng.randrange(1, 20) if rng.random() < 0.8 else Decimal(rng.randrange(1, 1000)) / 10
+        tax_type = rng.choice((TAXABLE, TAXABLE, ZERO_RATED, EXEMPT)) if mixed else TAXABLE
+        cart.append(LineItem(f'商品{i}', count, price, tax_type=tax_type))
+    return cart
+
+
+def test_allocation(check):
+    """最大餘數法"""
+    check('餘數相同時前面的品項優先 (4 × 10.5 = 42 → 11, 11, 10, 10)',
+          allocate_largest_remainder([105] * 4, 10, 42) == [11, 11, 10, 10])
+    check('餘數大者優先 (0.2 / 0.7 / 0.1，合計 1 → 0, 1, 0)',
+          allocate_largest_remainder([2, 7, 1], 10, 1) == [0, 1, 0])
+
+    amounts = AGGREGATOR.aggregate([LineItem('A', 3, Decimal('33.3')), LineItem('B', 7, Decimal('14.29'))])
+    check(f'99.9 + 100.03 = 199.93 → 200 ({[item.amount for item in amounts.items]})',
+          [item.amount for item in amounts.items] == [100, 100] and amounts.total_amount == 200)
+
+    single = AGGREGATOR.aggregate([LineItem('商品', 1, 1050)], b2b=True)
+    expected = calculate_b2b_amounts(1050)
+    check('單一品項 B2B 金額與 tax_calculator 相同 (1050 → 1000 + 50)',
+          (single.sales_amount, single.tax_amount, single.total_amount)
+          == (expected['sales_amount'], expected['tax_amount'], expected['total_amount'])
+          and single.items[0].tax == 50 and single.tax_type == TAXABLE)
+
+    cart = random_cart(random.Random(7), 50, mixed=True)
+    check('相同輸入結果相同', AGGREGATOR.aggregate(cart, b2b=True) == AGGREGATOR.aggregate(list(cart), b2b=True))
+
+
+def test_properties(check, carts: int = 300):
+    """隨機購物車"""
+    rng = random.Random(20240501)
+    net_prices = ItemAggregator(prices_include_tax=False)
+    failures = []
+    for n in range(carts):
+        cart = random_cart(rng, rng.randrange(1, 301), mixed=n % 2 == 0)
+        for aggregator, b2b in ((AGGREGATOR, False), (AGGREGATOR, True), (net_prices, True)):
+            amounts = aggregator.aggregate(cart, b2b=b2b)
+            payload = amounts.to_ecpay()
+            errors = validate_ecpay(payload, b2b)
+            balanced = (amounts.sales_amount + amounts.zero_tax_sales_amount + amounts.free_tax_sales_amount
+                        + amounts.tax_amount == amounts.total_amount
+                        and sum(item.amount + item.tax for item in amounts.items) == amounts.total_amount
+                        and sum(item.tax for item in amounts.items) == amounts.tax_amount)
+            if errors or not balanced:
+                failures.append((n, b2b, errors[:2]))
+    check(f'{carts} 個隨機購物車 × (B2C、B2B 含稅單價、B2B 未稅單價) 金額相符且通過 ECPay 規則檢查 {failures[:1]}',
+          not failures)
+
+    mixed = AGGREGATOR.aggregate([LineItem('A', 1, 1050), LineItem('B', 2, 100, tax_type=ZERO_RATED),
+                                  LineItem('C', 1, 300, tax_type=EXEMPT)], b2b=True)
+    payload = mixed.to_ecpay()
+    check(f"混合課稅只有應稅部分計算稅額 (SalesAmount {payload['SalesAmount']}，TaxAmount {payload['TaxAmount']}，"
+          f"ZeroTax {payload['ZeroTaxSalesAmount']}，FreeTax {payload['FreeTaxSalesAmount']})",
+          payload['TaxType'] == '9' and (payload['SalesAmount'], payload['TaxAmount'], payload['ZeroTaxSalesAmount'],
+                                         payload['FreeTaxSalesAmount'], payload['TotalAmount'])
+          == (1000, 50, 200, 300, 1550))
+
+
+def test_validation(check):
+    """ECPay 金額規則"""
+    payload = AGGREGATOR.aggregate(random_cart(random.Random(3), 20, mixed=False), b2b=True).to_ecpay()
+    payload['Items'][0]['ItemAmount'] += 1
+    errors = validate_ecpay(payload, b2b=True)
+    check(f'ItemAmount 竄改 1 元即發現 ({len(errors)} 項)',
+          errors and all(e.startswith('10000016') for e in errors))
+
+    payload = AGGREGATOR.aggregate([LineItem('A', 1, 100), LineItem('B', 1, 100, tax_type=EXEMPT)]).to_ecpay()
+    del payload['Items'][1]['ItemTaxType']
+    check('混合課稅缺少 ItemTaxType', any('ItemTaxType' in e for e in validate_ecpay(payload, b2b=False)))
+
+    rejected = 0
+    for items in ([], [LineItem('A', 1, -5)], [LineItem('A', 'abc', 5)], [LineItem('A', 1, 5, tax_type='4')]):
+        try:
+            AGGREGATOR.aggregate(items)
+        except ValueError:
+            rejected += 1
+    check(f'空明細、負數、非數字、不支援的課稅別丟出 ValueError ({rejected}/4)', rejected == 4)
+
+
+def test_stream(check):
+    """串流處理訂單"""
+    orders = [
+        {'relate_number': 'A1', 'items': '[{"ItemName": "商品", "ItemCount": 2, "ItemPrice": 525}]',
+         'total_amount': '1050', 'customer_identifier': '12345678'},
+        {'relate_number': 'A2', 'items': [{'name': '商品', 'count': 1, 'price': 'x'}]},
+        {'relate_number': 'A3', 'items': [{'ItemName': '商品', 'ItemCount': 1, 'ItemPrice': 99}], 'total_amount': 100},
+        {'relate_number': 'A4', 'items': [{'ItemName': '商品', 'ItemCount': 3, 'ItemPrice': 33.3}]},
+    ]
+    results = list(AGGREGATOR.stream(iter(orders)))
+    check(f"stream() 單筆錯誤不中斷 ({[r.error[:12] or 'OK' for r in results]})",
+          len(results) == 4 and results[0].amounts.tax_amount == 50 and results[0].amounts.b2b
+          and results[1].error and '不符' in results[2].error and results[3].amounts.total_amount == 100)
+
+
+def test_linear(check):
+    """線性時間"""
+    rng = random.Random(11)
+    timings = []
+    for lines in (10_000, 100_000):
+        cart = random_cart(rng, lines, mixed=True)
+        started = time.perf_counter()
+        amounts = AGGREGATOR.aggregate(cart, b2b=True)
+        timings.append(time.perf_counter() - started)
+        assert amounts.total_amount > 0
+    ratio = timings[1] / timings[0]
+    print(f"\n   10,000 筆 {timings[0] * 1000:.0f} ms，100,000 筆 {timings[1] * 1000:.0f} ms "
+          f"({100_000 / timings[1]:,.0f} 筆/秒)")
+    check(f'明細筆數 ×10，處理時間 ×{ratio:.1f}', ratio < 20)
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("商品明細彙總測試")
+    print("=" * 60 + "\n")
+
+    test_allocation(check)
+    test_properties(check)
+    test_validation(check)
+    test_stream(check)
+    test_linear(check)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+發票 outbox 測試 (invoice_outbox.py)
+
+驗證:
+- 寫入後重新開啟資料庫仍在 (不需 uploader 在線)，重複寫入同一 RelateNumber 回傳既有 id
+- 送出前規則檢查未通過的發票不寫入
+- 同一商店依寫入順序送出 (前一張重試中時後面的發票等待)，不同商店併發
+- 可重試錯誤 (逾時、連線失敗) 以退避重試，不可重試錯誤標記為 rejected，超過重試次數標記為 failed
+- 未設定服務的商店其發票標記為 rejected，drain() 不會卡住
+- 送出中當機後重送回傳 10000006 時查詢補記為 issued
+- 佇列指標 (各狀態筆數、最舊待送秒數、速率) 與 Prometheus 輸出
+- 透過模擬伺服器以 AsyncECPayInvoiceService 完整送出
+並量測結帳寫入延遲。
+
+使用方法:
+    python test-invoice-outbox.py
+"""
+
+import asyncio
+import logging
+import logging.handlers
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from ecpay_mock_server import MockECPayInvoiceServer
+from example_loader import load_example
+from error_handler import InvoiceErrorHandler
+from error_registry import ErrorCategory
+from invoice_outbox import (
+    FAILED, ISSUED, NO_SERVICE_ERROR, PENDING, REJECTED, InvoiceOutbox, OutboxUploader,
+)
+
+async_example = load_example('ecpay-invoice-async-example')
+InvoiceIssueData = async_example.InvoiceIssueData
+InvoiceIssueResponse = async_example.InvoiceIssueResponse
+ECPayInvoiceService = async_example.ECPayInvoiceService
+
+MERCHANT_ID = ECPayInvoiceService.TEST_MERCHANT_ID
+
+
+def invoice(relate_number: str, merchant_id: str = MERCHANT_ID, amount: int = 100, **fields) -> InvoiceIssueData:
+    return InvoiceIssueData(**fields,
+        merchant_id=merchant_id, relate_number=relate_number, customer_identifier='0000000000',
+        customer_name='王小明', customer_addr='', customer_phone='', customer_email='test@example.com',
+        sales_amount=amount, total_amount=amount,
+        items=[{'ItemName': '商品', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': amount,
+                'ItemTaxType': '1', 'ItemAmount': amount}])
+
+
+class FakeService:
+    """
+    依 RelateNumber 預先排定回應的服務
+
+    script[relate_number] 依序為每次送出的結果: 'ok'、ECPay RtnCode (int) 或例外；用完後一律 'ok'。
+    """
+
+    def __init__(self, script: Dict[str, list] = None, latency: float = 0.0):
+        self.script = {key: list(value) for key, value in (script or {}).items()}
+        self.latency = latency
+        self.calls: List[str] = []
+        self.issued: Dict[str, str] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def issue_invoice(self, data) -> InvoiceIssueResponse:
+        self.calls.append(data.relate_number)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+
+        steps = self.script.get(data.relate_number)
+        outcome = steps.pop(0) if steps else 'ok'
+        if isinstance(outcome, Exception):
+            raise outcome
+        if outcome == 'ok':
+            number = self.issued.setdefault(data.relate_number, f'AB{len(self.issued):08d}')
+            return InvoiceIssueResponse(success=True, invoice_number=number, invoice_date='2024-01-15 10:00:00',
+                                        random_number='1234', rtn_code=1)
+        return InvoiceIssueResponse(success=False, rtn_code=outcome, rtn_msg=f'錯誤 {outcome}')
+
+    async def query_invoice(self, relate_number: str) -> Dict:
+        if relate_number not in self.issued:
+            return {'RtnCode': 2000042, 'RtnMsg': '查無資料'}
+        return {'RtnCode': 1, 'IIS_Number': self.issued[relate_number],
+                'IIS_Create_Date': '2024-01-15 10:00:00', 'IIS_Random_Number': '1234'}
+
+
+def uploader(outbox: InvoiceOutbox, services, **options) -> OutboxUploader:
+    options.setdefault('backoff_factor', 0.01)
+    options.setdefault('poll_interval', 0.01)
+    return OutboxUploader(outbox, services, **options)
+
+
+def test_enqueue(check, tmp: Path):
+    """寫入與持久化"""
+    path = tmp / 'enqueue.db'
+    outbox = InvoiceOutbox(path)
+    first = outbox.enqueue(invoice('ORD001'))
+    ids = outbox.enqueue_many([invoice('ORD002'), invoice('ORD003')])
+    again = outbox.enqueue(invoice('ORD001'))
+    check('重複寫入同一 RelateNumber 回傳既有 id', again == first and len(set([first, *ids])) == 3)
+
+    try:
+        outbox.enqueue(invoice('ORD004', carrier_type='3', carrier_num='bad'))
+        check('送出前規則檢查未通過丟出 ValueError', False)
+    except ValueError:
+        check('送出前規則檢查未通過丟出 ValueError', True)
+
+    try:
+        outbox.enqueue_many([invoice('ORD005'), invoice('ORD006', carrier_type='3', carrier_num='bad')])
+    except ValueError:
+        pass
+    check('enqueue_many 任一張未通過時整批不寫入', outbox.get(MERCHANT_ID, 'ORD005') is None)
+    outbox.close()
+
+    reopened = InvoiceOutbox(path)
+    entries = reopened.next_batch(MERCHANT_ID)
+    check('重新開啟後佇列仍在且依寫入順序',
+          [entry.relate_number for entry in entries] == ['ORD001', 'ORD002', 'ORD003'])
+    restored = reopened.invoice(entries[0])
+    check('payload 還原為 InvoiceIssueData', isinstance(restored, InvoiceIssueData)
+          and restored.items[0]['ItemName'] == '商品')
+    reopened.close()
+
+
+def test_ordering(check, tmp: Path):
+    """同商店依序，跨商店併發"""
+    outbox = InvoiceOutbox(tmp / 'ordering.db')
+    merchants = [f'300{index:04d}' for index in range(4)]
+    for number in range(5):
+        outbox.enqueue_many([invoice(f'ORD{number:03d}', merchant) for merchant in merchants])
+
+    services = {merchant: FakeService(latency=0.01) for merchant in merchants}
+    # 第一張逾時一次: 後面的發票必須等它重試成功
+    services[merchants[0]].script['ORD000'] = [TimeoutError('逾時')]
+    result = asyncio.run(uploader(outbox, services, workers=4).drain())
+
+    def numbers(merchant):
+        return [outbox.get(merchant, f'ORD{n:03d}')['invoice_no'] for n in range(5)]
+
+    check('同商店依寫入順序開立 (重試的發票沒有被越過)',
+          all(numbers(merchant) == sorted(numbers(merchant)) for merchant in merchants)
+          and services[merchants[0]].calls == ['ORD000'] + [f'ORD{n:03d}' for n in range(5)])
+    check('同商店同時最多 1 張在途', all(service.max_in_flight == 1 for service in services.values()))
+    check(f'全部開立 (issued {result.issued}，重試 {result.retries})',
+          result.issued == 20 and result.retries == 1 and outbox.stats().depth == 0)
+
+    started = time.perf_counter()
+    asyncio.run(uploader(outbox, services, workers=4).drain())
+    check('佇列清空後 drain 立即結束', time.perf_counter() - started < 1)
+    outbox.close()
+
+
+def test_concurrency(check, tmp: Path):
+    """workers 限制同時處理的商店數"""
+    outbox = InvoiceOutbox(tmp / 'concurrency.db')
+    shared = FakeService(latency=0.02)
+    for index in range(8):
+        outbox.enqueue(invoice('ORD001', f'400{index:04d}'))
+
+    started = time.perf_counter()
+    asyncio.run(uploader(outbox, lambda merchant_id: shared, workers=4).drain())
+    elapsed = time.perf_counter() - started
+    check(f'8 個商店、workers=4: 同時在途 {shared.max_in_flight} 張，耗時 {elapsed * 1000:.0f} ms',
+          shared.max_in_flight == 4 and len(shared.calls) == 8)
+    outbox.close()
+
+
+def test_errors(check, tmp: Path):
+    """錯誤分類"""
+    outbox = InvoiceOutbox(tmp / 'errors.db')
+    outbox.enqueue_many([invoice(name) for name in ('RETRY', 'REJECT', 'GIVEUP', 'AFTER')])
+    service = FakeService({
+        'RETRY': [ConnectionError('連線中斷')],
+        'REJECT': [10000016],
+        'GIVEUP': [TimeoutError('逾時')] * 3,
+    })
+    result = asyncio.run(uploader(outbox, {MERCHANT_ID: service}, max_retries=2).drain())
+
+    def status(name):
+        return outbox.get(MERCHANT_ID, name)
+
+    check('連線失敗重試後開立', status('RETRY')['status'] == ISSUED and status('RETRY')['attempts'] == 2)
+    check('10000016 不重試，標記為 rejected',
+          status('REJECT')['status'] == REJECTED and status('REJECT')['rtn_code'] == '10000016'
+          and service.calls.count('REJECT') == 1)
+    check('逾時超過 max_retries 標記為 failed',
+          status('GIVEUP')['status'] == FAILED and status('GIVEUP')['rtn_code'] == 'TIMEOUT_ERROR'
+          and service.calls.count('GIVEUP') == 3)
+    check('rejected / failed 不阻擋後面的發票', status('AFTER')['status'] == ISSUED)
+    check(f'統計: {result}', result.issued == 2 and result.rejected == 1 and result.failed == 1
+          and result.errors.get('TIMEOUT_ERROR') == 3)
+
+    check('requeue() 將 failed 重新排入佇列', outbox.requeue() == 1 and status('GIVEUP')['status'] == PENDING)
+    outbox.close()
+
+    outbox = InvoiceOutbox(tmp / 'no-service.db')
+    outbox.enqueue_many([invoice('ORD001'), invoice('ORD001', '9999999'), invoice('ORD002', '9999999')])
+    logs = logging.handlers.BufferingHandler(capacity=100)
+    logger = logging.getLogger('test-invoice-outbox.no-service')
+    logger.addHandler(logs)
+    logger.propagate = False
+    handler = InvoiceErrorHandler(logger=logger)
+    try:
+        result = asyncio.run(asyncio.wait_for(
+            uploader(outbox, {MERCHANT_ID: FakeService()}, handler=handler).drain(), 5))
+    except asyncio.TimeoutError:
+        result = None
+    check('未設定服務的商店: 發票標記為 rejected，drain() 仍會結束',
+          result is not None and result.issued == 1 and result.rejected == 2
+          and outbox.get('9999999', 'ORD002')['status'] == REJECTED
+          and outbox.get('9999999', 'ORD002')['rtn_code'] == 'NO_SERVICE')
+    check('NO_SERVICE 由 outbox 定義 (不在共用錯誤碼表)，日誌帶有 requeue 建議',
+          handler.get_error_info('NO_SERVICE').category == ErrorCategory.UNKNOWN
+          and sum(NO_SERVICE_ERROR.suggestion in record.getMessage() for record in logs.buffer) == 2)
+    outbox.close()
+
+
+def test_crash_recovery(check, tmp: Path):
+    """送出後未寫回結果即當機"""
+    outbox = InvoiceOutbox(tmp / 'crash.db')
+    outbox.enqueue(invoice('ORD001'))
+    service = FakeService()
+    # 模擬: 上一個行程已開立 ORD001，但結果未寫回資料庫
+    service.issued['ORD001'] = 'AB99999999'
+    service.script['ORD001'] = [10000006]
+    result = asyncio.run(uploader(outbox, {MERCHANT_ID: service}).drain())
+    entry = outbox.get(MERCHANT_ID, 'ORD001')
+    check('重送回傳 10000006 時查詢補記為 issued',
+          entry['status'] == ISSUED and entry['invoice_no'] == 'AB99999999' and result.recovered == 1)
+    outbox.close()
+
+
+def test_stop(check, tmp: Path):
+    """背景執行與停止"""
+    outbox = InvoiceOutbox(tmp / 'stop.db')
+
+    async def scenario():
+        stop = asyncio.Event()
+        service = FakeService()
+        task = asyncio.create_task(uploader(outbox, {MERCHANT_ID: service}).run(stop))
+        await asyncio.sleep(0.05)
+        outbox.enqueue(invoice('LATE'))  # uploader 執行中寫入
+        for _ in range(100):
+            if outbox.stats().depth == 0:
+                break
+            await asyncio.sleep(0.01)
+        stop.set()
+        await asyncio.wait_for(task, timeout=1)
+        return service
+
+    service = asyncio.run(scenario())
+    check('uploader 執行中寫入的發票被送出，stop 後結束', service.calls == ['LATE'])
+    outbox.close()
+
+
+def test_metrics(check, tmp: Path):
+    """佇列指標"""
+    outbox = InvoiceOutbox(tmp / 'metrics.db')
+    outbox.enqueue_many([invoice(f'ORD{n:03d}') for n in range(3)] + [invoice('ORD000', '5000001')])
+    time.sleep(0.02)
+    stats = outbox.stats()
+    check(f'待送 {stats.depth} 張，最舊 {stats.oldest_pending_age * 1000:.0f} ms',
+          stats.depth == 4 and stats.pending_by_merchant == {MERCHANT_ID: 3, '5000001': 1}
+          and stats.oldest_pending_age > 0 and stats.enqueue_rate > 0 and stats.drain_rate == 0)
+
+    asyncio.run(uploader(outbox, lambda merchant_id: FakeService()).drain())
+    stats = outbox.stats()
+    text = stats.prometheus_text()
+    check(f'送出後: {stats}', stats.depth == 0 and stats.counts[ISSUED] == 4 and stats.drain_rate > 0
+          and stats.oldest_pending_age == 0)
+    check('Prometheus 輸出', 'invoice_outbox_entries{status="issued"} 4' in text
+          and 'invoice_outbox_drain_rate' in text)
+    outbox.close()
+
+
+async def test_mock_server(check, tmp: Path):
+    """模擬伺服器完整送出"""
+    outbox = InvoiceOutbox(tmp / 'server.db')
+    outbox.enqueue_many([invoice(f'SRV{n:03d}') for n in range(10)])
+    async with MockECPayInvoiceServer() as server:
+        service = async_example.AsyncECPayInvoiceService(
+            merchant_id=MERCHANT_ID,
+            hash_key=ECPayInvoiceService.TEST_HASH_KEY,
+            hash_iv=ECPayInvoiceService.TEST_HASH_IV,
+            base_url=server.url,
+        )
+        try:
+            result = await uploader(outbox, {MERCHANT_ID: service}).drain()
+        finally:
+            await service.close()
+        numbers = [outbox.get(MERCHANT_ID, f'SRV{n:03d}')['invoice_no'] for n in range(10)]
+        check(f'模擬伺服器開立 {result.issued} 張，號碼依序',
+              result.issued == 10 and len(server.invoices) == 10 and numbers == sorted(numbers) and all(numbers))
+    outbox.close()
+
+
+def benchmark(tmp: Path):
+    """結帳寫入延遲"""
+    print("\n[效能] 結帳寫入延遲 (每次寫入一張並提交)")
+    for synchronous in ('FULL', 'NORMAL'):
+        outbox = InvoiceOutbox(tmp / f'bench-{synchronous}.db', synchronous=synchronous)
+        latencies = []
+        for n in range(500):
+            data = invoice(f'B{n:05d}')
+            started = time.perf_counter()
+            outbox.enqueue(data)
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        print(f"   synchronous={synchronous:<6} p50 {latencies[len(latencies) // 2] * 1000:.3f} ms，"
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f} ms")
+        outbox.close()
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("發票 outbox 測試")
+    print("=" * 60 + "\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        test_enqueue(check, tmp)
+        test_ordering(check, tmp)
+        test_concurrency(check, tmp)
+        test_errors(check, tmp)
+        test_crash_recovery(check, tmp)
+        test_stop(check, tmp)
+        test_metrics(check, tmp)
+        asyncio.run(test_mock_server(check, tmp))
+        benchmark(tmp)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+發票字軌配號測試 (invoice_tracks.py)
+
+驗證:
+- 期別換算 (民國年 + 雙月期) 與字軌區間格式檢查
+- 依字軌順序跨區間配號，號碼用完時丟出 TrackExhaustedError (allocate_many 不會只配發一部分)
+- 多執行緒同時配號不重複
+- 當機 (未 close) 後重新啟動不會重複配號，最多跳過 block_size 個號碼；正常 close 後不跳號
+- 同一狀態檔不能同時由兩個配號器使用
+- RandomNumber 為 4 碼數字
+並量測配號吞吐量。
+
+使用方法:
+    python test-invoice-tracks.py
+"""
+
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import List
+
+from invoice_tracks import (
+    HAS_FCNTL, InvoiceNumberAllocator, Period, TrackExhaustedError, TrackRange, load_ranges,
+)
+
+DAY = date(2024, 1, 15)
+PERIOD = Period(113, 1)
+
+
+def ranges(*specs) -> List[TrackRange]:
+    return [TrackRange(PERIOD, header, start, end) for header, start, end in specs]
+
+
+def test_periods(check, tmp: Path):
+    """期別與字軌區間"""
+    check('2024-01-15 → 113 年 01-02 月 (11302)，2024-12-31 → 11312',
+          Period.of(DAY) == PERIOD and PERIOD.code == '11302' and Period.of(date(2024, 12, 31)).code == '11312'
+          and str(PERIOD) == '113 年 01-02 月')
+
+    rejected = 0
+    for spec in (('ab', 0, 49), ('AB', 0, 48), ('AB', 10, 59), ('AB', 50, 0), ('A1', 0, 49)):
+        try:
+            TrackRange(PERIOD, *spec)
+        except ValueError:
+            rejected += 1
+    check(f'字軌小寫、非 50 號為單位、起訖顛倒丟出 ValueError ({rejected}/5)', rejected == 5)
+
+    try:
+        InvoiceNumberAllocator(tmp / 'overlap.json', ranges(('AB', 0, 99), ('AB', 50, 149)))
+        check('重疊的字軌區間丟出 ValueError', False)
+    except ValueError:
+        check('重疊的字軌區間丟出 ValueError', True)
+
+
+def test_allocation(check, tmp: Path):
+    """配號"""
+    tracks = tmp / 'tracks.csv'
+    tracks.write_text('InvoiceYear,InvoiceTerm,InvoiceHeader,InvoiceStart,InvoiceEnd\n'
+                      '113,1,CD,00000000,00000049\n113,1,AB,00000100,00000149\n113,1,AB,00000000,00000049\n',
+                      encoding='utf-8')
+    with InvoiceNumberAllocator(tmp / 'state.json', load_ranges(tracks)) as allocator:
+        numbers = [n.invoice_no for n in allocator.allocate_many(150, DAY)]
+        check(f'依字軌與起號順序跨區間配號 ({numbers[0]}, {numbers[49]}, {numbers[50]}, {numbers[100]}, {numbers[-1]})',
+              numbers[:2] == ['AB00000000', 'AB00000001'] and numbers[50] == 'AB00000100'
+              and numbers[100] == 'CD00000000' and numbers[-1] == 'CD00000049' and len(set(numbers)) == 150)
+        try:
+            allocator.allocate(DAY)
+            check('號碼用完時丟出 TrackExhaustedError', False)
+        except TrackExhaustedError as e:
+            check(f'號碼用完時丟出 TrackExhaustedError ({e})', allocator.usage(PERIOD).remaining == 0)
+        try:
+            allocator.allocate(date(2024, 3, 1))
+            check('沒有字軌的期別丟出 ValueError', False)
+        except ValueError:
+            check('沒有字軌的期別丟出 ValueError', True)
+
+    with InvoiceNumberAllocator(tmp / 'partial.json', ranges(('AB', 0, 49))) as allocator:
+        allocator.allocate_many(40, DAY)
+        try:
+            allocator.allocate_many(20, DAY)
+            exhausted = False
+        except TrackExhaustedError:
+            exhausted = True
+        check('allocate_many 剩餘不足時不配發任何號碼',
+              exhausted and allocator.usage(PERIOD).allocated == 40)
+        rejected = 0
+        for count in (0, -5, 2.0):
+            try:
+                allocator.allocate_many(count, DAY)
+            except ValueError:
+                rejected += 1
+        check(f'allocate_many 的 count 非正整數丟出 ValueError，不倒退序號 ({rejected}/3)',
+              rejected == 3 and allocator.usage(PERIOD).allocated == 40
+              and allocator.allocate(DAY).invoice_no == 'AB00000040')
+        number = allocator.allocate(DAY)
+        check(f'RandomNumber 為 4 碼數字 ({number.as_payload()})',
+              len(number.random_number) == 4 and number.random_number.isdigit())
+
+
+def test_threads(check, tmp: Path, threads: int = 8, per_thread: int = 5000):
+    """多執行緒"""
+    with InvoiceNumberAllocator(tmp / 'threads.json', ranges(('AB', 0, 99999)), block_size=500,
+                                fsync=False) as allocator:
+        results: List[List[str]] = [[] for _ in range(threads)]
+
+        def work(out: List[str]):
+            for _ in range(per_thread):
+                out.append(allocator.allocate(DAY).invoice_no)
+
+        workers = [threading.Thread(target=work, args=(out,)) for out in results]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        numbers = [n for out in results for n in out]
+        check(f'{threads} 個執行緒同時配發 {len(numbers):,} 個號碼不重複',
+              len(set(numbers)) == threads * per_thread and allocator.usage(PERIOD).allocated == len(numbers))
+
+
+def test_crash_recovery(check, tmp: Path):
+    """當機與正常關閉"""
+    state = tmp / 'crash.json'
+    first = InvoiceNumberAllocator(state, ranges(('AB', 0, 999)), block_size=100)
+    before = [first.allocate(DAY).invoice_no for _ in range(130)]
+    # 模擬當機: 不呼叫 close()，只釋放檔案鎖
+    if first._lock_file is not None:
+        first._lock_file.close()
+
+    with InvoiceNumberAllocator(state, ranges(('AB', 0, 999)), block_size=100) as second:
+        after = second.allocate(DAY).invoice_no
+        gap = int(after[2:]) - int(before[-1][2:]) - 1
+        check(f'當機後重新啟動不重複配號 (最後 {before[-1]} → {after}，跳過 {gap} 個)',
+              after not in before and 0 <= gap <= 100)
+        second.allocate_many(5, DAY)
+
+    with InvoiceNumberAllocator(state, ranges(('AB', 0, 999))) as third:
+        check(f'正常 close 後不跳號 ({third.allocate(DAY).invoice_no})', third.usage(PERIOD).allocated == 207)
+
+    if HAS_FCNTL:
+        with InvoiceNumberAllocator(state, ranges(('AB', 0, 999))):
+            try:
+                InvoiceNumberAllocator(state, ranges(('AB', 0, 999)))
+                check('同一狀態檔不能同時使用', False)
+            except RuntimeError:
+                check('同一狀態檔不能同時使用', True)
+
+
+def benchmark(tmp: Path, count: int = 200_000):
+    """配號吞吐量"""
+    print()
+    for block_size in (1, 100, 10_000):
+        with InvoiceNumberAllocator(tmp / f'bench-{block_size}.json', ranges(('AB', 0, 9_999_999)),
+                                    block_size=block_size) as allocator:
+            n = count if block_size > 1 else 500
+            started = time.perf_counter()
+            for _ in range(n):
+                allocator.allocate(DAY)
+            elapsed = time.perf_counter() - started
+            print(f"   block_size {block_size:>6}: {n / elapsed:>12,.0f} 號/秒")
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("發票字軌配號測試")
+    print("=" * 60 + "\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        test_periods(check, tmp)
+        test_allocation(check, tmp)
+        test_threads(check, tmp)
+        test_crash_recovery(check, tmp)
+        benchmark(tmp)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+買受人與載具驗證測試 (invoice_validator.py)
+
+驗證:
+- 統一編號檢查碼 (含第 7 碼為 7 的特例)，並與逐碼計算的參考實作比對全部 10^6 個前 6 碼組合
+- carrier-types.csv 的手機條碼、自然人憑證、捐贈碼格式
+- InvoiceIssueData 欄位組合 (B2B 載具 / 捐贈、列印)
+- validate_many() 回傳每一列的錯誤清單，bulk_issue.build_invoice 在本機拒絕錯誤資料
+並量測批次驗證的吞吐量。
+
+使用方法:
+    python test-invoice-validator.py
+"""
+
+import random
+import sys
+import time
+from typing import List
+
+from bulk_issue import ECPayInvoiceService, InvoiceIssueData, build_invoice
+from invoice_validator import is_valid_carrier, is_valid_love_code, is_valid_ubn, validate_issue_data, validate_many
+
+
+def reference_ubn(identifier: str) -> bool:
+    """參考實作: 乘積拆成十位數與個位數相加"""
+    digits = [int(c) * w for c, w in zip(identifier, (1, 2, 1, 2, 1, 2, 4, 1))]
+    total = sum(int(c) for product in digits for c in str(product))
+    if total % 5 == 0:
+        return True
+    # 第 7 碼為 7: 7 × 4 = 28 → 2 + 8 = 10，可取 1 或 0
+    return identifier[6] == '7' and (total - 9) % 5 == 0
+
+
+def invoice(**fields) -> InvoiceIssueData:
+    values = dict(merchant_id='2000132', relate_number='ORD001', customer_identifier='0000000000',
+                  customer_name='', customer_addr='', customer_phone='', customer_email='test@example.com',
+                  sales_amount=1050, total_amount=1050)
+    values.update(fields)
+    return InvoiceIssueData(**values)
+
+
+def test_ubn(check):
+    """統一編號"""
+    check('80129529 正確、80129528 / 8012952 / 8012952A 錯誤',
+          is_valid_ubn('80129529') and not any(map(is_valid_ubn, ('80129528', '8012952', '8012952A', '８0129529'))))
+    check('第 7 碼為 7 的特例 (10458575、10458570)', is_valid_ubn('10458575') and is_valid_ubn('10458570'))
+
+    rng = random.Random(5)
+    mismatched = [ubn for ubn in (f'{prefix:06d}{rng.randrange(100):02d}' for prefix in range(1_000_000))
+                  if is_valid_ubn(ubn) != reference_ubn(ubn)]
+    check(f'1,000,000 個統編與參考實作一致 {mismatched[:3]}', not mismatched)
+
+
+def test_carriers(check):
+    """載具與捐贈碼"""
+    check('手機條碼 /ABC1234、/A.B+C-1 正確', is_valid_carrier('3', '/ABC1234') and is_valid_carrier('3', '/A.B+C-1'))
+    check('手機條碼 長度、小寫、逗號錯誤',
+          not any(is_valid_carrier('3', n) for n in ('/ABC123', '/abc1234', '/AB,1234', 'ABC12345')))
+    check('自然人憑證 AB12345678901234 正確、A123456789012345 錯誤',
+          is_valid_carrier('2', 'AB12345678901234') and not is_valid_carrier('2', 'A123456789012345'))
+    check('結尾換行不通過 (手機條碼、自然人憑證、捐贈碼)',
+          not is_valid_carrier('3', '/ABC+123\n') and not is_valid_carrier('2', 'AB12345678901234\n')
+          and not is_valid_love_code('168\n'))
+    check('綠界載具 (1) 不檢查格式、未知類型錯誤', is_valid_carrier('1', '') and not is_valid_carrier('4', '/ABC1234'))
+    check('捐贈碼 3 ~ 7 碼數字', is_valid_love_code('168') and is_valid_love_code('1234567')
+          and not is_valid_love_code('12') and not is_valid_love_code('12345678'))
+
+
+def test_fields(check):
+    """欄位組合"""
+    check('B2C 手機條碼通過', validate_issue_data(invoice(carrier_type='3', carrier_num='/ABC1234')) == [])
+    check('B2B 不列印、不使用載具通過', validate_issue_data(invoice(customer_identifier='80129529')) == [])
+
+    cases = [
+        ('B2B 使用載具', invoice(customer_identifier='80129529', carrier_type='3', carrier_num='/ABC1234'), 'B2B'),
+        ('B2B 捐贈', invoice(customer_identifier='80129529', donation='1', love_code='168'), 'B2B'),
+        ('捐贈碼錯誤', invoice(donation='1', love_code='12'), 'love_code'),
+        ('載具號碼未指定類型', invoice(carrier_num='/ABC1234'), 'carrier_type'),
+        ('有載具卻列印', invoice(carrier_type='3', carrier_num='/ABC1234', print='1', customer_name='王小明',
+                          customer_addr='台北市'), 'print'),
+        ('列印缺少地址', invoice(print='1', customer_name='王小明'), 'customer_addr'),
+        ('Email 格式錯誤', invoice(customer_email='test@'), 'customer_email'),
+        ('relate_number 超過 30 字元', invoice(relate_number='X' * 31), 'relate_number'),
+    ]
+    missed = [name for name, data, field in cases if not any(field in e for e in validate_issue_data(data))]
+    check(f'{len(cases)} 種錯誤組合皆被發現 {missed or ""}', not missed)
+
+    errors = validate_issue_data(invoice(customer_identifier='12345678', carrier_type='3', carrier_num='bad'))
+    check(f'一次回報所有錯誤 ({len(errors)} 項)', len(errors) == 3)
+
+
+def test_bulk(check, count: int = 100_000):
+    """批次驗證"""
+    rng = random.Random(9)
+    rows = []
+    for i in range(count):
+        row = {'relate_number': f'ORD{i}', 'customer_identifier': '80129529' if i % 3 == 0 else '',
+               'customer_email': 'test@example.com'}
+        if i % 3 == 1:
+            row.update(carrier_type='3', carrier_num=f"/{rng.choice(['ABC1234', 'XYZ.+-9', 'abc1234'])}")
+        if i % 3 == 2:
+            row.update(donation='1', love_code=rng.choice(['168', '25885', '1']))
+        rows.append(row)
+
+    started = time.perf_counter()
+    results = validate_many(rows)
+    elapsed = time.perf_counter() - started
+    expected = sum(1 for row in rows if row.get('carrier_num') == '/abc1234' or row.get('love_code') == '1')
+    check(f'validate_many {count:,} 筆 ({count / elapsed:,.0f} 筆/秒)，錯誤列 {expected:,}',
+          len(results) == count and sum(1 for errors in results if errors) == expected)
+
+    service = ECPayInvoiceService(ECPayInvoiceService.TEST_MERCHANT_ID, ECPayInvoiceService.TEST_HASH_KEY,
+                                  ECPayInvoiceService.TEST_HASH_IV)
+    rejected = 0
+    for order in ({'relate_number': 'B1', 'customer_identifier': '12345678', 'total_amount': 1050},
+                  {'relate_number': 'B2', 'total_amount': 100, 'carrier_type': '3', 'carrier_num': '/abc'}):
+        try:
+            build_invoice(order, ECPayInvoiceService.TEST_MERCHANT_ID, service)
+        except ValueError:
+            rejected += 1
+    check(f'bulk_issue.build_invoice 在本機拒絕檢查碼錯誤的統編與格式錯誤的載具 ({rejected}/2)', rejected == 2)
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("買受人與載具驗證測試")
+    print("=" * 60 + "\n")
+
+    test_ubn(check)
+    test_carriers(check)
+    test_fields(check)
+    test_bulk(check)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+送出前規則檢查測試 (presubmit.py)
+
+驗證:
+- 正確的 B2C / B2B 開立資料通過
+- 每條規則回報 error-codes.csv 對應的錯誤碼 (10000019 打統編使用載具、10000016 金額...)
+- record() 後同一 RelateNumber 預測為 10000006，LRU 容量固定
+- 折讓超過發票金額 (10000010)、作廢後折讓 (10000008)、已折讓發票作廢 (10000009)
+- 時鐘誤差超過 10 分鐘預測為 10000005
+- bulk_issue 不送出預測會失敗的訂單
+並量測每筆檢查的耗時。
+
+使用方法:
+    python test-presubmit.py
+"""
+
+import asyncio
+import csv
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from bulk_issue import BulkInvoiceIssuer, ECPayInvoiceService
+from ecpay_mock_server import MockECPayInvoiceServer
+from example_loader import load_example
+from error_handler import InvoiceErrorHandler
+from presubmit import ECPAY_RULES, PresubmitChecker, RecentKeys
+
+example = load_example('ecpay-invoice-example')
+InvoiceIssueData = example.InvoiceIssueData
+InvoiceAllowanceData = example.InvoiceAllowanceData
+InvoiceVoidData = example.InvoiceVoidData
+
+MERCHANT_ID = ECPayInvoiceService.TEST_MERCHANT_ID
+
+
+def b2c(**fields) -> InvoiceIssueData:
+    values = dict(merchant_id=MERCHANT_ID, relate_number='ORD001', customer_identifier='0000000000',
+                  customer_name='王小明', customer_addr='', customer_phone='', customer_email='test@example.com',
+                  sales_amount=1050, total_amount=1050,
+                  items=[{'ItemName': '商品', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': 1050,
+                          'ItemTaxType': '1', 'ItemAmount': 1050}])
+    values.update(fields)
+    return InvoiceIssueData(**values)
+
+
+def b2b(**fields) -> InvoiceIssueData:
+    values = dict(customer_identifier='80129529', sales_amount=1000, tax_amount=50, total_amount=1050,
+                  items=[{'ItemName': '商品', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': 1000,
+                          'ItemTaxType': '1', 'ItemAmount': 1000}])
+    values.update(fields)
+    return b2c(**values)
+
+
+def allowance(amount: int, invoice_no: str = 'AB12345678') -> InvoiceAllowanceData:
+    return InvoiceAllowanceData(merchant_id=MERCHANT_ID, invoice_no=invoice_no, invoice_date='2024-01-15',
+                                customer_name='王小明', notify_mail='test@example.com', allowance_amount=amount,
+                                items=[{'ItemName': '退貨', 'ItemCount': 1, 'ItemWord': '個', 'ItemPrice': amount,
+                                        'ItemTaxType': '1', 'ItemAmount': amount}])
+
+
+def codes(checker: PresubmitChecker, data) -> List[str]:
+    return [violation.code for violation in checker.check(data)]
+
+
+def test_issue_rules(check):
+    """開立規則"""
+    checker = PresubmitChecker()
+    check('正確的 B2C / B2B 資料通過', checker.check(b2c()) == [] and checker.check(b2b()) == [])
+
+    cases = [
+        ('打統編使用載具', b2b(carrier_type='3', carrier_num='/ABC1234'), '10000019'),
+        ('打統編捐贈', b2b(donation='1', love_code='168'), '10000020'),
+        ('載具與捐贈同時存在', b2c(carrier_type='3', carrier_num='/ABC1234', donation='1', love_code='168'),
+         '10000018'),
+        ('統編檢查碼錯誤', b2b(customer_identifier='12345678'), '10000011'),
+        ('B2B 稅額為 0', b2b(tax_amount=0, total_amount=1000), '10000016'),
+        ('明細合計不符', b2c(sales_amount=1000, total_amount=1000), '10000016'),
+        ('手機條碼格式錯誤', b2c(carrier_type='3', carrier_num='/abc'), '10000001'),
+        ('RelateNumber 超過 30 字元', b2c(relate_number='X' * 31), '10000001'),
+    ]
+    missed = [f'{name} {codes(checker, data)}' for name, data, code in cases if code not in codes(checker, data)]
+    check(f'{len(cases)} 種必定失敗的資料皆預測出錯誤碼 {missed or ""}', not missed)
+
+    violation = checker.check(b2b(carrier_type='3', carrier_num='/ABC1234'))[0]
+    check(f'Violation 帶有 error-codes.csv 的說明 ({violation})',
+          violation.info.message == '打統編不可使用載具' and not violation.info.is_retryable)
+
+    checker.record(b2c(), invoice_no='AB12345678')
+    check('record() 後同一 RelateNumber 預測為 10000006',
+          codes(checker, b2c()) == ['10000006'] and checker.check(b2c(relate_number='ORD002')) == [])
+
+    checker.observe_server_time(time.time() - 900)
+    check('本機時鐘快 15 分鐘預測為 10000005', '10000005' in codes(checker, b2c(relate_number='ORD003')))
+
+    handler = InvoiceErrorHandler('ecpay')
+    mismatched = set()
+    for rule_set in ECPAY_RULES:
+        for rule in rule_set.rules:
+            ours = checker.registry.get(rule.code, rule_set.provider)
+            theirs = handler.get_error_info(rule.code)
+            if (ours.category, ours.retry_strategy, ours.is_retryable) != \
+                    (theirs.category, theirs.retry_strategy, theirs.is_retryable):
+                mismatched.add(rule.code)
+    check(f'預測錯誤的分類與重試策略同 InvoiceErrorHandler {sorted(mismatched) or ""}', not mismatched)
+
+    try:
+        checker.check(object())
+        check('未知資料類別丟出 TypeError', False)
+    except TypeError:
+        check('未知資料類別丟出 TypeError', True)
+
+
+def test_allowance_and_void(check):
+    """折讓與作廢"""
+    checker = PresubmitChecker()
+    checker.record(b2c(), invoice_no='AB12345678')
+
+    check('折讓 300 通過', checker.check(allowance(300)) == [])
+    checker.record(allowance(300))
+    check('累計折讓超過發票金額預測為 10000010', codes(checker, allowance(800)) == ['10000010']
+          and checker.check(allowance(750)) == [])
+
+    bad = InvoiceAllowanceData(merchant_id=MERCHANT_ID, invoice_no='AB123', invoice_date='2024/01/15',
+                               customer_name='', allowance_notify='S', allowance_amount=100,
+                               items=[{'ItemAmount': 90}])
+    check(f'折讓欄位與明細錯誤 ({codes(checker, bad)})', codes(checker, bad) == ['10000016', '10000001'])
+
+    void = InvoiceVoidData(merchant_id=MERCHANT_ID, invoice_no='AB12345678', invoice_date='2024-01-15',
+                           reason='退貨')
+    check('已折讓的發票作廢預測為 10000009', codes(checker, void) == ['10000009'])
+
+    checker.record(b2c(relate_number='ORD009'), invoice_no='CD12345678')
+    void = InvoiceVoidData(merchant_id=MERCHANT_ID, invoice_no='CD12345678', invoice_date='2024-01-15',
+                           reason='取消')
+    checker.record(void)
+    check('作廢後再作廢 / 折讓預測為 10000008',
+          codes(checker, void) == ['10000008'] and codes(checker, allowance(10, 'CD12345678')) == ['10000008'])
+
+
+def test_recent_keys(check):
+    """LRU"""
+    recent = RecentKeys(capacity=3)
+    for key in 'abcd':
+        recent.put(key)
+    recent.get('b')
+    recent.put('e')
+    check('容量固定，淘汰最久未使用的 key', len(recent) == 3 and 'b' in recent and 'a' not in recent
+          and 'c' not in recent)
+
+
+async def test_bulk(check):
+    """bulk_issue 整合"""
+    with tempfile.TemporaryDirectory() as tmp:
+        orders = Path(tmp) / 'orders.csv'
+        with open(orders, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=['relate_number', 'customer_identifier', 'total_amount',
+                                                   'carrier_type', 'carrier_num', 'customer_email'])
+            writer.writeheader()
+            writer.writerow({'relate_number': 'P1', 'total_amount': 100, 'customer_email': 'a@example.com'})
+            writer.writerow({'relate_number': 'P2', 'total_amount': 100, 'customer_email': 'a@example.com',
+                             'carrier_type': '3', 'carrier_num': '/ABC1234'})
+
+        async with MockECPayInvoiceServer() as server:
+            checker = PresubmitChecker()
+            checker.record(b2c(relate_number='P1'))
+            issuer = BulkInvoiceIssuer({MERCHANT_ID: (ECPayInvoiceService.TEST_HASH_KEY,
+                                                      ECPayInvoiceService.TEST_HASH_IV)},
+                                       checkpoint_path=Path(tmp) / 'checkpoint.jsonl', base_url=server.url,
+                                       workers=2, rate=1000, presubmit=checker)
+            result = await issuer.run(orders)
+            check(f'預測失敗的訂單不送出 (invalid {result.invalid}，送出 {server.requests} 次，{result.errors})',
+                  result.invalid == 1 and result.issued == 1 and server.requests == 1
+                  and result.errors == {'10000006': 1} and ('2000132', 'P2') in checker.issued)
+
+
+def benchmark(count: int = 100_000):
+    """每筆檢查耗時"""
+    checker = PresubmitChecker()
+    invoices = [b2b(relate_number=f'ORD{i}') for i in range(1000)]
+    started = time.perf_counter()
+    for i in range(count):
+        checker.check(invoices[i % len(invoices)])
+    elapsed = time.perf_counter() - started
+    print(f"\n   {count:,} 筆 B2B 檢查: 每筆 {elapsed / count * 1e6:.1f} µs ({count / elapsed:,.0f} 筆/秒)")
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("送出前規則檢查測試")
+    print("=" * 60 + "\n")
+
+    test_issue_rules(check)
+    test_allowance_and_void(check)
+    test_recent_keys(check)
+    asyncio.run(test_bulk(check))
+    benchmark()
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
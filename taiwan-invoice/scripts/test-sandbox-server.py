@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+電子發票沙箱測試 (sandbox_server.py)
+
+以 examples/ecpay-invoice-async-example.py 與 references 的請求格式對本機沙箱發送請求，驗證:
+- ECPay 開立 / 查詢 / 作廢 (AES 加密 JSON)
+- SmilePay 開立 (GET 與 POST)、金額驗算錯誤、作廢，回應 XML
+- Amego 開立、簽章與時間戳記驗證、作廢
+- 錯誤注入比例與錯誤碼皆來自 data/error-codes.csv
+- 限流回應 429 + Retry-After
+- ProviderSandbox 為抽象類別；sandbox_core.py 三個技能的副本內容相同
+並量測 asyncio client 對沙箱的吞吐量。
+
+需要: pip install aiohttp pycryptodome requests
+
+使用方法:
+    python test-sandbox-server.py
+    python test-sandbox-server.py --count 2000 --concurrency 100 --latency lognormal:20,0.5
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+import requests
+
+from example_loader import load_example
+from sandbox_core import ProviderSandbox, Response
+from sandbox_server import (
+    DEFAULT_MERCHANTS, InvoiceSandbox, LatencyModel, SandboxPolicy, SandboxThread, amego_sign, load_error_codes,
+)
+
+# sandbox_core.py 有副本的技能
+SKILLS = ('taiwan-invoice', 'taiwan-payment', 'taiwan-logistics')
+
+async_example = load_example('ecpay-invoice-async-example')
+AsyncECPayInvoiceService = async_example.AsyncECPayInvoiceService
+ECPayInvoiceService = async_example.ECPayInvoiceService
+InvoiceIssueData = async_example.InvoiceIssueData
+InvoiceVoidData = async_example.InvoiceVoidData
+
+SMILEPAY_PATH = '/api_test/SPEinvoice_Storage.asp'
+GRVC, (VERIFY_KEY,) = next(iter(DEFAULT_MERCHANTS['smilepay'].items()))
+AMEGO_ID, (APP_KEY,) = next(iter(DEFAULT_MERCHANTS['amego'].items()))
+
+
+def make_invoice(relate_number: str, amount: int = 1050) -> InvoiceIssueData:
+    """建立 B2C 測試發票"""
+    return InvoiceIssueData(
+        merchant_id=ECPayInvoiceService.TEST_MERCHANT_ID,
+        relate_number=relate_number,
+        customer_identifier='0000000000',
+        customer_name='王小明',
+        customer_addr='台北市信義區',
+        customer_phone='0912345678',
+        customer_email='test@example.com',
+        sales_amount=amount,
+        total_amount=amount,
+        items=[
+            {'ItemName': '商品A', 'ItemCount': 1, 'ItemWord': '個',
+             'ItemPrice': amount, 'ItemTaxType': '1', 'ItemAmount': amount}
+        ]
+    )
+
+
+def smilepay_params(data_id: str, all_amount: int = 170) -> Dict[str, str]:
+    """references/SMILEPAY_API_REFERENCE.md 的 B2C 開立範例"""
+    now = time.localtime()
+    return {
+        'Grvc': GRVC, 'Verify_key': VERIFY_KEY, 'Name': '速買配', 'Phone': '0900000000',
+        'Email': 'Test@testmailserver.net', 'Intype': '07', 'TaxType': '1', 'LoveKey': '', 'DonateMark': '0',
+        'Description': '商品1|商品2', 'Quantity': '5|8', 'UnitPrice': '10|15', 'Unit': '顆|條',
+        'Amount': '50|120', 'ALLAmount': str(all_amount), 'data_id': data_id,
+        'InvoiceDate': time.strftime('%Y/%m/%d', now), 'InvoiceTime': time.strftime('%H:%M:%S', now),
+    }
+
+
+def amego_params(data, timestamp: int = None, app_key: str = APP_KEY) -> Dict[str, str]:
+    """Amego 表單: invoice / data / time / sign"""
+    payload = json.dumps(data, ensure_ascii=False)
+    timestamp = str(timestamp or int(time.time()))
+    return {'invoice': AMEGO_ID, 'data': payload, 'time': timestamp, 'sign': amego_sign(payload, timestamp, app_key)}
+
+
+def amego_order(order_id: str) -> Dict:
+    return {'OrderId': order_id, 'BuyerIdentifier': '0000000000', 'BuyerName': '王小明',
+            'ProductItem': [{'Description': '商品A', 'Quantity': 1, 'UnitPrice': 168, 'Amount': 168, 'TaxType': 1}],
+            'SalesAmount': 168, 'TaxType': 1, 'TaxRate': '0.05', 'TaxAmount': 0, 'TotalAmount': 168}
+
+
+def xml_fields(text: str) -> Dict[str, str]:
+    return {child.tag: child.text or '' for child in ET.fromstring(text)}
+
+
+async def check_ecpay(check) -> None:
+    """ECPay: 直接使用 asyncio 範例 client"""
+    async with InvoiceSandbox() as sandbox:
+        async with AsyncECPayInvoiceService(
+                ECPayInvoiceService.TEST_MERCHANT_ID, ECPayInvoiceService.TEST_HASH_KEY,
+                ECPayInvoiceService.TEST_HASH_IV, base_url=sandbox.url) as service:
+            issued = await service.issue_invoice(make_invoice('SBX-0001'))
+            queried = await service.query_invoice('SBX-0001')
+            voided = await service.void_invoice(InvoiceVoidData(
+                merchant_id=ECPayInvoiceService.TEST_MERCHANT_ID, invoice_no=issued.invoice_number,
+                invoice_date=issued.invoice_date, reason='訂單取消'))
+    check('ECPay 開立 / 查詢 / 作廢',
+          issued.success and queried.get('IIS_Number') == issued.invoice_number and voided.get('RtnCode') == 1)
+
+
+def check_formats(check) -> None:
+    """SmilePay / Amego 的請求 / 回應格式"""
+    with SandboxThread(InvoiceSandbox()) as sandbox:
+        session = requests.Session()
+
+        issued = xml_fields(session.get(sandbox.url + SMILEPAY_PATH, params=smilepay_params('SBX-0002')).text)
+        posted = xml_fields(session.post(sandbox.url + SMILEPAY_PATH, data=smilepay_params('SBX-0003')).text)
+        check('SmilePay GET / POST 開立 (XML)',
+              issued['Status'] == '0' and len(issued['InvoiceNumber']) == 10 and posted['Status'] == '0'
+              and posted['InvoiceNumber'] != issued['InvoiceNumber'])
+        wrong = xml_fields(session.get(sandbox.url + SMILEPAY_PATH, params=smilepay_params('SBX-0004', 171)).text)
+        duplicate = xml_fields(session.get(sandbox.url + SMILEPAY_PATH, params=smilepay_params('SBX-0002')).text)
+        bad_key = xml_fields(session.get(sandbox.url + SMILEPAY_PATH,
+                                         params=dict(smilepay_params('SBX-0005'), Verify_key='X')).text)
+        check('SmilePay 金額驗算 -10066 / data_id 重複 -10072 / 驗證碼錯誤 -10011',
+              (wrong['Status'], duplicate['Status'], bad_key['Status']) == ('-10066', '-10072', '-10011'))
+        cancel = {'Grvc': GRVC, 'Verify_key': VERIFY_KEY, 'InvoiceNumber': issued['InvoiceNumber'],
+                  'InvoiceDate': issued['InvoiceDate'], 'types': 'Cancel', 'CancelReason': '訂單取消'}
+        first = xml_fields(session.post(sandbox.url + '/api_test/SPEinvoice_Storage_Modify.asp', data=cancel).text)
+        again = xml_fields(session.post(sandbox.url + '/api_test/SPEinvoice_Storage_Modify.asp', data=cancel).text)
+        check('SmilePay 作廢與重複作廢 -2008', first['Status'] == '0' and again['Status'] == '-2008')
+
+        created = session.post(sandbox.url + '/json/f0401', data=amego_params(amego_order('SBX-0006'))).json()
+        stale = session.post(sandbox.url + '/json/f0401',
+                             data=amego_params(amego_order('SBX-0007'), int(time.time()) - 120)).json()
+        bad_sign = session.post(sandbox.url + '/json/f0401',
+                                data=amego_params(amego_order('SBX-0008'), app_key='wrong')).json()
+        check('Amego 開立 / 時間戳記 3 / 簽章 2',
+              created['code'] == 0 and created['invoice_number'] and created['random_number']
+              and (stale['code'], bad_sign['code']) == (3, 2))
+        void = amego_params([{'CancelInvoiceNumber': created['invoice_number']}])
+        first = session.post(sandbox.url + '/json/f0501', data=void).json()
+        again = session.post(sandbox.url + '/json/f0501', data=void).json()
+        check('Amego 作廢與重複作廢 101', first['code'] == 0 and again['code'] == 101)
+
+
+def check_policy(check) -> None:
+    """錯誤注入與限流"""
+    with SandboxThread(InvoiceSandbox(SandboxPolicy(error_rate=0.3, seed=7))) as sandbox:
+        session = requests.Session()
+        results = [session.post(sandbox.url + '/json/f0401', data=amego_params(amego_order(f'INJ{i:05d}'))).json()
+                   for i in range(500)]
+    csv_codes = {int(code) for code, _ in load_error_codes()['amego']}
+    failed = Counter(r['code'] for r in results if r['code'] != 0)
+    check(f'錯誤注入比例 ({sum(failed.values()) / len(results):.1%}，預期 30%)',
+          abs(sum(failed.values()) / len(results) - 0.3) < 0.06)
+    check(f'注入的錯誤碼皆來自 error-codes.csv ({len(failed)} 種)', set(failed) <= csv_codes and len(failed) > 5)
+
+    policy = SandboxPolicy(error_rate=1.0, error_codes={'smilepay': ['-10071']})
+    with SandboxThread(InvoiceSandbox(policy)) as sandbox:
+        result = xml_fields(requests.get(sandbox.url + SMILEPAY_PATH, params=smilepay_params('ONLY0001')).text)
+    check('SmilePay 限定注入的錯誤碼', (result['Status'], result['Desc']) == ('-10071', '無可用字軌'))
+
+    # 限流: 每秒 20 筆、瞬間容量 5；0.5 秒內連續送出
+    with SandboxThread(InvoiceSandbox(SandboxPolicy(rate_limit=20, burst=5))) as sandbox:
+        session = requests.Session()
+        statuses, retry_after = Counter(), set()
+        started = time.perf_counter()
+        while time.perf_counter() - started < 0.5:
+            response = session.post(sandbox.url + '/json/f0501', data=amego_params([{'CancelInvoiceNumber': 'X'}]))
+            statuses[response.status_code] += 1
+            if response.status_code == 429:
+                retry_after.add(response.headers.get('Retry-After'))
+        elapsed = time.perf_counter() - started
+    allowed = 5 + 20 * elapsed
+    check(f'限流回應 429 + Retry-After (放行 {statuses[200]}，上限約 {allowed:.0f}，拒絕 {statuses[429]})',
+          statuses[429] > 0 and retry_after == {'1'} and statuses[200] <= allowed + 1)
+
+
+async def benchmark(count: int, concurrency: int, latency: str) -> None:
+    """asyncio client (ECPay issue_many) 對沙箱的吞吐量"""
+    policy = SandboxPolicy(latency=LatencyModel.parse(latency), seed=1)
+    async with InvoiceSandbox(policy) as sandbox:
+        async with AsyncECPayInvoiceService(
+                ECPayInvoiceService.TEST_MERCHANT_ID, ECPayInvoiceService.TEST_HASH_KEY,
+                ECPayInvoiceService.TEST_HASH_IV, base_url=sandbox.url, max_concurrency=concurrency) as service:
+            started = time.perf_counter()
+            responses = await service.issue_many(make_invoice(f'BEN-{i:08d}') for i in range(count))
+            elapsed = time.perf_counter() - started
+        connections = sandbox.stats.connections
+
+    failed = sum(1 for r in responses if isinstance(r, Exception) or not r.success)
+    print(f"\n   吞吐量 (併發 {concurrency}, {count} 張, 延遲 {latency}): {count / elapsed:,.0f} 張/秒，"
+          f"連線 {connections}，失敗 {failed}")
+
+
+def core_copy_mismatches() -> List[str]:
+    """
+    sandbox_core.py 在三個技能各有一份，內容必須相同
+
+    Returns:
+        內容不同的技能目錄 (技能單獨安裝、找不到其他副本時為空)
+    """
+    scripts_dir = Path(__file__).resolve().parent
+    source = (scripts_dir / 'sandbox_core.py').read_bytes()
+    mismatched = []
+    for skill in SKILLS:
+        copy = scripts_dir.parent.parent / skill / 'scripts' / 'sandbox_core.py'
+        if copy.exists() and copy.read_bytes() != source:
+            mismatched.append(skill)
+    return mismatched
+
+
+def check_core(check) -> None:
+    """共用部分 (sandbox_core.py)"""
+    class Incomplete(ProviderSandbox):
+        def error_response(self, provider, code, message):
+            return Response.json({'code': code})
+
+    rejected = 0
+    for cls in (ProviderSandbox, Incomplete):
+        try:
+            cls()
+        except TypeError:
+            rejected += 1
+    check('ProviderSandbox 為抽象類別 (未實作 error_codes / error_response 不可建立)', rejected == 2)
+
+    mismatched = core_copy_mismatches()
+    check(f"sandbox_core.py 三個技能的副本一致{' (' + ', '.join(mismatched) + ')' if mismatched else ''}",
+          not mismatched)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='電子發票沙箱測試')
+    parser.add_argument('--count', type=int, default=1000, help='吞吐量量測的張數 (預設: 1000)')
+    parser.add_argument('--concurrency', type=int, default=50, help='吞吐量量測的併發上限 (預設: 50)')
+    parser.add_argument('--latency', default='lognormal:10,0.5', help='吞吐量量測的延遲分佈')
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("電子發票沙箱測試")
+    print("=" * 60 + "\n")
+
+    asyncio.run(check_ecpay(check))
+    check_formats(check)
+    check_policy(check)
+    check_core(check)
+    asyncio.run(benchmark(args.count, args.concurrency, args.latency))
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+稅額計算測試 (tax_calculator.py)
+
+驗證:
+- tax-rules.csv 的範例金額
+- 性質測試: 0 ~ --exhaustive 的每個金額及隨機大金額，銷售額 + 稅額 = 總額，
+  稅額與精確值 (分數) 相差不超過 0.5，且與原本的 round(total - total / 1.05) 相同
+- 批次 API 與單筆 API 結果一致
+- 混合課稅 (TaxType 9) 只有應稅部分計算稅額
+- 非整數金額、負數、不支援的課稅別丟出 ValueError
+並比較原本的浮點公式、單筆 API 與批次 API 的吞吐量。
+
+使用方法:
+    python test-tax-calculator.py
+    python test-tax-calculator.py --exhaustive 10000000 --count 5000000
+"""
+
+import argparse
+import csv
+import random
+import re
+import sys
+import time
+from array import array
+from decimal import Decimal
+from fractions import Fraction
+from typing import List
+
+from tax_calculator import DEFAULT_CSV, HAS_NUMPY, TAX_TYPES, TaxCalculator, split_totals, tax_of
+
+CALCULATOR = TaxCalculator()
+FIVE_PERCENT = Fraction(1, 20)
+
+
+def legacy_tax(total: int) -> int:
+    """原本的浮點公式"""
+    return round(total - (total / 1.05))
+
+
+def test_csv_examples(check):
+    """tax-rules.csv 的範例金額"""
+    codes = {name: code for code, name in TAX_TYPES.items()}
+    mismatched = []
+    checked = 0
+    with open(DEFAULT_CSV, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            invoice_type, code = row['invoice_type'], codes[row['tax_type']]
+            total, sales, tax = int(row['example_total']), int(row['example_sales']), int(row['example_tax'])
+            if code == '9':
+                # 混合: notes 的「應稅 X (含稅) + 免稅 Y」
+                taxable, exempt = map(int, re.search(r'應稅 (\d+) \(含稅\) \+ 免稅 (\d+)', row['notes']).groups())
+                result = CALCULATOR.split_mixed(taxable, exempt=exempt, invoice_type=invoice_type)
+            else:
+                result = CALCULATOR.split(total, invoice_type, code)
+            checked += 1
+            if (result.sales_amount, result.tax_amount, result.total_amount) != (sales, tax, total):
+                mismatched.append(f"{invoice_type} {row['tax_type']}: {result.as_dict()}")
+    check(f'tax-rules.csv 全部 {checked} 列範例 (B2B 1050 → 1000 + 50，B2C 稅額為 0，B2B 混合只有應稅部分計稅，'
+          f'B2C 混合 SalesAmount 為全部含稅合計) '
+          f'{mismatched or ""}', checked == len(CALCULATOR.rules) and not mismatched)
+
+    mixed = CALCULATOR.split_mixed(1050, zero_rated=300, exempt=500)
+    check(f'混合課稅只有應稅部分計算稅額 ({mixed.as_dict()})',
+          (mixed.sales_amount, mixed.tax_amount, mixed.zero_tax_sales_amount, mixed.free_tax_sales_amount,
+           mixed.total_amount) == (1000, 50, 300, 500, 1850)
+          and mixed.sales_amount + mixed.tax_amount + mixed.zero_tax_sales_amount
+          + mixed.free_tax_sales_amount == mixed.total_amount
+          and CALCULATOR.split_mixed(550, exempt=500, invoice_type='B2C').as_dict()
+          == {'sales_amount': 1050, 'tax_amount': 0, 'total_amount': 1050})
+
+
+def test_properties(check, exhaustive: int):
+    """性質測試"""
+    totals = array('q', range(exhaustive + 1))
+    sales, tax = split_totals(totals, FIVE_PERCENT)
+    balanced = all(s + t == total for s, t, total in zip(sales, tax, totals))
+    check(f'0 ~ {exhaustive:,} 每個金額: 銷售額 + 稅額 = 總額', balanced)
+
+    legacy = all(t == legacy_tax(total) for t, total in zip(tax, totals))
+    check(f'0 ~ {exhaustive:,} 每個金額: 與原本的 round(total - total / 1.05) 相同', legacy)
+
+    rng = random.Random(20240101)
+    samples = [rng.randrange(0, 10 ** digits) for digits in range(1, 31) for _ in range(2000)]
+    bad = []
+    for total in samples:
+        for rate in (FIVE_PERCENT, Fraction(1, 4)):
+            t = tax_of(total, rate)
+            exact = total * rate / (1 + rate)
+            if abs(t - exact) > Fraction(1, 2) or not 0 <= t <= total:
+                bad.append((total, rate))
+    check(f'{len(samples):,} 個隨機金額 (至 10^30): 稅額與精確值相差不超過 0.5', not bad)
+
+    # NumPy 以 int64 運算，批次 API 只比對 10^15 以下的金額
+    sample = [total for total in samples if total < 10 ** 15]
+    batch_sales, batch_tax = CALCULATOR.split_many(sample)
+    scalar = [CALCULATOR.split(total) for total in sample]
+    check(f"批次 API ({'NumPy' if HAS_NUMPY else 'array'}) 與單筆 API 一致",
+          list(batch_sales) == [r.sales_amount for r in scalar]
+          and list(batch_tax) == [r.tax_amount for r in scalar])
+
+    zero_sales, zero_tax = CALCULATOR.split_many([1050, 7], 'B2B', '3')
+    b2c_sales, b2c_tax = CALCULATOR.split_many([1050, 7], 'B2C', '1')
+    check('免稅 / B2C 批次計算稅額為 0',
+          list(zero_tax) == list(b2c_tax) == [0, 0] and list(zero_sales) == list(b2c_sales) == [1050, 7])
+
+
+def test_errors(check):
+    """輸入驗證"""
+    check('Decimal 整數金額可用', CALCULATOR.split(Decimal('1050')).tax_amount == 50)
+
+    rejected = 0
+    for call in (lambda: CALCULATOR.split(10.5), lambda: CALCULATOR.split(Decimal('10.5')),
+                 lambda: CALCULATOR.split(-1), lambda: CALCULATOR.split(100, 'B2B', '9'),
+                 lambda: CALCULATOR.split(100, 'B2C', '4'), lambda: CALCULATOR.split_many([1, -1]),
+                 lambda: CALCULATOR.split_many([1050, 1050.9]), lambda: split_totals([Decimal('1.5')], FIVE_PERCENT),
+                 lambda: split_totals([2 ** 63], FIVE_PERCENT)):
+        try:
+            call()
+        except ValueError:
+            rejected += 1
+    check(f'非整數、負數、過大、不支援的課稅別丟出 ValueError (批次 API 不截斷小數) ({rejected}/9)', rejected == 9)
+
+    sales, tax = CALCULATOR.split_many(iter([Decimal('1050'), 21]))
+    check('批次 API 接受整數值的 Decimal 與 iterator', list(sales) == [1000, 20] and list(tax) == [50, 1])
+
+
+def benchmark(count: int):
+    """原本的浮點公式 vs 單筆 API vs 批次 API"""
+    rng = random.Random(1)
+    totals = array('q', (rng.randrange(1, 1_000_000) for _ in range(count)))
+    rows = []
+
+    started = time.perf_counter()
+    for total in totals:
+        tax = legacy_tax(total)
+        _ = total - tax
+    rows.append(('round(total - total / 1.05)', time.perf_counter() - started))
+
+    started = time.perf_counter()
+    for total in totals:
+        CALCULATOR.split(total)
+    rows.append(('TaxCalculator.split', time.perf_counter() - started))
+
+    started = time.perf_counter()
+    CALCULATOR.split_many(totals)
+    rows.append((f"split_many ({'NumPy' if HAS_NUMPY else 'array'})", time.perf_counter() - started))
+
+    print(f"\n   {'方式':<30} {'筆/秒':>14}")
+    for label, elapsed in rows:
+        print(f"   {label:<30} {count / elapsed:>14,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='稅額計算測試')
+    parser.add_argument('--exhaustive', type=int, default=2_000_000, help='逐一驗證的金額上限 (預設: 2000000)')
+    parser.add_argument('--count', type=int, default=1_000_000, help='吞吐量量測筆數 (預設: 1000000)')
+    args = parser.parse_args()
+
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("稅額計算測試")
+    print("=" * 60 + "\n")
+
+    test_csv_examples(check)
+    test_properties(check, args.exhaustive)
+    test_errors(check)
+    benchmark(args.count)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,7 +13,7 @@ import hashlib
 import time
 import urllib.parse
 from datetime import datetime
-from typing import Dict, Literal, Optional
+from typing import Any, Dict, Literal, Optional
 from dataclasses import dataclass, field
 
 try:
@@ -115,7 +115,8 @@ class NewebPayCVSLogistics:
         merchant_id: str,
         hash_key: str,
         hash_iv: str,
-        is_production: bool = False
+        is_production: bool = False,
+        transport: Optional[Any] = None,
     ):
         """
         初始化 NewebPay CVS 物流服務
@@ -125,6 +126,7 @@ class NewebPayCVSLogistics:
             hash_key: HashKey (32 字元)
             hash_iv: HashIV (16 字元)
             is_production: 是否為正式環境 (預設 False)
+            transport: 共用的 HTTP transport (scripts/http_transport.py 的 SyncTransport)，未指定時使用 requests
 
         Raises:
             ImportError: 缺少必要套件
@@ -139,6 +141,7 @@ class NewebPayCVSLogistics:
         self.hash_key = hash_key.encode('utf-8')
         self.hash_iv = hash_iv.encode('utf-8')
         self.base_url = self.PROD_BASE_URL if is_production else self.TEST_BASE_URL
+        self.transport = transport or requests
 
     def aes_encrypt(self, data: str) -> str:
         """
@@ -243,7 +246,7 @@ class NewebPayCVSLogistics:
         }
 
         # 發送請求 (NewebPay 會重導向到門市選擇頁面)
-        response = requests.post(
+        response = self.transport.post(
             f'{self.base_url}/storeMap',
             data=api_data,
             allow_redirects=False,
@@ -381,7 +384,7 @@ class NewebPayCVSLogistics:
 
         # 發送 API 請求
         try:
-            response = requests.post(
+            response = self.transport.post(
                 f'{self.base_url}/createShipment',
                 data=api_data,
                 timeout=30,
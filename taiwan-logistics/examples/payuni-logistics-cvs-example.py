@@ -12,7 +12,7 @@ import hashlib
 import urllib.parse
 import time
 from datetime import datetime
-from typing import Dict, Literal, Optional
+from typing import Any, Dict, Literal, Optional
 from dataclasses import dataclass, field
 
 try:
@@ -136,7 +136,8 @@ class PAYUNiLogistics:
         mer_id: str,
         hash_key: str,
         hash_iv: str,
-        is_production: bool = False
+        is_production: bool = False,
+        transport: Optional[Any] = None,
     ):
         """
         初始化 PAYUNi 物流服務
@@ -146,6 +147,7 @@ class PAYUNiLogistics:
             hash_key: HashKey
             hash_iv: HashIV (16 bytes)
             is_production: 是否為正式環境 (預設 False)
+            transport: 共用的 HTTP transport (scripts/http_transport.py 的 SyncTransport)，未指定時使用 requests
 
         Raises:
             ImportError: 缺少必要套件
@@ -160,6 +162,7 @@ class PAYUNiLogistics:
         self.hash_key = hash_key.encode('utf-8')
         self.hash_iv = hash_iv.encode('utf-8')
         self.base_url = self.PROD_API_URL if is_production else self.TEST_API_URL
+        self.transport = transport or requests
 
     def encrypt_data(self, data: Dict[str, any]) -> str:
         """
@@ -303,7 +306,7 @@ class PAYUNiLogistics:
 
         # 發送 API 請求
         try:
-            response = requests.post(
+            response = self.transport.post(
                 f'{self.base_url}/logistics/create',
                 data=api_data,
                 timeout=30,
@@ -423,7 +426,7 @@ class PAYUNiLogistics:
 
         # 發送 API 請求
         try:
-            response = requests.post(
+            response = self.transport.post(
                 f'{self.base_url}/logistics/create',
                 data=api_data,
                 timeout=30,
@@ -500,7 +503,7 @@ class PAYUNiLogistics:
 
         # 發送 API 請求
         try:
-            response = requests.post(
+            response = self.transport.post(
                 f'{self.base_url}/logistics/query',
                 data=api_data,
                 timeout=30,
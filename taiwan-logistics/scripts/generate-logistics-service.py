@@ -544,11 +544,20 @@ import hashlib
 import base64
 import json
 import time
-import requests
-from typing import Dict, List, Optional, Literal
+from typing import Any, Dict, List, Optional, Literal
 from dataclasses import dataclass, field
 {crypto_imports}
 
+try:
+    # taiwan-logistics/scripts/http_transport.py: 依 base URL 共用連線池 (keep-alive)，連線 / 讀取逾時分開設定
+    from http_transport import get_default_transport
+except ImportError:
+    import requests
+
+    def get_default_transport():
+        """未附帶 http_transport.py 時直接使用 requests 模組"""
+        return requests
+
 
 # ============================================================================
 # 資料結構
@@ -621,7 +630,8 @@ class {class_name}LogisticsService:
     TEST_URL = '{test_url}'
     PROD_URL = '{prod_url}'
 
-    def __init__(self, merchant_id: str, hash_key: str, hash_iv: str, is_prod: bool = False):
+    def __init__(self, merchant_id: str, hash_key: str, hash_iv: str, is_prod: bool = False,
+                 transport: Optional[Any] = None):
         """
         初始化物流服務
 
@@ -630,11 +640,14 @@ class {class_name}LogisticsService:
             hash_key: Hash Key
             hash_iv: Hash IV
             is_prod: 是否為正式環境
+            transport: HTTP transport (http_transport.SyncTransport)，多個服務可共用同一個連線池；
+                       未指定時使用 get_default_transport()
         """
         self.merchant_id = merchant_id
         self.hash_key = hash_key{hash_key_encode}
         self.hash_iv = hash_iv{hash_iv_encode}
         self.api_base_url = self.PROD_URL if is_prod else self.TEST_URL
+        self.transport = transport or get_default_transport()
 
     # ========================================================================
     # 加密/簽章方法
@@ -727,7 +740,7 @@ class {class_name}LogisticsService:
             encrypted = self._encrypt(json.dumps(api_data, ensure_ascii=False))
             hash_data = self._generate_hash(encrypted)
 
-            response = requests.post(
+            response = self.transport.post(
                 f'{{self.api_base_url}}/createShipment',
                 data={{
                     'MerchantID': self.merchant_id,
@@ -783,7 +796,7 @@ class {class_name}LogisticsService:
             encrypted = self._encrypt(json.dumps(api_data, ensure_ascii=False))
             hash_data = self._generate_hash(encrypted)
 
-            response = requests.post(
+            response = self.transport.post(
                 f'{{self.api_base_url}}/getShipmentNo',
                 data={{
                     'MerchantID': self.merchant_id,
@@ -862,7 +875,7 @@ class {class_name}LogisticsService:
             encrypted = self._encrypt(json.dumps(api_data, ensure_ascii=False))
             hash_data = self._generate_hash(encrypted)
 
-            response = requests.post(
+            response = self.transport.post(
                 f'{{self.api_base_url}}/queryShipment',
                 data={{
                     'MerchantID': self.merchant_id,
@@ -895,7 +908,7 @@ class {class_name}LogisticsService:
             encrypted = self._encrypt(json.dumps(api_data, ensure_ascii=False))
             hash_data = self._generate_hash(encrypted)
 
-            response = requests.post(
+            response = self.transport.post(
                 f'{{self.api_base_url}}/trace',
                 data={{
                     'MerchantID': self.merchant_id,
@@ -19,10 +19,13 @@ import csv
 import json
 import math
 import argparse
+from collections import Counter
 from pathlib import Path
 from typing import List, Dict, Tuple
 from dataclasses import dataclass
 
+from keyword_automaton import KeywordAutomaton
+
 
 @dataclass
 class LogisticsProvider:
@@ -105,13 +108,6 @@ class LogisticsRecommender:
         '物流': 1.0, '配送': 1.0, '取貨': 1.0, '超商': 1.2, '宅配': 1.2,
     }
 
-    # 反模式 (不建議使用的場景)
-    ANTI_PATTERNS = {
-        'ecpay': ['無技術資源', '極簡需求', 'api優先', '現代化'],
-        'newebpay': ['簡單api', '單一支付', '極簡', '最小化'],
-        'payuni': ['大型專案', '完整文檔', '傳統', 'php']
-    }
-
     def __init__(self, data_dir: Path = None):
         """初始化推薦引擎"""
         if data_dir is None:
@@ -119,8 +115,11 @@ class LogisticsRecommender:
 
         self.data_dir = data_dir
         self.providers: List[LogisticsProvider] = []
+        self.anti_patterns: List[Dict[str, str]] = []
         self.bm25 = BM25(k1=1.5, b=0.75)
         self.load_data()
+        self.load_anti_patterns()
+        self._build_index()
 
     def load_data(self):
         """載入服務商資料"""
@@ -132,22 +131,66 @@ class LogisticsRecommender:
         with open(providers_file, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             for row in reader:
+                # providers.csv 以 name_zh / name_en / type 描述服務商，
+                # 舊欄位 (display_name, auth_method...) 存在時優先使用
+                features = row.get('features', '')
                 self.providers.append(
                     LogisticsProvider(
                         provider=row['provider'],
-                        display_name=row['display_name'],
-                        auth_method=row['auth_method'],
-                        encryption=row['encryption'],
-                        test_url=row['test_url'],
-                        prod_url=row['prod_url'],
-                        content_type=row['content_type'],
-                        features=row['features'].split(' | '),
-                        market_share=row['market_share'],
-                        api_style=row['api_style'],
-                        logistics_types=row['logistics_types'].split(' | ')
+                        display_name=row.get('display_name') or row.get('name_zh', row['provider']),
+                        auth_method=row.get('auth_method', ''),
+                        encryption=row.get('encryption', ''),
+                        test_url=row.get('test_url', ''),
+                        prod_url=row.get('prod_url', ''),
+                        content_type=row.get('content_type', ''),
+                        features=features.split(' | ') if ' | ' in features else features.split(','),
+                        market_share=row.get('market_share') or row.get('coverage', ''),
+                        api_style=row.get('api_style') or row.get('name_en', ''),
+                        logistics_types=(row.get('logistics_types') or row.get('type', '')).split(' | ')
                     )
                 )
 
+    def load_anti_patterns(self):
+        """載入反模式 (不建議使用的場景)"""
+        anti_file = self.data_dir / 'anti-patterns.csv'
+        if not anti_file.exists():
+            return
+
+        with open(anti_file, 'r', encoding='utf-8') as f:
+            self.anti_patterns = list(csv.DictReader(f))
+
+    def _build_index(self):
+        """
+        預先編譯服務商詞彙與反模式為單一自動機，查詢只需掃描一次
+
+        BM25 每個詞對各服務商的分數只與服務商文件有關，建立時即算好；
+        服務商詞彙前後加上空白後加入自動機，只在查詢中完整的詞命中 (與 tokenize 後逐詞比對相同)。
+
+        payload 格式:
+            ('term', term)      服務商文件中的詞，分數見 self._postings[term]
+            ('anti', index)     anti-patterns.csv 第 index 列
+        """
+        doc_terms = [self.tokenize(self.build_document(p)) for p in self.providers]
+        doc_term_sets = [set(terms) for terms in doc_terms]
+        doc_freq = Counter(term for terms in doc_term_sets for term in terms)
+        total_docs = len(self.providers)
+        avg_doc_len = sum(len(terms) for terms in doc_terms) / total_docs if total_docs else 0.0
+
+        automaton = KeywordAutomaton()
+        self._postings: Dict[str, List[Tuple[int, float]]] = {}
+        for term in doc_freq:
+            self._postings[term] = [
+                (index, self.bm25.score([term], terms, avg_doc_len, len(terms), total_docs, doc_freq))
+                for index, terms in enumerate(doc_terms)
+                if term in doc_term_sets[index]
+            ]
+            automaton.add(f' {term} ', ('term', term))
+
+        for index, pattern in enumerate(self.anti_patterns):
+            automaton.add(pattern.get('keyword', '').lower(), ('anti', index))
+
+        self._automaton = automaton.build()
+
     def tokenize(self, text: str) -> List[str]:
         """分詞"""
         text = text.lower()
@@ -166,47 +209,49 @@ class LogisticsRecommender:
         ]
         return ' '.join(parts)
 
-    def calculate_weighted_score(self, query: str, provider: LogisticsProvider) -> Tuple[float, List[str]]:
-        """計算加權分數"""
-        query_terms = self.tokenize(query)
-        doc_text = self.build_document(provider)
-        doc_terms = self.tokenize(doc_text)
-
-        # 計算 BM25 基礎分數
-        total_docs = len(self.providers)
-        avg_doc_len = sum(len(self.tokenize(self.build_document(p))) for p in self.providers) / total_docs
-        doc_len = len(doc_terms)
+    def scan_query(self, query: str) -> Tuple[List[Tuple[float, List[str]]], Dict[str, List[str]]]:
+        """
+        單次掃描查詢，同時計算各服務商的加權分數與反模式警告
 
-        doc_freq = {}
-        for term in set(query_terms):
-            doc_freq[term] = sum(1 for p in self.providers if term in self.tokenize(self.build_document(p)))
+        Returns:
+            ([(score, [reasons])] (與 self.providers 同順序), {provider: [warnings]})
+        """
+        base_scores = [0.0] * len(self.providers)
+        bonus = [0.0] * len(self.providers)
+        match_reasons: List[List[str]] = [[] for _ in self.providers]
+        anti_hits = set()
+
+        # 正規化空白後前後補空白，讓服務商詞彙只在完整的詞命中
+        text = f" {' '.join(self.tokenize(query))} "
+        for _, _, (kind, key) in self._automaton.iter_matches(text):
+            if kind == 'anti':
+                anti_hits.add(key)
+                continue
 
-        base_score = self.bm25.score(query_terms, doc_terms, avg_doc_len, doc_len, total_docs, doc_freq)
+            # 計算 BM25 基礎分數，並應用關鍵字權重
+            weight = self.KEYWORD_WEIGHTS.get(key, 1.0)
+            for index, term_score in self._postings[key]:
+                base_scores[index] += term_score
+                if weight > 1.0:
+                    bonus[index] += (weight - 1.0) * 0.1
+                    match_reasons[index].append(f"關鍵字匹配: {key} (權重 {weight:.1f})")
 
-        # 應用關鍵字權重
-        weighted_score = base_score
-        match_reasons = []
+        warnings: Dict[str, List[str]] = {}
+        for index in sorted(anti_hits):
+            pattern = self.anti_patterns[index]
+            warnings.setdefault(pattern['provider'].lower(), []).append(pattern['warning'])
 
-        for term in query_terms:
-            if term in doc_terms:
-                weight = self.KEYWORD_WEIGHTS.get(term, 1.0)
-                if weight > 1.0:
-                    weighted_score += base_score * (weight - 1.0) * 0.1
-                    match_reasons.append(f"關鍵字匹配: {term} (權重 {weight:.1f})")
+        scores = [(base * (1.0 + extra), reasons)
+                  for base, extra, reasons in zip(base_scores, bonus, match_reasons)]
+        return scores, warnings
 
-        return weighted_score, match_reasons
+    def calculate_weighted_score(self, query: str, provider: LogisticsProvider) -> Tuple[float, List[str]]:
+        """計算加權分數"""
+        return self.scan_query(query)[0][self.providers.index(provider)]
 
     def check_anti_patterns(self, query: str, provider_key: str) -> List[str]:
         """檢查反模式"""
-        warnings = []
-        query_lower = query.lower()
-
-        if provider_key in self.ANTI_PATTERNS:
-            for pattern in self.ANTI_PATTERNS[provider_key]:
-                if pattern in query_lower:
-                    warnings.append(f"注意: {provider_key.upper()} 可能不適合「{pattern}」場景")
-
-        return warnings
+        return self.scan_query(query)[1].get(provider_key, [])
 
     def recommend(self, query: str, top_k: int = 3) -> List[RecommendResult]:
         """
@@ -220,10 +265,10 @@ class LogisticsRecommender:
             推薦結果清單
         """
         results = []
+        scores, anti_warnings = self.scan_query(query)
 
-        for provider in self.providers:
-            score, match_reasons = self.calculate_weighted_score(query, provider)
-            warnings = self.check_anti_patterns(query, provider.provider.lower())
+        for provider, (score, match_reasons) in zip(self.providers, scores):
+            warnings = anti_warnings.get(provider.provider.lower(), [])
 
             results.append(
                 RecommendResult(
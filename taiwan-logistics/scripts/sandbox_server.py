@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Taiwan Logistics Skill - 物流服務商本機沙箱 (壓力測試用)
+
+ECPay / NewebPay / PAYUNi 的物流測試環境不能拿來做壓力測試。此沙箱以 asyncio 實作
+最小 HTTP/1.1 伺服器 (keep-alive)，依 references/*.md 與 data/operations.csv
+模擬各服務商端點的加密、簽章與回應格式，並可設定:
+
+- 回應延遲分佈 (fixed / uniform / normal / lognormal / exponential)
+- 依比例注入服務商錯誤狀態碼 (取自 data/status-codes.csv 中 error / failed 的狀態)、
+  HTTP 503 或直接斷線
+- 每個商店的請求速率上限 (token bucket，超過時回應 429 + Retry-After)
+
+模擬的端點:
+    ECPay     /Express/Create                      CheckMacValue 驗證，回應 1|OK|... 或 0|錯誤碼|訊息
+              /Helper/QueryLogisticsTradeInfo/V2   回應 URL 編碼字串 + CheckMacValue
+    NewebPay  /API/Logistic/storeMap               HashData_ 驗證，302 重導向至門市選擇頁
+              /API/Logistic/createShipment         EncryptData_ 解密，回應加密結果
+              /API/Logistic/queryShipment          同上
+    PAYUNi    /api/logistics/create                HashInfo 驗證、EncryptInfo 解密，回應加密結果
+              /api/logistics/query                 同上
+
+ECPay CheckMacValue 同時接受 MD5 (references 與 test_logistics.py) 與 SHA256
+(examples/ecpay-logistics-cvs-example.py) 兩種算法，依長度判斷；回應一律使用 MD5。
+
+使用範例:
+    python sandbox_server.py --port 8091 --latency lognormal:30,0.5 --error-rate 0.02 --rate-limit 50
+
+    # 程式內使用
+    async with LogisticsSandbox(SandboxPolicy(latency=LatencyModel.parse('normal:20,5'))) as sandbox:
+        service.base_url = sandbox.url + '/API/Logistic'   # NewebPayCVSLogistics
+        ...
+        print(sandbox.stats)
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import hmac
+import json
+import urllib.parse
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from example_loader import load_example
+from payuni_crypto import get_cipher as get_payuni_cipher
+from sandbox_core import (
+    LatencyModel, ProviderSandbox, Response, Route, SandboxPolicy, SandboxThread, add_policy_arguments, build_policy,
+)
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+
+# status-codes.csv 中視為錯誤的 category
+ERROR_CATEGORIES = ('error', 'failed')
+
+newebpay = load_example('newebpay-logistics-cvs-example')
+NewebPayCVSLogistics = newebpay.NewebPayCVSLogistics
+
+# 沙箱預設接受的商店 (provider → {商店代號: (HashKey, HashIV)})
+DEFAULT_MERCHANTS: Dict[str, Dict[str, Tuple[str, str]]] = {
+    'ecpay': {'2000132': ('5294y06JbISpM5x9', 'v77hoKGq4kWxNNIS')},
+    'newebpay': {'MS12345678': ('Fs5cX1TGqYM2PpdbE14a9H83YQSQF5jn', 'C6AcmfqJILwgnhIP')},
+    'payuni': {'U12345678': ('12345678901234567890123456789012', '1234567890123456')},
+}
+
+
+# ============================================================================
+# 錯誤碼
+# ============================================================================
+
+@lru_cache(maxsize=None)
+def load_error_codes() -> Dict[str, Tuple[Tuple[str, str], ...]]:
+    """
+    讀取 data/status-codes.csv 中 category 為 error / failed 的狀態碼
+    (物流 skill 沒有獨立的錯誤碼表)
+
+    Returns:
+        provider → ((code, status_zh), ...)
+    """
+    codes: Dict[str, list] = {}
+    with open(DATA_DIR / 'status-codes.csv', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row['category'] in ERROR_CATEGORIES:
+                codes.setdefault(row['provider'], []).append((row['code'], row['status_zh']))
+    return {provider: tuple(items) for provider, items in codes.items()}
+
+
+# ============================================================================
+# 物流服務商
+# ============================================================================
+
+def ecpay_check_mac_value(params: Dict[str, str], hash_key: str, hash_iv: str, algorithm: str = 'md5') -> str:
+    """
+    ECPay 物流 CheckMacValue
+
+    Args:
+        algorithm: 'md5' (quote_plus 編碼，references 的算法) 或
+                   'sha256' (quote 編碼，examples/ecpay-logistics-cvs-example.py 的算法)
+    """
+    param_str = '&'.join(f'{k}={v}' for k, v in sorted(params.items()) if k != 'CheckMacValue')
+    raw = f'HashKey={hash_key}&{param_str}&HashIV={hash_iv}'
+    if algorithm == 'md5':
+        return hashlib.md5(urllib.parse.quote_plus(raw).lower().encode('utf-8')).hexdigest().upper()
+    return hashlib.sha256(urllib.parse.quote(raw, safe='').lower().encode('utf-8')).hexdigest().upper()
+
+
+class LogisticsSandbox(ProviderSandbox):
+    """ECPay / NewebPay / PAYUNi 物流沙箱"""
+
+    def __init__(self, policy: Optional[SandboxPolicy] = None, host: str = '127.0.0.1', port: int = 0,
+                 merchants: Optional[Dict[str, Dict[str, Tuple[str, str]]]] = None):
+        """
+        Args:
+            policy: 延遲、錯誤注入與限流設定
+            host: 監聽位址
+            port: 監聽埠 (0 = 自動選擇)
+            merchants: 接受的商店 provider → {商店代號: (HashKey, HashIV)} (預設 DEFAULT_MERCHANTS)
+        """
+        super().__init__(policy, host, port)
+        self.merchants = merchants or DEFAULT_MERCHANTS
+        self.orders: Dict[Tuple[str, str, str], Dict] = {}  # (provider, 商店代號, 訂單編號) → 訂單
+        self.logistics_ids: Dict[str, Tuple[str, str, str]] = {}  # 物流編號 → orders 的 key
+        self.trade_seq = 0
+
+        self._newebpay = {mid: NewebPayCVSLogistics(mid, *keys)
+                          for mid, keys in self.merchants.get('newebpay', {}).items()}
+        self._payuni = {mid: get_payuni_cipher(*keys) for mid, keys in self.merchants.get('payuni', {}).items()}
+
+        self.routes.update({
+            '/Express/Create': Route('ecpay', self.ecpay_create, 'MerchantID'),
+            '/Helper/QueryLogisticsTradeInfo/V2': Route('ecpay', self.ecpay_query, 'MerchantID'),
+            '/API/Logistic/storeMap': Route('newebpay', self.newebpay_store_map, 'UID_'),
+            '/API/Logistic/createShipment': Route('newebpay', self.newebpay_create, 'UID_'),
+            '/API/Logistic/queryShipment': Route('newebpay', self.newebpay_query, 'UID_'),
+            '/api/logistics/create': Route('payuni', self.payuni_create, 'MerID'),
+            '/api/logistics/query': Route('payuni', self.payuni_query, 'MerID'),
+        })
+
+    def _next_seq(self) -> int:
+        self.trade_seq += 1
+        return self.trade_seq
+
+    def _add_order(self, key: Tuple[str, str, str], logistics_id: str, order: Dict) -> Dict:
+        order['LogisticsID'] = logistics_id
+        self.orders[key] = order
+        self.logistics_ids[logistics_id] = key
+        return order
+
+    def error_codes(self) -> Dict[str, Tuple[Tuple[str, str], ...]]:
+        return load_error_codes()
+
+    def error_response(self, provider: str, code: str, message: str) -> Response:
+        if provider == 'ecpay':
+            return Response.text(f'0|{code}|{message}', 'text/plain; charset=utf-8')
+        if provider == 'newebpay':
+            return Response.json({'Status': code, 'Message': message})
+        return Response.json({'Status': 'ERROR', 'Message': message, 'ErrCode': code})
+
+    # ------------------------------------------------------------------
+    # ECPay
+    # ------------------------------------------------------------------
+
+    def _ecpay_verify(self, fields: Dict[str, str]) -> Optional[Response]:
+        keys = self.merchants.get('ecpay', {}).get(fields.get('MerchantID', ''))
+        if keys is None:
+            return self.error_response('ecpay', '10100002', '商店代號不存在')
+        received = fields.get('CheckMacValue', '').upper()
+        algorithm = 'sha256' if len(received) == 64 else 'md5'
+        if not hmac.compare_digest(ecpay_check_mac_value(fields, *keys, algorithm), received):
+            return self.error_response('ecpay', '10100058', 'CheckMacValue 錯誤')
+        return None
+
+    def ecpay_create(self, fields: Dict[str, str]) -> Response:
+        """Express/Create: 建立物流訂單，回應 1|OK|欄位=值|...|CheckMacValue=..."""
+        error = self._ecpay_verify(fields)
+        if error is not None:
+            return error
+        if not fields.get('GoodsAmount', '').isdigit() or int(fields['GoodsAmount']) <= 0:
+            return self.error_response('ecpay', '10500040', '商品金額錯誤')
+
+        merchant_id = fields['MerchantID']
+        key = ('ecpay', merchant_id, fields.get('MerchantTradeNo', ''))
+        if key in self.orders:
+            return self.error_response('ecpay', '10500001', '訂單編號重複')
+
+        seq = self._next_seq()
+        order = self._add_order(key, f'{seq:010d}', {
+            'MerchantID': merchant_id,
+            'MerchantTradeNo': key[2],
+            'RtnCode': '300',
+            'RtnMsg': '訂單建立成功',
+            'AllPayLogisticsID': f'{seq:010d}',
+            'CVSPaymentNo': f'C{seq:07d}' if fields.get('LogisticsType') == 'CVS' else '',
+            'CVSValidationNo': f'{seq % 10000:04d}' if fields.get('LogisticsType') == 'CVS' else '',
+            'LogisticsType': fields.get('LogisticsType', ''),
+            'LogisticsSubType': fields.get('LogisticsSubType', ''),
+            'GoodsAmount': fields['GoodsAmount'],
+            'UpdateStatusDate': f'{datetime.now():%Y/%m/%d %H:%M:%S}',
+            'ReceiverName': fields.get('ReceiverName', ''),
+            'ReceiverPhone': fields.get('ReceiverPhone', fields.get('ReceiverCellPhone', '')),
+            'ReceiverStoreID': fields.get('ReceiverStoreID', ''),
+            'BookingNote': '',
+        })
+        result = {name: value for name, value in order.items() if name != 'LogisticsID'}
+        result['CheckMacValue'] = ecpay_check_mac_value(result, *self.merchants['ecpay'][merchant_id])
+        return Response.text('1|OK|' + '|'.join(f'{k}={v}' for k, v in result.items()), 'text/plain; charset=utf-8')
+
+    def ecpay_query(self, fields: Dict[str, str]) -> Response:
+        """QueryLogisticsTradeInfo/V2: 依 AllPayLogisticsID 查詢，回應 URL 編碼字串 + CheckMacValue"""
+        error = self._ecpay_verify(fields)
+        if error is not None:
+            return error
+
+        key = self.logistics_ids.get(fields.get('AllPayLogisticsID', ''))
+        if key is None or key[:2] != ('ecpay', fields['MerchantID']):
+            return self.error_response('ecpay', '10500004', '查無物流訂單')
+        order = self.orders[key]
+        result = {name: order[name] for name in (
+            'MerchantID', 'MerchantTradeNo', 'AllPayLogisticsID', 'LogisticsType', 'LogisticsSubType',
+            'GoodsAmount', 'UpdateStatusDate', 'ReceiverName', 'ReceiverPhone', 'ReceiverStoreID')}
+        result['LogisticsStatus'] = order['RtnCode']
+        result['TradeDate'] = order['UpdateStatusDate']
+        result['CheckMacValue'] = ecpay_check_mac_value(result, *self.merchants['ecpay'][key[1]])
+        return Response.text(urllib.parse.urlencode(result))
+
+    # ------------------------------------------------------------------
+    # NewebPay
+    # ------------------------------------------------------------------
+
+    def _newebpay_decrypt(self, fields: Dict[str, str]):
+        """驗證 HashData_ 並解密 EncryptData_，回傳 (service, data) 或錯誤回應"""
+        service = self._newebpay.get(fields.get('UID_', ''))
+        if service is None:
+            return None, self.error_response('newebpay', 'MID-001', '商店代號錯誤')
+        encrypt_data = fields.get('EncryptData_', '')
+        if not service.verify_hash_data(encrypt_data, fields.get('HashData_', '')):
+            return None, self.error_response('newebpay', 'HASH-001', 'HashData 驗證失敗')
+        try:
+            return service, json.loads(service.aes_decrypt(encrypt_data))
+        except ValueError:
+            return None, self.error_response('newebpay', 'AES-002', '解密失敗')
+
+    def _newebpay_success(self, service, message: str, data: Dict) -> Response:
+        encrypt_data = service.aes_encrypt(json.dumps(data, ensure_ascii=False))
+        return Response.json({'Status': 'SUCCESS', 'Message': message, 'EncryptData_': encrypt_data,
+                              'HashData_': service.generate_hash_data(encrypt_data)})
+
+    def newebpay_store_map(self, fields: Dict[str, str]) -> Response:
+        """storeMap: 302 重導向至 (模擬的) 門市選擇頁"""
+        service, data = self._newebpay_decrypt(fields)
+        if service is None:
+            return data
+        query = urllib.parse.urlencode({'MerchantOrderNo': data.get('MerchantOrderNo', ''),
+                                        'ShipType': data.get('ShipType', '')})
+        return Response(b'', '302 Found', 'text/plain', {'Location': f'{self.url}/storeMap?{query}'})
+
+    def newebpay_create(self, fields: Dict[str, str]) -> Response:
+        """createShipment: 建立物流訂單，回應加密的物流編號與寄件代碼"""
+        service, data = self._newebpay_decrypt(fields)
+        if service is None:
+            return data
+        if not data.get('ReceiverStoreCode'):
+            return self.error_response('newebpay', 'LGS-001', '缺少收件門市')
+
+        key = ('newebpay', service.merchant_id, data.get('MerchantOrderNo', ''))
+        if key in self.orders:
+            return self.error_response('newebpay', 'ORDER-001', '訂單編號重複')
+
+        seq = self._next_seq()
+        order = self._add_order(key, f'NL{seq:010d}', {
+            'MerchantID': service.merchant_id,
+            'MerchantOrderNo': key[2],
+            'TradeNo': f'{datetime.now():%y%m%d}{seq:010d}',
+            'LgsType': data.get('LgsType', ''),
+            'ShipType': data.get('ShipType', ''),
+            'StoreID': data['ReceiverStoreCode'],
+            'Amt': int(data.get('GoodsAmount', 0)),
+            'UserName': data.get('ReceiverName', ''),
+            'UserTel': data.get('ReceiverCellPhone', ''),
+            'CVSPaymentNo': f'N{seq:07d}',
+            'CVSValidationNo': f'{seq % 10000:04d}',
+        })
+        return self._newebpay_success(service, '建立成功', {
+            'MerchantID': service.merchant_id,
+            'MerchantOrderNo': key[2],
+            'TradeNo': order['TradeNo'],
+            'LogisticsNo': order['LogisticsID'],
+            'CVSPaymentNo': order['CVSPaymentNo'],
+            'CVSValidationNo': order['CVSValidationNo'],
+            'BookingNote': '',
+        })
+
+    def newebpay_query(self, fields: Dict[str, str]) -> Response:
+        """queryShipment: 回應加密的物流狀態"""
+        service, data = self._newebpay_decrypt(fields)
+        if service is None:
+            return data
+        order = self.orders.get(('newebpay', service.merchant_id, data.get('MerchantOrderNo', '')))
+        if order is None:
+            return self.error_response('newebpay', 'ORDER-002', '查無物流訂單')
+        return self._newebpay_success(service, '查詢成功', {
+            'MerchantID': service.merchant_id,
+            'LgsType': order['LgsType'],
+            'TradeNo': order['TradeNo'],
+            'MerchantOrderNo': order['MerchantOrderNo'],
+            'Amt': order['Amt'],
+            'LgsNo': order['LogisticsID'],
+            'ShipType': order['ShipType'],
+            'StoreID': order['StoreID'],
+            'UserName': order['UserName'],
+            'UserTel': order['UserTel'],
+            'Retld': '300',
+            'RetString': '訂單建立成功',
+        })
+
+    # ------------------------------------------------------------------
+    # PAYUNi
+    # ------------------------------------------------------------------
+
+    def _payuni_decrypt(self, fields: Dict[str, str]):
+        """驗證 HashInfo 並解密 EncryptInfo，回傳 (cipher, data) 或錯誤回應"""
+        cipher = self._payuni.get(fields.get('MerID', ''))
+        if cipher is None:
+            return None, self.error_response('payuni', 'INVALID_MERID', '商店代號錯誤')
+        encrypt_info = fields.get('EncryptInfo', '')
+        if not cipher.verify_checksum(encrypt_info, fields.get('HashInfo', '')):
+            return None, self.error_response('payuni', 'INVALID_CHECKSUM', 'HashInfo 驗證失敗')
+        try:
+            return cipher, cipher.decrypt(encrypt_info)
+        except ValueError:
+            return None, self.error_response('payuni', 'AES_DECRYPT_ERROR', '解密失敗')
+
+    def _payuni_success(self, cipher, data: Dict) -> Response:
+        encrypt_info = cipher.encrypt(data)
+        return Response.json({'Status': 'SUCCESS', 'Message': '成功', 'EncryptInfo': encrypt_info,
+                              'HashInfo': cipher.checksum(encrypt_info)})
+
+    def payuni_create(self, fields: Dict[str, str]) -> Response:
+        """logistics/create: 7-11 回應寄件代碼，黑貓回應託運單號"""
+        cipher, data = self._payuni_decrypt(fields)
+        if cipher is None:
+            return data
+        if not str(data.get('GoodsAmount', '')).isdigit():
+            return self.error_response('payuni', '400', '訂單錯誤')
+
+        key = ('payuni', fields['MerID'], data.get('MerTradeNo', ''))
+        if key in self.orders:
+            return self.error_response('payuni', 'DUPLICATE_ORDER', '訂單編號重複')
+
+        seq = self._next_seq()
+        logistics_type = data.get('LogisticsType', '')
+        order = self._add_order(key, f'PL{seq:012d}', {
+            'LogisticsType': logistics_type,
+            'ShipmentNo': f'{seq:012d}',
+            'ReceiverStoreID': data.get('ReceiverStoreID', ''),
+            'UpdateTime': f'{datetime.now():%Y-%m-%d %H:%M:%S}',
+        })
+        result = {'MerID': fields['MerID'], 'MerTradeNo': key[2], 'LogisticsID': order['LogisticsID'],
+                  'LogisticsType': logistics_type}
+        if 'Tcat' in logistics_type:
+            result.update(ShipmentNo=order['ShipmentNo'], BookingNote='')
+        else:
+            result.update(CVSPaymentNo=f'P{seq:07d}', CVSValidationNo=f'{seq % 10000:04d}',
+                          ExpireDate=f'{datetime.now() + timedelta(days=7):%Y-%m-%d}')
+        return self._payuni_success(cipher, result)
+
+    def payuni_query(self, fields: Dict[str, str]) -> Response:
+        """logistics/query: 回應加密的物流狀態"""
+        cipher, data = self._payuni_decrypt(fields)
+        if cipher is None:
+            return data
+        order = self.orders.get(('payuni', fields['MerID'], data.get('MerTradeNo', '')))
+        if order is None:
+            return self.error_response('payuni', '400', '訂單錯誤')
+        return self._payuni_success(cipher, {
+            'LogisticsID': order['LogisticsID'],
+            'MerTradeNo': data['MerTradeNo'],
+            'LogisticsType': order['LogisticsType'],
+            'LogisticsStatus': '200',
+            'LogisticsStatusMsg': '訂單建立成功',
+            'ShipmentNo': order['ShipmentNo'],
+            'ReceiverStoreID': order['ReceiverStoreID'],
+            'UpdateTime': order['UpdateTime'],
+        })
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+async def serve(args):
+    """啟動沙箱直到中斷"""
+    async with LogisticsSandbox(build_policy(args), args.host, args.port) as sandbox:
+        print(f"物流沙箱: {sandbox.url}")
+        for path, route in sandbox.routes.items():
+            print(f"   {route.provider:<9} {path}")
+        print("按 Ctrl+C 停止")
+        await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='物流服務商本機沙箱')
+    parser.add_argument('--host', default='127.0.0.1', help='監聽位址 (預設: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8091, help='監聽埠 (預設: 8091)')
+    add_policy_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
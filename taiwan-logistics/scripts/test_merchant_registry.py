@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+多商店金鑰管理測試 (merchant_registry.py)
+
+驗證:
+- 同一 (provider, merchant_id, environment) 取得同一實例，環境不同則分開
+- 環境旗標: ECPayLogistics 的第 4 個參數為 test_mode (正式環境傳入 False)，
+  NewebPayCVSLogistics / PAYUNiLogistics 為 is_production
+- LRU 淘汰與使用統計
+- 金鑰檔輪替時只淘汰有變動的商店；輪替過程檔案損毀時沿用原本的金鑰
+- CSV 金鑰檔與環境變數載入
+
+需要: pip install pycryptodome requests
+
+使用方法:
+    python test_merchant_registry.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from merchant_registry import MerchantRegistry
+
+
+def make_merchants(count: int, rotation: int = 0) -> List[Dict]:
+    """產生三家服務商的測試商店，rotation 改變時第 0 家商店的 HashKey 會改變"""
+    providers = ('ecpay', 'newebpay', 'payuni')
+    merchants = []
+    for i in range(count):
+        key_version = rotation if i == 0 else 0
+        merchants.append({
+            'provider': providers[i % 3],
+            'merchant_id': f'M{i:05d}',
+            'hash_key': f'{i:05d}{key_version:03d}'.ljust(32, 'k'),
+            'hash_iv': f'{i:05d}'.ljust(16, 'v'),
+            'environment': 'test',
+        })
+    return merchants
+
+
+def write_merchants(path: Path, merchants: List[Dict]):
+    """以暫存檔 + rename 原子替換，模擬金鑰輪替"""
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps({'merchants': merchants}), encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def test_environment(check, path: Path, merchants: List[Dict]):
+    """快取與環境旗標"""
+    registry = MerchantRegistry(path, reload_interval=0)
+    first = registry.get('ecpay', 'M00000')
+    production = registry.get('ecpay', 'M00000', 'production')
+    check('同一商店取得同一實例', registry.get('ecpay', 'M00000') is first)
+    check('ECPay 測試 / 正式環境分開快取，正式環境使用正式網址 (test_mode 旗標反轉)',
+          production is not first and first.api_url == 'https://logistics-stage.ecpay.com.tw'
+          and production.api_url == 'https://logistics.ecpay.com.tw')
+    check('實例使用設定的金鑰', first.hash_key == merchants[0]['hash_key'])
+
+    newebpay = registry.get('newebpay', 'M00001')
+    newebpay_production = registry.get('newebpay', 'M00001', 'production')
+    payuni = registry.get('payuni', 'M00002')
+    payuni_production = registry.get('payuni', 'M00002', 'production')
+    check('NewebPay / PAYUNi 以 is_production 切換環境',
+          newebpay.base_url == newebpay.TEST_BASE_URL and newebpay_production.base_url == newebpay.PROD_BASE_URL
+          and payuni.base_url == payuni.TEST_API_URL and payuni_production.base_url == payuni.PROD_API_URL)
+    try:
+        registry.get('ecpay', 'NOPE')
+        check('未設定的商店拋出 KeyError', False)
+    except KeyError:
+        check('未設定的商店拋出 KeyError', True)
+
+
+def test_lru(check, path: Path):
+    """LRU 淘汰"""
+    small = MerchantRegistry(path, capacity=2, reload_interval=0)
+    a = small.get('ecpay', 'M00000')
+    small.get('newebpay', 'M00001')
+    small.get('ecpay', 'M00000')
+    small.get('payuni', 'M00002')
+    usage = small.usage()
+    check('LRU 淘汰最久未使用的商店',
+          len(small) == 2 and ('newebpay', 'M00001', 'test') not in small and small.get('ecpay', 'M00000') is a)
+    check('使用統計 (取用 / 建立 / 淘汰)',
+          (usage[('ecpay', 'M00000', 'test')].requests, usage[('ecpay', 'M00000', 'test')].builds) == (2, 1)
+          and usage[('newebpay', 'M00001', 'test')].evictions == 1)
+
+
+def test_reload(check, path: Path):
+    """金鑰輪替"""
+    registry = MerchantRegistry(path, reload_interval=0)
+    first = registry.get('ecpay', 'M00000')
+    kept = registry.get('newebpay', 'M00001')
+    time.sleep(0.01)
+    write_merchants(path, make_merchants(6, rotation=1))
+    rotated = registry.get('ecpay', 'M00000')
+    check('金鑰輪替後重建實例',
+          rotated is not first and rotated.hash_key == make_merchants(1, rotation=1)[0]['hash_key'])
+    check('未輪替的商店保留實例', registry.get('newebpay', 'M00001') is kept)
+    check('已移除的商店被淘汰', ('ecpay', 'M00000', 'production') not in registry)
+
+    time.sleep(0.01)
+    path.write_text('{"merchants": [', encoding='utf-8')
+    check('金鑰檔損毀時沿用原本的金鑰',
+          registry.get('ecpay', 'M00000') is rotated and registry.last_error is not None)
+
+
+def test_sources(check, tmp: Path):
+    """CSV 與環境變數"""
+    csv_path = tmp / 'merchants.csv'
+    csv_path.write_text('provider,merchant_id,hash_key,hash_iv,environment\n'
+                        'payuni,U1,' + 'k' * 32 + ',' + 'v' * 16 + ',production\n', encoding='utf-8')
+    check('CSV 金鑰檔', MerchantRegistry(csv_path).get('payuni', 'U1', 'production').mer_id == 'U1')
+    os.environ['TEST_MERCHANTS'] = json.dumps(make_merchants(3))
+    check('環境變數 JSON', MerchantRegistry.from_env('TEST_MERCHANTS').get('payuni', 'M00002').mer_id == 'M00002')
+    os.environ['TEST_MERCHANTS'] = str(csv_path)
+    check('環境變數檔案路徑', len(MerchantRegistry.from_env('TEST_MERCHANTS').merchants()) == 1)
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("多商店金鑰管理測試")
+    print("=" * 60 + "\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        path = tmp / 'merchants.json'
+        merchants = make_merchants(6)
+        merchants += [dict(m, environment='production') for m in merchants[:3]]
+        write_merchants(path, merchants)
+
+        test_environment(check, path, merchants)
+        test_lru(check, path)
+        test_reload(check, path)
+        test_sources(check, tmp)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+物流服務商推薦系統 回歸測試 (準確率 + 延遲)
+
+以黃金查詢集 (golden queries) 驗證 recommend.py 的推薦品質與效能:
+- 自動產生: providers.csv 的 provider / name_zh / name_en 欄位
+  (物流資料沒有 reasoning.csv，以服務商本身的識別欄位作為查詢)
+- 人工撰寫: GOLDEN_CASES
+
+量測 accuracy@1、accuracy@3、每筆查詢延遲 (p50/p95/max) 與總吞吐量，
+任一指標低於門檻、或有查詢完全沒有推薦結果時，即以非零結束碼退出，可直接接在 CI 後面。
+
+使用方法:
+    python test_recommend.py
+    python test_recommend.py --verbose          # 列出未命中的查詢
+    python test_recommend.py --repeat 100       # 增加重複次數以穩定延遲量測
+    python test_recommend.py --max-p95-ms 0.5   # 較慢的機器放寬延遲門檻
+"""
+
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from recommend import LogisticsRecommender, RecommendResult
+
+# 回歸門檻 (依目前基準值設定，優化後只可往上調)
+MIN_ACCURACY_AT_1 = 1.0
+MIN_ACCURACY_AT_3 = 1.0
+# p95 延遲門檻 = 基準值 x 餘裕 (基準值為 --repeat 20 量測五次的最大值，1 CPU 開發機)
+BASELINE_P95_LATENCY_MS = 0.035
+LATENCY_MARGIN = 5.0
+MAX_P95_LATENCY_MS = BASELINE_P95_LATENCY_MS * LATENCY_MARGIN
+
+# 共用 keyword_automaton.py 的技能目錄
+SKILLS = ('taiwan-invoice', 'taiwan-payment', 'taiwan-logistics')
+
+# 人工撰寫的黃金查詢 (query, 預期服務商)
+GOLDEN_CASES: List[Tuple[str, str]] = [
+    ('ecpay 7-11 全家', 'ecpay'),
+    ('綠界物流 超商 c2c', 'ecpay'),
+    ('ecpay 宅配 黑貓', 'ecpay'),
+    ('payuni 冷凍', 'payuni'),
+    ('統一物流 7-11常溫/冷凍', 'payuni'),
+    ('payuni aes-256-gcm加密', 'payuni'),
+    ('newebpay aes-256-cbc加密', 'newebpay'),
+    ('藍新物流 超商', 'newebpay'),
+    ('tcat 常溫 冷藏', 'tcat'),
+    ('黑貓宅急便 冷凍', 'tcat'),
+    ('unimart 7-11', 'unimart'),
+    ('fami 全家店到店', 'fami'),
+]
+
+
+def build_golden_set(recommender: LogisticsRecommender) -> List[Tuple[str, str, str]]:
+    """
+    組合黃金查詢集
+
+    Returns:
+        [(query, expected_provider, source)]
+    """
+    cases = []
+    seen = set()
+
+    with open(recommender.data_dir / 'providers.csv', 'r', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+
+    for row in rows:
+        expected = row['provider']
+        queries = [row.get('provider', ''), row.get('name_zh', ''), row.get('name_en', '')]
+        for query in queries:
+            query = query.strip()
+            if query and (query, expected) not in seen:
+                seen.add((query, expected))
+                cases.append((query, expected, 'providers.csv'))
+
+    for query, expected in GOLDEN_CASES:
+        if (query, expected) not in seen:
+            seen.add((query, expected))
+            cases.append((query, expected, 'manual'))
+
+    return cases
+
+
+def top_providers(results: List[RecommendResult]) -> List[str]:
+    """由推薦結果取得排序後的服務商清單 (僅含有得分者)"""
+    return [r.provider for r in results if r.score > 0]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """計算百分位數 (nearest-rank)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_suite(repeat: int = 20) -> Dict:
+    """執行黃金查詢集並回傳統計結果"""
+    recommender = LogisticsRecommender()
+    cases = build_golden_set(recommender)
+    latencies = []
+    hits_at_1 = 0
+    hits_at_3 = 0
+    misses = []
+    empty = []
+
+    started = time.perf_counter()
+    for run in range(repeat):
+        for query, expected, source in cases:
+            t0 = time.perf_counter()
+            result = recommender.recommend(query, top_k=3)
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+            ranked = top_providers(result)
+            hits_at_1 += bool(ranked) and ranked[0] == expected
+            hits_at_3 += expected in ranked[:3]
+            if run == 0 and ranked[:1] != [expected]:
+                misses.append((query, expected, ranked[:3], source))
+            if run == 0 and not ranked:
+                empty.append(query)
+    elapsed = time.perf_counter() - started
+
+    total = len(cases) * repeat
+    return {
+        'queries': len(cases),
+        'total_runs': total,
+        'accuracy_at_1': hits_at_1 / total if total else 0.0,
+        'accuracy_at_3': hits_at_3 / total if total else 0.0,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'max_ms': max(latencies) if latencies else 0.0,
+        'throughput_qps': total / elapsed if elapsed > 0 else 0.0,
+        'misses': misses,
+        'empty': empty,
+    }
+
+
+def automaton_copy_mismatches() -> List[str]:
+    """
+    keyword_automaton.py 在三個技能各有一份，內容必須相同
+
+    Returns:
+        內容不同的技能目錄 (技能單獨安裝、找不到其他副本時為空)
+    """
+    scripts_dir = Path(__file__).resolve().parent
+    source = (scripts_dir / 'keyword_automaton.py').read_bytes()
+    mismatched = []
+    for skill in SKILLS:
+        copy = scripts_dir.parent.parent / skill / 'scripts' / 'keyword_automaton.py'
+        if copy.exists() and copy.read_bytes() != source:
+            mismatched.append(skill)
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description='物流服務商推薦系統回歸測試')
+    parser.add_argument('--repeat', type=int, default=20, help='重複執行次數 (預設: 20)')
+    parser.add_argument('--min-acc1', type=float, default=MIN_ACCURACY_AT_1, help='accuracy@1 門檻')
+    parser.add_argument('--min-acc3', type=float, default=MIN_ACCURACY_AT_3, help='accuracy@3 門檻')
+    parser.add_argument('--max-p95-ms', type=float, default=MAX_P95_LATENCY_MS, help='p95 延遲門檻 (ms)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='列出未命中的查詢')
+    args = parser.parse_args()
+
+    stats = run_suite(repeat=max(1, args.repeat))
+
+    print("=" * 60)
+    print("物流服務商推薦系統 回歸測試")
+    print("=" * 60)
+    print(f"\n黃金查詢: {stats['queries']} 筆 (共執行 {stats['total_runs']} 次)")
+
+    checks = [
+        ('accuracy@1', stats['accuracy_at_1'], args.min_acc1, stats['accuracy_at_1'] >= args.min_acc1),
+        ('accuracy@3', stats['accuracy_at_3'], args.min_acc3, stats['accuracy_at_3'] >= args.min_acc3),
+        ('p95 延遲 (ms)', stats['p95_ms'], args.max_p95_ms, stats['p95_ms'] <= args.max_p95_ms),
+    ]
+
+    print()
+    for name, value, threshold, passed in checks:
+        print(f"   {name:<14} {value:>8.3f}  (門檻 {threshold:g})  {'[PASS]' if passed else '[FAIL]'}")
+    print(f"   {'p50 延遲 (ms)':<14} {stats['p50_ms']:>8.3f}")
+    print(f"   {'max 延遲 (ms)':<14} {stats['max_ms']:>8.3f}")
+    print(f"   {'吞吐量 (q/s)':<14} {stats['throughput_qps']:>8.1f}")
+
+    if args.verbose and stats['misses']:
+        print("\n未命中 (top-1):")
+        for query, expected, ranked, source in stats['misses']:
+            print(f"   [{source}] {query} -> 預期 {expected}, 實際 {', '.join(ranked) or '無'}")
+
+    print(f"   {'無結果查詢':<14} {len(stats['empty']):>8d}  (門檻 0)  {'[FAIL]' if stats['empty'] else '[PASS]'}")
+    mismatched = automaton_copy_mismatches()
+    print(f"   keyword_automaton.py 副本一致  {'[FAIL] ' + ', '.join(mismatched) if mismatched else '[PASS]'}")
+
+    failed = [name for name, _, _, passed in checks if not passed]
+    if stats['empty']:
+        failed.append(f"無推薦結果的查詢 {len(stats['empty'])} 筆")
+    if mismatched:
+        failed.append('keyword_automaton.py 副本不一致')
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] 回歸: {', '.join(failed)}" if failed else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+物流沙箱測試 (sandbox_server.py)
+
+以範例服務類別與 test_logistics.py 的簽章方式對本機沙箱發送請求，驗證:
+- ECPay / NewebPay / PAYUNi 的建立物流訂單、查詢與電子地圖回應格式、簽章可被 client 驗證
+- ECPay CheckMacValue 的 MD5 (test_logistics.py) 與 SHA256 (範例) 兩種算法
+- 錯誤注入比例與狀態碼皆來自 data/status-codes.csv
+- 限流回應 429 + Retry-After
+- ProviderSandbox 為抽象類別；sandbox_core.py 三個技能的副本內容相同
+並量測多執行緒 client 的吞吐量。
+
+使用方法:
+    python test_sandbox_server.py
+    python test_sandbox_server.py --threads 16 --count 2000 --latency lognormal:20,0.5
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+import requests
+
+from example_loader import load_example
+from sandbox_core import ProviderSandbox, Response
+from sandbox_server import (
+    DEFAULT_MERCHANTS, LatencyModel, LogisticsSandbox, SandboxPolicy, SandboxThread, ecpay_check_mac_value,
+    load_error_codes,
+)
+from test_logistics import generate_check_mac_value
+
+# sandbox_core.py 有副本的技能
+SKILLS = ('taiwan-invoice', 'taiwan-payment', 'taiwan-logistics')
+
+ecpay = load_example('ecpay-logistics-cvs-example')
+newebpay = load_example('newebpay-logistics-cvs-example')
+payuni = load_example('payuni-logistics-cvs-example')
+
+ECPAY_ID, NEWEBPAY_ID, PAYUNI_ID = (next(iter(DEFAULT_MERCHANTS[p])) for p in ('ecpay', 'newebpay', 'payuni'))
+
+
+def payuni_service(base_url: str):
+    service = payuni.PAYUNiLogistics(PAYUNI_ID, *DEFAULT_MERCHANTS['payuni'][PAYUNI_ID])
+    service.base_url = base_url + '/api'
+    return service
+
+
+def payuni_order(order_no: str):
+    return payuni.CVS711ShipmentData(
+        mer_trade_no=order_no, goods_type=1, goods_amount=500, goods_name='測試商品',
+        sender_name='寄件人', sender_phone='0912345678', sender_store_id='123456',
+        receiver_name='收件人', receiver_phone='0987654321', receiver_store_id='654321',
+        notify_url='https://example.com/notify')
+
+
+def check_formats(check) -> None:
+    """三家服務商的請求 / 回應格式"""
+    with SandboxThread(LogisticsSandbox()) as sandbox:
+        session = requests.Session()
+        hash_key, hash_iv = DEFAULT_MERCHANTS['ecpay'][ECPAY_ID]
+
+        # ECPay: 範例的 create_cvs_order (SHA256) 建立，test_logistics.py 的算法 (MD5) 查詢
+        service = ecpay.ECPayLogistics(ECPAY_ID, hash_key, hash_iv)
+        created = session.post(sandbox.url + '/Express/Create', data=service.create_cvs_order(
+            'SBX0001', '測試商品', 500, '收件人', '0987654321', '131386')).text
+        status, message, *pairs = created.split('|')
+        result = dict(pair.split('=', 1) for pair in pairs)
+        check('ECPay Express/Create 回應 1|OK|... (CheckMacValue 可驗證)',
+              (status, message) == ('1', 'OK') and result['MerchantTradeNo'] == 'SBX0001'
+              and result['CheckMacValue'] == generate_check_mac_value(
+                  {k: v for k, v in result.items() if k != 'CheckMacValue'}, hash_key, hash_iv))
+
+        params = {'MerchantID': ECPAY_ID, 'AllPayLogisticsID': result['AllPayLogisticsID'],
+                  'TimeStamp': str(int(time.time()))}
+        params['CheckMacValue'] = generate_check_mac_value(params, hash_key, hash_iv)
+        queried = dict(urllib.parse.parse_qsl(session.post(
+            sandbox.url + '/Helper/QueryLogisticsTradeInfo/V2', data=params).text, keep_blank_values=True))
+        check('ECPay 查詢 (URL 編碼 + CheckMacValue)',
+              queried.get('MerchantTradeNo') == 'SBX0001' and queried.get('LogisticsStatus') == '300'
+              and queried['CheckMacValue'] == ecpay_check_mac_value(queried, hash_key, hash_iv))
+
+        params['CheckMacValue'] = '0' * 32
+        rejected = session.post(sandbox.url + '/Helper/QueryLogisticsTradeInfo/V2', data=params).text
+        check('ECPay CheckMacValue 錯誤回應 0|10100058|...', rejected.startswith('0|10100058|'))
+
+        # NewebPay: 範例的 query_store_map / create_shipment
+        service = newebpay.NewebPayCVSLogistics(NEWEBPAY_ID, *DEFAULT_MERCHANTS['newebpay'][NEWEBPAY_ID])
+        service.base_url = sandbox.url + '/API/Logistic'
+        redirect = service.query_store_map(newebpay.StoreMapData(
+            merchant_order_no='SBX0002', lgs_type='C2C', ship_type='1', return_url='https://example.com/map'))
+        shipment = service.create_shipment(newebpay.CVSShipmentData(
+            merchant_order_no='SBX0002', lgs_type='C2C', ship_type='1', receiver_store_code='131386',
+            receiver_name='收件人', receiver_cell_phone='0987654321', goods_amount=880, goods_name='測試商品'))
+        check('NewebPay storeMap 302 重導向', redirect.startswith(sandbox.url + '/storeMap?MerchantOrderNo=SBX0002'))
+        check('NewebPay createShipment (EncryptData_ / HashData_ 可驗證)',
+              shipment.success and shipment.logistics_no and shipment.cvs_payment_no)
+
+        encrypt_data = service.aes_encrypt(json.dumps({'MerchantOrderNo': 'SBX0002',
+                                                       'TimeStamp': str(int(time.time()))}))
+        result = session.post(service.base_url + '/queryShipment', data={
+            'UID_': NEWEBPAY_ID, 'EncryptData_': encrypt_data, 'HashData_': service.generate_hash_data(encrypt_data),
+            'Version_': '1.0', 'RespondType_': 'JSON'}).json()
+        trade = json.loads(service.aes_decrypt(result['EncryptData_']))
+        check('NewebPay queryShipment',
+              service.verify_hash_data(result['EncryptData_'], result['HashData_'])
+              and trade['LgsNo'] == shipment.logistics_no and trade['Amt'] == 880)
+
+        # PAYUNi: 範例的 create_711_shipment / query_shipment
+        service = payuni_service(sandbox.url)
+        created = service.create_711_shipment(payuni_order('SBX0003'))
+        duplicate = service.create_711_shipment(payuni_order('SBX0003'))
+        queried = service.query_shipment(payuni.QueryShipmentData(mer_trade_no='SBX0003'))
+        check('PAYUNi logistics/create 與 logistics/query',
+              created.success and created.cvs_payment_no and created.expire_date
+              and queried.success and queried.logistics_id == created.logistics_id
+              and queried.logistics_status == '200')
+        check('PAYUNi 重複訂單回應錯誤', not duplicate.success and duplicate.raw.get('ErrCode') == 'DUPLICATE_ORDER')
+
+
+def check_policy(check) -> None:
+    """錯誤注入與限流"""
+    policy = SandboxPolicy(error_rate=0.3, seed=7)
+    with SandboxThread(LogisticsSandbox(policy)) as sandbox:
+        service = payuni_service(sandbox.url)
+        results = [service.create_711_shipment(payuni_order(f'INJ{i:05d}')) for i in range(500)]
+    csv_codes = {code for code, _ in load_error_codes()['payuni']}
+    failed = Counter(r.raw.get('ErrCode') for r in results if not r.success)
+    check(f'錯誤注入比例 ({sum(failed.values()) / len(results):.1%}，預期 30%)',
+          abs(sum(failed.values()) / len(results) - 0.3) < 0.06)
+    check(f'注入的狀態碼皆來自 status-codes.csv ({", ".join(sorted(failed))})', set(failed) == csv_codes)
+
+    policy = SandboxPolicy(error_rate=1.0, error_codes={'ecpay': ['3001']})
+    with SandboxThread(LogisticsSandbox(policy)) as sandbox:
+        service = ecpay.ECPayLogistics(ECPAY_ID, *DEFAULT_MERCHANTS['ecpay'][ECPAY_ID])
+        text = requests.post(sandbox.url + '/Express/Create', data=service.create_cvs_order(
+            'ONLY0001', '測試商品', 500, '收件人', '0987654321', '131386')).text
+    check('ECPay 限定注入的狀態碼', text == '0|3001|系統錯誤')
+
+    # 限流: 每秒 20 筆、瞬間容量 5；0.5 秒內連續送出
+    with SandboxThread(LogisticsSandbox(SandboxPolicy(rate_limit=20, burst=5))) as sandbox:
+        session = requests.Session()
+        service = payuni_service(sandbox.url)
+        encrypt_info = service.encrypt_data({'MerID': PAYUNI_ID, 'MerTradeNo': 'RATE'})
+        data = {'MerID': PAYUNI_ID, 'Version': '1.0', 'EncryptInfo': encrypt_info,
+                'HashInfo': service.generate_hash_info(encrypt_info)}
+        statuses, retry_after = Counter(), set()
+        started = time.perf_counter()
+        while time.perf_counter() - started < 0.5:
+            response = session.post(service.base_url + '/logistics/query', data=data)
+            statuses[response.status_code] += 1
+            if response.status_code == 429:
+                retry_after.add(response.headers.get('Retry-After'))
+        elapsed = time.perf_counter() - started
+    allowed = 5 + 20 * elapsed
+    check(f'限流回應 429 + Retry-After (放行 {statuses[200]}，上限約 {allowed:.0f}，拒絕 {statuses[429]})',
+          statuses[429] > 0 and retry_after == {'1'} and statuses[200] <= allowed + 1)
+
+
+def core_copy_mismatches() -> List[str]:
+    """
+    sandbox_core.py 在三個技能各有一份，內容必須相同
+
+    Returns:
+        內容不同的技能目錄 (技能單獨安裝、找不到其他副本時為空)
+    """
+    scripts_dir = Path(__file__).resolve().parent
+    source = (scripts_dir / 'sandbox_core.py').read_bytes()
+    mismatched = []
+    for skill in SKILLS:
+        copy = scripts_dir.parent.parent / skill / 'scripts' / 'sandbox_core.py'
+        if copy.exists() and copy.read_bytes() != source:
+            mismatched.append(skill)
+    return mismatched
+
+
+def check_core(check) -> None:
+    """共用部分 (sandbox_core.py)"""
+    class Incomplete(ProviderSandbox):
+        def error_response(self, provider, code, message):
+            return Response.json({'code': code})
+
+    rejected = 0
+    for cls in (ProviderSandbox, Incomplete):
+        try:
+            cls()
+        except TypeError:
+            rejected += 1
+    check('ProviderSandbox 為抽象類別 (未實作 error_codes / error_response 不可建立)', rejected == 2)
+
+    mismatched = core_copy_mismatches()
+    check(f"sandbox_core.py 三個技能的副本一致{' (' + ', '.join(mismatched) + ')' if mismatched else ''}",
+          not mismatched)
+
+
+def benchmark(threads: int, count: int, latency: str) -> None:
+    """多執行緒 client 對沙箱的吞吐量 (PAYUNi create_711_shipment)"""
+    policy = SandboxPolicy(latency=LatencyModel.parse(latency), seed=1)
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    with SandboxThread(LogisticsSandbox(policy)) as sandbox:
+        def worker(offset: int):
+            service = payuni_service(sandbox.url)
+            local = []
+            for i in range(offset, count, threads):
+                started = time.perf_counter()
+                service.create_711_shipment(payuni_order(f'BEN{i:08d}'))
+                local.append(time.perf_counter() - started)
+            with lock:
+                latencies.extend(local)
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"\n   吞吐量 ({threads} 執行緒, {count} 筆, 延遲 {latency}): {count / elapsed:,.0f} 筆/秒")
+    print(f"   p50 {latencies[len(latencies) // 2] * 1000:.1f} ms   "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='物流沙箱測試')
+    parser.add_argument('--threads', type=int, default=8, help='吞吐量量測的執行緒數 (預設: 8)')
+    parser.add_argument('--count', type=int, default=800, help='吞吐量量測的請求數 (預設: 800)')
+    parser.add_argument('--latency', default='lognormal:10,0.5', help='吞吐量量測的延遲分佈')
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("物流沙箱測試")
+    print("=" * 60 + "\n")
+
+    check_formats(check)
+    check_policy(check)
+    check_core(check)
+    benchmark(args.threads, args.count, args.latency)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,12 +9,21 @@ API 文件: https://developers.ecpay.com.tw
 """
 
 import hashlib
+import hmac
+import sys
 import urllib.parse
 import time
 from datetime import datetime
+from pathlib import Path
 from typing import Dict, Literal, Optional, List
 from dataclasses import dataclass, field
 
+# CheckMacValue 的 URL Encode 與 scripts/ecpay_checkmac.py 共用同一份 .NET 規則實作
+_SCRIPTS_DIR = str(Path(__file__).resolve().parent.parent / 'scripts')
+if _SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, _SCRIPTS_DIR)
+from ecpay_checkmac import dotnet_url_encode  # noqa: E402
+
 
 @dataclass
 class PaymentOrderData:
@@ -146,8 +155,8 @@ class ECPayPaymentService:
         # 步驟 3: 加入 HashKey 和 HashIV
         raw = f'HashKey={self.hash_key}&{param_str}&HashIV={self.hash_iv}'
 
-        # 步驟 4: URL Encode 並轉小寫
-        encoded = urllib.parse.quote_plus(raw).lower()
+        # 步驟 4: URL Encode (.NET 規則: - _ . ! * ( ) 不編碼，~ 編碼為 %7e) 並轉小寫
+        encoded = dotnet_url_encode(raw)
 
         # 步驟 5: SHA256 雜湊並轉大寫
         return hashlib.sha256(encoded.encode('utf-8')).hexdigest().upper()
@@ -162,12 +171,15 @@ class ECPayPaymentService:
         Returns:
             bool: 驗證是否通過
         """
-        received_mac = params.pop('CheckMacValue', None)
+        received_mac = params.get('CheckMacValue')
         if not received_mac:
             return False
 
-        calculated_mac = self.generate_check_mac_value(params)
-        return calculated_mac == received_mac.upper()
+        # 不修改呼叫端的 dict
+        calculated_mac = self.generate_check_mac_value(
+            {k: v for k, v in params.items() if k != 'CheckMacValue'}
+        )
+        return hmac.compare_digest(calculated_mac.encode('utf-8'), received_mac.upper().encode('utf-8'))
 
     def create_order(
         self,
@@ -275,8 +287,7 @@ class ECPayPaymentService:
             ...     print(f"付款成功: {result.trade_no}")
         """
         # 驗證 CheckMacValue
-        verify_data = callback_data.copy()
-        if not self.verify_check_mac_value(verify_data):
+        if not self.verify_check_mac_value(callback_data):
             raise ValueError('CheckMacValue 驗證失敗')
 
         # 解析回傳資料
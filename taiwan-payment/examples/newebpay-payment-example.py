@@ -9,6 +9,7 @@ API 文件: https://www.newebpay.com
 """
 
 import hashlib
+import hmac
 import urllib.parse
 import json
 from datetime import datetime
@@ -155,13 +156,22 @@ class NewebPayMPGService:
         # 步驟 1: 轉換為查詢字串
         query_string = urllib.parse.urlencode(data)
 
-        # 步驟 2: AES-256-CBC 加密
-        cipher = AES.new(self.hash_key, AES.MODE_CBC, self.hash_iv)
-        padded = pad(query_string.encode('utf-8'), AES.block_size)
-        encrypted = cipher.encrypt(padded)
+        # 步驟 2: AES-256-CBC 加密並轉換為 hex
+        return self.encrypt_text(query_string)
+
+    def encrypt_text(self, text: str) -> str:
+        """
+        以 AES-256-CBC 加密字串 (查詢字串或 JSON)
 
-        # 步驟 3: 轉換為 hex
-        return encrypted.hex()
+        Args:
+            text: 明文
+
+        Returns:
+            str: AES 加密後的 hex 字串
+        """
+        cipher = AES.new(self.hash_key, AES.MODE_CBC, self.hash_iv)
+        padded = pad(text.encode('utf-8'), AES.block_size)
+        return cipher.encrypt(padded).hex()
 
     def decrypt_trade_info(self, encrypted_data: str) -> Dict[str, any]:
         """
@@ -171,7 +181,7 @@ class NewebPayMPGService:
             encrypted_data: AES 加密的 hex 字串
 
         Returns:
-            Dict: 解密後的資料字典
+            Dict: 解密後的資料字典 (RespondType=JSON 時為 JSON 物件)
 
         Raises:
             ValueError: 解密失敗
@@ -185,8 +195,10 @@ class NewebPayMPGService:
             decrypted = decipher.decrypt(encrypted_bytes)
             unpadded = unpad(decrypted, AES.block_size)
 
-            # 步驟 3: 解析查詢字串
+            # 步驟 3: 解析 JSON 或查詢字串
             query_string = unpadded.decode('utf-8')
+            if query_string.startswith('{'):
+                return json.loads(query_string)
             params = urllib.parse.parse_qs(query_string)
 
             # 步驟 4: 轉換為單值字典
@@ -228,7 +240,7 @@ class NewebPayMPGService:
             bool: 驗證是否通過
         """
         calculated_sha = self.generate_trade_sha(trade_info)
-        return calculated_sha == trade_sha.upper()
+        return hmac.compare_digest(calculated_sha.encode('utf-8'), trade_sha.upper().encode('utf-8'))
 
     def create_order(
         self,
@@ -349,7 +361,22 @@ class NewebPayMPGService:
         if not self.verify_trade_sha(trade_info, trade_sha):
             raise ValueError('TradeSha 驗證失敗')
 
-        # 解密 TradeInfo
+        # 解密 TradeInfo 並解析
+        return self.decode_callback(trade_info)
+
+    def decode_callback(self, trade_info: str) -> MPGCallbackData:
+        """
+        解密並解析已通過 TradeSha 驗證的 TradeInfo
+
+        Args:
+            trade_info: 加密後的 TradeInfo
+
+        Returns:
+            MPGCallbackData: 解析後的回傳資料
+
+        Raises:
+            ValueError: 解密失敗
+        """
         decrypted = self.decrypt_trade_info(trade_info)
 
         # 解析回傳資料
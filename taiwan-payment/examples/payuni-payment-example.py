@@ -12,7 +12,7 @@ import hashlib
 import urllib.parse
 import time
 from datetime import datetime
-from typing import Dict, Literal, Optional
+from typing import Any, Dict, Literal, Optional
 from dataclasses import dataclass, field
 
 try:
@@ -68,8 +68,8 @@ class PaymentCallbackData:
     trade_status: str
     pay_type: str
     pay_date: str
-    settle_date: Optional[str] = None
     checksum: str
+    settle_date: Optional[str] = None
     raw: Dict = field(default_factory=dict)
 
 
@@ -105,7 +105,8 @@ class PAYUNiPaymentService:
         mer_id: str,
         hash_key: str,
         hash_iv: str,
-        is_production: bool = False
+        is_production: bool = False,
+        transport: Optional[Any] = None,
     ):
         """
         初始化 PAYUNi 金流服務
@@ -115,6 +116,7 @@ class PAYUNiPaymentService:
             hash_key: HashKey
             hash_iv: HashIV (16 bytes)
             is_production: 是否為正式環境 (預設 False)
+            transport: 共用的 HTTP transport (scripts/http_transport.py 的 SyncTransport)，未指定時使用 requests
 
         Raises:
             ImportError: 缺少 pycryptodome 套件
@@ -127,6 +129,7 @@ class PAYUNiPaymentService:
         self.hash_iv = hash_iv.encode('utf-8')
         self.api_url = self.PROD_API_URL if is_production else self.TEST_API_URL
         self.query_url = self.PROD_QUERY_URL if is_production else self.TEST_QUERY_URL
+        self.transport = transport
 
     def encrypt_data(self, data: Dict[str, any]) -> str:
         """
@@ -299,8 +302,10 @@ class PAYUNiPaymentService:
 
         # 發送 API 請求
         try:
-            import requests
-            response = requests.post(
+            http = self.transport
+            if http is None:
+                import requests as http
+            response = http.post(
                 self.api_url,
                 data=api_data,
                 timeout=30,
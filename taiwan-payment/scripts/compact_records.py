@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Taiwan Payment Skill - 精簡記錄類別 (__slots__)
+
+examples/ 中的 PaymentCallbackData、PaymentOrderResponse、MPGCallbackData 等
+都是一般 @dataclass，每個實例帶一個 __dict__，且 raw 欄位保存整份回傳參數的 dict。
+一天份的回呼放在記憶體中對帳時，這兩者佔了大部分 RSS。
+
+compact() 依原本的 dataclass 欄位產生對應的精簡類別:
+- slots=True，實例沒有 __dict__
+- 可選 frozen=True (不可變，可作為 dict key / set 成員)
+- raw 改存原始編碼 (payload bytes)，讀取 .raw 時才解碼，不快取
+  ('form': application/x-www-form-urlencoded，'json': 緊湊 JSON)
+- 少數固定值的欄位 (RtnMsg、PaymentType 等) 以 sys.intern 共用字串，
+  每筆回呼各自解析出的相同字串不再重複佔用記憶體
+
+使用範例:
+    from compact_records import ECPayCallbackRecord
+
+    record = ECPayCallbackRecord.from_record(service.parse_callback(params))
+    record = ECPayCallbackRecord.from_payload(request.get_data(), **fields)
+    record.raw['CheckMacValue']    # 需要時才解碼
+    record.to_record()             # 轉回原本的 PaymentCallbackData
+
+記憶體量測:
+    python compact_records.py --benchmark --count 1000000
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.parse
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from example_loader import load_example
+
+ENCODINGS = ('json', 'form')
+
+
+def encode_payload(raw: Dict[str, Any], encoding: str = 'json') -> bytes:
+    """
+    將 raw dict 編碼為 payload
+
+    Args:
+        raw: 原始回傳參數
+        encoding: 'json' 或 'form'
+
+    Returns:
+        UTF-8 bytes
+    """
+    if not raw:
+        return b''
+    if encoding == 'form':
+        return urllib.parse.urlencode(raw).encode('ascii')
+    return json.dumps(raw, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def decode_payload(payload: bytes, encoding: str = 'json') -> Dict[str, Any]:
+    """將 payload 解碼為 dict"""
+    if not payload:
+        return {}
+    if encoding == 'form':
+        return dict(urllib.parse.parse_qsl(payload.decode('utf-8'), keep_blank_values=True))
+    return json.loads(payload)
+
+
+@lru_cache(maxsize=None)
+def compact(cls: type, frozen: bool = False, encoding: str = 'json', name: Optional[str] = None,
+            intern_fields: Tuple[str, ...] = ()) -> type:
+    """
+    產生 dataclass 的精簡版本
+
+    Args:
+        cls: 原本的 dataclass
+        frozen: 是否不可變
+        encoding: raw 的編碼方式 ('json' / 'form')
+        name: 類別名稱 (預設為 Compact<原名稱> / Frozen<原名稱>)
+        intern_fields: 以 sys.intern 共用字串的欄位 (僅適合少數固定值的欄位)
+
+    Returns:
+        slots=True 的 dataclass；原類別有 raw 欄位時改為 payload 欄位與 raw 屬性
+
+    Raises:
+        ValueError: encoding 不支援
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f'不支援的編碼: {encoding}')
+
+    source_fields = [f for f in dataclasses.fields(cls) if f.name != 'raw']
+    has_raw = len(source_fields) != len(dataclasses.fields(cls))
+    field_names = tuple(f.name for f in source_fields)
+
+    specs = []
+    for f in source_fields:
+        options = {}
+        if f.default is not dataclasses.MISSING:
+            options['default'] = f.default
+        if f.default_factory is not dataclasses.MISSING:
+            options['default_factory'] = f.default_factory
+        specs.append((f.name, f.type, dataclasses.field(**options)))
+
+    namespace = {
+        '__module__': __name__,
+        '__doc__': f'{cls.__doc__ or cls.__name__} (精簡版)',
+        'source': cls,
+        'encoding': encoding,
+    }
+
+    if has_raw:
+        specs.append(('payload', bytes, dataclasses.field(default=b'', repr=False, compare=False)))
+
+        def raw(self) -> Dict[str, Any]:
+            """原始回傳參數 (每次存取時解碼)"""
+            return decode_payload(self.payload, encoding)
+
+        namespace['raw'] = property(raw)
+
+    def from_record(klass, record, payload: Optional[bytes] = None):
+        """
+        由原本的 dataclass 實例轉換
+
+        Args:
+            record: 原本的實例
+            payload: 已編碼的原始資料 (預設由 record.raw 編碼)
+        """
+        values = {n: getattr(record, n) for n in field_names}
+        if has_raw:
+            values['payload'] = payload if payload is not None else encode_payload(record.raw, encoding)
+        return klass(**values)
+
+    def from_payload(klass, payload: bytes, **values):
+        """直接以原始資料 (例如 POST body) 建立，不經過 dict"""
+        return klass(payload=payload, **values)
+
+    def to_record(self):
+        """轉回原本的 dataclass"""
+        values = {n: getattr(self, n) for n in field_names}
+        if has_raw:
+            values['raw'] = self.raw
+        return cls(**values)
+
+    if intern_fields:
+        def __post_init__(self):
+            for n in intern_fields:
+                value = getattr(self, n)
+                if type(value) is str:
+                    object.__setattr__(self, n, sys.intern(value))
+
+        namespace['__post_init__'] = __post_init__
+
+    namespace['from_record'] = classmethod(from_record)
+    if has_raw:
+        namespace['from_payload'] = classmethod(from_payload)
+    namespace['to_record'] = to_record
+
+    class_name = name or f"{'Frozen' if frozen else 'Compact'}{cls.__name__}"
+    return dataclasses.make_dataclass(class_name, specs, namespace=namespace, slots=True, frozen=frozen)
+
+
+ecpay = load_example('ecpay-payment-example')
+newebpay = load_example('newebpay-payment-example')
+payuni = load_example('payuni-payment-example')
+
+# ECPay 回呼本身就是 form POST，payload 可直接存 request body
+ECPAY_INTERN = ('rtn_msg', 'payment_type', 'payment_type_charge_fee')
+NEWEBPAY_INTERN = ('status', 'message', 'merchant_id', 'payment_type')
+PAYUNI_INTERN = ('status', 'message', 'mer_id', 'trade_status', 'pay_type')
+
+ECPayCallbackRecord = compact(ecpay.PaymentCallbackData, encoding='form', name='ECPayCallbackRecord',
+                              intern_fields=ECPAY_INTERN)
+ECPayOrderResponseRecord = compact(ecpay.PaymentOrderResponse, encoding='form', name='ECPayOrderResponseRecord')
+NewebPayCallbackRecord = compact(newebpay.MPGCallbackData, name='NewebPayCallbackRecord',
+                                 intern_fields=NEWEBPAY_INTERN)
+PAYUNiCallbackRecord = compact(payuni.PaymentCallbackData, name='PAYUNiCallbackRecord', intern_fields=PAYUNI_INTERN)
+PAYUNiOrderResponseRecord = compact(payuni.PaymentOrderResponse, name='PAYUNiOrderResponseRecord')
+
+FrozenECPayCallbackRecord = compact(ecpay.PaymentCallbackData, frozen=True, encoding='form',
+                                    name='FrozenECPayCallbackRecord', intern_fields=ECPAY_INTERN)
+FrozenNewebPayCallbackRecord = compact(newebpay.MPGCallbackData, frozen=True, name='FrozenNewebPayCallbackRecord',
+                                       intern_fields=NEWEBPAY_INTERN)
+FrozenPAYUNiCallbackRecord = compact(payuni.PaymentCallbackData, frozen=True, name='FrozenPAYUNiCallbackRecord',
+                                     intern_fields=PAYUNI_INTERN)
+
+
+# ============================================================================
+# 記憶體量測
+# ============================================================================
+
+VARIANTS = {
+    'dataclass': '原本 PaymentCallbackData (raw dict)',
+    'compact': 'ECPayCallbackRecord (slots + payload)',
+    'frozen': 'FrozenECPayCallbackRecord',
+}
+
+
+_RTN_MSG = urllib.parse.quote_plus('交易成功')
+
+
+def _callback_body(i: int) -> bytes:
+    """模擬 ReturnURL 收到的 POST body"""
+    return (
+        f'MerchantID=3002607&MerchantTradeNo=ORD{i:012d}&RtnCode=1&RtnMsg={_RTN_MSG}'
+        f'&TradeNo=2401{i:012d}&TradeAmt={100 + i % 5000}&PaymentDate=2024%2F01%2F29+14%3A{i % 60:02d}%3A00'
+        f'&PaymentType=Credit_CreditCard&PaymentTypeChargeFee=30'
+        f'&TradeDate=2024%2F01%2F29+14%3A{i % 60:02d}%3A00&SimulatePaid=0&CheckMacValue={i:064X}'
+    ).encode('ascii')
+
+
+def _build(variant: str, body: bytes):
+    """與 ECPayPaymentService.parse_callback 相同的欄位轉換 (每筆各自解析，字串不共用)"""
+    params = dict(urllib.parse.parse_qsl(body.decode('ascii'), keep_blank_values=True))
+    values = dict(
+        merchant_trade_no=params['MerchantTradeNo'],
+        rtn_code=int(params['RtnCode']),
+        rtn_msg=params['RtnMsg'],
+        trade_no=params['TradeNo'],
+        trade_amt=int(params['TradeAmt']),
+        payment_date=params['PaymentDate'],
+        payment_type=params['PaymentType'],
+        payment_type_charge_fee=params['PaymentTypeChargeFee'],
+        trade_date=params['TradeDate'],
+        simulate_paid=int(params['SimulatePaid']),
+        check_mac_value=params['CheckMacValue'],
+    )
+    if variant == 'dataclass':
+        return ecpay.PaymentCallbackData(raw=params, **values)
+    record_cls = ECPayCallbackRecord if variant == 'compact' else FrozenECPayCallbackRecord
+    return record_cls.from_payload(body, **values)
+
+
+def _rss_bytes() -> int:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def _measure(variant: str, count: int):
+    """子程序: 建立 count 筆記錄並輸出 RSS 增量 (bytes) 與耗時"""
+    before = _rss_bytes()
+    started = time.perf_counter()
+    records = [_build(variant, _callback_body(i)) for i in range(count)]
+    elapsed = time.perf_counter() - started
+    used = _rss_bytes() - before
+    assert records[-1].raw['TradeNo'] == f'2401{count - 1:012d}'
+    print(json.dumps({'rss': used, 'elapsed': elapsed}))
+
+
+def benchmark(count: int = 1_000_000) -> int:
+    """各版本在獨立子程序中建立 count 筆回呼記錄，比較 RSS 增量"""
+    if not os.path.exists('/proc/self/statm'):
+        print('需要 Linux /proc 才能量測 RSS')
+        return 1
+
+    print("=" * 72)
+    print(f"付款回呼記錄記憶體用量 ({count:,} 筆，ECPay PaymentCallbackData)")
+    print("=" * 72)
+
+    results = {}
+    for variant, label in VARIANTS.items():
+        output = subprocess.run(
+            [sys.executable, __file__, '--measure', variant, '--count', str(count)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results[variant] = json.loads(output)
+        rss = results[variant]['rss']
+        print(f"   {label:<40} {rss / 1024 ** 2:>9.1f} MB  {rss / count:>6.0f} B/筆  "
+              f"{results[variant]['elapsed']:>6.2f} 秒")
+
+    baseline = results['dataclass']['rss']
+    print(f"\n   節省: {(1 - results['compact']['rss'] / baseline) * 100:.0f}% "
+          f"({baseline / results['compact']['rss']:.1f}x)")
+
+    # 轉換正確性
+    body = _callback_body(7)
+    original = _build('dataclass', body)
+    record = ECPayCallbackRecord.from_record(original)
+    frozen = _build('frozen', body)
+    checks = [
+        ('from_record → to_record 還原', record.to_record() == original),
+        ('lazy raw 解碼與原始參數相同', frozen.raw == original.raw),
+        ('無 __dict__', not hasattr(record, '__dict__')),
+        ('frozen 可 hash', hash(frozen) == hash(_build('frozen', body))),
+        ('固定值欄位共用字串', _build('compact', body).rtn_msg is record.rtn_msg),
+    ]
+    print()
+    for check_name, passed in checks:
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {check_name}")
+    print("=" * 72)
+
+    return 0 if all(passed for _, passed in checks) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='精簡記錄類別 (__slots__)')
+    parser.add_argument('--benchmark', action='store_true', help='比較原本 dataclass 與精簡版本的記憶體用量')
+    parser.add_argument('--count', type=int, default=1_000_000, help='量測筆數 (預設: 1000000)')
+    parser.add_argument('--measure', choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        _measure(args.measure, args.count)
+        return 0
+    if args.benchmark:
+        return benchmark(args.count)
+
+    parser.print_help()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
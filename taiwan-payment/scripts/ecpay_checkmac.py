@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Taiwan Payment Skill - ECPay CheckMacValue 回呼驗證
+
+大量付款回呼 (ReturnURL) 的驗證元件:
+- 每個商店的 HashKey / HashIV 前後綴只編碼一次，並預先算好前綴的 SHA256 狀態
+- 只對參數區段做 URL Encode，使用 .NET 風格 (ECPay 規格) 的 256 項查表
+- 參數名稱的編碼結果快取 (回呼欄位固定)，純英數值直接轉小寫
+- 以 hmac.compare_digest 比對，不修改呼叫端的 dict
+- verify_many() 批次驗證佇列中的回呼
+
+.NET 風格 URL Encode (等同 quote_plus → 轉小寫 → 還原 %2d %5f %2e %21 %2a %28 %29):
+    英數字與 - _ . ! * ( ) 不編碼，空白轉 +，其餘轉 %xx (小寫)
+
+使用範例:
+    from ecpay_checkmac import ECPayCallbackVerifier
+
+    verifier = ECPayCallbackVerifier({'3002607': ('pwFHCqoQZGmho4w6', 'EkRm7iFT261dpevs')})
+    if verifier.verify(request.form.to_dict()):
+        ...
+    results = verifier.verify_many(queued_callbacks)
+
+效能量測:
+    python ecpay_checkmac.py --benchmark
+"""
+
+import argparse
+import hashlib
+import hmac
+import sys
+import time
+import urllib.parse
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+# .NET HttpUtility.UrlEncode 不編碼的字元
+_SAFE_BYTES = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_.!*()'
+
+
+def _build_table() -> Tuple[str, ...]:
+    table = []
+    for b in range(256):
+        if b in _SAFE_BYTES:
+            table.append(chr(b).lower())
+        elif b == 0x20:
+            table.append('+')
+        else:
+            table.append(f'%{b:02x}')
+    return tuple(table)
+
+
+# byte → 編碼並轉小寫後的字串
+_ENCODE_TABLE = _build_table()
+
+# ECPay 規格的還原表 (僅供參照實作使用)
+DOTNET_RESTORE = (
+    ('%2d', '-'), ('%5f', '_'), ('%2e', '.'), ('%21', '!'),
+    ('%2a', '*'), ('%28', '('), ('%29', ')'),
+)
+
+
+def dotnet_url_encode(text: str) -> str:
+    """
+    ECPay CheckMacValue 使用的 URL Encode (已轉小寫)
+
+    Args:
+        text: 原始字串
+
+    Returns:
+        編碼並轉小寫後的字串
+    """
+    if text.isascii() and text.isalnum():
+        return text.lower()
+    table = _ENCODE_TABLE
+    return ''.join([table[b] for b in text.encode('utf-8')])
+
+
+def reference_url_encode(text: str) -> str:
+    """規格文件的逐步實作 (quote_plus → 轉小寫 → 還原特殊字元)，用於比對"""
+    encoded = urllib.parse.quote_plus(text, safe='').lower()
+    for before, after in DOTNET_RESTORE:
+        encoded = encoded.replace(before, after)
+    return encoded.replace('~', '%7e')
+
+
+class CheckMacValue:
+    """
+    單一商店的 CheckMacValue 計算器
+
+    HashKey 前綴編碼後先送入 SHA256，每次計算只 copy() 雜湊狀態再補上參數與後綴。
+    """
+
+    def __init__(self, hash_key: str, hash_iv: str):
+        self._prefix_hash = hashlib.sha256(dotnet_url_encode(f'HashKey={hash_key}&').encode('ascii'))
+        self._suffix = dotnet_url_encode(f'&HashIV={hash_iv}').encode('ascii')
+        self._key_cache: Dict[str, str] = {}
+
+    def _encode_key(self, key: str) -> str:
+        encoded = self._key_cache.get(key)
+        if encoded is None:
+            encoded = dotnet_url_encode(key) + '%3d'
+            self._key_cache[key] = encoded
+        return encoded
+
+    def compute(self, params: Mapping[str, object]) -> str:
+        """
+        計算 CheckMacValue (忽略 params 中的 CheckMacValue)
+
+        Args:
+            params: 回呼參數
+
+        Returns:
+            SHA256 雜湊值 (大寫)
+        """
+        encode_key = self._encode_key
+        section = '%26'.join([
+            encode_key(key) + dotnet_url_encode(str(value))
+            for key, value in sorted(params.items())
+            if key != 'CheckMacValue'
+        ])
+
+        digest = self._prefix_hash.copy()
+        digest.update(section.encode('ascii'))
+        digest.update(self._suffix)
+        return digest.hexdigest().upper()
+
+    def verify(self, params: Mapping[str, object]) -> bool:
+        """驗證回呼參數中的 CheckMacValue"""
+        received = params.get('CheckMacValue')
+        if not received or not isinstance(received, str):
+            return False
+        return hmac.compare_digest(self.compute(params).encode('ascii'),
+                                   received.upper().encode('utf-8'))
+
+
+class ECPayCallbackVerifier:
+    """
+    多商店 ECPay 回呼驗證
+
+    依回呼中的 MerchantID 選擇對應的 CheckMacValue 計算器；
+    未註冊的商店一律驗證失敗。
+    """
+
+    def __init__(self, merchants: Optional[Mapping[str, Tuple[str, str]]] = None):
+        """
+        Args:
+            merchants: {MerchantID: (HashKey, HashIV)}
+        """
+        self._macs: Dict[str, CheckMacValue] = {}
+        for merchant_id, (hash_key, hash_iv) in (merchants or {}).items():
+            self.add_merchant(merchant_id, hash_key, hash_iv)
+
+    def add_merchant(self, merchant_id: str, hash_key: str, hash_iv: str):
+        """註冊 (或更新) 商店金鑰"""
+        self._macs[merchant_id] = CheckMacValue(hash_key, hash_iv)
+
+    def compute(self, params: Mapping[str, object]) -> str:
+        """
+        計算回呼應有的 CheckMacValue
+
+        Raises:
+            KeyError: 商店未註冊
+        """
+        return self._macs[params.get('MerchantID')].compute(params)
+
+    def verify(self, params: Mapping[str, object]) -> bool:
+        """驗證單筆回呼"""
+        mac = self._macs.get(params.get('MerchantID'))
+        return mac is not None and mac.verify(params)
+
+    def verify_many(self, callbacks: Iterable[Mapping[str, object]]) -> List[bool]:
+        """
+        批次驗證
+
+        Args:
+            callbacks: 回呼參數清單
+
+        Returns:
+            與輸入順序相同的驗證結果
+        """
+        macs = self._macs
+        results = []
+        for params in callbacks:
+            mac = macs.get(params.get('MerchantID'))
+            results.append(mac is not None and mac.verify(params))
+        return results
+
+
+# ============================================================================
+# 效能量測
+# ============================================================================
+
+def _sample_callbacks(service, count: int) -> List[Dict[str, str]]:
+    callbacks = []
+    for i in range(count):
+        params = {
+            'MerchantID': service.merchant_id,
+            'MerchantTradeNo': f'ORD{i:012d}',
+            'StoreID': '',
+            'RtnCode': '1',
+            'RtnMsg': '交易成功',
+            'TradeNo': f'2401{i:012d}',
+            'TradeAmt': str(100 + i % 5000),
+            'PaymentDate': '2024/01/29 14:30:00',
+            'PaymentType': 'Credit_CreditCard',
+            'PaymentTypeChargeFee': '30',
+            'TradeDate': '2024/01/29 14:25:00',
+            'SimulatePaid': '0',
+            'CustomField1': f'user-{i % 97}@example.com',
+        }
+        params['CheckMacValue'] = service.generate_check_mac_value(params)
+        callbacks.append(params)
+    return callbacks
+
+
+def benchmark(count: int = 20000) -> int:
+    """與 ECPayPaymentService.verify_check_mac_value 比較"""
+    import random
+    from example_loader import load_example
+
+    ecpay = load_example('ecpay-payment-example')
+    Service = ecpay.ECPayPaymentService
+    service = Service(Service.TEST_MERCHANT_ID, Service.TEST_HASH_KEY, Service.TEST_HASH_IV)
+    verifier = ECPayCallbackVerifier({Service.TEST_MERCHANT_ID: (Service.TEST_HASH_KEY, Service.TEST_HASH_IV)})
+
+    callbacks = _sample_callbacks(service, count)
+    tampered = dict(callbacks[0], TradeAmt='1')
+
+    def timed(func, repeat: int = 3):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - started)
+        return result, best
+
+    baseline, baseline_time = timed(lambda: [service.verify_check_mac_value(dict(cb)) for cb in callbacks])
+    fast, fast_time = timed(lambda: verifier.verify_many(callbacks))
+
+    # .NET 風格編碼與規格文件的逐步實作一致
+    rng = random.Random(0)
+    alphabet = 'aZ09 -_.!*()~@#$%^&+=/?:;,\'"<>[]{}|\\`王小明'
+    samples = [''.join(rng.choice(alphabet) for _ in range(24)) for _ in range(2000)]
+
+    checks = [
+        ('與原實作結果相同', baseline == fast and all(fast)),
+        ('竄改金額驗證失敗', not verifier.verify(tampered)),
+        ('未註冊商店驗證失敗', not verifier.verify(dict(callbacks[0], MerchantID='0000000'))),
+        ('不修改輸入', all('CheckMacValue' in cb for cb in callbacks)),
+        ('.NET 風格編碼 = 規格還原表', all(dotnet_url_encode(s) == reference_url_encode(s) for s in samples)),
+    ]
+
+    print("=" * 60)
+    print(f"ECPay CheckMacValue 回呼驗證效能 ({count} 筆)")
+    print("=" * 60)
+    print(f"\n   原實作 verify_check_mac_value: {baseline_time / count * 1e6:>8.2f} us/筆 "
+          f"({count / baseline_time:,.0f} 筆/秒)")
+    print(f"   ECPayCallbackVerifier.verify_many: {fast_time / count * 1e6:>5.2f} us/筆 "
+          f"({count / fast_time:,.0f} 筆/秒)")
+    print(f"   加速: {baseline_time / fast_time:.2f}x\n")
+
+    for name, passed in checks:
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+    print("=" * 60)
+
+    return 0 if all(passed for _, passed in checks) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ECPay CheckMacValue 回呼驗證')
+    parser.add_argument('--benchmark', action='store_true', help='與原本實作比較效能')
+    parser.add_argument('--count', type=int, default=20000, help='量測筆數 (預設: 20000)')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        return benchmark(args.count)
+
+    parser.print_help()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Taiwan Payment Skill - 錯誤碼表 (data/error-codes.csv)
+
+行程內只建立一次的唯讀錯誤碼表，以 (服務商, 錯誤碼) 為 key:
+- 不同服務商相同的錯誤碼 (例如 NewebPay 與 PAYUNi 的 SUCCESS) 各自獨立，不會互相覆蓋
+- 查詢為 dict 查找；未登錄的錯誤碼回傳共用的 ErrorInfo，不會每次查詢都建立新物件
+- CSV 的 category 欄位轉換為 ErrorCategory，NETWORK / SERVER 類別預設以指數退避重試
+- 可傳入 overrides 以自訂的分類與重試設定覆寫 CSV 內容
+
+payment 與 invoice 的 data/error-codes.csv 欄位相同 (payment 另有 severity)，兩個 skill 共用此模組的格式。
+
+使用範例:
+    from error_registry import get_error_registry
+
+    registry = get_error_registry()
+    info = registry.get('TM-999', provider='newebpay')
+    print(info.message, info.category)
+"""
+
+import csv
+import functools
+import threading
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, Iterable, Iterator, Mapping, Optional, Tuple
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+DEFAULT_CSV = DATA_DIR / 'error-codes.csv'
+
+# 與服務商無關的錯誤碼 (網路、逾時等) 的 provider
+ANY_PROVIDER = ''
+
+
+class ErrorCategory(Enum):
+    """錯誤類別"""
+    VALIDATION = "validation"  # 驗證錯誤
+    AUTHENTICATION = "authentication"  # 認證錯誤
+    PERMISSION = "permission"  # 權限錯誤
+    BUSINESS_LOGIC = "business_logic"  # 業務邏輯錯誤
+    NETWORK = "network"  # 網路錯誤
+    SERVER = "server"  # 伺服器錯誤
+    UNKNOWN = "unknown"  # 未知錯誤
+
+
+class RetryStrategy(Enum):
+    """重試策略"""
+    NO_RETRY = "no_retry"  # 不重試
+    IMMEDIATE = "immediate"  # 立即重試
+    EXPONENTIAL_BACKOFF = "exponential_backoff"  # 指數退避
+    LINEAR_BACKOFF = "linear_backoff"  # 線性退避
+
+
+@dataclass(frozen=True)
+class ErrorInfo:
+    """錯誤資訊"""
+    code: str
+    message: str
+    category: ErrorCategory
+    retry_strategy: RetryStrategy
+    suggestion: str
+    is_retryable: bool = False
+    provider: str = ANY_PROVIDER
+
+
+# error-codes.csv 的 category 欄位 → ErrorCategory
+# (成功列歸在 VALIDATION、不重試)
+CSV_CATEGORIES: Mapping[str, ErrorCategory] = MappingProxyType({
+    # taiwan-invoice
+    '通用': ErrorCategory.VALIDATION,
+    '成功': ErrorCategory.VALIDATION,
+    '認證': ErrorCategory.AUTHENTICATION,
+    '權限': ErrorCategory.PERMISSION,
+    '開立': ErrorCategory.BUSINESS_LOGIC,
+    '作廢': ErrorCategory.BUSINESS_LOGIC,
+    '折讓': ErrorCategory.BUSINESS_LOGIC,
+    '作廢折讓': ErrorCategory.BUSINESS_LOGIC,
+    '查詢': ErrorCategory.BUSINESS_LOGIC,
+    # taiwan-payment
+    'success': ErrorCategory.VALIDATION,
+    'validation': ErrorCategory.VALIDATION,
+    'auth': ErrorCategory.AUTHENTICATION,
+    'encryption': ErrorCategory.AUTHENTICATION,
+    'payment': ErrorCategory.BUSINESS_LOGIC,
+    'refund': ErrorCategory.BUSINESS_LOGIC,
+    'query': ErrorCategory.BUSINESS_LOGIC,
+    'system': ErrorCategory.SERVER,
+})
+
+# 網路 / 伺服器錯誤預設可重試
+RETRYABLE_CATEGORIES = frozenset({ErrorCategory.NETWORK, ErrorCategory.SERVER})
+
+# 與服務商無關的錯誤碼
+GENERIC_ERRORS: Tuple[ErrorInfo, ...] = (
+    ErrorInfo(
+        code='NETWORK_ERROR',
+        message='網路連線錯誤',
+        category=ErrorCategory.NETWORK,
+        retry_strategy=RetryStrategy.EXPONENTIAL_BACKOFF,
+        suggestion='網路連線失敗，系統將自動重試',
+        is_retryable=True
+    ),
+    ErrorInfo(
+        code='SERVER_ERROR',
+        message='伺服器錯誤',
+        category=ErrorCategory.SERVER,
+        retry_strategy=RetryStrategy.EXPONENTIAL_BACKOFF,
+        suggestion='伺服器暫時無法回應，系統將自動重試',
+        is_retryable=True
+    ),
+    ErrorInfo(
+        code='TIMEOUT_ERROR',
+        message='請求逾時',
+        category=ErrorCategory.NETWORK,
+        retry_strategy=RetryStrategy.LINEAR_BACKOFF,
+        suggestion='請求逾時，系統將自動重試',
+        is_retryable=True
+    ),
+    ErrorInfo(
+        code='CIRCUIT_OPEN',
+        message='熔斷中',
+        category=ErrorCategory.SERVER,
+        retry_strategy=RetryStrategy.NO_RETRY,
+        suggestion='服務商連續發生網路/伺服器錯誤，暫停送出請求，請於 retry_after 秒後再試',
+        is_retryable=False
+    ),
+)
+
+
+def error_info_from_row(row: Dict[str, str]) -> ErrorInfo:
+    """
+    將 error-codes.csv 的一列轉為 ErrorInfo
+
+    Raises:
+        KeyError: 缺少 provider / code 欄位
+    """
+    category = CSV_CATEGORIES.get(row.get('category', '').strip(), ErrorCategory.UNKNOWN)
+    retryable = category in RETRYABLE_CATEGORIES
+    return ErrorInfo(
+        code=row['code'].strip(),
+        message=row.get('message_zh', '').strip(),
+        category=category,
+        retry_strategy=RetryStrategy.EXPONENTIAL_BACKOFF if retryable else RetryStrategy.NO_RETRY,
+        suggestion=row.get('solution', '').strip() or row.get('message_en', '').strip(),
+        is_retryable=retryable,
+        provider=row['provider'].strip().lower(),
+    )
+
+
+class ErrorRegistry:
+    """
+    唯讀錯誤碼表
+
+    查詢順序: (服務商, 錯誤碼) → 與服務商無關的錯誤碼 → 其他服務商的同一錯誤碼 (未指定服務商時)
+    → 共用的未知錯誤 ErrorInfo。
+    """
+
+    # 未登錄錯誤碼的快取上限 (錯誤碼來自外部回應，避免無限成長)
+    MAX_INTERNED_UNKNOWN = 4096
+
+    def __init__(self, entries: Iterable[ErrorInfo]):
+        """
+        Args:
+            entries: 錯誤資訊 (相同 (provider, code) 時後者覆寫前者)
+        """
+        table: Dict[Tuple[str, str], ErrorInfo] = {}
+        for info in entries:
+            table[(info.provider, info.code)] = info
+
+        by_code: Dict[str, ErrorInfo] = {}
+        by_provider: Dict[str, Dict[str, ErrorInfo]] = {}
+        for (provider, code), info in table.items():
+            by_code.setdefault(code, info)
+            by_provider.setdefault(provider, {})[code] = info
+
+        generic = by_provider.get(ANY_PROVIDER, {})
+        self._table = MappingProxyType(table)
+        self._by_code = MappingProxyType(by_code)
+        self._views = MappingProxyType({
+            provider: MappingProxyType({**generic, **codes}) for provider, codes in by_provider.items()
+        })
+        self._unknown: Dict[str, ErrorInfo] = {}
+        self._unknown_lock = threading.Lock()
+
+    @classmethod
+    def from_csv(cls, path: Path = DEFAULT_CSV, overrides: Iterable[ErrorInfo] = ()) -> 'ErrorRegistry':
+        """
+        由 error-codes.csv 建立
+
+        Args:
+            path: CSV 路徑
+            overrides: 覆寫 CSV 內容的錯誤資訊 (例如內建的分類與重試設定)
+        """
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = [error_info_from_row(row) for row in csv.DictReader(f) if row.get('code')]
+        return cls([*GENERIC_ERRORS, *rows, *overrides])
+
+    def get(self, code: str, provider: Optional[str] = None) -> ErrorInfo:
+        """
+        查詢錯誤資訊
+
+        Args:
+            code: 錯誤碼
+            provider: 服務商 (不分大小寫)；None = 不限
+
+        Returns:
+            錯誤資訊 (未登錄時為 category UNKNOWN、不重試)
+        """
+        code = str(code)
+        if provider:
+            info = self._table.get((provider.lower(), code))
+            if info is not None:
+                return info
+        info = self._table.get((ANY_PROVIDER, code))
+        if info is not None:
+            return info
+        if not provider:
+            info = self._by_code.get(code)
+            if info is not None:
+                return info
+        return self.unknown(code)
+
+    def unknown(self, code: str) -> ErrorInfo:
+        """未登錄錯誤碼的 ErrorInfo (同一錯誤碼回傳同一個物件)"""
+        info = self._unknown.get(code)
+        if info is not None:
+            return info
+        info = ErrorInfo(
+            code=code,
+            message='未知錯誤',
+            category=ErrorCategory.UNKNOWN,
+            retry_strategy=RetryStrategy.NO_RETRY,
+            suggestion=f'錯誤碼 {code} 未記錄在系統中，請查閱官方文件',
+            is_retryable=False
+        )
+        with self._unknown_lock:
+            if len(self._unknown) >= self.MAX_INTERNED_UNKNOWN:
+                return info
+            return self._unknown.setdefault(code, info)
+
+    def codes(self, provider: str) -> Mapping[str, ErrorInfo]:
+        """單一服務商的錯誤碼 (含與服務商無關的錯誤碼)，唯讀"""
+        return self._views.get(provider.lower(), self._views.get(ANY_PROVIDER, MappingProxyType({})))
+
+    def providers(self) -> Tuple[str, ...]:
+        """登錄的服務商"""
+        return tuple(p for p in self._views if p != ANY_PROVIDER)
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self._table
+
+    def __iter__(self) -> Iterator[ErrorInfo]:
+        return iter(self._table.values())
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+
+@functools.lru_cache(maxsize=None)
+def get_error_registry(overrides: Tuple[ErrorInfo, ...] = ()) -> ErrorRegistry:
+    """
+    行程共用的錯誤碼表 (相同 overrides 只建立一次)
+
+    Args:
+        overrides: 覆寫 CSV 內容的錯誤資訊
+    """
+    return ErrorRegistry.from_csv(DEFAULT_CSV, overrides)
+
+
+if __name__ == '__main__':
+    registry = get_error_registry()
+    print(f"錯誤碼: {len(registry)} 筆，服務商: {', '.join(registry.providers())}\n")
+    for provider in registry.providers():
+        retryable = sum(1 for info in registry.codes(provider).values() if info.is_retryable)
+        print(f"  {provider:<10} {len(registry.codes(provider)):>3} 筆 (可重試 {retryable})")
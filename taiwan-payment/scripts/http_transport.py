@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Taiwan Payment Skill - 共用連線池的 HTTP transport
+
+examples/ 與產生器輸出的服務類別原本每次呼叫都 requests.post(..., timeout=30)，
+每個請求都重新建立 TCP / TLS 連線。transport 負責:
+
+- 依 base URL (scheme + host + port) 各保留一個連線池，keep-alive 重複使用連線
+- 可調整的連線池大小 (pool_connections / pool_maxsize / pool_block)
+- 連線逾時與讀取逾時分開設定
+- 選用 HTTP/2 (需安裝 httpx[http2])
+- 同步 (SyncTransport，requests) 與 asyncio (AsyncTransport，aiohttp) 兩種實作
+
+服務類別以 transport 參數注入，部署時可讓所有服務商共用同一個 transport:
+
+    from http_transport import SyncTransport, TransportConfig
+
+    transport = SyncTransport(TransportConfig(connect_timeout=3, read_timeout=20, pool_maxsize=50))
+    payuni = PAYUNiPaymentService(mer_id, hash_key, hash_iv, transport=transport)
+    newebpay = NewebPayCVSLogistics(merchant_id, hash_key, hash_iv, transport=transport)
+
+    # asyncio
+    async with AsyncTransport(TransportConfig(pool_maxsize=100)) as transport:
+        response = await transport.post(url, data=params)
+        result = response.json()
+
+未注入時服務類別沿用原本的 requests 模組；產生器輸出的服務則使用 get_default_transport()。
+
+例外: SyncTransport 一律丟出 requests 的例外類別 (HTTP/2 模式下 httpx 的例外會轉成對應的
+requests.exceptions 類別，原例外保留在 __cause__)，原本的 except requests.exceptions.* 區塊不需修改；
+AsyncTransport 沿用底層套件 (aiohttp / httpx) 的例外類別。
+"""
+
+import asyncio
+import json
+import threading
+import urllib.parse
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple, Union
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    HAS_REQUESTS = True
+except ImportError:
+    HAS_REQUESTS = False
+
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+try:
+    import h2  # noqa: F401  (httpx 的 HTTP/2 支援需要 h2)
+    import httpx
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+Timeout = Union[None, float, Tuple[float, float]]
+
+
+@dataclass(frozen=True)
+class TransportConfig:
+    """連線池與逾時設定"""
+    connect_timeout: float = 5.0     # 建立連線逾時 (秒)
+    read_timeout: float = 30.0       # 等待回應逾時 (秒)
+    pool_connections: int = 10       # 每個 base URL 保留的閒置連線數
+    pool_maxsize: int = 50           # 每個 base URL 同時使用的連線上限
+    pool_block: bool = False         # 連線用完時等待 (True) 或另開臨時連線 (False)
+    keepalive_timeout: float = 30.0  # 閒置連線保留秒數 (aiohttp / httpx)
+    http2: bool = False              # 使用 HTTP/2 (httpx)
+
+
+def base_url_of(url: str) -> str:
+    """連線池的 key: scheme://host[:port]"""
+    parts = urllib.parse.urlsplit(url)
+    return f'{parts.scheme}://{parts.netloc}'.lower()
+
+
+@dataclass
+class TransportResponse:
+    """
+    AsyncTransport 的回應 (body 已完整讀取)
+
+    介面與 requests.Response 常用的部分相同: status_code、headers、url、content、text、json()
+    """
+    status_code: int
+    headers: Dict[str, str]
+    url: str
+    content: bytes
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        """
+        Raises:
+            ConnectionError: HTTP 狀態碼 >= 400
+        """
+        if not self.ok:
+            raise ConnectionError(f'HTTP {self.status_code}: {self.url}')
+
+
+def requests_error(error: Exception) -> Exception:
+    """httpx 例外 → 對應的 requests.exceptions 例外"""
+    exceptions = requests.exceptions
+    if isinstance(error, httpx.ConnectTimeout):
+        mapped = exceptions.ConnectTimeout
+    elif isinstance(error, httpx.ReadTimeout):
+        mapped = exceptions.ReadTimeout
+    elif isinstance(error, httpx.TimeoutException):
+        mapped = exceptions.Timeout
+    elif isinstance(error, httpx.TooManyRedirects):
+        mapped = exceptions.TooManyRedirects
+    elif isinstance(error, (httpx.InvalidURL, httpx.UnsupportedProtocol)):
+        mapped = exceptions.InvalidURL
+    elif isinstance(error, httpx.TransportError):
+        mapped = exceptions.ConnectionError
+    else:
+        mapped = exceptions.RequestException
+    return mapped(str(error))
+
+
+class SyncTransport:
+    """
+    同步 transport (thread-safe)
+
+    每個 base URL 一個 requests.Session (HTTP/2 時為 httpx.Client)，多個執行緒可共用。
+    回傳值為 requests.Response / httpx.Response；例外一律為 requests.exceptions 的類別。
+    """
+
+    def __init__(self, config: Optional[TransportConfig] = None):
+        """
+        Raises:
+            ImportError: 缺少 requests，或要求 HTTP/2 但缺少 httpx[http2]
+        """
+        self.config = config or TransportConfig()
+        if self.config.http2 and not HAS_HTTP2:
+            raise ImportError('HTTP/2 需要安裝必要套件:\n  pip install "httpx[http2]"')
+        if not self.config.http2 and not HAS_REQUESTS:
+            raise ImportError('需要安裝必要套件:\n  pip install requests')
+
+        self.requests: Counter = Counter()  # base URL → 請求數
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _create_client(self) -> Any:
+        config = self.config
+        if config.http2:
+            return httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=config.pool_maxsize,
+                                    max_keepalive_connections=config.pool_connections,
+                                    keepalive_expiry=config.keepalive_timeout),
+                timeout=httpx.Timeout(config.read_timeout, connect=config.connect_timeout),
+            )
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=config.pool_connections, pool_maxsize=config.pool_maxsize,
+                              pool_block=config.pool_block)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def client_for(self, url: str) -> Any:
+        """取得 (必要時建立) url 所屬 base URL 的連線池"""
+        key = base_url_of(url)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._clients[key] = self._create_client()
+        return client
+
+    def _timeout(self, timeout: Timeout) -> Tuple[float, float]:
+        """單一數字視為讀取逾時 (相容原本的 timeout=30)，連線逾時沿用設定"""
+        if timeout is None:
+            return (self.config.connect_timeout, self.config.read_timeout)
+        if isinstance(timeout, tuple):
+            return timeout
+        return (self.config.connect_timeout, float(timeout))
+
+    def _count(self, url: str):
+        with self._stats_lock:
+            self.requests[base_url_of(url)] += 1
+
+    def request(self, method: str, url: str, timeout: Timeout = None, allow_redirects: bool = True,
+                **kwargs) -> Any:
+        """
+        發送請求
+
+        Args:
+            method: HTTP 方法
+            url: 完整網址
+            timeout: None = 依設定；數字 = 讀取逾時；(connect, read)
+            allow_redirects: 是否跟隨重導向
+            **kwargs: data / json / params / headers
+
+        Raises:
+            requests.exceptions.RequestException: 連線失敗、逾時等 (HTTP/2 模式由 httpx 例外轉換)
+        """
+        client = self.client_for(url)
+        connect, read = self._timeout(timeout)
+        self._count(url)
+        if self.config.http2:
+            try:
+                return client.request(method, url, timeout=httpx.Timeout(read, connect=connect),
+                                      follow_redirects=allow_redirects, **kwargs)
+            except (httpx.HTTPError, httpx.InvalidURL) as e:
+                if not HAS_REQUESTS:
+                    raise
+                raise requests_error(e) from e
+        return client.request(method, url, timeout=(connect, read), allow_redirects=allow_redirects, **kwargs)
+
+    def post(self, url: str, data: Any = None, json: Any = None, **kwargs) -> Any:
+        """POST (參數同 requests.post)"""
+        return self.request('POST', url, data=data, json=json, **kwargs)
+
+    def get(self, url: str, params: Any = None, **kwargs) -> Any:
+        """GET (參數同 requests.get)"""
+        return self.request('GET', url, params=params, **kwargs)
+
+    def pools(self) -> Tuple[str, ...]:
+        """目前已建立連線池的 base URL"""
+        return tuple(self._clients)
+
+    def close(self):
+        """關閉所有連線池"""
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            client.close()
+
+    def __enter__(self) -> 'SyncTransport':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AsyncTransport:
+    """
+    asyncio transport
+
+    每個 base URL 一個 aiohttp.ClientSession (HTTP/2 時為 httpx.AsyncClient)，
+    於第一次請求時在目前的事件迴圈中建立。回傳值為 TransportResponse。
+    """
+
+    def __init__(self, config: Optional[TransportConfig] = None):
+        """
+        Raises:
+            ImportError: 缺少 aiohttp，或要求 HTTP/2 但缺少 httpx[http2]
+        """
+        self.config = config or TransportConfig()
+        if self.config.http2 and not HAS_HTTP2:
+            raise ImportError('HTTP/2 需要安裝必要套件:\n  pip install "httpx[http2]"')
+        if not self.config.http2 and not HAS_AIOHTTP:
+            raise ImportError('需要安裝必要套件:\n  pip install aiohttp')
+
+        self.requests: Counter = Counter()
+        self._clients: Dict[str, Any] = {}
+
+    def _create_client(self) -> Any:
+        config = self.config
+        if config.http2:
+            return httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_connections=config.pool_maxsize,
+                                    max_keepalive_connections=config.pool_connections,
+                                    keepalive_expiry=config.keepalive_timeout),
+                timeout=httpx.Timeout(config.read_timeout, connect=config.connect_timeout),
+            )
+
+        connector = aiohttp.TCPConnector(limit=config.pool_maxsize, limit_per_host=config.pool_maxsize,
+                                         keepalive_timeout=config.keepalive_timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(
+            total=None, connect=config.connect_timeout, sock_read=config.read_timeout))
+
+    def client_for(self, url: str) -> Any:
+        """取得 (必要時建立) url 所屬 base URL 的連線池"""
+        key = base_url_of(url)
+        client = self._clients.get(key)
+        if client is None:
+            client = self._clients[key] = self._create_client()
+        return client
+
+    async def request(self, method: str, url: str, timeout: Timeout = None, allow_redirects: bool = True,
+                      **kwargs) -> TransportResponse:
+        """
+        發送請求並讀取完整回應
+
+        Args:
+            method: HTTP 方法
+            url: 完整網址
+            timeout: None = 依設定；數字 = 讀取逾時；(connect, read)
+            allow_redirects: 是否跟隨重導向
+            **kwargs: data / json / params / headers
+        """
+        client = self.client_for(url)
+        self.requests[base_url_of(url)] += 1
+        if timeout is not None and not isinstance(timeout, tuple):
+            timeout = (self.config.connect_timeout, float(timeout))
+
+        if self.config.http2:
+            if timeout is not None:
+                kwargs['timeout'] = httpx.Timeout(timeout[1], connect=timeout[0])
+            response = await client.request(method, url, follow_redirects=allow_redirects, **kwargs)
+            return TransportResponse(response.status_code, dict(response.headers), str(response.url),
+                                     response.content)
+
+        if timeout is not None:
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=None, connect=timeout[0], sock_read=timeout[1])
+        async with client.request(method, url, allow_redirects=allow_redirects, **kwargs) as response:
+            return TransportResponse(response.status, dict(response.headers), str(response.url),
+                                     await response.read())
+
+    async def post(self, url: str, data: Any = None, json: Any = None, **kwargs) -> TransportResponse:
+        """POST"""
+        return await self.request('POST', url, data=data, json=json, **kwargs)
+
+    async def get(self, url: str, params: Any = None, **kwargs) -> TransportResponse:
+        """GET"""
+        return await self.request('GET', url, params=params, **kwargs)
+
+    def pools(self) -> Tuple[str, ...]:
+        """目前已建立連線池的 base URL"""
+        return tuple(self._clients)
+
+    async def close(self):
+        """關閉所有連線池"""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            if self.config.http2:
+                await client.aclose()
+            else:
+                await client.close()
+        if clients and not self.config.http2:
+            # 讓 aiohttp 完成 SSL 連線的關閉流程
+            await asyncio.sleep(0)
+
+    async def __aenter__(self) -> 'AsyncTransport':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+_default_transport: Optional[SyncTransport] = None
+_default_lock = threading.Lock()
+
+
+def get_default_transport() -> SyncTransport:
+    """取得行程共用的預設 SyncTransport (第一次呼叫時建立)"""
+    global _default_transport
+    if _default_transport is None:
+        with _default_lock:
+            if _default_transport is None:
+                _default_transport = SyncTransport()
+    return _default_transport
+
+
+def set_default_transport(transport: SyncTransport):
+    """替換行程共用的預設 transport (例如部署時套用自訂的連線池設定)"""
+    global _default_transport
+    with _default_lock:
+        _default_transport = transport
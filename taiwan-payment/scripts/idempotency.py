@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Taiwan Payment Skill - 以 MerchantTradeNo 去重的冪等層
+
+金流服務商在沒有收到 200 (或 1|OK) 時會重送付款通知，同一筆付款的回呼也可能由 ReturnURL 與
+NotifyURL 各送一次；業務邏輯若沒有去重就會重複出貨、重複入帳。在回呼處理前加一層以
+(商店代號, 訂單編號) 為 key 的冪等層:
+
+- 已完成: 回傳快取的處理結果，不再執行業務邏輯
+- 進行中: 同一程序內同一 key 的並行呼叫合併為一次 (single-flight)，全部取得同一個結果；
+  共用同一個 SQLite 檔的多個程序以處理中紀錄 (claim) 互斥，後到的程序等待結果寫入
+- 丟出例外時不快取，服務商重送時會重新處理
+- 只有付款成功的回呼去重；失敗通知每次都交給業務邏輯 (之後仍可能收到同一訂單的成功通知)
+
+訂單編號依 reconcile.normalize_callback 取得 (ECPay MerchantTradeNo、NewebPay MerchantOrderNo、
+PAYUNi MerTradeNo)。快取存放於 SQLite (預設 synchronous=NORMAL)，以 TTL 過期並限制筆數
+(超過時先移除最早到期的紀錄)，重新啟動後仍有效。
+
+使用範例:
+    from idempotency import IdempotencyStore, IdempotentCallbackProcessor
+
+    store = IdempotencyStore('callbacks.db', ttl=7 * 86400)
+    processor = IdempotentCallbackProcessor(handle_payment, store)   # handle_payment(callback) -> dict
+    result = processor.process(request.form.to_dict())              # 同步
+    result = await processor.aprocess(callback)                     # handle_payment 為 coroutine 函數時
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, Union
+
+from reconcile import normalize_callback
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    merchant_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    result TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (merchant_id, key)
+);
+CREATE INDEX IF NOT EXISTS idempotency_expires ON idempotency (expires_at);
+CREATE TABLE IF NOT EXISTS idempotency_claims (
+    merchant_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (merchant_id, key)
+);
+"""
+
+
+class IdempotencyStore:
+    """
+    冪等結果的持久化儲存 (SQLite)
+
+    以 (merchant_id, key) 保存 JSON 結果，超過 ttl 秒後視為不存在；
+    筆數超過 max_entries 時移除已過期及最早到期的紀錄。可由多個執行緒共用，
+    多個程序開啟同一個檔案時以 claim() 互斥處理同一個 key。
+    """
+
+    def __init__(self, path: Union[str, Path] = ':memory:', ttl: float = 86400.0,
+                 max_entries: int = 100_000, synchronous: str = 'NORMAL'):
+        """
+        Args:
+            path: SQLite 檔案路徑 (':memory:' 時不持久化)
+            ttl: 結果保存秒數
+            max_entries: 最大筆數
+            synchronous: SQLite synchronous 設定
+        """
+        if ttl <= 0:
+            raise ValueError('ttl 必須大於 0')
+        if max_entries <= 0:
+            raise ValueError('max_entries 必須大於 0')
+        if synchronous.upper() not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+            raise ValueError(f'不支援的 synchronous: {synchronous}')
+
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        if str(path) != ':memory:':
+            self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(f'PRAGMA synchronous={synchronous.upper()}')
+        self._db.executescript(SCHEMA)
+        self._count = self._db.execute('SELECT COUNT(*) FROM idempotency').fetchone()[0]
+
+    def get(self, merchant_id: str, key: str, now: Optional[float] = None) -> Optional[Any]:
+        """取得未過期的結果 (不存在時回傳 None)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._db.execute(
+                'SELECT result FROM idempotency WHERE merchant_id = ? AND key = ? AND expires_at > ?',
+                (merchant_id, key, now)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, merchant_id: str, key: str, result: Any, now: Optional[float] = None):
+        """保存結果 (result 需可序列化為 JSON)"""
+        now = time.time() if now is None else now
+        text = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            cursor = self._db.execute(
+                'UPDATE idempotency SET result = ?, expires_at = ? WHERE merchant_id = ? AND key = ?',
+                (text, now + self.ttl, merchant_id, key))
+            if not cursor.rowcount:
+                self._db.execute('INSERT INTO idempotency (merchant_id, key, result, expires_at) VALUES (?, ?, ?, ?)',
+                                 (merchant_id, key, text, now + self.ttl))
+                self._count += 1
+                if self._count > self.max_entries:
+                    self._evict(now)
+
+    def claim(self, merchant_id: str, key: str, lease: float, now: Optional[float] = None) -> bool:
+        """
+        取得 key 的處理權 (跨程序互斥)
+
+        以 INSERT 處理中的紀錄取得，已被其他連線取得且未超過 lease 秒時回傳 False；
+        持有者當機未釋放時，lease 到期後可被重新取得。
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._db.execute('DELETE FROM idempotency_claims WHERE merchant_id = ? AND key = ? AND expires_at <= ?',
+                             (merchant_id, key, now))
+            return self._db.execute(
+                'INSERT OR IGNORE INTO idempotency_claims (merchant_id, key, expires_at) VALUES (?, ?, ?)',
+                (merchant_id, key, now + lease)).rowcount == 1
+
+    def release(self, merchant_id: str, key: str):
+        """釋放 claim() 取得的處理權"""
+        with self._lock:
+            self._db.execute('DELETE FROM idempotency_claims WHERE merchant_id = ? AND key = ?', (merchant_id, key))
+
+    def delete(self, merchant_id: str, key: str):
+        """移除結果 (例如退款後允許同一訂單編號重新處理)"""
+        with self._lock:
+            self._count -= self._db.execute('DELETE FROM idempotency WHERE merchant_id = ? AND key = ?',
+                                            (merchant_id, key)).rowcount
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """移除已過期的紀錄 (以及超過 max_entries 的部分)，回傳移除筆數"""
+        with self._lock:
+            return self._evict(time.time() if now is None else now)
+
+    def _evict(self, now: float) -> int:
+        removed = self._db.execute('DELETE FROM idempotency WHERE expires_at <= ?', (now,)).rowcount
+        self._count -= removed
+        excess = self._count - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                'DELETE FROM idempotency WHERE rowid IN '
+                '(SELECT rowid FROM idempotency ORDER BY expires_at LIMIT ?)', (excess,))
+            self._count -= excess
+            removed += excess
+        return removed
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+@dataclass
+class IdempotencyStats:
+    """冪等層統計"""
+    hits: int = 0       # 回傳快取結果
+    calls: int = 0      # 實際呼叫
+    coalesced: int = 0  # 合併到進行中的呼叫
+    waited: int = 0     # 等待其他程序處理完成
+
+
+class _Flight:
+    """執行緒間共用的一次進行中呼叫"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class IdempotencyGuard:
+    """
+    冪等呼叫: 已完成的 key 回傳快取結果，進行中的 key 合併為一次呼叫
+
+    call() 供同步函數 (跨執行緒合併)，acall() 供 coroutine 函數 (同一事件迴圈內合併)；
+    acall() 的 SQLite 讀寫 (含 store 的 threading.Lock) 在 asyncio.to_thread 執行，不會卡住 event loop。
+    同一程序內的並行呼叫在記憶體中合併；實際呼叫前再以 store.claim() 取得處理權，
+    共用同一個 SQLite 檔的其他程序 (多個 worker) 每 poll_interval 秒檢查一次，等待結果寫入。
+    """
+
+    def __init__(self, store: IdempotencyStore, encode: Callable[[Any], Any] = None,
+                 decode: Callable[[Any], Any] = None, cacheable: Callable[[Any], bool] = None,
+                 lease: float = 300.0, poll_interval: float = 0.05):
+        """
+        Args:
+            store: 結果儲存
+            encode: 結果 → 可序列化為 JSON 的值 (預設不轉換)
+            decode: encode 的反向轉換 (預設不轉換)
+            cacheable: 結果是否保存 (預設全部保存；丟出例外時一律不保存)
+            lease: 處理權的有效秒數 (需大於一次呼叫含重試的最長時間)
+            poll_interval: 等待其他程序時的檢查間隔 (秒)
+        """
+        self.store = store
+        self.encode = encode or (lambda result: result)
+        self.decode = decode or (lambda value: value)
+        self.cacheable = cacheable or (lambda result: True)
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.stats = IdempotencyStats()
+        self._lock = threading.Lock()
+        self._flights: Dict[Tuple[str, str], _Flight] = {}
+        self._tasks: Dict[Tuple[Hashable, str, str], asyncio.Future] = {}
+
+    def _cached(self, merchant_id: str, key: str) -> Tuple[bool, Any]:
+        # 結果包在 {'v': ...} 中: 回傳 None 的呼叫也能與「不存在」區分
+        value = self.store.get(merchant_id, key)
+        if value is None:
+            return False, None
+        self.stats.hits += 1
+        return True, self.decode(value['v'])
+
+    def _save(self, merchant_id: str, key: str, result: Any):
+        if self.cacheable(result):
+            self.store.put(merchant_id, key, {'v': self.encode(result)})
+
+    def _try_claim(self, merchant_id: str, key: str) -> Optional[Tuple[bool, Any]]:
+        """查快取並嘗試取得處理權；其他程序處理中時回傳 None"""
+        hit, result = self._cached(merchant_id, key)
+        if hit or self.store.claim(merchant_id, key, self.lease):
+            return hit, result
+        return None
+
+    def _claim(self, merchant_id: str, key: str) -> Tuple[bool, Any]:
+        """取得處理權 (回傳 (False, None))，或等待其他程序的結果 (回傳 (True, 結果))"""
+        waited = False
+        while True:
+            claimed = self._try_claim(merchant_id, key)
+            if claimed is not None:
+                return claimed
+            if not waited:
+                waited = True
+                self.stats.waited += 1
+            time.sleep(self.poll_interval)
+
+    async def _aclaim(self, merchant_id: str, key: str) -> Tuple[bool, Any]:
+        waited = False
+        while True:
+            claimed = await asyncio.to_thread(self._try_claim, merchant_id, key)
+            if claimed is not None:
+                return claimed
+            if not waited:
+                waited = True
+                self.stats.waited += 1
+            await asyncio.sleep(self.poll_interval)
+
+    def call(self, merchant_id: str, key: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """同步呼叫 func(*args, **kwargs)，同一 (merchant_id, key) 只執行一次"""
+        hit, result = self._cached(merchant_id, key)
+        if hit:
+            return result
+
+        with self._lock:
+            flight = self._flights.get((merchant_id, key))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(merchant_id, key)] = _Flight()
+                self.stats.calls += 1
+            else:
+                self.stats.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            # 取得 leader 前可能有另一個呼叫 (或另一個程序) 剛完成並寫入快取
+            hit, flight.result = self._claim(merchant_id, key)
+            if not hit:
+                try:
+                    flight.result = func(*args, **kwargs)
+                    self._save(merchant_id, key, flight.result)
+                finally:
+                    self.store.release(merchant_id, key)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[(merchant_id, key)]
+            flight.done.set()
+
+    async def acall(self, merchant_id: str, key: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """await func(*args, **kwargs)，同一 (merchant_id, key) 只執行一次"""
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), merchant_id, key)
+        future = self._tasks.get(task_key)
+        if future is None:
+            hit, result = await asyncio.to_thread(self._cached, merchant_id, key)
+            if hit:
+                return result
+            # 查詢快取期間同一 key 的其他呼叫可能已開始
+            future = self._tasks.get(task_key)
+        if future is not None:
+            self.stats.coalesced += 1
+            # shield: 一個等待者被取消時不影響其他等待者
+            return await asyncio.shield(future)
+
+        self.stats.calls += 1
+        future = self._tasks[task_key] = asyncio.ensure_future(self._run(merchant_id, key, func, args, kwargs))
+        future.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+        return await asyncio.shield(future)
+
+    async def _run(self, merchant_id: str, key: str, func, args, kwargs) -> Any:
+        hit, result = await self._aclaim(merchant_id, key)
+        if hit:
+            return result
+        try:
+            result = await func(*args, **kwargs)
+            await asyncio.to_thread(self._save, merchant_id, key, result)
+        finally:
+            await asyncio.to_thread(self.store.release, merchant_id, key)
+        return result
+
+
+class IdempotentCallbackProcessor:
+    """
+    在付款回呼處理前加上以 (商店代號, 訂單編號) 為 key 的冪等層
+
+    回呼為 ECPay 的 POST 參數、NewebPay 解密後的 TradeInfo (含 Result) 或 PAYUNi 解密後的 EncryptInfo。
+    handler 的回傳值需可序列化為 JSON (或指定 encode / decode)。
+    """
+
+    def __init__(self, handler: Callable[[Dict], Any], store: IdempotencyStore,
+                 encode: Callable[[Any], Any] = None, decode: Callable[[Any], Any] = None):
+        """
+        Args:
+            handler: 業務邏輯 handler(callback)，同步函數或 coroutine 函數
+            store: 結果儲存
+            encode: 處理結果 → 可序列化為 JSON 的值
+            decode: encode 的反向轉換
+        """
+        self.handler = handler
+        self.guard = IdempotencyGuard(store, encode=encode, decode=decode)
+
+    @property
+    def stats(self) -> IdempotencyStats:
+        return self.guard.stats
+
+    @staticmethod
+    def key_of(callback: Dict, provider: Optional[str] = None) -> Tuple[str, str, bool]:
+        """
+        回呼的 (商店代號, 訂單編號, 是否付款成功)
+
+        商店代號前加上服務商名稱 (例如 'ecpay:3002607')，不同服務商的訂單編號不會互相影響。
+
+        Raises:
+            ValueError: 無法判斷服務商或沒有訂單編號
+        """
+        normalized = normalize_callback(callback, provider)
+        if not normalized['order_id']:
+            raise ValueError('回呼沒有訂單編號')
+        return f"{normalized['provider']}:{normalized['merchant_id']}", normalized['order_id'], normalized['paid']
+
+    def process(self, callback: Dict, provider: Optional[str] = None) -> Any:
+        """處理回呼 (同一訂單的成功通知只處理一次)"""
+        merchant_id, order_id, paid = self.key_of(callback, provider)
+        if not paid:
+            return self.handler(callback)
+        return self.guard.call(merchant_id, order_id, self.handler, callback)
+
+    async def aprocess(self, callback: Dict, provider: Optional[str] = None) -> Any:
+        """處理回呼 (handler 為 coroutine 函數)"""
+        merchant_id, order_id, paid = self.key_of(callback, provider)
+        if not paid:
+            return await self.handler(callback)
+        return await self.guard.acall(merchant_id, order_id, self.handler, callback)
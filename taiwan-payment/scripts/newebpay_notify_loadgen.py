@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+NewebPay NotifyURL 負載產生器
+
+預先產生已簽章的付款通知 (TradeInfo 為 RespondType=JSON 格式的 AES 加密內容)，
+以多條 keep-alive 連線重送到 NotifyURL，量測回應延遲與吞吐量，並驗證:
+- 所有 TradeSha 正確的通知都被接受且解析後放入佇列 (不重複、不遺漏)
+- 竄改的通知回應 400
+- 取用端變慢時，佇列與處理中的通知數量維持在上限內 (背壓)
+
+使用方法:
+    python newebpay_notify_loadgen.py                     # 啟動本機接收器並測試
+    python newebpay_notify_loadgen.py --compare           # 同步解密 vs thread pool vs process pool
+    python newebpay_notify_loadgen.py --url http://127.0.0.1:8081/notify --count 50000
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import urllib.parse
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from newebpay_notify_server import (
+    DEMO_HASH_IV, DEMO_HASH_KEY, DEMO_MERCHANT_ID, NewebPayMPGService, NewebPayNotifyReceiver,
+)
+
+
+def build_notifications(count: int, tamper_every: int = 0) -> List[Tuple[bytes, bool]]:
+    """
+    產生已簽章的通知 POST body
+
+    Args:
+        count: 筆數
+        tamper_every: 每 N 筆竄改一筆 TradeSha (0 = 不竄改)
+
+    Returns:
+        [(body, 是否為有效通知)]
+    """
+    service = NewebPayMPGService(DEMO_MERCHANT_ID, DEMO_HASH_KEY, DEMO_HASH_IV)
+    notifications = []
+    for i in range(count):
+        trade_info = service.encrypt_text(json.dumps({
+            'Status': 'SUCCESS',
+            'Message': '授權成功',
+            'Result': {
+                'MerchantID': DEMO_MERCHANT_ID,
+                'Amt': 100 + i % 5000,
+                'TradeNo': f'24012912{i:010d}',
+                'MerchantOrderNo': f'MPG{i:012d}',
+                'PaymentType': 'CREDIT',
+                'RespondType': 'JSON',
+                'PayTime': '2024-01-29 14:30:00',
+                'IP': '203.0.113.10',
+                'EscrowBank': 'HNCB',
+                'AuthBank': 'Esun',
+                'RespondCode': '00',
+                'Auth': f'{i % 1000000:06d}',
+                'Card6No': '400022',
+                'Card4No': '1111',
+            },
+        }, ensure_ascii=False))
+        trade_sha = service.generate_trade_sha(trade_info)
+        valid = not (tamper_every and i % tamper_every == tamper_every - 1)
+        if not valid:
+            trade_sha = trade_sha[::-1]
+        body = urllib.parse.urlencode({
+            'Status': 'SUCCESS',
+            'MerchantID': DEMO_MERCHANT_ID,
+            'Version': '2.0',
+            'TradeInfo': trade_info,
+            'TradeSha': trade_sha,
+        }).encode('ascii')
+        notifications.append((body, valid))
+    return notifications
+
+
+async def send_all(url: str, notifications: List[Tuple[bytes, bool]], connections: int) -> Dict:
+    """
+    以多條 keep-alive 連線送出所有通知
+
+    Returns:
+        {'elapsed', 'latencies', 'statuses', 'mismatched'}
+    """
+    parsed = urllib.parse.urlsplit(url)
+    host, port, path = parsed.hostname, parsed.port or 80, parsed.path or '/'
+    queue = iter(enumerate(notifications))
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    mismatched = 0
+
+    async def client():
+        nonlocal mismatched
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for _, (body, valid) in queue:
+                started = time.perf_counter()
+                writer.write(
+                    f'POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\n'
+                    f'Content-Type: application/x-www-form-urlencoded\r\n'
+                    f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body
+                )
+                await writer.drain()
+
+                status = int((await reader.readline()).split(b' ', 2)[1])
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    name, _, value = line.partition(b':')
+                    if name.strip().lower() == b'content-length':
+                        length = int(value)
+                await reader.readexactly(length)
+
+                latencies.append(time.perf_counter() - started)
+                statuses[status] += 1
+                expected = 200 if valid else 400
+                if status != expected and status != 503:
+                    mismatched += 1
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    return {'elapsed': time.perf_counter() - started, 'latencies': latencies,
+            'statuses': statuses, 'mismatched': mismatched}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def format_run(label: str, result: Dict, count: int) -> str:
+    latencies = result['latencies']
+    return (f"   {label:<22} {count / result['elapsed']:>9,.0f} 筆/秒   "
+            f"p50 {percentile(latencies, 50) * 1000:>6.2f} ms   p99 {percentile(latencies, 99) * 1000:>7.2f} ms")
+
+
+async def run_local(notifications: List[Tuple[bytes, bool]], connections: int, workers: int, executor: str,
+                    consumer_delay: float = 0.0, queue_size: int = 10000,
+                    max_pending: Optional[int] = None) -> Tuple[Dict, NewebPayNotifyReceiver, List, int]:
+    """啟動本機接收器、送出通知並取用所有解析結果"""
+    receiver = NewebPayNotifyReceiver(workers=workers, executor=executor, queue_size=queue_size,
+                                      max_pending=max_pending, ack_timeout=30.0)
+    consumed = []
+    high_water = 0
+
+    async def consumer():
+        nonlocal high_water
+        while True:
+            high_water = max(high_water, receiver.queue.qsize() + len(receiver._pending))
+            consumed.append(await receiver.get())
+            if consumer_delay:
+                await asyncio.sleep(consumer_delay)
+
+    async with receiver:
+        consumer_task = asyncio.create_task(consumer())
+        result = await send_all(receiver.url, notifications, connections)
+        await receiver.drain()
+        while receiver.queue.qsize():
+            await asyncio.sleep(0.01)
+        consumer_task.cancel()
+
+    return result, receiver, consumed, high_water
+
+
+async def run_checks(args) -> int:
+    failures = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    notifications = build_notifications(args.count, tamper_every=args.tamper_every)
+    valid = sum(1 for _, ok in notifications if ok)
+
+    result, receiver, consumed, _ = await run_local(notifications, args.connections, args.workers, args.executor)
+    print(format_run(f'{args.executor} x{args.workers}', result, args.count))
+    print()
+
+    order_numbers = Counter(c.merchant_order_no for c in consumed)
+    check(f'有效通知全部接受 ({receiver.stats.accepted}/{valid})', receiver.stats.accepted == valid)
+    check(f'竄改通知回應 400 ({receiver.stats.rejected})',
+          receiver.stats.rejected == args.count - valid and result['mismatched'] == 0)
+    check('解析結果不重複、不遺漏', len(order_numbers) == valid and max(order_numbers.values(), default=1) == 1)
+    check('解析內容正確', all(c.status == 'SUCCESS' and c.amt >= 100 for c in consumed))
+
+    # 背壓: 取用端每筆 2 ms、佇列上限 20、處理名額 10
+    slow = notifications[:300]
+    _, slow_receiver, slow_consumed, high_water = await run_local(
+        slow, 20, 2, 'thread', consumer_delay=0.002, queue_size=20, max_pending=10)
+    check(f'取用端變慢時積壓有上限 (最多 {high_water} 筆 ≤ 30)',
+          high_water <= 30 and len(slow_consumed) == sum(1 for _, ok in slow if ok))
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+    return 1 if failures else 0
+
+
+async def run_compare(args) -> int:
+    notifications = build_notifications(args.count)
+    for label, workers, executor in (('同步解密 (對照組)', 0, 'thread'),
+                                     (f'thread pool x{args.workers}', args.workers, 'thread'),
+                                     (f'process pool x{args.workers}', args.workers, 'process')):
+        result, receiver, consumed, _ = await run_local(notifications, args.connections, workers, executor)
+        print(format_run(label, result, args.count) + f"   (解析 {len(consumed)})")
+    print("=" * 60)
+    return 0
+
+
+async def run_remote(args) -> int:
+    notifications = build_notifications(args.count, tamper_every=args.tamper_every)
+    result = await send_all(args.url, notifications, args.connections)
+    print(format_run('remote', result, args.count))
+    print(f"   回應狀態: {dict(result['statuses'])}")
+    print("=" * 60)
+    return 1 if result['mismatched'] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NewebPay NotifyURL 負載產生器')
+    parser.add_argument('--url', help='NotifyURL (未指定時啟動本機接收器)')
+    parser.add_argument('--count', type=int, default=5000, help='通知筆數 (預設: 5000)')
+    parser.add_argument('--connections', type=int, default=50, help='併發連線數 (預設: 50)')
+    parser.add_argument('--workers', type=int, default=4, help='本機接收器 worker 數 (預設: 4)')
+    parser.add_argument('--executor', choices=('thread', 'process'), default='thread', help='本機接收器 worker 類型')
+    parser.add_argument('--tamper-every', type=int, default=50, help='每 N 筆竄改一筆 TradeSha (0 = 不竄改)')
+    parser.add_argument('--compare', action='store_true', help='比較同步解密與 worker pool')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"NewebPay NotifyURL 負載測試 ({args.count} 筆, {args.connections} 連線)")
+    print("=" * 60)
+
+    if args.url:
+        return asyncio.run(run_remote(args))
+    if args.compare:
+        return asyncio.run(run_compare(args))
+    return asyncio.run(run_checks(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Taiwan Payment Skill - NewebPay NotifyURL 非同步接收器
+
+NewebPayMPGService.parse_callback 在同一個呼叫中驗證 TradeSha 並以 AES-256-CBC
+解密 TradeInfo；在 Web 框架的請求執行緒上同步執行時，尖峰期間通知會排隊等待。
+此接收器以 asyncio 處理 NotifyURL POST:
+
+1. 事件迴圈上只做 TradeSha 驗證 (HashKey 前綴的 SHA256 狀態預先算好，常數時間比對)
+2. 取得處理名額後立即回應 200，解密與解析交給有上限的 thread / process pool
+3. 解析後的 MPGCallbackData 放入有上限的 asyncio.Queue 供業務邏輯取用
+
+背壓: 處理名額 (max_pending) 涵蓋「解密中 + 等待放入佇列」的通知；
+佇列滿時名額不會釋放，新的通知最多等待 ack_timeout 秒，逾時回應 503
+讓藍新稍後重送，而不是無上限地堆積在記憶體中。
+
+workers=0 時在事件迴圈上同步解密後才回應 (與 parse_callback 相同，作為對照組)。
+
+單筆通知解密或解析失敗 (金鑰錯誤、Result 不是物件、Amt 不是數字等) 只計入 decrypt_errors，
+不影響其他通知；POST 內容超過 max_body_size 時回應 413 並關閉連線。
+
+使用範例:
+    receiver = NewebPayNotifyReceiver(merchant_id, hash_key, hash_iv, port=8081, workers=4)
+    async with receiver:
+        async for callback in receiver:
+            handle_payment(callback)      # MPGCallbackData
+
+    python newebpay_notify_server.py --port 8081 --workers 4
+    python newebpay_notify_loadgen.py --compare      # 負載測試
+"""
+
+import argparse
+import asyncio
+import functools
+import hashlib
+import hmac
+import urllib.parse
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional, Set, Tuple
+
+from example_loader import load_example
+
+newebpay = load_example('newebpay-payment-example')
+NewebPayMPGService = newebpay.NewebPayMPGService
+MPGCallbackData = newebpay.MPGCallbackData
+
+# 本機測試用金鑰 (HashKey 32 字元、HashIV 16 字元)
+DEMO_MERCHANT_ID = 'MS12345678'
+DEMO_HASH_KEY = 'Fs5cX1TGqYM2PpdbE14a9H83YQSQF5jn'
+DEMO_HASH_IV = 'C6AcmfqJILwgnhIP'
+
+EXECUTORS = ('thread', 'process')
+
+
+@functools.lru_cache(maxsize=16)
+def _worker_service(merchant_id: str, hash_key: str, hash_iv: str) -> NewebPayMPGService:
+    return NewebPayMPGService(merchant_id, hash_key, hash_iv)
+
+
+def _decode_in_worker(merchant_id: str, hash_key: str, hash_iv: str, trade_info: str) -> MPGCallbackData:
+    """process pool 中執行: 每個 worker 各自快取一個服務物件"""
+    return _worker_service(merchant_id, hash_key, hash_iv).decode_callback(trade_info)
+
+
+@dataclass
+class NotifyStats:
+    """接收器統計"""
+    received: int = 0        # 收到的 POST
+    accepted: int = 0        # TradeSha 通過並回應 200
+    rejected: int = 0        # TradeSha 驗證失敗 (400)
+    throttled: int = 0       # 等待處理名額逾時 (503)
+    oversized: int = 0       # 內容超過 max_body_size (413)
+    decoded: int = 0         # 解密完成並放入佇列
+    decrypt_errors: int = 0  # TradeSha 通過但解密或解析失敗
+
+
+class NewebPayNotifyReceiver:
+    """NewebPay NotifyURL 非同步接收器"""
+
+    def __init__(self, merchant_id: str = DEMO_MERCHANT_ID, hash_key: str = DEMO_HASH_KEY,
+                 hash_iv: str = DEMO_HASH_IV, host: str = '127.0.0.1', port: int = 0,
+                 path: str = '/notify', workers: int = 4, executor: str = 'thread',
+                 max_pending: Optional[int] = None, queue_size: int = 10000, ack_timeout: float = 5.0,
+                 max_body_size: int = 64 * 1024):
+        """
+        Args:
+            merchant_id: 商店代號
+            hash_key: HashKey (32 字元)
+            hash_iv: HashIV (16 字元)
+            host: 監聽位址
+            port: 監聽埠 (0 = 自動選擇)
+            path: NotifyURL 路徑
+            workers: 解密 worker 數 (0 = 在事件迴圈上同步解密)
+            executor: 'thread' 或 'process'
+            max_pending: 已回應但尚未放入佇列的通知上限 (預設 workers * 8)
+            queue_size: 解析結果佇列上限
+            ack_timeout: 等待處理名額的上限秒數，逾時回應 503
+            max_body_size: POST 內容上限 (bytes)，超過時回應 413
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f'executor 必須為 {EXECUTORS}')
+
+        self.merchant_id = merchant_id
+        self.host = host
+        self.port = port
+        self.path = path
+        self.workers = workers
+        self.executor_type = executor
+        self.ack_timeout = ack_timeout
+        self.max_body_size = max_body_size
+
+        self.service = NewebPayMPGService(merchant_id, hash_key, hash_iv)
+        self._credentials = (merchant_id, hash_key, hash_iv)
+
+        # TradeSha = SHA256("HashKey=...&" + TradeInfo + "&HashIV=...")
+        self._sha_prefix = hashlib.sha256(f'HashKey={hash_key}&'.encode('utf-8'))
+        self._sha_suffix = f'&HashIV={hash_iv}'.encode('utf-8')
+
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.stats = NotifyStats()
+
+        self._max_pending = max_pending or max(workers, 1) * 8
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending: Set[asyncio.Task] = set()
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self._executor: Optional[Executor] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        """NotifyURL"""
+        return f'http://{self.host}:{self.port}{self.path}'
+
+    async def start(self):
+        """啟動伺服器與 worker pool"""
+        self._slots = asyncio.Semaphore(self._max_pending)
+        if self.workers:
+            if self.executor_type == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='newebpay-decrypt')
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def drain(self):
+        """等待所有已回應的通知處理完成 (佇列需有人取用)"""
+        while self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    async def stop(self):
+        """停止接收並等待處理中的通知完成"""
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections.values()):
+                writer.close()
+            await asyncio.gather(*list(self._connections), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        await self.drain()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def __aenter__(self) -> 'NewebPayNotifyReceiver':
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def get(self) -> MPGCallbackData:
+        """取得下一筆解析後的付款通知"""
+        callback = await self.queue.get()
+        self.queue.task_done()
+        return callback
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> MPGCallbackData:
+        return await self.get()
+
+    # ------------------------------------------------------------------
+    # 通知處理
+    # ------------------------------------------------------------------
+
+    def verify_trade_sha(self, trade_info: str, trade_sha: str) -> bool:
+        """TradeSha 驗證 (與 NewebPayMPGService.verify_trade_sha 結果相同)"""
+        digest = self._sha_prefix.copy()
+        digest.update(trade_info.encode('utf-8'))
+        digest.update(self._sha_suffix)
+        return hmac.compare_digest(digest.hexdigest().upper().encode('ascii'),
+                                   trade_sha.upper().encode('utf-8'))
+
+    def _decoder(self):
+        if self.executor_type == 'process':
+            return functools.partial(_decode_in_worker, *self._credentials)
+        return self.service.decode_callback
+
+    async def handle_notify(self, params: Dict[str, str]) -> Tuple[str, str]:
+        """
+        處理一筆通知
+
+        Args:
+            params: POST 表單參數
+
+        Returns:
+            (HTTP 狀態, 回應內容)
+        """
+        self.stats.received += 1
+        trade_info = params.get('TradeInfo', '')
+        if not trade_info or not self.verify_trade_sha(trade_info, params.get('TradeSha', '')):
+            self.stats.rejected += 1
+            return '400 Bad Request', 'TradeSha 驗證失敗'
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.ack_timeout)
+        except asyncio.TimeoutError:
+            self.stats.throttled += 1
+            return '503 Service Unavailable', 'Busy'
+
+        if self._executor is None:
+            # 對照組: 同步解密後才回應
+            await self._process(trade_info)
+        else:
+            task = asyncio.create_task(self._process(trade_info))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+        self.stats.accepted += 1
+        return '200 OK', 'OK'
+
+    async def _process(self, trade_info: str):
+        """解密、解析並放入佇列 (完成後釋放處理名額)"""
+        try:
+            if self._executor is None:
+                callback = self.service.decode_callback(trade_info)
+            else:
+                loop = asyncio.get_running_loop()
+                callback = await loop.run_in_executor(self._executor, self._decoder(), trade_info)
+            await self.queue.put(callback)
+            self.stats.decoded += 1
+        except Exception:
+            # 單筆通知的任何失敗 (解密、Result 格式、欄位型別) 都不可中斷接收器
+            self.stats.decrypt_errors += 1
+        finally:
+            self._slots.release()
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    async def _read_request(
+            self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], Optional[bytes]]]:
+        """讀取一個 HTTP 請求，連線關閉時回傳 None；內容超過 max_body_size 時 body 為 None (不讀取)"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+
+        method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0))
+        if length < 0 or length > self.max_body_size:
+            return method, path, headers, None
+        body = await reader.readexactly(length) if length else b''
+        return method, path, headers, body
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """處理一條連線上的所有請求 (keep-alive)"""
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                if body is None:
+                    # 未讀取的內容留在連線上，回應後關閉
+                    self.stats.oversized += 1
+                    status, text = '413 Payload Too Large', 'Payload Too Large'
+                    keep_alive = False
+                elif method != 'POST' or path.split('?', 1)[0] != self.path:
+                    status, text = '404 Not Found', 'Not Found'
+                else:
+                    params = dict(urllib.parse.parse_qsl(body.decode('utf-8', 'replace'), keep_blank_values=True))
+                    status, text = await self.handle_notify(params)
+
+                payload = text.encode('utf-8')
+                writer.write(
+                    f'HTTP/1.1 {status}\r\n'
+                    f'Content-Type: text/plain; charset=utf-8\r\n'
+                    f'Content-Length: {len(payload)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+                    f'\r\n'.encode('latin-1') + payload
+                )
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+
+async def serve(args):
+    """啟動接收器並列印收到的付款通知"""
+    receiver = NewebPayNotifyReceiver(
+        args.merchant_id, args.hash_key, args.hash_iv, host=args.host, port=args.port,
+        path=args.path, workers=args.workers, executor=args.executor,
+    )
+    async with receiver:
+        print(f"NewebPay NotifyURL: {receiver.url} (workers={args.workers}, {args.executor})")
+        print("按 Ctrl+C 停止")
+        async for callback in receiver:
+            print(f"   {callback.status} {callback.merchant_order_no} {callback.amt} {callback.trade_no}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NewebPay NotifyURL 非同步接收器')
+    parser.add_argument('--host', default='127.0.0.1', help='監聽位址 (預設: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8081, help='監聽埠 (預設: 8081)')
+    parser.add_argument('--path', default='/notify', help='NotifyURL 路徑 (預設: /notify)')
+    parser.add_argument('--workers', type=int, default=4, help='解密 worker 數 (0 = 同步解密)')
+    parser.add_argument('--executor', choices=EXECUTORS, default='thread', help='worker 類型 (預設: thread)')
+    parser.add_argument('--merchant-id', default=DEMO_MERCHANT_ID, help='商店代號')
+    parser.add_argument('--hash-key', default=DEMO_HASH_KEY, help='HashKey')
+    parser.add_argument('--hash-iv', default=DEMO_HASH_IV, help='HashIV')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
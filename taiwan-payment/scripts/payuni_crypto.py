@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Taiwan Payment Skill - PAYUNi AES-256-GCM 加解密工具
+
+PAYUNi 的 EncryptInfo 格式: 查詢字串 → AES-256-GCM (nonce = HashIV) → hex(密文 + 16 bytes tag)
+HashInfo / Checksum: SHA256(EncryptInfo + HashKey + HashIV) 轉大寫
+
+與 PAYUNiPaymentService.encrypt_data / decrypt_data / generate_checksum 輸出相容，差異在於:
+- HashKey / HashIV 的 bytes 與字串形式只在建立時轉換一次，並依商店快取 (get_cipher)
+- 解密時以 memoryview 切出密文與 tag，不另外複製
+- 解密後的查詢字串直接解析為單值 dict (不經過 parse_qs 的 list 再轉換)；
+  只有含 % 或 + 的值才做 unquote
+- Checksum 直接對 bytes 計算，不重組字串
+- 提供批次 API: encrypt_many / decrypt_many
+
+統一物流 (PAYUNiLogistics) 使用相同格式，見 taiwan-logistics/scripts/payuni_crypto.py。
+
+使用範例:
+    from payuni_crypto import get_cipher
+
+    cipher = get_cipher(hash_key, hash_iv)
+    encrypt_info = cipher.encrypt({'MerID': 'U12345678', 'TradeAmt': 100})
+    hash_info = cipher.checksum(encrypt_info)
+    data = cipher.decrypt(encrypt_info)
+
+效能量測:
+    python payuni_crypto.py --benchmark
+"""
+
+import argparse
+import hashlib
+import hmac
+import sys
+import time
+import urllib.parse
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Union
+
+from Crypto.Cipher import AES
+
+TAG_SIZE = 16
+
+_unquote_plus = urllib.parse.unquote_plus
+
+
+def parse_query(text: str) -> Dict[str, Any]:
+    """
+    解析查詢字串為 dict (輸出與範例的 parse_qs + 單值轉換相同)
+
+    空值的參數會被略過 (parse_qs 預設行為)；同名參數出現多次時值為 list。
+    """
+    result: Dict[str, Any] = {}
+    for pair in text.split('&'):
+        name, sep, value = pair.partition('=')
+        if not sep or not value:
+            continue
+        if '%' in name or '+' in name:
+            name = _unquote_plus(name)
+        if '%' in value or '+' in value:
+            value = _unquote_plus(value)
+
+        existing = result.get(name)
+        if existing is None:
+            result[name] = value
+        elif isinstance(existing, list):
+            existing.append(value)
+        else:
+            result[name] = [existing, value]
+    return result
+
+
+class PAYUNiCipher:
+    """
+    PAYUNi AES-256-GCM 加解密 (單一商店)
+
+    GCM 的 cipher 物件只能使用一次，因此每則訊息仍建立一次 AES 物件。
+    """
+
+    def __init__(self, hash_key: Union[str, bytes], hash_iv: Union[str, bytes]):
+        """
+        Args:
+            hash_key: HashKey (32 bytes)
+            hash_iv: HashIV (16 bytes)
+
+        Raises:
+            ValueError: HashKey 長度錯誤
+        """
+        self.hash_key = hash_key.encode('utf-8') if isinstance(hash_key, str) else bytes(hash_key)
+        self.hash_iv = hash_iv.encode('utf-8') if isinstance(hash_iv, str) else bytes(hash_iv)
+
+        if len(self.hash_key) not in (16, 24, 32):
+            raise ValueError(f'HashKey 長度錯誤 (目前 {len(self.hash_key)} bytes)')
+        if not self.hash_iv:
+            raise ValueError('HashIV 不可為空')
+
+        # Checksum 的後綴 (HashKey + HashIV)
+        self._checksum_suffix = self.hash_key + self.hash_iv
+
+    def encrypt_text(self, query_string: str) -> str:
+        """
+        加密查詢字串
+
+        Returns:
+            hex(密文 + tag)
+        """
+        cipher = AES.new(self.hash_key, AES.MODE_GCM, nonce=self.hash_iv)
+        encrypted, tag = cipher.encrypt_and_digest(query_string.encode('utf-8'))
+        return encrypted.hex() + tag.hex()
+
+    def encrypt(self, data: Dict[str, Any]) -> str:
+        """
+        序列化並加密
+
+        Args:
+            data: 交易資料
+
+        Returns:
+            EncryptInfo (hex)
+        """
+        return self.encrypt_text(urllib.parse.urlencode(data))
+
+    def decrypt_text(self, encrypt_info: str) -> str:
+        """
+        解密為查詢字串
+
+        Raises:
+            ValueError: hex 格式錯誤、長度不足或 tag 驗證失敗
+        """
+        data = memoryview(bytes.fromhex(encrypt_info))
+        if len(data) <= TAG_SIZE:
+            raise ValueError('加密資料長度錯誤')
+
+        decipher = AES.new(self.hash_key, AES.MODE_GCM, nonce=self.hash_iv)
+        return decipher.decrypt_and_verify(data[:-TAG_SIZE], data[-TAG_SIZE:]).decode('utf-8')
+
+    def decrypt(self, encrypt_info: str) -> Dict[str, Any]:
+        """
+        解密並解析
+
+        Raises:
+            ValueError: 解密失敗
+        """
+        try:
+            return parse_query(self.decrypt_text(encrypt_info))
+        except (ValueError, KeyError) as e:
+            raise ValueError(f'解密失敗: {e}')
+
+    def checksum(self, encrypt_info: str) -> str:
+        """產生 HashInfo / Checksum (SHA256 大寫)"""
+        digest = hashlib.sha256(encrypt_info.encode('utf-8'))
+        digest.update(self._checksum_suffix)
+        return digest.hexdigest().upper()
+
+    def verify_checksum(self, encrypt_info: str, checksum: str) -> bool:
+        """驗證 HashInfo / Checksum (常數時間比對)"""
+        return hmac.compare_digest(self.checksum(encrypt_info).encode('ascii'), checksum.upper().encode('utf-8'))
+
+    def encrypt_many(self, items: Iterable[Dict[str, Any]]) -> List[str]:
+        """批次加密"""
+        encrypt = self.encrypt
+        return [encrypt(data) for data in items]
+
+    def decrypt_many(self, items: Iterable[str]) -> List[Dict[str, Any]]:
+        """批次解密"""
+        decrypt = self.decrypt
+        return [decrypt(data) for data in items]
+
+
+@lru_cache(maxsize=256)
+def get_cipher(hash_key: str, hash_iv: str) -> PAYUNiCipher:
+    """
+    取得 (快取的) 商店加解密物件
+
+    Args:
+        hash_key: HashKey
+        hash_iv: HashIV
+
+    Returns:
+        PAYUNiCipher
+    """
+    return PAYUNiCipher(hash_key, hash_iv)
+
+
+# ============================================================================
+# 效能量測
+# ============================================================================
+
+BENCH_HASH_KEY = '12345678901234567890123456789012'
+BENCH_HASH_IV = '1234567890123456'
+
+
+def _sample_payloads(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            'MerID': 'U12345678',
+            'MerTradeNo': f'ORD{i:012d}',
+            'TradeNo': f'PU{i:016d}',
+            'TradeAmt': 100 + i % 5000,
+            'Status': 'SUCCESS',
+            'Message': '交易成功',
+            'TradeStatus': '1',
+            'PayType': 'Credit',
+            'PayDate': '2024-01-29 14:30:00',
+            'ProdDesc': '測試商品 x 1',
+            'BuyerEmail': 'test@example.com',
+            'Timestamp': 1700000000 + i,
+        }
+        for i in range(count)
+    ]
+
+
+def benchmark(count: int = 20000) -> int:
+    """比較 PAYUNiPaymentService 原本的加解密與 PAYUNiCipher"""
+    from example_loader import load_example
+
+    payuni = load_example('payuni-payment-example')
+    service = payuni.PAYUNiPaymentService('U12345678', BENCH_HASH_KEY, BENCH_HASH_IV)
+    cipher = get_cipher(BENCH_HASH_KEY, BENCH_HASH_IV)
+    payloads = _sample_payloads(count)
+    expected = [{k: str(v) for k, v in p.items()} for p in payloads]
+
+    def timed(func, repeat: int = 3):
+        """取 repeat 次中最快的一次，降低 GC 與暖機造成的誤差"""
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - started)
+        return result, best
+
+    baseline_encrypted, baseline_enc = timed(lambda: [service.encrypt_data(p) for p in payloads])
+    baseline_decrypted, baseline_dec = timed(lambda: [service.decrypt_data(e) for e in baseline_encrypted])
+    _, baseline_sum = timed(lambda: [service.generate_checksum(e) for e in baseline_encrypted])
+
+    encrypted, fast_enc = timed(lambda: cipher.encrypt_many(payloads))
+    decrypted, fast_dec = timed(lambda: cipher.decrypt_many(encrypted))
+    checksums, fast_sum = timed(lambda: [cipher.checksum(e) for e in encrypted])
+
+    tampered = encrypted[0][:-2] + ('00' if encrypted[0][-2:] != '00' else '11')
+    try:
+        cipher.decrypt(tampered)
+        tamper_rejected = False
+    except ValueError:
+        tamper_rejected = True
+
+    edge = 'A=1&B=&C=x+y%26z&A=2&D'
+    checks = [
+        ('密文與原實作相同', encrypted == baseline_encrypted),
+        ('解密結果與原實作相同', decrypted == baseline_decrypted == expected),
+        ('Checksum 與原實作相同', checksums[:100] == [service.generate_checksum(e) for e in encrypted[:100]]),
+        ('查詢字串邊界情況與 parse_qs 相同',
+         parse_query(edge) == {k: v[0] if len(v) == 1 else v for k, v in urllib.parse.parse_qs(edge).items()}),
+        ('竄改 tag 時解密失敗', tamper_rejected),
+    ]
+
+    print("=" * 60)
+    print(f"PAYUNi AES-256-GCM 加解密效能 ({count} 筆)")
+    print("=" * 60)
+    print(f"\n   {'':<12} {'原本 (us/筆)':>14} {'cipher (us/筆)':>16} {'加速':>8}")
+    for name, before, after in (('加密', baseline_enc, fast_enc), ('解密', baseline_dec, fast_dec),
+                                ('Checksum', baseline_sum, fast_sum)):
+        print(f"   {name:<12} {before / count * 1e6:>14.1f} {after / count * 1e6:>16.1f} "
+              f"{before / after:>7.2f}x")
+    print()
+    for name, passed in checks:
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+    print("=" * 60)
+
+    return 0 if all(passed for _, passed in checks) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PAYUNi AES-256-GCM 加解密工具')
+    parser.add_argument('--benchmark', action='store_true', help='與原本實作比較效能')
+    parser.add_argument('--count', type=int, default=20000, help='量測筆數 (預設: 20000)')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        return benchmark(args.count)
+
+    parser.print_help()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
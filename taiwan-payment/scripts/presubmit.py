@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Taiwan Payment Skill - 送出前規則檢查
+
+error-codes.csv / troubleshooting.csv 中有許多錯誤是必然發生的 (訂單編號重複、金額不是正整數、
+付款方式不支援、金額超出付款方式上下限...)，原本要簽章並送到金流服務商才會回報。
+PresubmitChecker 在建立訂單前於本機檢查三家服務商的訂單 dataclass，回傳預測的錯誤碼 (Violation)，
+呼叫端可直接略過必定失敗的請求。
+
+規則 (金額上下限來自 data/payment-methods.csv):
+    ECPay PaymentOrderData     10100003 訂單編號重複、10100050 金額錯誤、10100001 參數格式
+    NewebPay MPGOrderData      MPG03009 訂單編號重複、AMT-001 金額錯誤、TRA10001 參數錯誤
+    PAYUNi PaymentOrderData    DUPLICATE_ORDER 訂單編號重複、INVALID_AMOUNT 金額錯誤、
+                               INVALID_PAYMENT_TYPE 不支援的支付方式
+
+最近建立的訂單編號以固定容量的 LRU 保存 (結果精確；Bloom filter 的誤判會擋下從未送出的訂單，
+因此不採用)。只有 record() 登錄的訂單會參與重複檢查。
+
+使用範例:
+    from presubmit import PresubmitChecker
+
+    checker = PresubmitChecker()
+    violations = checker.check(order_data)
+    if violations:
+        print(violations[0])        # [ECPAY] 10100050 交易金額錯誤: ...
+    else:
+        response = service.create_order(order_data)
+        checker.record(order_data)
+"""
+
+import csv
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from error_registry import ErrorInfo, ErrorRegistry, get_error_registry
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+PAYMENT_METHODS_CSV = DATA_DIR / 'payment-methods.csv'
+
+ECPAY_PAYMENTS = frozenset({'Credit', 'ATM', 'CVS', 'BARCODE', 'WebATM', 'ApplePay', 'TWQR', 'BNPL', 'ALL'})
+PAYUNI_PAYMENTS = frozenset({'Credit', 'VACC', 'CVS', 'AFTEE', 'iCashPay'})
+
+# MPGOrderData 的 enable_* 欄位 → payment-methods.csv 的 newebpay_code
+NEWEBPAY_METHODS: Dict[str, str] = {
+    'enable_credit': 'CREDIT',
+    'enable_vacc': 'VACC',
+    'enable_cvs': 'CVS',
+    'enable_barcode': 'BARCODE',
+    'enable_linepay': 'LINEPAY',
+    'enable_applepay': 'APPLEPAY',
+}
+
+_ECPAY_TRADE_NO = re.compile(r'^[A-Za-z0-9]{1,20}$')
+_NEWEBPAY_ORDER_NO = re.compile(r'^[A-Za-z0-9_]{1,30}$')
+_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+_URL = re.compile(r'^https?://\S+$')
+
+
+def load_amount_limits(path: Path = PAYMENT_METHODS_CSV) -> Dict[Tuple[str, str], Tuple[int, Optional[int]]]:
+    """讀取 payment-methods.csv 的金額上下限，以 (服務商, 付款方式代碼) 為 key"""
+    limits = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            low = int(row['min_amount'] or 1)
+            high = int(row['max_amount']) if row['max_amount'] else None
+            for provider in ('ecpay', 'newebpay', 'payuni'):
+                code = row.get(f'{provider}_code', '').strip()
+                # 組合代碼 (例如 Credit+CreditInstallment) 不是 ChoosePayment 的值
+                if code and '+' not in code:
+                    limits.setdefault((provider, code.upper()), (low, high))
+    return limits
+
+
+AMOUNT_LIMITS = load_amount_limits()
+
+
+@dataclass(frozen=True)
+class Violation:
+    """預測的 API 錯誤"""
+    provider: str
+    code: str
+    detail: str
+    info: ErrorInfo
+
+    def __str__(self) -> str:
+        return f'[{self.provider.upper()}] {self.code} {self.info.message}: {self.detail}'
+
+
+@dataclass(frozen=True)
+class Rule:
+    """一條送出前檢查規則 (check 通過時回傳 None，否則回傳說明)"""
+    code: str
+    check: Callable[[Any, 'PresubmitChecker'], Optional[str]]
+
+
+@dataclass(frozen=True)
+class RuleSet:
+    """一種訂單 dataclass 的規則 (以 marker 欄位判斷資料類別，marker 同時是訂單編號欄位)"""
+    provider: str
+    marker: str
+    rules: Tuple[Rule, ...]
+
+
+class RecentKeys:
+    """最近使用的 key (LRU，容量固定)"""
+
+    def __init__(self, capacity: int = 100_000):
+        if capacity <= 0:
+            raise ValueError('capacity 必須大於 0')
+        self.capacity = capacity
+        self._items: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key: Hashable, value: Any = True):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def _text(value: Any) -> str:
+    return '' if value is None else str(value).strip()
+
+
+def _positive_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def _out_of_range(provider: str, method: str, amount: int) -> Optional[str]:
+    """金額超出付款方式上下限時回傳說明 (未登錄的付款方式不檢查)"""
+    limits = AMOUNT_LIMITS.get((provider, method.upper()))
+    if limits is None:
+        return None
+    low, high = limits
+    if amount < low or (high is not None and amount > high):
+        return f'{method} 金額需介於 {low} ~ {high or "不限"}: {amount}'
+    return None
+
+
+def _duplicate(data, checker) -> Optional[str]:
+    rule_set = checker.rule_set(data)
+    order_no = getattr(data, rule_set.marker)
+    if (rule_set.provider, order_no) in checker.recent:
+        return f'訂單編號 {order_no} 已於本行程建立'
+    return None
+
+
+# ============================================================================
+# ECPay
+# ============================================================================
+
+def _ecpay_amount(data, checker) -> Optional[str]:
+    if not _positive_int(data.total_amount):
+        return f'TotalAmount 必須為正整數: {data.total_amount!r}'
+    if data.choose_payment != 'ALL':
+        return _out_of_range('ecpay', data.choose_payment, data.total_amount)
+    return None
+
+
+def _ecpay_fields(data, checker) -> Optional[str]:
+    errors = []
+    if not _ECPAY_TRADE_NO.match(_text(data.merchant_trade_no)):
+        errors.append(f'MerchantTradeNo 需為 1 ~ 20 碼英數字: {data.merchant_trade_no}')
+    if data.merchant_trade_date:
+        try:
+            datetime.strptime(data.merchant_trade_date, '%Y/%m/%d %H:%M:%S')
+        except ValueError:
+            errors.append(f'MerchantTradeDate 格式需為 yyyy/MM/dd HH:mm:ss: {data.merchant_trade_date}')
+    if not _text(data.trade_desc) or not _text(data.item_name):
+        errors.append('TradeDesc 與 ItemName 必填')
+    elif len(data.item_name) > 400:
+        errors.append('ItemName 不可超過 400 字元')
+    if not _URL.match(_text(data.return_url)):
+        errors.append(f'ReturnURL 格式錯誤: {data.return_url}')
+    if data.choose_payment not in ECPAY_PAYMENTS:
+        errors.append(f'ChoosePayment 不支援: {data.choose_payment}')
+    return '; '.join(errors) or None
+
+
+# ============================================================================
+# NewebPay
+# ============================================================================
+
+def _newebpay_amount(data, checker) -> Optional[str]:
+    if not _positive_int(data.amt):
+        return f'Amt 必須為正整數: {data.amt!r}'
+    enabled = [code for flag, code in NEWEBPAY_METHODS.items() if getattr(data, flag, False)]
+    reasons = [_out_of_range('newebpay', code, data.amt) for code in enabled]
+    # MPG 只顯示金額範圍內的付款方式，全部超出範圍時才會失敗
+    if enabled and all(reasons):
+        return '; '.join(reasons)
+    return None
+
+
+def _newebpay_fields(data, checker) -> Optional[str]:
+    errors = []
+    if not _NEWEBPAY_ORDER_NO.match(_text(data.merchant_order_no)):
+        errors.append(f'MerchantOrderNo 需為 1 ~ 30 碼英數字或底線: {data.merchant_order_no}')
+    if not _text(data.item_desc) or len(data.item_desc) > 50:
+        errors.append('ItemDesc 必填且不可超過 50 字元')
+    if not _EMAIL.match(_text(data.email)):
+        errors.append(f'Email 格式錯誤: {data.email}')
+    if not _URL.match(_text(data.return_url)):
+        errors.append(f'ReturnURL 格式錯誤: {data.return_url}')
+    if data.trade_limit and not 60 <= data.trade_limit <= 900:
+        errors.append(f'TradeLimit 需為 0 或 60 ~ 900 秒: {data.trade_limit}')
+    if not any(getattr(data, flag, False) for flag in NEWEBPAY_METHODS):
+        errors.append('至少需啟用一種付款方式')
+    return '; '.join(errors) or None
+
+
+# ============================================================================
+# PAYUNi
+# ============================================================================
+
+def _payuni_amount(data, checker) -> Optional[str]:
+    if not _positive_int(data.trade_amt):
+        return f'TradeAmt 必須為正整數: {data.trade_amt!r}'
+    return _out_of_range('payuni', data.pay_type, data.trade_amt)
+
+
+def _payuni_payment_type(data, checker) -> Optional[str]:
+    if data.pay_type not in PAYUNI_PAYMENTS:
+        return f'pay_type {data.pay_type}'
+    return None
+
+
+PAYMENT_RULES: Tuple[RuleSet, ...] = (
+    RuleSet('ecpay', 'merchant_trade_no', (
+        Rule('10100003', _duplicate),
+        Rule('10100050', _ecpay_amount),
+        Rule('10100001', _ecpay_fields),
+    )),
+    RuleSet('newebpay', 'merchant_order_no', (
+        Rule('MPG03009', _duplicate),
+        Rule('AMT-001', _newebpay_amount),
+        Rule('TRA10001', _newebpay_fields),
+    )),
+    RuleSet('payuni', 'mer_trade_no', (
+        Rule('DUPLICATE_ORDER', _duplicate),
+        Rule('INVALID_PAYMENT_TYPE', _payuni_payment_type),
+        Rule('INVALID_AMOUNT', _payuni_amount),
+    )),
+)
+
+
+class PresubmitChecker:
+    """
+    送出前規則檢查 (不做任何 I/O)
+
+    check() 回傳預測的錯誤；建立訂單成功後以 record() 登錄，供之後的重複檢查使用。
+    """
+
+    def __init__(self, rule_sets: Iterable[RuleSet] = PAYMENT_RULES, registry: Optional[ErrorRegistry] = None,
+                 capacity: int = 100_000):
+        """
+        Args:
+            rule_sets: 規則 (依序以 marker 欄位比對資料類別)
+            registry: 錯誤碼表 (預設為 data/error-codes.csv)
+            capacity: 保留最近幾筆訂單編號
+        """
+        self.rule_sets = tuple(rule_sets)
+        self.registry = registry or get_error_registry()
+        self.recent = RecentKeys(capacity)
+
+    def rule_set(self, data: Any) -> RuleSet:
+        """
+        取得資料類別對應的規則
+
+        Raises:
+            TypeError: 沒有對應的規則
+        """
+        for rule_set in self.rule_sets:
+            if hasattr(data, rule_set.marker):
+                return rule_set
+        raise TypeError(f'沒有 {type(data).__name__} 的送出前規則')
+
+    def check(self, data: Any) -> List[Violation]:
+        """
+        檢查一筆訂單
+
+        Returns:
+            預測的錯誤 (依規則順序；空 list 表示通過)
+        """
+        rule_set = self.rule_set(data)
+        violations = []
+        for rule in rule_set.rules:
+            detail = rule.check(data, self)
+            if detail:
+                info = self.registry.get(rule.code, rule_set.provider)
+                violations.append(Violation(rule_set.provider, rule.code, detail, info))
+        return violations
+
+    def check_many(self, rows: Iterable[Any]) -> List[List[Violation]]:
+        """批次檢查，回傳與 rows 順序相同的結果"""
+        return [self.check(row) for row in rows]
+
+    def record(self, data: Any):
+        """登錄建立成功的訂單"""
+        rule_set = self.rule_set(data)
+        self.recent.put((rule_set.provider, getattr(data, rule_set.marker)))
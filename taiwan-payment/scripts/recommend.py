@@ -11,13 +11,15 @@ Taiwan Payment 推薦系統
     python recommend.py "新創公司 API" --format simple
 """
 
-from typing import List, Dict, Tuple, Optional
+from typing import Any, List, Dict, Tuple, Optional
 import argparse
 import csv
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Tuple
 import json
 
+from keyword_automaton import KeywordAutomaton
+
 # 路徑設定
 SCRIPT_DIR = Path(__file__).parent
 DATA_DIR = SCRIPT_DIR.parent / 'data'
@@ -65,81 +67,130 @@ RECOMMENDATION_RULES = {
     '物流': [('ecpay', 2, '同時支援金流物流')],
 }
 
-# 反模式 (不建議的場景)
-ANTI_PATTERNS = {
-    'ecpay': [
-        ('無技術資源', 'SHA256 加密流程較複雜，建議有技術人員'),
-        ('極簡需求', '若只需基礎支付，可能功能過多'),
-    ],
-    'newebpay': [
-        ('簡單 API', 'AES 雙層加密較複雜'),
-        ('單一支付', '若只需單一支付方式，不需選擇此平台'),
-    ],
-    'payuni': [
-        ('大型專案', '社群資源較少，大型專案建議選 ECPay'),
-        ('完整文檔', '文檔完整度不如 ECPay'),
-    ]
-}
-
 
-def load_reasoning_csv() -> List[Dict]:
-    """從 reasoning.csv 載入推薦規則"""
-    csv_path = DATA_DIR / 'reasoning.csv'
+def _load_csv(filename: str) -> List[Dict]:
+    """載入 data 目錄下的 CSV"""
+    csv_path = DATA_DIR / filename
     if not csv_path.exists():
         return []
 
-    rules = []
     with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            rules.append(row)
+        return list(csv.DictReader(f))
 
-    return rules
 
+@lru_cache(maxsize=None)
+def load_reasoning_csv() -> List[Dict]:
+    """從 reasoning.csv 載入推薦規則"""
+    return _load_csv('reasoning.csv')
 
-def analyze_requirements(query: str) -> Dict[str, Tuple[int, List[str]]]:
+
+@lru_cache(maxsize=None)
+def load_anti_patterns() -> List[Dict]:
+    """從 anti-patterns.csv 載入反模式關鍵字"""
+    return _load_csv('anti-patterns.csv')
+
+
+def _rule_terms(rule: Dict) -> List[str]:
+    """reasoning.csv 規則的比對詞: scenario 與 use_cases 的各個詞"""
+    terms = rule.get('scenario', '').lower().split()
+    for use_case in rule.get('use_cases', '').lower().split(' | '):
+        terms.extend(use_case.split())
+    return [t for t in terms if t != '/']
+
+
+@lru_cache(maxsize=None)
+def build_automaton() -> KeywordAutomaton:
     """
-    分析需求並計算各服務商的推薦分數
+    編譯所有規則為單一自動機
+
+    payload 格式:
+        ('keyword', key)    RECOMMENDATION_RULES 關鍵字
+        ('rule', index)     reasoning.csv 第 index 列
+        ('anti', index)     anti-patterns.csv 第 index 列
+    """
+    automaton = KeywordAutomaton()
+
+    for keyword in RECOMMENDATION_RULES:
+        automaton.add(keyword, ('keyword', keyword))
+
+    for index, rule in enumerate(load_reasoning_csv()):
+        for term in _rule_terms(rule):
+            automaton.add(term, ('rule', index))
+
+    for index, pattern in enumerate(load_anti_patterns()):
+        automaton.add(pattern.get('keyword', '').lower(), ('anti', index))
+
+    return automaton.build()
+
+
+def scan_query(query: str) -> Tuple[Dict[str, Tuple[int, List[str]]], Dict[str, List[str]]]:
+    """
+    單次掃描查詢，同時計算各服務商分數與反模式警告
 
     Returns:
-        {provider: (score, [reasons])}
+        ({provider: (score, [reasons])}, {provider: [warnings]})
     """
-    query_lower = query.lower()
+    hits = build_automaton().scan(query.lower())
     scores = {'ecpay': 0, 'newebpay': 0, 'payuni': 0}
     reasons = {'ecpay': [], 'newebpay': [], 'payuni': []}
+    warnings = {'ecpay': [], 'newebpay': [], 'payuni': []}
 
     # 基於關鍵字規則計分
     for keyword, recommendations in RECOMMENDATION_RULES.items():
-        if keyword in query_lower:
+        if ('keyword', keyword) in hits:
             for provider, weight, reason in recommendations:
                 scores[provider] += weight
                 reasons[provider].append(f'✓ {reason} (+{weight})')
 
-    # 從 CSV 載入額外規則
-    csv_rules = load_reasoning_csv()
-    for rule in csv_rules:
-        scenario = rule.get('scenario', '').lower()
-        if any(word in scenario for word in query_lower.split()):
-            provider = rule.get('recommended_provider', '').lower()
-            if provider in scores:
-                confidence = rule.get('confidence', 'MEDIUM')
-                weight_map = {'HIGH': 3, 'MEDIUM': 2, 'LOW': 1}
-                weight = weight_map.get(confidence, 1)
-                scores[provider] += weight
+    # reasoning.csv 規則，命中規則的 anti_patterns 作為該服務商的注意事項
+    weight_map = {'HIGH': 3, 'MEDIUM': 2, 'LOW': 1}
+    for index, rule in enumerate(load_reasoning_csv()):
+        if ('rule', index) not in hits:
+            continue
+
+        provider = rule.get('recommended_provider', '').lower()
+        if provider not in scores:
+            continue
+
+        weight = weight_map.get(rule.get('confidence', 'MEDIUM'), 1)
+        scores[provider] += weight
+
+        reason_text = rule.get('reason', '')
+        if reason_text:
+            reasons[provider].append(f'✓ {reason_text} (+{weight})')
 
-                reason_text = rule.get('reason', '')
-                if reason_text:
-                    reasons[provider].append(f'✓ {reason_text} (+{weight})')
+        caveat = rule.get('anti_patterns', '')
+        if caveat:
+            warning = f"⚠ {rule.get('scenario', '')}: {caveat}"
+            if warning not in warnings[provider]:
+                warnings[provider].append(warning)
 
-    return {p: (s, reasons[p]) for p, s in scores.items()}
+    # 反模式關鍵字
+    for index, pattern in enumerate(load_anti_patterns()):
+        provider = pattern.get('provider', '')
+        if ('anti', index) in hits and provider in warnings:
+            warnings[provider].append(f"⚠ {pattern.get('keyword', '')}: {pattern.get('warning', '')}")
+
+    return {p: (s, reasons[p]) for p, s in scores.items()}, warnings
+
+
+def analyze_requirements(query: str) -> Dict[str, Tuple[int, List[str]]]:
+    """
+    分析需求並計算各服務商的推薦分數
+
+    Returns:
+        {provider: (score, [reasons])}
+    """
+    return scan_query(query)[0]
 
 
-def get_anti_patterns(provider: str) -> List[str]:
-    """獲取反模式警告"""
-    return [f'⚠ {pattern}: {desc}' for pattern, desc in ANTI_PATTERNS.get(provider, [])]
+def get_anti_patterns(provider: str, query: str = '') -> List[str]:
+    """獲取反模式警告 (依查詢內容)"""
+    return scan_query(query)[1].get(provider, [])
 
 
-def format_recommendation_ascii(results: Dict[str, Tuple[int, List[str]]], query: str) -> str:
+def format_recommendation_ascii(results: Dict[str, Tuple[int, List[str]]], query: str,
+                                warnings: Optional[Dict[str, List[str]]] = None) -> str:
     """格式化輸出 (ASCII Box)"""
     # 排序
     sorted_results = sorted(results.items(), key=lambda x: x[1][0], reverse=True)
@@ -178,7 +229,7 @@ def format_recommendation_ascii(results: Dict[str, Tuple[int, List[str]]], query
             output.append('')
 
         # 反模式警告
-        anti = get_anti_patterns(provider)
+        anti = (warnings or {}).get(provider, [])
         if anti:
             output.append('   注意事項:')
             for warning in anti:
@@ -190,7 +241,8 @@ def format_recommendation_ascii(results: Dict[str, Tuple[int, List[str]]], query
     return '\n'.join(output)
 
 
-def format_recommendation_json(results: Dict[str, Tuple[int, List[str]]], query: str) -> str:
+def format_recommendation_json(results: Dict[str, Tuple[int, List[str]]], query: str,
+                               warnings: Optional[Dict[str, List[str]]] = None) -> str:
     """格式化輸出 (JSON)"""
     sorted_results = sorted(results.items(), key=lambda x: x[1][0], reverse=True)
 
@@ -215,14 +267,15 @@ def format_recommendation_json(results: Dict[str, Tuple[int, List[str]]], query:
             'display_name': provider_names.get(provider, provider),
             'score': score,
             'reasons': [r.replace('✓ ', '').split(' (+')[0] for r in reason_list],
-            'anti_patterns': [a.replace('⚠ ', '') for a in get_anti_patterns(provider)]
+            'anti_patterns': [a.replace('⚠ ', '') for a in (warnings or {}).get(provider, [])]
         }
         output_data['recommendations'].append(rec)
 
     return json.dumps(output_data, ensure_ascii=False, indent=2)
 
 
-def format_recommendation_simple(results: Dict[str, Tuple[int, List[str]]], query: str) -> str:
+def format_recommendation_simple(results: Dict[str, Tuple[int, List[str]]], query: str,
+                                 warnings: Optional[Dict[str, List[str]]] = None) -> str:
     """格式化輸出 (Simple Text)"""
     sorted_results = sorted(results.items(), key=lambda x: x[1][0], reverse=True)
 
@@ -244,7 +297,7 @@ def format_recommendation_simple(results: Dict[str, Tuple[int, List[str]]], quer
             for reason in reason_list:
                 output.append(f'  - {reason.replace("✓ ", "")}')
 
-        anti = get_anti_patterns(provider)
+        anti = (warnings or {}).get(provider, [])
         if anti:
             for warning in anti:
                 output.append(f'  ! {warning.replace("⚠ ", "")}')
@@ -261,16 +314,16 @@ def main():
 
     args = parser.parse_args()
 
-    # 分析需求
-    results = analyze_requirements(args.query)
+    # 分析需求 (單次掃描取得分數與警告)
+    results, warnings = scan_query(args.query)
 
     # 格式化輸出
     if args.format == 'json':
-        print(format_recommendation_json(results, args.query))
+        print(format_recommendation_json(results, args.query, warnings))
     elif args.format == 'simple':
-        print(format_recommendation_simple(results, args.query))
+        print(format_recommendation_simple(results, args.query, warnings))
     else:
-        print(format_recommendation_ascii(results, args.query))
+        print(format_recommendation_ascii(results, args.query, warnings))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Taiwan Payment Skill - 付款回呼對帳
+
+將金流回呼紀錄 (ECPay / NewebPay / PAYUNi) 與訂單帳本以訂單編號對帳，
+差異逐筆輸出為 JSONL。兩邊輸入皆以串流讀取，記憶體用量與資料量無關:
+
+1. 分割: 依訂單編號的雜湊值把兩邊紀錄寫入磁碟上的分割檔 (JSONL)
+2. 合併: 一次只把一個分割的訂單載入 dict，再串流比對同分割的回呼
+3. 分割檔超過 max_partition_bytes 時，取雜湊值的下一段位數再分割
+
+回呼欄位依 data/field-mappings.csv 正規化 (merchant_id / order_id / amount /
+trade_no / rtn_code / rtn_msg)，服務商未標示時依欄位名稱判斷。
+
+差異類型:
+    amount           付款成功但金額與訂單不符
+    status           回呼顯示付款成功但訂單未付款，或訂單已付款但只有失敗回呼
+    duplicate        同一訂單有多筆不同 TradeNo 的成功付款 (重複扣款)
+    missing_order    回呼找不到對應訂單
+    missing_callback 訂單已付款但沒有任何回呼
+    duplicate_order  訂單帳本中同一訂單編號出現多次 (以第一筆對帳)
+
+無法解析的 JSONL 行、非物件的紀錄與缺少訂單編號 / 金額的紀錄計為格式錯誤後繼續處理。
+
+回呼紀錄 (JSONL，每行一筆):
+    ECPay 的 POST 參數、NewebPay 解密後的 TradeInfo (含 Result)、
+    PAYUNi 解密後的 EncryptInfo；可另加 "provider" 欄位
+
+訂單帳本 (CSV 表頭 / JSONL key):
+    order_id    訂單編號 (必填)
+    amount      訂單金額 (必填)
+    status      訂單狀態 (paid / success / completed / 1 視為已付款)
+
+用法:
+    python reconcile.py callbacks.jsonl orders.csv -o mismatches.jsonl
+    python reconcile.py callbacks.jsonl orders.jsonl --partitions 256 --work-dir /tmp/recon
+"""
+
+import argparse
+import csv
+import json
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+
+PROVIDERS = ('ecpay', 'newebpay', 'payuni')
+
+# field-mappings.csv 以建立交易的欄位為主，回呼的欄位名稱不同時補在這裡
+CALLBACK_ALIASES = {
+    'ecpay': {'amount': ('TradeAmt',)},
+    'newebpay': {},
+    'payuni': {'trade_no': ('TradeNo',)},
+}
+
+PAID_ORDER_STATUSES = frozenset({'paid', 'success', 'completed', '1'})
+
+MISMATCH_TYPES = ('amount', 'status', 'duplicate', 'missing_order', 'missing_callback', 'duplicate_order')
+
+
+@lru_cache(maxsize=1)
+def load_field_mappings() -> Dict[str, Dict[str, Tuple[str, ...]]]:
+    """
+    讀取 field-mappings.csv
+
+    Returns:
+        {provider: {欄位: (候選欄位名稱, ...)}}
+    """
+    mappings: Dict[str, Dict[str, Tuple[str, ...]]] = {p: {} for p in PROVIDERS}
+    with open(DATA_DIR / 'field-mappings.csv', 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            for provider in PROVIDERS:
+                name = row.get(f'{provider}_name', '')
+                if name:
+                    mappings[provider][row['field_name']] = (name,)
+
+    for provider, aliases in CALLBACK_ALIASES.items():
+        for field_name, names in aliases.items():
+            mappings[provider][field_name] = names + mappings[provider].get(field_name, ())
+    return mappings
+
+
+def detect_provider(raw: Dict) -> str:
+    """
+    依欄位名稱判斷回呼的服務商
+
+    Raises:
+        ValueError: 無法判斷
+    """
+    provider = raw.get('provider')
+    if provider:
+        return provider
+    if 'Result' in raw:
+        return 'newebpay'
+
+    mappings = load_field_mappings()
+    for provider in PROVIDERS:
+        if mappings[provider]['order_id'][0] in raw:
+            return provider
+    raise ValueError('無法判斷回呼的服務商')
+
+
+def _is_paid(provider: str, raw: Dict) -> bool:
+    """回呼是否代表付款成功"""
+    if provider == 'ecpay':
+        return str(raw.get('RtnCode', '')) == '1'
+    if str(raw.get('Status', '')).upper() != 'SUCCESS':
+        return False
+    # PAYUNi: TradeStatus 1 = 已付款
+    return provider != 'payuni' or str(raw.get('TradeStatus', '1')) == '1'
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_callback(raw: Dict, provider: Optional[str] = None) -> Dict:
+    """
+    將回呼正規化為共用欄位
+
+    Args:
+        raw: 回呼參數
+        provider: 服務商 (未指定時自動判斷)
+
+    Returns:
+        {'provider', 'merchant_id', 'order_id', 'amount', 'trade_no', 'rtn_code', 'rtn_msg', 'paid'}
+    """
+    provider = provider or detect_provider(raw)
+    fields = raw
+    if provider == 'newebpay':
+        result = raw.get('Result')
+        if isinstance(result, str):
+            try:
+                result = json.loads(result)
+            except ValueError:
+                result = None
+        if isinstance(result, dict):
+            fields = {**raw, **result}
+
+    mapping = load_field_mappings()[provider]
+
+    def pick(name: str):
+        for key in mapping.get(name, ()):
+            if key in fields:
+                return fields[key]
+        return None
+
+    return {
+        'provider': provider,
+        'merchant_id': str(pick('merchant_id') or ''),
+        'order_id': str(pick('order_id') or '').strip(),
+        'amount': _to_int(pick('amount')),
+        'trade_no': str(pick('trade_no') or ''),
+        'rtn_code': str(pick('rtn_code') or ''),
+        'rtn_msg': str(pick('rtn_msg') or ''),
+        'paid': _is_paid(provider, fields),
+    }
+
+
+def normalize_order(raw: Dict) -> Dict:
+    """將訂單正規化為 {'order_id', 'amount', 'paid'}"""
+    return {
+        'order_id': str(raw.get('order_id') or '').strip(),
+        'amount': _to_int(raw.get('amount')),
+        'paid': str(raw.get('status', '')).strip().lower() in PAID_ORDER_STATUSES,
+    }
+
+
+def read_records(path: Path, on_error: Optional[Callable[[int, str], None]] = None) -> Iterator[Dict]:
+    """
+    串流讀取紀錄 (依副檔名判斷 CSV 或 JSONL)
+
+    Args:
+        path: 檔案路徑
+        on_error: JSONL 某行無法解析時呼叫 on_error(行號, 錯誤訊息) 並略過該行；
+                  未指定時丟出 ValueError
+
+    Yields:
+        紀錄 dict (JSONL 的非物件紀錄原樣傳回，由 PaymentReconciler.run 計為格式錯誤)
+
+    Raises:
+        ValueError: JSONL 格式錯誤 (未指定 on_error)
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.suffix.lower() in ('.jsonl', '.ndjson'):
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    error = f'第 {line_no} 行 JSON 格式錯誤: {e}'
+                    if on_error is None:
+                        raise ValueError(error)
+                    on_error(line_no, error)
+                    continue
+                yield record
+        else:
+            yield from csv.DictReader(f)
+
+
+# ============================================================================
+# 分割與合併
+# ============================================================================
+
+def _partition_of(order_id: str, partitions: int, depth: int) -> int:
+    """
+    第 depth 層的分割編號
+
+    CRC32 是線性的，換 seed 重算會讓同一分割的紀錄落在同一個子分割，
+    因此每一層改取雜湊值的下一段位數。
+    """
+    return (zlib.crc32(order_id.encode('utf-8')) // partitions ** depth) % partitions
+
+
+def _spill(records: Iterable[Dict], directory: Path, prefix: str, partitions: int, depth: int) -> List[Path]:
+    """依訂單編號雜湊寫入分割檔，回傳各分割檔路徑"""
+    paths = [directory / f'{prefix}-{i:04d}.jsonl' for i in range(partitions)]
+    files: List[IO] = [open(p, 'w', encoding='utf-8') for p in paths]
+    try:
+        dumps = json.dumps
+        for record in records:
+            files[_partition_of(record['order_id'], partitions, depth)].write(
+                dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+    finally:
+        for f in files:
+            f.close()
+    return paths
+
+
+def _read_spilled(path: Path) -> Iterator[Dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+@dataclass
+class ReconcileResult:
+    """對帳結果統計"""
+    orders: int = 0
+    callbacks: int = 0
+    matched: int = 0
+    invalid: int = 0
+    repartitioned: int = 0
+    elapsed: float = 0.0
+    mismatches: Counter = field(default_factory=Counter)
+
+
+class PaymentReconciler:
+    """
+    以分割合併 (hash partition join) 串流對帳
+
+    記憶體上限約為單一分割的訂單數；分割檔大於 max_partition_bytes 時
+    再分割 (最多 max_depth 層)。
+    """
+
+    def __init__(self, partitions: int = 64, max_partition_bytes: int = 64 * 1024 * 1024,
+                 max_depth: int = 3, work_dir: Optional[Path] = None):
+        """
+        Args:
+            partitions: 分割數
+            max_partition_bytes: 單一分割 (訂單 + 回呼) 的大小上限
+            max_depth: 再分割的最大層數
+            work_dir: 分割檔目錄 (預設為系統暫存目錄)
+        """
+        self.partitions = partitions
+        self.max_partition_bytes = max_partition_bytes
+        self.max_depth = max_depth
+        self.work_dir = work_dir
+
+    def run(self, callbacks: Iterable[Dict], orders: Iterable[Dict], output: IO,
+            provider: Optional[str] = None) -> ReconcileResult:
+        """
+        執行對帳
+
+        Args:
+            callbacks: 回呼紀錄 (原始欄位)
+            orders: 訂單紀錄
+            output: 差異輸出 (文字檔，JSONL)
+            provider: 回呼的服務商 (未指定時逐筆判斷)
+
+        Returns:
+            ReconcileResult
+        """
+        result = ReconcileResult()
+        started = time.monotonic()
+
+        def clean_callbacks() -> Iterator[Dict]:
+            for raw in callbacks:
+                try:
+                    record = normalize_callback(raw, provider) if isinstance(raw, dict) else None
+                except (TypeError, ValueError):
+                    record = None
+                result.callbacks += 1
+                if record is None or not record['order_id']:
+                    result.invalid += 1
+                    continue
+                yield record
+
+        def clean_orders() -> Iterator[Dict]:
+            for raw in orders:
+                record = normalize_order(raw) if isinstance(raw, dict) else None
+                result.orders += 1
+                if record is None or not record['order_id'] or record['amount'] is None:
+                    result.invalid += 1
+                    continue
+                yield record
+
+        if self.work_dir is not None:
+            self.work_dir.mkdir(parents=True, exist_ok=True)
+        directory = Path(tempfile.mkdtemp(prefix='reconcile-', dir=self.work_dir))
+        try:
+            order_parts = _spill(clean_orders(), directory, 'orders', self.partitions, 0)
+            callback_parts = _spill(clean_callbacks(), directory, 'callbacks', self.partitions, 0)
+            for order_path, callback_path in zip(order_parts, callback_parts):
+                self._join(order_path, callback_path, output, result, depth=0)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        result.elapsed = time.monotonic() - started
+        return result
+
+    def _join(self, order_path: Path, callback_path: Path, output: IO,
+              result: ReconcileResult, depth: int):
+        """合併一個分割 (必要時再分割)"""
+        size = order_path.stat().st_size + callback_path.stat().st_size
+        if size > self.max_partition_bytes and depth < self.max_depth:
+            result.repartitioned += 1
+            directory = order_path.parent
+            prefix = f'{order_path.stem}-{depth + 1}'
+            sub_orders = _spill(_read_spilled(order_path), directory, f'{prefix}o', self.partitions, depth + 1)
+            sub_callbacks = _spill(_read_spilled(callback_path), directory, f'{prefix}c', self.partitions, depth + 1)
+            order_path.unlink()
+            callback_path.unlink()
+            for sub_order, sub_callback in zip(sub_orders, sub_callbacks):
+                self._join(sub_order, sub_callback, output, result, depth + 1)
+            return
+
+        ledger: Dict[str, Dict] = {}
+        emit = self._emit
+        for order in _read_spilled(order_path):
+            first = ledger.setdefault(order['order_id'], order)
+            if first is not order:
+                emit(output, result, 'duplicate_order', None, order, first_order_amount=first['amount'])
+
+        # order_id -> [成功的 TradeNo 集合, 是否有回呼, 首筆成功回呼]
+        seen: Dict[str, list] = {}
+
+        for callback in _read_spilled(callback_path):
+            order_id = callback['order_id']
+            order = ledger.get(order_id)
+            if order is None:
+                emit(output, result, 'missing_order', callback)
+                continue
+
+            state = seen.get(order_id)
+            if state is None:
+                state = seen[order_id] = [set(), callback]
+            if not callback['paid']:
+                continue
+
+            trade_nos = state[0]
+            if callback['trade_no'] in trade_nos:
+                continue  # 同一筆交易的重送通知
+            trade_nos.add(callback['trade_no'])
+            state[1] = callback
+
+            if len(trade_nos) > 1:
+                emit(output, result, 'duplicate', callback, order, paid_count=len(trade_nos))
+            elif callback['amount'] != order['amount']:
+                emit(output, result, 'amount', callback, order)
+            elif not order['paid']:
+                emit(output, result, 'status', callback, order)
+            else:
+                result.matched += 1
+
+        for order_id, order in ledger.items():
+            state = seen.get(order_id)
+            if state is None:
+                if order['paid']:
+                    emit(output, result, 'missing_callback', None, order)
+            elif not state[0] and order['paid']:
+                emit(output, result, 'status', state[1], order)
+
+        order_path.unlink()
+        callback_path.unlink()
+
+    @staticmethod
+    def _emit(output: IO, result: ReconcileResult, kind: str, callback: Optional[Dict],
+              order: Optional[Dict] = None, **extra):
+        result.mismatches[kind] += 1
+        record = {
+            'type': kind,
+            'order_id': (callback or order)['order_id'],
+        }
+        if callback is not None:
+            record.update({
+                'provider': callback['provider'],
+                'merchant_id': callback['merchant_id'],
+                'trade_no': callback['trade_no'],
+                'callback_amount': callback['amount'],
+                'callback_paid': callback['paid'],
+                'rtn_code': callback['rtn_code'],
+            })
+        if order is not None:
+            record.update({'order_amount': order['amount'], 'order_paid': order['paid']})
+        record.update(extra)
+        output.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def format_result(result: ReconcileResult) -> str:
+    """格式化對帳結果"""
+    lines = [
+        '=' * 60,
+        '付款回呼對帳結果',
+        '=' * 60,
+        f'   訂單:     {result.orders}',
+        f'   回呼:     {result.callbacks}',
+        f'   相符:     {result.matched}',
+        f'   格式錯誤: {result.invalid}',
+    ]
+    for kind in MISMATCH_TYPES:
+        lines.append(f'   {kind:<17} {result.mismatches.get(kind, 0)}')
+    if result.repartitioned:
+        lines.append(f'   再分割:   {result.repartitioned}')
+    lines.append(f'   耗時:     {result.elapsed:.2f} 秒')
+    lines.append('=' * 60)
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='付款回呼與訂單對帳')
+    parser.add_argument('callbacks', type=Path, help='回呼紀錄 (JSONL / CSV)')
+    parser.add_argument('orders', type=Path, help='訂單帳本 (CSV / JSONL)')
+    parser.add_argument('-o', '--output', type=Path, help='差異輸出 JSONL (預設: stdout)')
+    parser.add_argument('--provider', choices=PROVIDERS, help='回呼服務商 (預設: 自動判斷)')
+    parser.add_argument('--partitions', type=int, default=64, help='分割數 (預設: 64)')
+    parser.add_argument('--max-partition-mb', type=float, default=64, help='單一分割上限 MB (預設: 64)')
+    parser.add_argument('--work-dir', type=Path, help='分割檔目錄 (預設: 系統暫存目錄)')
+    args = parser.parse_args()
+
+    skipped = Counter()
+
+    def records(path: Path, kind: str) -> Iterator[Dict]:
+        def skip(line_no: int, error: str):
+            skipped[kind] += 1
+            print(f'{path}: {error}', file=sys.stderr)
+        return read_records(path, on_error=skip)
+
+    reconciler = PaymentReconciler(
+        partitions=args.partitions,
+        max_partition_bytes=int(args.max_partition_mb * 1024 * 1024),
+        work_dir=args.work_dir,
+    )
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            result = reconciler.run(records(args.callbacks, 'callbacks'), records(args.orders, 'orders'), output,
+                                    args.provider)
+    else:
+        result = reconciler.run(records(args.callbacks, 'callbacks'), records(args.orders, 'orders'), sys.stdout,
+                                args.provider)
+    # 無法解析的行也計入筆數與格式錯誤
+    result.callbacks += skipped['callbacks']
+    result.orders += skipped['orders']
+    result.invalid += sum(skipped.values())
+
+    print(format_result(result), file=sys.stderr)
+    return 1 if sum(result.mismatches.values()) or result.invalid else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+服務商本機沙箱的共用部分 (HTTP 伺服器、延遲、錯誤注入與限流)
+
+sandbox_server.py 以 ProviderSandbox 為基底實作各服務商的端點；延遲分佈、限流、
+錯誤注入與 HTTP 處理與服務商無關，集中在此。
+
+taiwan-invoice / taiwan-payment / taiwan-logistics 各自保留一份相同的檔案
+(每個技能需可獨立安裝)，修改時請同步更新三份；test[-_]sandbox[-_]server 會檢查三份內容一致。
+
+使用範例:
+    from sandbox_core import LatencyModel, ProviderSandbox, Response, Route, SandboxPolicy
+
+    class MySandbox(ProviderSandbox):
+        def __init__(self, policy=None):
+            super().__init__(policy)
+            self.routes['/api/query'] = Route('demo', self.query, 'MerchantID')
+
+        def error_codes(self):
+            return {'demo': (('E01', '模擬錯誤'),)}
+
+        def error_response(self, provider, code, message):
+            return Response.json({'code': code, 'message': message})
+
+        def query(self, fields):
+            return Response.json({'code': '0000'})
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import urllib.parse
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+
+# ============================================================================
+# 延遲、錯誤注入與限流
+# ============================================================================
+
+class LatencyModel:
+    """
+    回應延遲分佈 (參數單位為毫秒)
+
+    規格字串:
+        fixed:20            固定 20 ms
+        uniform:10,50       10 ~ 50 ms 均勻分佈
+        normal:30,5         平均 30 ms、標準差 5 ms (負值取 0)
+        lognormal:20,0.5    中位數 20 ms、sigma 0.5 (長尾)
+        exponential:25      平均 25 ms
+    """
+
+    DISTRIBUTIONS = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exponential': 1}
+
+    def __init__(self, distribution: str = 'fixed', params: Sequence[float] = (0.0,)):
+        """
+        Raises:
+            ValueError: 不支援的分佈或參數數量錯誤
+        """
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f'不支援的延遲分佈: {distribution}')
+        if len(params) != self.DISTRIBUTIONS[distribution]:
+            raise ValueError(f'{distribution} 需要 {self.DISTRIBUTIONS[distribution]} 個參數')
+        if any(p < 0 for p in params):
+            raise ValueError('延遲參數不可為負數')
+
+        self.distribution = distribution
+        self.params = tuple(float(p) for p in params)
+
+    @classmethod
+    def parse(cls, spec: str) -> 'LatencyModel':
+        """由規格字串建立 (例如 'lognormal:20,0.5'；純數字視為 fixed)"""
+        name, _, args = spec.partition(':')
+        if not args:
+            name, args = 'fixed', name
+        return cls(name.strip().lower(), [float(a) for a in args.split(',')])
+
+    def sample(self, rng: random.Random) -> float:
+        """抽樣一次延遲 (秒)"""
+        kind, p = self.distribution, self.params
+        if kind == 'fixed':
+            ms = p[0]
+        elif kind == 'uniform':
+            ms = rng.uniform(p[0], p[1])
+        elif kind == 'normal':
+            ms = rng.gauss(p[0], p[1])
+        elif kind == 'lognormal':
+            ms = rng.lognormvariate(math.log(p[0]), p[1]) if p[0] else 0.0
+        else:
+            ms = rng.expovariate(1 / p[0]) if p[0] else 0.0
+        return max(ms, 0.0) / 1000
+
+    def __repr__(self) -> str:
+        return f"LatencyModel('{self.distribution}:{','.join(f'{p:g}' for p in self.params)}')"
+
+
+class TokenBucket:
+    """每秒 rate 個 token、最多累積 burst 個"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def acquire(self) -> float:
+        """
+        取得一個 token
+
+        Returns:
+            0 表示成功，否則為需等待的秒數
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+@dataclass
+class SandboxPolicy:
+    """沙箱行為設定"""
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    error_rate: float = 0.0          # 回應服務商錯誤碼的比例
+    error_codes: Optional[Dict[str, Sequence[str]]] = None  # 限定注入的錯誤碼 (預設為 error_codes() 全部)
+    http_error_rate: float = 0.0     # 回應 HTTP 503 的比例
+    drop_rate: float = 0.0           # 不回應直接關閉連線的比例
+    rate_limit: float = 0.0          # 每個商店每秒請求上限 (0 = 不限)
+    burst: int = 10                  # 限流的瞬間容量
+    seed: Optional[int] = None       # 亂數種子 (固定後延遲與錯誤注入可重現)
+
+
+@dataclass
+class SandboxStats:
+    """沙箱統計"""
+    connections: int = 0
+    requests: int = 0
+    rate_limited: int = 0
+    http_errors: int = 0
+    dropped: int = 0
+    routes: Counter = field(default_factory=Counter)
+    injected: Counter = field(default_factory=Counter)  # (provider, code) → 次數
+
+
+@dataclass
+class Response:
+    """HTTP 回應"""
+    body: bytes = b''
+    status: str = '200 OK'
+    content_type: str = 'application/json; charset=utf-8'
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def json(cls, data: Dict) -> 'Response':
+        return cls(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    @classmethod
+    def text(cls, text: str, content_type: str = 'text/html; charset=utf-8') -> 'Response':
+        return cls(text.encode('utf-8'), content_type=content_type)
+
+
+@dataclass
+class Route:
+    """端點設定"""
+    provider: str
+    handler: Callable[[Dict[str, Any]], Response]
+    merchant_field: str  # 限流依據的商店代號欄位
+
+
+# ============================================================================
+# HTTP 伺服器
+# ============================================================================
+
+class ProviderSandbox(ABC):
+    """
+    服務商沙箱基底類別
+
+    子類別以 self.routes 註冊端點，並實作 error_codes() 提供可注入的錯誤碼、
+    error_response() 以各服務商的格式回應錯誤碼。
+    """
+
+    def __init__(self, policy: Optional[SandboxPolicy] = None, host: str = '127.0.0.1', port: int = 0):
+        """
+        Args:
+            policy: 延遲、錯誤注入與限流設定
+            host: 監聽位址
+            port: 監聽埠 (0 = 自動選擇)
+        """
+        self.policy = policy or SandboxPolicy()
+        self.host = host
+        self.port = port
+        self.routes: Dict[str, Route] = {}
+        self.stats = SandboxStats()
+
+        self._rng = random.Random(self.policy.seed)
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: set = set()
+
+    @property
+    def url(self) -> str:
+        """伺服器 base URL"""
+        return f'http://{self.host}:{self.port}'
+
+    async def start(self):
+        """啟動伺服器"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """停止伺服器並關閉所有連線"""
+        if self._server is not None:
+            self._server.close()
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def reset_stats(self):
+        """重設統計"""
+        self.stats = SandboxStats()
+
+    @abstractmethod
+    def error_codes(self) -> Dict[str, Tuple[Tuple[str, str], ...]]:
+        """可注入的錯誤碼: provider → ((code, message), ...)"""
+
+    @abstractmethod
+    def error_response(self, provider: str, code: str, message: str) -> Response:
+        """以服務商格式回應錯誤碼"""
+
+    def parse_fields(self, query: str, body: bytes) -> Dict[str, Any]:
+        """請求參數 (query string 與表單 body)；JSON 等其他格式由子類別覆寫"""
+        fields: Dict[str, Any] = dict(urllib.parse.parse_qsl(query, keep_blank_values=True))
+        if body:
+            fields.update(urllib.parse.parse_qsl(body.decode('utf-8', 'replace'), keep_blank_values=True))
+        return fields
+
+    def _pick_error(self, provider: str) -> Tuple[str, str]:
+        """依 policy.error_codes 或 error_codes() 隨機選一個錯誤碼"""
+        codes = self.error_codes().get(provider, ())
+        allowed = (self.policy.error_codes or {}).get(provider)
+        if allowed:
+            messages = dict(codes)
+            codes = tuple((code, messages.get(code, '模擬錯誤')) for code in allowed)
+        return self._rng.choice(codes) if codes else ('ERROR', '模擬錯誤')
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        """讀取一個 HTTP 請求，連線關閉時回傳 None"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0))
+        body = await reader.readexactly(length) if length else b''
+        return method, target, headers, body
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """處理一條連線上的所有請求 (keep-alive)"""
+        task = asyncio.current_task()
+        self._connections.add(task)
+        self.stats.connections += 1
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+
+                method, target, headers, body = request
+                response = await self._respond(method, target, body)
+                if response is None:
+                    break
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                head = [f'HTTP/1.1 {response.status}',
+                        f'Content-Type: {response.content_type}',
+                        f'Content-Length: {len(response.body)}',
+                        f'Connection: {"keep-alive" if keep_alive else "close"}']
+                head.extend(f'{name}: {value}' for name, value in response.headers.items())
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + response.body)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _respond(self, method: str, target: str, body: bytes) -> Optional[Response]:
+        """套用限流、延遲與錯誤注入後交給端點處理；回傳 None 表示直接斷線"""
+        path, _, query = target.partition('?')
+        route = self.routes.get(path)
+        if route is None or method not in ('GET', 'POST'):
+            return Response(b'Not Found', '404 Not Found', 'text/plain')
+
+        self.stats.requests += 1
+        self.stats.routes[path] += 1
+        fields = self.parse_fields(query, body)
+
+        policy = self.policy
+        if policy.rate_limit:
+            key = (route.provider, fields.get(route.merchant_field, ''))
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(policy.rate_limit, policy.burst)
+            wait = bucket.acquire()
+            if wait:
+                self.stats.rate_limited += 1
+                return Response(b'Too Many Requests', '429 Too Many Requests', 'text/plain',
+                                {'Retry-After': str(max(1, math.ceil(wait)))})
+
+        delay = policy.latency.sample(self._rng)
+        if delay:
+            await asyncio.sleep(delay)
+
+        roll = self._rng.random()
+        if roll < policy.drop_rate:
+            self.stats.dropped += 1
+            return None
+        roll -= policy.drop_rate
+        if roll < policy.http_error_rate:
+            self.stats.http_errors += 1
+            return Response(b'Service Unavailable', '503 Service Unavailable', 'text/plain')
+        roll -= policy.http_error_rate
+        if roll < policy.error_rate:
+            code, message = self._pick_error(route.provider)
+            self.stats.injected[(route.provider, code)] += 1
+            return self.error_response(route.provider, code, message)
+
+        return route.handler(fields)
+
+
+class SandboxThread:
+    """
+    在背景執行緒的事件迴圈中執行沙箱，供 requests 等同步 client 使用
+
+    使用範例:
+        with SandboxThread(sandbox) as running:
+            requests.post(running.url + '/api/query', data=...)
+    """
+
+    def __init__(self, sandbox: ProviderSandbox):
+        self.sandbox = sandbox
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> ProviderSandbox:
+        ready = threading.Event()
+        errors = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._loop.run_until_complete(self.sandbox.start())
+            except Exception as e:
+                errors.append(e)
+                ready.set()
+                return
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.sandbox.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='sandbox', daemon=True)
+        self._thread.start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+        return self.sandbox
+
+    def __exit__(self, exc_type, exc, tb):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def build_policy(args) -> SandboxPolicy:
+    """由命令列參數建立 SandboxPolicy"""
+    return SandboxPolicy(
+        latency=LatencyModel.parse(args.latency),
+        error_rate=args.error_rate,
+        http_error_rate=args.http_error_rate,
+        drop_rate=args.drop_rate,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+        seed=args.seed,
+    )
+
+
+def add_policy_arguments(parser: argparse.ArgumentParser):
+    """加入 SandboxPolicy 相關的命令列參數"""
+    parser.add_argument('--latency', default='fixed:0', help='延遲分佈 (例如 lognormal:20,0.5，單位 ms)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='注入服務商錯誤碼的比例')
+    parser.add_argument('--http-error-rate', type=float, default=0.0, help='回應 HTTP 503 的比例')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='直接斷線的比例')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='每個商店每秒請求上限 (0 = 不限)')
+    parser.add_argument('--burst', type=int, default=10, help='限流瞬間容量 (預設: 10)')
+    parser.add_argument('--seed', type=int, help='亂數種子')
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Taiwan Payment Skill - 金流服務商本機沙箱 (壓力測試用)
+
+ECPay / NewebPay / PAYUNi 的測試環境不能拿來做壓力測試。此沙箱以 asyncio 實作
+最小 HTTP/1.1 伺服器 (keep-alive)，依 references/*.md 與 data/operations.csv
+模擬各服務商端點的加密、簽章與回應格式，並可設定:
+
+- 回應延遲分佈 (fixed / uniform / normal / lognormal / exponential)
+- 依比例注入服務商錯誤碼 (取自 data/error-codes.csv)、HTTP 503 或直接斷線
+- 每個商店的請求速率上限 (token bucket，超過時回應 429 + Retry-After)
+
+模擬的端點:
+    ECPay     /Cashier/AioCheckOut/V5      CheckMacValue 驗證，建立訂單 (視為已付款)
+              /Cashier/QueryTradeInfo/V5   回應 URL 編碼字串 + CheckMacValue
+    NewebPay  /MPG/mpg_gateway             TradeSha 驗證、TradeInfo 解密，建立訂單
+              /API/QueryTradeInfo          CheckValue 驗證，回應 JSON + CheckCode
+    PAYUNi    /api/upp                     HashInfo 驗證、EncryptInfo 解密，回應加密結果
+              /api/trade_query             同上
+
+使用範例:
+    python sandbox_server.py --port 8090 --latency lognormal:30,0.5 --error-rate 0.02 --rate-limit 50
+
+    # 程式內使用
+    async with PaymentSandbox(SandboxPolicy(latency=LatencyModel.parse('normal:20,5'))) as sandbox:
+        service.query_url = sandbox.url + '/Cashier/QueryTradeInfo/V5'
+        ...
+        print(sandbox.stats)
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import hmac
+import json
+import urllib.parse
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from ecpay_checkmac import CheckMacValue
+from example_loader import load_example
+from payuni_crypto import get_cipher as get_payuni_cipher
+from sandbox_core import (
+    LatencyModel, ProviderSandbox, Response, Route, SandboxPolicy, SandboxThread, add_policy_arguments, build_policy,
+)
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+
+newebpay = load_example('newebpay-payment-example')
+NewebPayMPGService = newebpay.NewebPayMPGService
+
+# 沙箱預設接受的商店 (provider → {商店代號: (HashKey, HashIV)})
+DEFAULT_MERCHANTS: Dict[str, Dict[str, Tuple[str, str]]] = {
+    'ecpay': {'3002607': ('pwFHCqoQZGmho4w6', 'EkRm7iFT261dpevs')},
+    'newebpay': {'MS12345678': ('Fs5cX1TGqYM2PpdbE14a9H83YQSQF5jn', 'C6AcmfqJILwgnhIP')},
+    'payuni': {'U12345678': ('12345678901234567890123456789012', '1234567890123456')},
+}
+
+
+# ============================================================================
+# 錯誤碼
+# ============================================================================
+
+@lru_cache(maxsize=None)
+def load_error_codes() -> Dict[str, Tuple[Tuple[str, str], ...]]:
+    """
+    讀取 data/error-codes.csv 中非成功的錯誤碼
+
+    Returns:
+        provider → ((code, message_zh), ...)
+    """
+    codes: Dict[str, list] = {}
+    with open(DATA_DIR / 'error-codes.csv', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row['category'] != 'success':
+                codes.setdefault(row['provider'], []).append((row['code'], row['message_zh']))
+    return {provider: tuple(items) for provider, items in codes.items()}
+
+
+# ============================================================================
+# 金流服務商
+# ============================================================================
+
+class PaymentSandbox(ProviderSandbox):
+    """ECPay / NewebPay / PAYUNi 金流沙箱"""
+
+    def __init__(self, policy: Optional[SandboxPolicy] = None, host: str = '127.0.0.1', port: int = 0,
+                 merchants: Optional[Dict[str, Dict[str, Tuple[str, str]]]] = None):
+        """
+        Args:
+            policy: 延遲、錯誤注入與限流設定
+            host: 監聽位址
+            port: 監聽埠 (0 = 自動選擇)
+            merchants: 接受的商店 provider → {商店代號: (HashKey, HashIV)} (預設 DEFAULT_MERCHANTS)
+        """
+        super().__init__(policy, host, port)
+        self.merchants = merchants or DEFAULT_MERCHANTS
+        self.orders: Dict[Tuple[str, str, str], Dict] = {}  # (provider, 商店代號, 訂單編號) → 訂單
+        self.trade_seq = 0
+
+        self._ecpay = {mid: CheckMacValue(*keys) for mid, keys in self.merchants.get('ecpay', {}).items()}
+        self._newebpay = {mid: NewebPayMPGService(mid, *keys) for mid, keys in self.merchants.get('newebpay', {}).items()}
+        self._payuni = {mid: get_payuni_cipher(*keys) for mid, keys in self.merchants.get('payuni', {}).items()}
+
+        self.routes.update({
+            '/Cashier/AioCheckOut/V5': Route('ecpay', self.ecpay_checkout, 'MerchantID'),
+            '/Cashier/QueryTradeInfo/V5': Route('ecpay', self.ecpay_query, 'MerchantID'),
+            '/MPG/mpg_gateway': Route('newebpay', self.newebpay_gateway, 'MerchantID'),
+            '/API/QueryTradeInfo': Route('newebpay', self.newebpay_query, 'MerchantID'),
+            '/api/upp': Route('payuni', self.payuni_upp, 'MerID'),
+            '/api/trade_query': Route('payuni', self.payuni_query, 'MerID'),
+        })
+
+    def _next_trade_no(self, prefix: str) -> str:
+        self.trade_seq += 1
+        return f'{prefix}{datetime.now():%y%m%d}{self.trade_seq:010d}'
+
+    def error_codes(self) -> Dict[str, Tuple[Tuple[str, str], ...]]:
+        return load_error_codes()
+
+    def error_response(self, provider: str, code: str, message: str) -> Response:
+        if provider == 'ecpay':
+            return Response.text(urllib.parse.urlencode({'RtnCode': code, 'RtnMsg': message}))
+        if provider == 'newebpay':
+            return Response.json({'Status': code, 'Message': message, 'Result': []})
+        return Response.json({'Status': 'ERROR', 'Message': message, 'ErrCode': code})
+
+    # ------------------------------------------------------------------
+    # ECPay
+    # ------------------------------------------------------------------
+
+    def _ecpay_verify(self, fields: Dict[str, str]) -> Optional[Response]:
+        checker = self._ecpay.get(fields.get('MerchantID', ''))
+        if checker is None:
+            return self.error_response('ecpay', '10100002', '商店代號不存在')
+        if not checker.verify(fields):
+            return self.error_response('ecpay', '10100058', 'CheckMacValue 錯誤')
+        return None
+
+    def ecpay_checkout(self, fields: Dict[str, str]) -> Response:
+        """AioCheckOut: 建立訂單 (沙箱中直接視為已付款)，回應付款頁"""
+        error = self._ecpay_verify(fields)
+        if error is not None:
+            return error
+        if not fields.get('TotalAmount', '').isdigit() or int(fields['TotalAmount']) <= 0:
+            return self.error_response('ecpay', '10100050', '交易金額錯誤')
+
+        key = ('ecpay', fields['MerchantID'], fields.get('MerchantTradeNo', ''))
+        if key in self.orders:
+            return self.error_response('ecpay', '10100003', '訂單編號重複')
+        self.orders[key] = {
+            'TradeNo': self._next_trade_no('EC'),
+            'TradeAmt': fields['TotalAmount'],
+            'ItemName': fields.get('ItemName', ''),
+            'PaymentType': 'Credit_CreditCard',
+            'TradeDate': fields.get('MerchantTradeDate', f'{datetime.now():%Y/%m/%d %H:%M:%S}'),
+            'PaymentDate': f'{datetime.now():%Y/%m/%d %H:%M:%S}',
+        }
+        return Response.text(f'<html><body>ECPay Sandbox {fields["MerchantTradeNo"]}</body></html>')
+
+    def ecpay_query(self, fields: Dict[str, str]) -> Response:
+        """QueryTradeInfo: URL 編碼回應 + CheckMacValue；查無訂單時 TradeStatus=0"""
+        error = self._ecpay_verify(fields)
+        if error is not None:
+            return error
+
+        merchant_id = fields['MerchantID']
+        order_no = fields.get('MerchantTradeNo', '')
+        order = self.orders.get(('ecpay', merchant_id, order_no))
+        result = {
+            'MerchantID': merchant_id,
+            'MerchantTradeNo': order_no,
+            'StoreID': '',
+            'TradeNo': order['TradeNo'] if order else '',
+            'TradeAmt': order['TradeAmt'] if order else '0',
+            'PaymentDate': order['PaymentDate'] if order else '',
+            'PaymentType': order['PaymentType'] if order else '',
+            'HandlingCharge': '0',
+            'PaymentTypeChargeFee': '0',
+            'TradeDate': order['TradeDate'] if order else '',
+            'TradeStatus': '1' if order else '0',
+            'ItemName': order['ItemName'] if order else '',
+        }
+        result['CheckMacValue'] = self._ecpay[merchant_id].compute(result)
+        return Response.text(urllib.parse.urlencode(result))
+
+    # ------------------------------------------------------------------
+    # NewebPay
+    # ------------------------------------------------------------------
+
+    def newebpay_gateway(self, fields: Dict[str, str]) -> Response:
+        """MPG: 驗證 TradeSha、解密 TradeInfo 後建立訂單 (視為已付款)"""
+        service = self._newebpay.get(fields.get('MerchantID', ''))
+        if service is None:
+            return self.error_response('newebpay', 'MID-001', '商店代號錯誤')
+        trade_info = fields.get('TradeInfo', '')
+        if not service.verify_trade_sha(trade_info, fields.get('TradeSha', '')):
+            return self.error_response('newebpay', 'TRA10014', 'TradeSha 驗證失敗')
+        try:
+            data = service.decrypt_trade_info(trade_info)
+        except ValueError:
+            return self.error_response('newebpay', 'AES-002', '解密失敗')
+
+        key = ('newebpay', service.merchant_id, data.get('MerchantOrderNo', ''))
+        if key in self.orders:
+            return self.error_response('newebpay', 'ORDER-001', '訂單編號重複')
+        self.orders[key] = {
+            'TradeNo': self._next_trade_no(''),
+            'Amt': int(data.get('Amt', 0)),
+            'PaymentType': 'CREDIT',
+            'CreateTime': f'{datetime.now():%Y-%m-%d %H:%M:%S}',
+            'PayTime': f'{datetime.now():%Y-%m-%d %H:%M:%S}',
+        }
+        return Response.text(f'<html><body>NewebPay Sandbox {key[2]}</body></html>')
+
+    def newebpay_query(self, fields: Dict[str, str]) -> Response:
+        """QueryTradeInfo: 驗證 CheckValue，回應 JSON + CheckCode"""
+        service = self._newebpay.get(fields.get('MerchantID', ''))
+        if service is None:
+            return self.error_response('newebpay', 'MID-001', '商店代號錯誤')
+
+        hash_key, hash_iv = service.hash_key.decode('utf-8'), service.hash_iv.decode('utf-8')
+        check_value = hashlib.sha256(
+            f"IV={hash_iv}&Amt={fields.get('Amt', '')}&MerchantID={service.merchant_id}"
+            f"&MerchantOrderNo={fields.get('MerchantOrderNo', '')}&Key={hash_key}".encode('utf-8')
+        ).hexdigest().upper()
+        if not hmac.compare_digest(check_value, fields.get('CheckValue', '').upper()):
+            return self.error_response('newebpay', 'TRA10014', 'CheckValue 驗證失敗')
+
+        order = self.orders.get(('newebpay', service.merchant_id, fields.get('MerchantOrderNo', '')))
+        if order is None or str(order['Amt']) != fields.get('Amt'):
+            return self.error_response('newebpay', 'TRA10001', '查無此筆交易')
+
+        result = {
+            'MerchantID': service.merchant_id,
+            'Amt': order['Amt'],
+            'TradeNo': order['TradeNo'],
+            'MerchantOrderNo': fields['MerchantOrderNo'],
+            'TradeStatus': '1',
+            'PaymentType': order['PaymentType'],
+            'CreateTime': order['CreateTime'],
+            'PayTime': order['PayTime'],
+        }
+        check_params = urllib.parse.urlencode(sorted(
+            (name, result[name]) for name in ('Amt', 'MerchantID', 'MerchantOrderNo', 'TradeNo')))
+        result['CheckCode'] = hashlib.sha256(
+            f'HashIV={hash_iv}&{check_params}&HashKey={hash_key}'.encode('utf-8')).hexdigest().upper()
+        return Response.json({'Status': 'SUCCESS', 'Message': '查詢成功', 'Result': result})
+
+    # ------------------------------------------------------------------
+    # PAYUNi
+    # ------------------------------------------------------------------
+
+    def _payuni_decrypt(self, fields: Dict[str, str]):
+        """驗證 HashInfo 並解密 EncryptInfo，回傳 (cipher, data) 或錯誤回應"""
+        cipher = self._payuni.get(fields.get('MerID', ''))
+        if cipher is None:
+            return None, self.error_response('payuni', 'INVALID_MERID', '商店代號錯誤')
+        encrypt_info = fields.get('EncryptInfo', '')
+        if not cipher.verify_checksum(encrypt_info, fields.get('HashInfo', '')):
+            return None, self.error_response('payuni', 'INVALID_CHECKSUM', 'HashInfo 驗證失敗')
+        try:
+            return cipher, cipher.decrypt(encrypt_info)
+        except ValueError:
+            return None, self.error_response('payuni', 'AES_DECRYPT_ERROR', '解密失敗')
+
+    def _payuni_success(self, cipher, data: Dict) -> Response:
+        encrypt_info = cipher.encrypt(data)
+        return Response.json({'Status': 'SUCCESS', 'Message': '成功', 'EncryptInfo': encrypt_info,
+                              'HashInfo': cipher.checksum(encrypt_info)})
+
+    def payuni_upp(self, fields: Dict[str, str]) -> Response:
+        """UPP: 建立訂單，回應 TradeNo 與付款網址"""
+        cipher, data = self._payuni_decrypt(fields)
+        if cipher is None:
+            return data
+        if not str(data.get('TradeAmt', '')).isdigit() or int(data['TradeAmt']) <= 0:
+            return self.error_response('payuni', 'INVALID_AMOUNT', '金額錯誤')
+
+        key = ('payuni', fields['MerID'], data.get('MerTradeNo', ''))
+        if key in self.orders:
+            return self.error_response('payuni', 'DUPLICATE_ORDER', '訂單編號重複')
+        trade_no = self._next_trade_no('PU')
+        self.orders[key] = {'TradeNo': trade_no, 'TradeAmt': data['TradeAmt'], 'PayType': data.get('PayType', '')}
+        return self._payuni_success(cipher, {
+            'MerID': fields['MerID'],
+            'MerTradeNo': key[2],
+            'TradeNo': trade_no,
+            'TradeAmt': data['TradeAmt'],
+            'PaymentURL': f'{self.url}/pay/{trade_no}',
+        })
+
+    def payuni_query(self, fields: Dict[str, str]) -> Response:
+        """trade_query: 回應加密的交易狀態"""
+        cipher, data = self._payuni_decrypt(fields)
+        if cipher is None:
+            return data
+        order = self.orders.get(('payuni', fields['MerID'], data.get('MerTradeNo', '')))
+        if order is None:
+            return self.error_response('payuni', 'ORDER_NOT_FOUND', '查無訂單')
+        return self._payuni_success(cipher, {
+            'MerTradeNo': data['MerTradeNo'],
+            'TradeNo': order['TradeNo'],
+            'TradeAmt': order['TradeAmt'],
+            'TradeStatus': '1',
+            'PayType': order['PayType'],
+        })
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+async def serve(args):
+    """啟動沙箱直到中斷"""
+    async with PaymentSandbox(build_policy(args), args.host, args.port) as sandbox:
+        print(f"金流沙箱: {sandbox.url}")
+        for path, route in sandbox.routes.items():
+            print(f"   {route.provider:<9} {path}")
+        print("按 Ctrl+C 停止")
+        await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='金流服務商本機沙箱')
+    parser.add_argument('--host', default='127.0.0.1', help='監聽位址 (預設: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8090, help='監聽埠 (預設: 8090)')
+    add_policy_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
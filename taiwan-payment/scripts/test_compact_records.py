@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+精簡記錄類別測試 (compact_records.py)
+
+驗證:
+- encode_payload / decode_payload 來回轉換不失真 (json / form，含中文、& = + %、空值)
+- ECPay / NewebPay / PAYUNi 回呼: from_record → to_record 與原本的 dataclass 相等，raw 延遲解碼後相同
+- from_payload 直接以 POST body 建立，raw 與 parse_qsl 的結果相同
+- 實例沒有 __dict__；frozen 版本不可修改、可作為 set 成員 (payload 不參與比較)
+- intern_fields 的字串在不同實例間共用
+- compact() 結果快取、不支援的編碼丟出 ValueError
+
+使用方法:
+    python test_compact_records.py
+"""
+
+import dataclasses
+import sys
+import urllib.parse
+from typing import List
+
+from compact_records import (
+    ECPayCallbackRecord, FrozenECPayCallbackRecord, NewebPayCallbackRecord, PAYUNiCallbackRecord,
+    PAYUNiOrderResponseRecord, compact, decode_payload, encode_payload, ecpay, newebpay, payuni,
+)
+
+Service = ecpay.ECPayPaymentService
+
+
+def ecpay_callback(order_id: str) -> dict:
+    service = Service(Service.TEST_MERCHANT_ID, Service.TEST_HASH_KEY, Service.TEST_HASH_IV)
+    params = {'MerchantID': Service.TEST_MERCHANT_ID, 'MerchantTradeNo': order_id, 'StoreID': '',
+              'RtnCode': '1', 'RtnMsg': '交易成功', 'TradeNo': '2401291430001', 'TradeAmt': '1000',
+              'PaymentDate': '2024/01/29 14:30:00', 'PaymentType': 'Credit_CreditCard',
+              'PaymentTypeChargeFee': '30', 'TradeDate': '2024/01/29 14:25:00', 'SimulatePaid': '0',
+              'CustomField1': 'a&b=c+d 100%'}
+    params['CheckMacValue'] = service.generate_check_mac_value(params)
+    return params
+
+
+def test_payload(check):
+    """payload 編碼"""
+    raw = {'RtnMsg': '交易成功', 'Note': 'a&b=c+d 100%', 'Blank': '', 'Amt': '1000'}
+    check('form 來回轉換 (含中文、& = + %、空值)', decode_payload(encode_payload(raw, 'form'), 'form') == raw)
+    nested = {'Status': 'SUCCESS', 'Result': {'Amt': 1000, 'Items': ['王', None]}}
+    check('json 來回轉換保留型別與巢狀結構', decode_payload(encode_payload(nested)) == nested)
+    check('空 dict 編碼為空 bytes', encode_payload({}) == b'' and decode_payload(b'', 'form') == {})
+
+
+def test_roundtrip(check):
+    """與原本的 dataclass 互轉"""
+    service = Service(Service.TEST_MERCHANT_ID, Service.TEST_HASH_KEY, Service.TEST_HASH_IV)
+    params = ecpay_callback('ORD001')
+    original = service.parse_callback(params)
+    record = ECPayCallbackRecord.from_record(original)
+    check('ECPay: to_record() 與原本相等、raw 延遲解碼後相同',
+          record.to_record() == original and record.raw == params and record.merchant_trade_no == 'ORD001')
+
+    body = urllib.parse.urlencode(params).encode('ascii')
+    values = {f.name: getattr(original, f.name) for f in dataclasses.fields(original) if f.name != 'raw'}
+    direct = ECPayCallbackRecord.from_payload(body, **values)
+    check('ECPay: from_payload 保存 POST body，raw 與 parse_qsl 相同',
+          direct.payload == body and direct.raw == dict(urllib.parse.parse_qsl(body.decode(), keep_blank_values=True))
+          and direct.to_record() == original)
+
+    mpg = newebpay.MPGCallbackData(status='SUCCESS', message='授權成功', merchant_order_no='ORD002', amt=1000,
+                                   trade_no='T1', merchant_id='MS12345678', payment_type='CREDIT',
+                                   pay_time='2024-01-29 14:30:00', ip='1.2.3.4',
+                                   raw={'Status': 'SUCCESS', 'Result': {'Amt': 1000}})
+    check('NewebPay: 預設欄位與巢狀 raw 保留', NewebPayCallbackRecord.from_record(mpg).to_record() == mpg)
+
+    callback = payuni.PaymentCallbackData(status='SUCCESS', message='OK', mer_id='U1', mer_trade_no='ORD003',
+                                          trade_no='P1', trade_amt=1000, trade_status='1', pay_type='Credit',
+                                          pay_date='2024-01-29 14:30:00', checksum='AB', raw={'TradeAmt': 1000})
+    response = payuni.PaymentOrderResponse(success=True, status='SUCCESS', message='OK', mer_trade_no='ORD003')
+    check('PAYUNi: 回呼與下單回應互轉',
+          PAYUNiCallbackRecord.from_record(callback).to_record() == callback
+          and PAYUNiOrderResponseRecord.from_record(response).to_record() == response)
+
+
+def test_layout(check):
+    """slots / frozen / intern"""
+    service = Service(Service.TEST_MERCHANT_ID, Service.TEST_HASH_KEY, Service.TEST_HASH_IV)
+    record = ECPayCallbackRecord.from_record(service.parse_callback(ecpay_callback('ORD001')))
+    check('實例沒有 __dict__', not hasattr(record, '__dict__'))
+
+    body_a = urllib.parse.urlencode(ecpay_callback('ORD001')).encode('ascii')
+    body_b = urllib.parse.urlencode(ecpay_callback('ORD002')).encode('ascii')
+
+    def fields(order_id: str) -> dict:
+        # 以 join 產生內容相同但各自獨立的字串 (模擬每筆回呼各自解析)
+        return dict(merchant_trade_no=order_id, rtn_code=1, rtn_msg=''.join(['交易', '成功']), trade_no='T',
+                    trade_amt=1000, payment_date='', payment_type=''.join(['Credit_', 'CreditCard']),
+                    payment_type_charge_fee='30', trade_date='', simulate_paid=0, check_mac_value='X')
+
+    a = FrozenECPayCallbackRecord.from_payload(body_a, **fields('ORD001'))
+    b = FrozenECPayCallbackRecord.from_payload(body_b, **fields('ORD002'))
+    same = FrozenECPayCallbackRecord.from_payload(body_b, **fields('ORD001'))
+    try:
+        a.rtn_code = 2
+        immutable = False
+    except dataclasses.FrozenInstanceError:
+        immutable = True
+    check('frozen 不可修改、可作為 set 成員 (payload 不參與比較)', immutable and len({a, b, same}) == 2)
+    check('intern_fields 的字串共用', a.rtn_msg is b.rtn_msg and a.payment_type is b.payment_type)
+
+    check('compact() 結果快取',
+          compact(ecpay.PaymentCallbackData, encoding='form', name='ECPayCallbackRecord',
+                  intern_fields=('rtn_msg', 'payment_type', 'payment_type_charge_fee')) is ECPayCallbackRecord)
+    try:
+        compact(ecpay.PaymentCallbackData, encoding='xml')
+        check('不支援的編碼丟出 ValueError', False)
+    except ValueError:
+        check('不支援的編碼丟出 ValueError', True)
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("精簡記錄類別測試")
+    print("=" * 60 + "\n")
+
+    test_payload(check)
+    test_roundtrip(check)
+    test_layout(check)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+ECPay CheckMacValue 測試 (ecpay_checkmac.py)
+
+驗證:
+- 綠界開發者文件「檢查碼機制」的範例參數算出文件上的 CheckMacValue
+- .NET 風格 URL Encode: - _ . ! * ( ) 不編碼、~ 編碼為 %7e、空白轉 +，
+  每個 ASCII 字元與中文字的結果與規格的逐步實作 (quote_plus → 還原表) 相同
+- 範例 ECPayPaymentService.generate_check_mac_value 與 CheckMacValue.compute 一致 (含特殊字元)
+- verify: 大小寫不敏感、竄改或缺少 CheckMacValue 時失敗、不修改輸入
+- ECPayCallbackVerifier 依 MerchantID 選擇金鑰，未註冊商店失敗
+
+使用方法:
+    python test_ecpay_checkmac.py
+"""
+
+import sys
+from typing import List
+
+from ecpay_checkmac import CheckMacValue, ECPayCallbackVerifier, dotnet_url_encode, reference_url_encode
+from example_loader import load_example
+
+ecpay = load_example('ecpay-payment-example')
+Service = ecpay.ECPayPaymentService
+
+HASH_KEY = 'pwFHCqoQZGmho4w6'
+HASH_IV = 'EkRm7iFT261dpevs'
+
+# 綠界開發者文件 (全方位金流 > 檢查碼機制) 的範例
+DOC_PARAMS = {
+    'ChoosePayment': 'ALL',
+    'EncryptType': 1,
+    'ItemName': 'Apple iphone 15',
+    'MerchantID': '3002607',
+    'MerchantTradeDate': '2023/03/12 15:30:23',
+    'MerchantTradeNo': 'ecpay20230312153023',
+    'PaymentType': 'aio',
+    'ReturnURL': 'https://www.ecpay.com.tw/receive.php',
+    'TotalAmount': 30000,
+    'TradeDesc': '促銷方案',
+}
+DOC_CHECK_MAC_VALUE = '6C51C9E6888DE861FD62FB1DD17029FC742634498FD813DC43D4243B5685B840'
+
+
+def test_known_vector(check):
+    """文件範例"""
+    mac = CheckMacValue(HASH_KEY, HASH_IV)
+    check(f'文件範例參數算出 {DOC_CHECK_MAC_VALUE[:12]}...', mac.compute(DOC_PARAMS) == DOC_CHECK_MAC_VALUE)
+    check('參數順序不影響結果', mac.compute(dict(reversed(list(DOC_PARAMS.items())))) == DOC_CHECK_MAC_VALUE)
+    check('compute 忽略參數中的 CheckMacValue',
+          mac.compute(dict(DOC_PARAMS, CheckMacValue='X')) == DOC_CHECK_MAC_VALUE)
+
+
+def test_encoding(check):
+    """.NET 風格 URL Encode"""
+    check("特殊字元: '-_.!*()' 不編碼、'~' → %7e、空白 → +",
+          dotnet_url_encode("a-_.!*()~ b") == 'a-_.!*()%7e+b')
+    check("其他符號與中文轉為小寫 %xx",
+          dotnet_url_encode("&=/:'王") == '%26%3d%2f%3a%27%e7%8e%8b')
+    check('純英數字只轉小寫', dotnet_url_encode('ABCxyz019') == 'abcxyz019')
+    mismatched = [b for b in range(128) if dotnet_url_encode(chr(b)) != reference_url_encode(chr(b))]
+    text = '促銷方案 (限時) *特價* ~ 100% 王小明!'
+    check(f'ASCII 每個字元與規格逐步實作相同 (不同 {len(mismatched)} 個)',
+          not mismatched and dotnet_url_encode(text) == reference_url_encode(text))
+
+
+def test_example_service(check):
+    """範例服務與 CheckMacValue 一致"""
+    service = Service(Service.TEST_MERCHANT_ID, HASH_KEY, HASH_IV)
+    mac = CheckMacValue(HASH_KEY, HASH_IV)
+    check('範例 generate_check_mac_value 算出文件範例的值',
+          service.generate_check_mac_value(DOC_PARAMS) == DOC_CHECK_MAC_VALUE)
+
+    special = dict(DOC_PARAMS, ItemName='Apple (iPhone 15) *限量* ~ 2 入!', TradeDesc="O'Reilly & 王")
+    check('含 ! * ( ) ~ 的參數: 範例與 CheckMacValue.compute 相同',
+          service.generate_check_mac_value(special) == mac.compute(special))
+
+    callback = {'MerchantID': '3002607', 'MerchantTradeNo': 'ORD001', 'RtnCode': '1', 'RtnMsg': '交易成功',
+                'TradeAmt': '1000', 'CustomField1': 'note (gift) ~ *'}
+    callback['CheckMacValue'] = service.generate_check_mac_value(callback)
+    check('範例產生的回呼可由 CheckMacValue 驗證，反之亦然',
+          mac.verify(callback) and service.verify_check_mac_value(
+              dict(callback, CheckMacValue=mac.compute(callback))))
+
+
+def test_verify(check):
+    """回呼驗證"""
+    mac = CheckMacValue(HASH_KEY, HASH_IV)
+    callback = dict(DOC_PARAMS, CheckMacValue=DOC_CHECK_MAC_VALUE.lower())
+    snapshot = dict(callback)
+    check('CheckMacValue 大小寫不敏感', mac.verify(callback))
+    check('不修改輸入', callback == snapshot)
+    check('竄改金額時失敗', not mac.verify(dict(callback, TotalAmount=1)))
+    check('缺少或非字串 CheckMacValue 時失敗',
+          not mac.verify(DOC_PARAMS) and not mac.verify(dict(DOC_PARAMS, CheckMacValue=None)))
+    check('金鑰不同時失敗', not CheckMacValue(HASH_KEY, 'x' * 16).verify(callback))
+
+    verifier = ECPayCallbackVerifier({'3002607': (HASH_KEY, HASH_IV),
+                                      '2000132': ('5294y06JbISpM5x9', 'v77hoKGq4kWxNNIS')})
+    results = verifier.verify_many([callback, dict(callback, MerchantID='2000132'),
+                                    dict(callback, MerchantID='0000000')])
+    check(f'ECPayCallbackVerifier 依 MerchantID 選擇金鑰、未註冊商店失敗 ({results})',
+          results == [True, False, False] and verifier.compute(DOC_PARAMS) == DOC_CHECK_MAC_VALUE)
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("ECPay CheckMacValue 測試")
+    print("=" * 60 + "\n")
+
+    test_known_vector(check)
+    test_encoding(check)
+    test_example_service(check)
+    test_verify(check)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+錯誤碼表測試 (error_registry.py)
+
+驗證:
+- data/error-codes.csv 全部載入，以 (服務商, 錯誤碼) 為 key，相同錯誤碼不互相覆蓋
+- category 欄位轉換為 ErrorCategory，system 類別可重試
+- 錯誤碼表與 ErrorInfo 為唯讀
+- 未登錄的錯誤碼回傳同一個 ErrorInfo，不每次建立新物件
+- get_error_registry() 行程內只建立一次
+- taiwan-invoice 的 error_registry.py 副本與此份相同 (模組說明除外)
+並比較 dict 查找與逐列掃描 CSV 的查詢速度。
+
+使用方法:
+    python test_error_registry.py
+"""
+
+import ast
+import csv
+import dataclasses
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+from error_registry import (
+    DEFAULT_CSV, ErrorCategory, ErrorInfo, ErrorRegistry, RetryStrategy, get_error_registry,
+)
+
+
+# error_registry.py 有副本的技能
+REGISTRY_SKILLS = ('taiwan-invoice', 'taiwan-payment')
+
+
+def registry_code(path: Path) -> str:
+    """模組說明 (各技能的使用範例不同) 之後的程式碼"""
+    source = path.read_text(encoding='utf-8')
+    docstring = ast.parse(source).body[0]
+    return '\n'.join(source.splitlines()[docstring.end_lineno:])
+
+
+def registry_copy_mismatches() -> List[str]:
+    """
+    error_registry.py 在 taiwan-invoice / taiwan-payment 各有一份，模組說明以外的內容必須相同
+
+    Returns:
+        內容不同的技能目錄 (技能單獨安裝、找不到其他副本時為空)
+    """
+    scripts_dir = Path(__file__).resolve().parent
+    code = registry_code(scripts_dir / 'error_registry.py')
+    mismatched = []
+    for skill in REGISTRY_SKILLS:
+        copy = scripts_dir.parent.parent / skill / 'scripts' / 'error_registry.py'
+        if copy.exists() and registry_code(copy) != code:
+            mismatched.append(skill)
+    return mismatched
+
+
+def csv_rows() -> List[dict]:
+    with open(DEFAULT_CSV, newline='', encoding='utf-8') as f:
+        return [row for row in csv.DictReader(f) if row.get('code')]
+
+
+def test_lookup(check):
+    """載入與查詢"""
+    rows = csv_rows()
+    registry = get_error_registry()
+    providers = {row['provider'].lower() for row in rows}
+    loaded = sum(1 for info in registry if info.provider)
+    check(f'CSV {len(rows)} 列全部載入 ({", ".join(registry.providers())})',
+          loaded == len(rows) and set(registry.providers()) == providers)
+
+    newebpay, payuni = registry.get('SUCCESS', 'newebpay'), registry.get('SUCCESS', 'PAYUNi')
+    check('不同服務商的同一錯誤碼各自獨立 (SUCCESS)',
+          newebpay.provider == 'newebpay' and payuni.provider == 'payuni'
+          and ('newebpay', 'SUCCESS') in registry and ('payuni', 'SUCCESS') in registry)
+
+    timeout = registry.get('TM-999', 'newebpay')
+    check(f'system 類別歸為 SERVER 並以指數退避重試 ({timeout.message})',
+          timeout.category == ErrorCategory.SERVER and timeout.is_retryable
+          and timeout.retry_strategy == RetryStrategy.EXPONENTIAL_BACKOFF)
+
+    check('未指定服務商的錯誤碼不會查到其他服務商',
+          registry.get('TM-999', 'ecpay').category == ErrorCategory.UNKNOWN
+          and registry.get('TM-999').provider == 'newebpay')
+
+    check('與服務商無關的錯誤碼 (NETWORK_ERROR) 各服務商皆可查詢',
+          all(registry.get('NETWORK_ERROR', p).is_retryable for p in registry.providers())
+          and 'NETWORK_ERROR' in registry.codes('payuni'))
+
+    override = dataclasses.replace(timeout, retry_strategy=RetryStrategy.LINEAR_BACKOFF)
+    custom = ErrorRegistry.from_csv(overrides=[override])
+    check('overrides 覆寫 CSV 內容',
+          custom.get('TM-999', 'newebpay').retry_strategy == RetryStrategy.LINEAR_BACKOFF
+          and len(custom) == len(registry))
+
+
+def test_immutable(check):
+    """唯讀與共用"""
+    registry = get_error_registry()
+    codes = registry.codes('ecpay')
+    try:
+        codes['NEW'] = registry.get('SUCCESS', 'ecpay')
+        mutated = True
+    except TypeError:
+        mutated = False
+    try:
+        registry.get('SUCCESS', 'ecpay').message = '已修改'
+        mutated = True
+    except dataclasses.FrozenInstanceError:
+        pass
+    check('codes() 與 ErrorInfo 不可修改', not mutated and isinstance(registry.get('1', 'ecpay'), ErrorInfo))
+
+    first, second = registry.get('UNLISTED-1', 'payuni'), registry.get('UNLISTED-1', 'newebpay')
+    check('未登錄的錯誤碼回傳同一個 ErrorInfo',
+          first is second and first.category == ErrorCategory.UNKNOWN and not first.is_retryable)
+
+    check('get_error_registry() 行程內只建立一次', get_error_registry() is registry)
+
+
+def benchmark(lookups: int = 100000):
+    """dict 查找 vs 逐列掃描 CSV"""
+    rows = csv_rows()
+    keys = [(row['provider'].lower(), row['code']) for row in rows]
+    registry = get_error_registry()
+
+    started = time.perf_counter()
+    for i in range(lookups):
+        provider, code = keys[i % len(keys)]
+        registry.get(code, provider)
+    registry_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(lookups):
+        provider, code = keys[i % len(keys)]
+        next(r for r in rows if r['provider'].lower() == provider and r['code'] == code)
+    scan_elapsed = time.perf_counter() - started
+
+    print(f"\n   {lookups} 次查詢: 逐列掃描 {scan_elapsed * 1000:.0f} ms，"
+          f"ErrorRegistry {registry_elapsed * 1000:.0f} ms ({scan_elapsed / registry_elapsed:.1f}x)")
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("錯誤碼表測試")
+    print("=" * 60 + "\n")
+
+    test_lookup(check)
+    test_immutable(check)
+    mismatched = registry_copy_mismatches()
+    check(f'各技能的 error_registry.py 副本相同 {mismatched or ""}', not mismatched)
+    benchmark()
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
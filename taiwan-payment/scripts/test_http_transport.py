@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+HTTP transport 測試 (http_transport.py)
+
+對本機沙箱 (sandbox_server.py) 驗證:
+- 注入 SyncTransport 後範例服務重複使用連線 (未注入時沿用 requests，每次新建連線)
+- 多個服務 / 多執行緒共用同一個 transport，依 base URL 分開連線池
+- 連線逾時與讀取逾時分開設定，單一數字的 timeout 視為讀取逾時
+- AsyncTransport 併發請求的連線數受 pool_maxsize 限制
+- 未安裝 httpx[http2] 時要求 HTTP/2 會丟出 ImportError
+並比較每次新建連線與共用連線池的吞吐量。
+
+使用方法:
+    python test_http_transport.py
+    python test_http_transport.py --count 1000 --latency fixed:5
+"""
+
+import argparse
+import asyncio
+import sys
+import threading
+import time
+
+import requests
+
+from example_loader import load_example
+from http_transport import (
+    HAS_HTTP2, AsyncTransport, SyncTransport, TransportConfig, get_default_transport, requests_error,
+    set_default_transport,
+)
+from sandbox_server import DEFAULT_MERCHANTS, LatencyModel, PaymentSandbox, SandboxPolicy, SandboxThread
+
+if HAS_HTTP2:
+    import httpx
+
+payuni = load_example('payuni-payment-example')
+
+PAYUNI_ID = next(iter(DEFAULT_MERCHANTS['payuni']))
+
+
+def payuni_service(base_url: str, transport=None):
+    service = payuni.PAYUNiPaymentService(PAYUNI_ID, *DEFAULT_MERCHANTS['payuni'][PAYUNI_ID], transport=transport)
+    service.api_url = base_url + '/api/upp'
+    service.query_url = base_url + '/api/trade_query'
+    return service
+
+
+def payuni_order(order_no: str, amount: int = 100):
+    return payuni.PaymentOrderData(mer_trade_no=order_no, trade_amt=amount, prod_desc='測試商品',
+                                   return_url='https://example.com/return',
+                                   notify_url='https://example.com/notify', pay_type='Credit')
+
+
+def query_data(service, order_no: str) -> dict:
+    encrypt_info = service.encrypt_data({'MerID': PAYUNI_ID, 'MerTradeNo': order_no, 'Timestamp': int(time.time())})
+    return {'MerID': PAYUNI_ID, 'Version': '1.0', 'EncryptInfo': encrypt_info,
+            'HashInfo': service.generate_checksum(encrypt_info)}
+
+
+def check_sync(check) -> None:
+    """SyncTransport: 連線重用、共用連線池、逾時"""
+    with SandboxThread(PaymentSandbox()) as sandbox:
+        service = payuni_service(sandbox.url)
+        results = [service.create_order(payuni_order(f'RAW{i:04d}')) for i in range(20)]
+        check(f'未注入 transport 沿用 requests ({sandbox.stats.connections} 條連線 / 20 個請求)',
+              all(r.success for r in results) and sandbox.stats.connections == 20)
+
+        sandbox.reset_stats()
+        with SyncTransport() as transport:
+            service = payuni_service(sandbox.url, transport)
+            results = [service.create_order(payuni_order(f'POOL{i:04d}')) for i in range(20)]
+            check(f'注入 SyncTransport 重複使用連線 ({sandbox.stats.connections} 條連線 / 20 個請求)',
+                  all(r.success for r in results) and sandbox.stats.connections == 1)
+
+    # 兩個服務商主機 + 8 個執行緒共用同一個 transport
+    config = TransportConfig(pool_connections=4, pool_maxsize=4, pool_block=True)
+    with SandboxThread(PaymentSandbox()) as first, SandboxThread(PaymentSandbox()) as second, \
+            SyncTransport(config) as transport:
+        services = [payuni_service(first.url, transport), payuni_service(second.url, transport)]
+        errors = []
+
+        def worker(n: int):
+            for i in range(10):
+                result = services[(n + i) % 2].create_order(payuni_order(f'T{n}-{i:03d}'))
+                if not result.success:
+                    errors.append(result.message)
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+        connections = (first.stats.connections, second.stats.connections)
+        check(f'多執行緒共用 transport，依 base URL 分開連線池 (連線數 {connections}，pool_maxsize=4)',
+              not errors and len(transport.pools()) == 2 and max(connections) <= 4
+              and transport.requests[first.url.lower()] == transport.requests[second.url.lower()] == 40)
+
+    # 逾時: 沙箱延遲 300 ms
+    policy = SandboxPolicy(latency=LatencyModel.parse('fixed:300'))
+    with SandboxThread(PaymentSandbox(policy)) as sandbox:
+        service = payuni_service(sandbox.url)
+        with SyncTransport(TransportConfig(connect_timeout=2, read_timeout=0.1)) as transport:
+            started = time.perf_counter()
+            try:
+                transport.post(service.query_url, data=query_data(service, 'SLOW'))
+                timed_out = False
+            except requests.exceptions.ReadTimeout:
+                timed_out = True
+            elapsed = time.perf_counter() - started
+            check(f'讀取逾時 (read_timeout=0.1，{elapsed * 1000:.0f} ms 後丟出 ReadTimeout)',
+                  timed_out and elapsed < 0.3)
+
+            response = transport.post(service.query_url, data=query_data(service, 'SLOW'), timeout=2)
+            check('單一數字 timeout 覆寫讀取逾時，連線逾時沿用設定',
+                  response.status_code == 200 and transport._timeout(2) == (2, 2.0)
+                  and transport._timeout(None) == (2, 0.1) and transport._timeout((1, 3)) == (1, 3))
+
+    default = get_default_transport()
+    replacement = SyncTransport()
+    set_default_transport(replacement)
+    check('get_default_transport() 為行程共用，可由 set_default_transport() 替換',
+          default is not replacement and get_default_transport() is replacement)
+
+
+async def check_async(check) -> None:
+    """AsyncTransport: 併發請求的連線數與逾時"""
+    with SandboxThread(PaymentSandbox(SandboxPolicy(latency=LatencyModel.parse('fixed:20')))) as sandbox:
+        service = payuni_service(sandbox.url)
+        data = [query_data(service, f'NONE{i}') for i in range(200)]
+
+        async with AsyncTransport(TransportConfig(pool_maxsize=10)) as transport:
+            responses = await asyncio.gather(*(transport.post(service.query_url, data=d) for d in data))
+            check(f'AsyncTransport 併發 200 個請求 ({sandbox.stats.connections} 條連線，pool_maxsize=10)',
+                  all(r.status_code == 200 and 'Status' in r.json() for r in responses)
+                  and 0 < sandbox.stats.connections <= 10)
+
+            try:
+                await transport.post(service.query_url, data=data[0], timeout=0.005)
+                timed_out = False
+            except asyncio.TimeoutError:
+                timed_out = True
+            check('AsyncTransport 讀取逾時', timed_out)
+
+
+def check_http2(check) -> None:
+    """HTTP/2 為選用功能"""
+    if HAS_HTTP2:
+        with SyncTransport(TransportConfig(http2=True)) as transport:
+            check('HTTP/2 (httpx) transport 可建立', transport.config.http2)
+            try:
+                transport.get('http://127.0.0.1:9/', timeout=(0.5, 0.5))
+                mapped = False
+            except requests.exceptions.RequestException as e:
+                mapped = isinstance(e.__cause__, httpx.HTTPError)
+            check('HTTP/2 模式的 httpx 例外轉為 requests.exceptions.RequestException', mapped)
+        samples = [(httpx.ConnectTimeout('x'), requests.exceptions.ConnectTimeout),
+                   (httpx.ReadTimeout('x'), requests.exceptions.ReadTimeout),
+                   (httpx.ConnectError('x'), requests.exceptions.ConnectionError),
+                   (httpx.TooManyRedirects('x'), requests.exceptions.TooManyRedirects)]
+        check('httpx 例外對應到相同語意的 requests 例外',
+              all(isinstance(requests_error(error), expected) for error, expected in samples))
+        return
+
+    for cls in (SyncTransport, AsyncTransport):
+        try:
+            cls(TransportConfig(http2=True))
+            raised = False
+        except ImportError as e:
+            raised = 'httpx[http2]' in str(e)
+        check(f'未安裝 httpx[http2] 時 {cls.__name__}(http2=True) 丟出 ImportError', raised)
+
+
+def benchmark(count: int, latency: str) -> None:
+    """循序 create_order: 每次新建連線 vs 共用連線池"""
+    policy = SandboxPolicy(latency=LatencyModel.parse(latency))
+    with SandboxThread(PaymentSandbox(policy)) as sandbox:
+        rows = []
+        for label, transport in (('requests.post (每次新建連線)', None), ('SyncTransport (連線池)', SyncTransport())):
+            sandbox.reset_stats()
+            service = payuni_service(sandbox.url, transport)
+            started = time.perf_counter()
+            for i in range(count):
+                service.create_order(payuni_order(f'BEN{len(rows)}-{i:06d}'))
+            elapsed = time.perf_counter() - started
+            rows.append((label, sandbox.stats.connections, count / elapsed))
+            if transport is not None:
+                transport.close()
+
+    print(f"\n   {'模式':<26} {'連線數':>7} {'筆/秒':>9}")
+    for label, connections, qps in rows:
+        print(f"   {label:<24} {connections:>7} {qps:>9.0f}")
+    print(f"\n   加速: {rows[1][2] / rows[0][2]:.1f}x (延遲 {latency}, {count} 筆)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP transport 測試')
+    parser.add_argument('--count', type=int, default=300, help='吞吐量量測的請求數 (預設: 300)')
+    parser.add_argument('--latency', default='fixed:1', help='吞吐量量測的延遲分佈 (預設: fixed:1)')
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("HTTP transport 測試")
+    print("=" * 60 + "\n")
+
+    check_sync(check)
+    asyncio.run(check_async(check))
+    check_http2(check)
+    benchmark(args.count, args.latency)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
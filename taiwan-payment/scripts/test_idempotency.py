@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+冪等層測試 (idempotency.py)
+
+驗證:
+- 結果依 TTL 過期、超過 max_entries 時移除最早到期的紀錄、重新開啟後仍有效
+- 重送的付款成功通知 (ECPay / NewebPay / PAYUNi) 只處理一次，回傳快取的處理結果
+- 同一通知同時送達 (多執行緒 / asyncio) 合併為一次處理；asyncio 時 SQLite 讀寫不阻塞 event loop
+- 處理失敗 (例外) 不快取，重送時重新處理；付款失敗通知不去重
+- 不同服務商的相同訂單編號各自處理
+- handler 回傳 None 時也去重
+- 多個 worker 程序共用同一個 SQLite 檔時同一通知只處理一次
+並量測快取命中的耗時。
+
+使用方法:
+    python test_idempotency.py
+"""
+
+import asyncio
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from idempotency import IdempotencyStore, IdempotentCallbackProcessor
+
+
+def ecpay_callback(order_id: str, paid: bool = True) -> Dict:
+    return {'MerchantID': '3002607', 'MerchantTradeNo': order_id, 'TradeNo': '2401151200001',
+            'TradeAmt': '1000', 'RtnCode': '1' if paid else '10100058', 'RtnMsg': 'OK'}
+
+
+def newebpay_callback(order_id: str) -> Dict:
+    return {'Status': 'SUCCESS', 'Message': 'OK',
+            'Result': {'MerchantID': 'MS12345678', 'MerchantOrderNo': order_id, 'Amt': 1000, 'TradeNo': 'T1'}}
+
+
+def payuni_callback(order_id: str) -> Dict:
+    return {'Status': 'SUCCESS', 'Message': 'OK', 'MerID': 'U1', 'MerTradeNo': order_id,
+            'TradeNo': 'P1', 'TradeAmt': 1000, 'TradeStatus': '1'}
+
+
+class Ledger:
+    """記錄每次處理的業務邏輯"""
+
+    def __init__(self, latency: float = 0.0, fail_first: bool = False):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.processed: List[str] = []
+        self._lock = threading.Lock()
+
+    def handle(self, callback: Dict) -> Dict:
+        time.sleep(self.latency)
+        with self._lock:
+            if self.fail_first and not self.processed:
+                self.processed.append('error')
+                raise RuntimeError('資料庫寫入失敗')
+            order_id = callback.get('MerchantTradeNo') or callback.get('MerTradeNo') or \
+                callback['Result']['MerchantOrderNo']
+            self.processed.append(order_id)
+            return {'order_id': order_id, 'shipment': len(self.processed)}
+
+    async def ahandle(self, callback: Dict) -> Dict:
+        await asyncio.sleep(self.latency)
+        return self.handle(callback)
+
+
+class SlowStore(IdempotencyStore):
+    """每次讀寫阻塞 20 ms (模擬磁碟 fsync 或鎖競爭)"""
+
+    def _slow(self, name: str, *args, **kwargs):
+        time.sleep(0.02)
+        return getattr(super(), name)(*args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        return self._slow('get', *args, **kwargs)
+
+    def put(self, *args, **kwargs):
+        return self._slow('put', *args, **kwargs)
+
+    def claim(self, *args, **kwargs):
+        return self._slow('claim', *args, **kwargs)
+
+    def release(self, *args, **kwargs):
+        return self._slow('release', *args, **kwargs)
+
+
+async def loop_ticks(coroutine) -> int:
+    """執行 coroutine 期間 event loop 每 5 ms 的計時器觸發次數 (store 阻塞 event loop 時接近 0)"""
+    ticks = 0
+    task = asyncio.ensure_future(coroutine)
+    while not task.done():
+        await asyncio.sleep(0.005)
+        ticks += 1
+    await task
+    return ticks
+
+
+def test_store(check, tmp: Path):
+    """結果儲存"""
+    path = tmp / 'store.db'
+    store = IdempotencyStore(path, ttl=10, max_entries=3)
+    store.put('3002607', 'ORD001', {'shipment': 1}, now=100)
+    check('put / get', store.get('3002607', 'ORD001', now=105) == {'shipment': 1})
+    check('超過 TTL 視為不存在', store.get('3002607', 'ORD001', now=110) is None)
+
+    for number in range(2, 6):
+        store.put('3002607', f'ORD00{number}', number, now=100 + number)
+    check(f'超過 max_entries 移除最早到期的紀錄 (剩 {len(store)} 筆)',
+          len(store) == 3 and store.get('3002607', 'ORD002', now=106) is None)
+    store.close()
+
+    reopened = IdempotencyStore(path, ttl=10, max_entries=3)
+    check('重新開啟後仍有效', reopened.get('3002607', 'ORD005', now=106) == 5)
+    reopened.close()
+
+
+def test_redelivery(check):
+    """重送通知"""
+    ledger = Ledger()
+    processor = IdempotentCallbackProcessor(ledger.handle, IdempotencyStore())
+    results = [processor.process(make('ORD001'))
+               for make in (ecpay_callback, newebpay_callback, payuni_callback) for _ in range(3)]
+    check('三家服務商的重送通知各只處理一次',
+          ledger.processed == ['ORD001'] * 3 and results[0] == results[1] == results[2]
+          and results[3] == results[5] and processor.stats.hits == 6)
+
+    ledger = Ledger()
+    processor = IdempotentCallbackProcessor(ledger.handle, IdempotencyStore())
+    processor.process(ecpay_callback('ORD002', paid=False))
+    processor.process(ecpay_callback('ORD002', paid=False))
+    processor.process(ecpay_callback('ORD002'))
+    processor.process(ecpay_callback('ORD002'))
+    check('付款失敗通知不去重，之後的成功通知仍處理一次', ledger.processed == ['ORD002'] * 3)
+
+    ledger = Ledger(fail_first=True)
+    processor = IdempotentCallbackProcessor(ledger.handle, IdempotencyStore())
+    try:
+        processor.process(ecpay_callback('ORD003'))
+    except RuntimeError:
+        pass
+    result = processor.process(ecpay_callback('ORD003'))
+    check('處理失敗不快取，重送時重新處理', ledger.processed == ['error', 'ORD003'] and result['shipment'] == 2)
+
+    shipped = []
+    processor = IdempotentCallbackProcessor(lambda callback: shipped.append(callback['MerchantTradeNo']),
+                                            IdempotencyStore())
+    for _ in range(3):
+        processor.process(ecpay_callback('ORD004'))
+    check('handler 回傳 None 時也只處理一次', shipped == ['ORD004'] and processor.stats.hits == 2)
+
+    try:
+        processor.process({'MerchantID': '3002607', 'MerchantTradeNo': '', 'RtnCode': '1'})
+        check('沒有訂單編號丟出 ValueError', False)
+    except ValueError:
+        check('沒有訂單編號丟出 ValueError', True)
+
+
+def test_concurrent(check):
+    """同時送達"""
+    ledger = Ledger(latency=0.05)
+    processor = IdempotentCallbackProcessor(ledger.handle, IdempotencyStore())
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(processor.process(ecpay_callback('ORD001'))))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    check(f'6 個執行緒同時處理同一通知只執行 1 次 (合併 {processor.stats.coalesced} 次)',
+          ledger.processed == ['ORD001'] and len(results) == 6 and all(r == results[0] for r in results))
+
+    ledger = Ledger(latency=0.02)
+    processor = IdempotentCallbackProcessor(ledger.ahandle, IdempotencyStore())
+
+    async def scenario():
+        return await asyncio.gather(*(processor.aprocess(newebpay_callback('ORD009')) for _ in range(10)))
+
+    results = asyncio.run(scenario())
+    check('asyncio 並行處理同一通知只執行 1 次',
+          ledger.processed == ['ORD009'] and all(result == results[0] for result in results))
+
+    slow_processor = IdempotentCallbackProcessor(Ledger(latency=0.02).ahandle, SlowStore())
+    ticks = asyncio.run(loop_ticks(slow_processor.aprocess(newebpay_callback('ORD010'))))
+    check(f'store 讀寫在 worker thread 執行，event loop 不被阻塞 (5 次 × 20 ms 期間計時器觸發 {ticks} 次)',
+          ticks >= 10)
+
+
+def test_workers(check, tmp: Path):
+    """多個 worker 程序共用 SQLite (以各自的連線模擬)"""
+    ledger = Ledger(latency=0.05)
+    processors = [IdempotentCallbackProcessor(ledger.handle, IdempotencyStore(tmp / 'workers.db'))
+                  for _ in range(3)]
+    for processor in processors:
+        processor.guard.poll_interval = 0.01
+    results = []
+    threads = [threading.Thread(target=lambda n=n: results.append(
+        processors[n % 3].process(ecpay_callback('ORD001')))) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    check('ReturnURL / NotifyURL 由不同 worker 同時收到: 只處理 1 次',
+          ledger.processed == ['ORD001'] and len(results) == 6 and all(r == results[0] for r in results))
+
+
+def benchmark(tmp: Path):
+    """快取命中耗時"""
+    ledger = Ledger()
+    processor = IdempotentCallbackProcessor(ledger.handle, IdempotencyStore(tmp / 'bench.db'))
+    callbacks = [ecpay_callback(f'ORD{n:06d}') for n in range(5_000)]
+    for callback in callbacks:
+        processor.process(callback)
+
+    started = time.perf_counter()
+    for callback in callbacks:
+        processor.process(callback)
+    elapsed = time.perf_counter() - started
+    print(f"\n[效能] 重送通知 5,000 次 (快取命中): {elapsed * 1000:.1f} ms "
+          f"({elapsed / 5_000 * 1e6:.1f} μs/次)")
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("冪等層測試")
+    print("=" * 60 + "\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        test_store(check, tmp)
+        test_redelivery(check)
+        test_concurrent(check)
+        test_workers(check, tmp)
+        benchmark(tmp)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+多商店金鑰管理測試 (merchant_registry.py)
+
+驗證:
+- 同一 (provider, merchant_id, environment) 取得同一實例，環境不同則分開
+- LRU 淘汰與使用統計
+- 金鑰檔輪替時只淘汰有變動的商店；輪替過程檔案損毀時沿用原本的金鑰
+- 多執行緒同時取用時每個商店只建立一次實例、統計不遺漏
+- CSV 金鑰檔與環境變數載入
+- 列出每次請求重新建立服務物件與 registry.get 的耗時
+
+使用方法:
+    python test_merchant_registry.py
+    python test_merchant_registry.py --count 200000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from merchant_registry import PROVIDERS, MerchantRegistry
+
+
+def make_merchants(count: int, rotation: int = 0) -> List[Dict]:
+    """產生三家服務商的測試商店，rotation 改變時第 0 家商店的 HashKey 會改變"""
+    providers = ('ecpay', 'newebpay', 'payuni')
+    merchants = []
+    for i in range(count):
+        key_version = rotation if i == 0 else 0
+        merchants.append({
+            'provider': providers[i % 3],
+            'merchant_id': f'M{i:05d}',
+            'hash_key': f'{i:05d}{key_version:03d}'.ljust(32, 'k'),
+            'hash_iv': f'{i:05d}'.ljust(16, 'v'),
+            'environment': 'test',
+        })
+    return merchants
+
+
+def write_merchants(path: Path, merchants: List[Dict]):
+    """以暫存檔 + rename 原子替換，模擬金鑰輪替"""
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps({'merchants': merchants}), encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多商店金鑰管理測試')
+    parser.add_argument('--count', type=int, default=50000, help='耗時比較的請求數 (預設: 50000)')
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("多商店金鑰管理測試")
+    print("=" * 60 + "\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'merchants.json'
+        merchants = make_merchants(30)
+        merchants.append(dict(merchants[0], environment='production'))
+        write_merchants(path, merchants)
+
+        # 快取與環境
+        registry = MerchantRegistry(path, reload_interval=0)
+        first = registry.get('ecpay', 'M00000')
+        production = registry.get('ecpay', 'M00000', 'production')
+        check('同一商店取得同一實例', registry.get('ecpay', 'M00000') is first)
+        check('正式 / 測試環境分開快取',
+              production is not first and production.api_url == production.PROD_API_URL
+              and first.api_url == first.TEST_API_URL)
+        check('實例使用設定的金鑰', first.hash_key == merchants[0]['hash_key'])
+        try:
+            registry.get('ecpay', 'NOPE')
+            check('未設定的商店拋出 KeyError', False)
+        except KeyError:
+            check('未設定的商店拋出 KeyError', True)
+
+        # LRU
+        small = MerchantRegistry(path, capacity=2, reload_interval=0)
+        a = small.get('ecpay', 'M00000')
+        small.get('newebpay', 'M00001')
+        small.get('ecpay', 'M00000')
+        small.get('payuni', 'M00002')
+        usage = small.usage()
+        check('LRU 淘汰最久未使用的商店',
+              len(small) == 2 and ('newebpay', 'M00001', 'test') not in small
+              and small.get('ecpay', 'M00000') is a)
+        check('使用統計 (取用 / 建立 / 淘汰)',
+              (usage[('ecpay', 'M00000', 'test')].requests, usage[('ecpay', 'M00000', 'test')].builds) == (2, 1)
+              and usage[('newebpay', 'M00001', 'test')].evictions == 1)
+
+        # 熱重載
+        kept = registry.get('newebpay', 'M00001')
+        time.sleep(0.01)
+        write_merchants(path, make_merchants(30, rotation=1))
+        rotated = registry.get('ecpay', 'M00000')
+        check('金鑰輪替後重建實例',
+              rotated is not first and rotated.hash_key == make_merchants(1, rotation=1)[0]['hash_key'])
+        check('未輪替的商店保留實例', registry.get('newebpay', 'M00001') is kept)
+        check('已移除的商店被淘汰', ('ecpay', 'M00000', 'production') not in registry)
+
+        time.sleep(0.01)
+        path.write_text('{"merchants": [', encoding='utf-8')
+        check('金鑰檔損毀時沿用原本的金鑰',
+              registry.get('ecpay', 'M00000') is rotated and registry.last_error is not None)
+        write_merchants(path, make_merchants(30, rotation=1))
+
+        # 多執行緒
+        shared = MerchantRegistry(path, reload_interval=0.05)
+        keys = [(m['provider'], m['merchant_id']) for m in make_merchants(30)]
+        per_thread = 3000
+        seen: Dict[tuple, set] = {key: set() for key in keys}
+        seen_lock = threading.Lock()
+
+        def worker(offset: int):
+            local = {key: set() for key in keys}
+            for i in range(per_thread):
+                key = keys[(i + offset) % len(keys)]
+                local[key].add(id(shared.get(*key)))
+            with seen_lock:
+                for key, ids in local.items():
+                    seen[key] |= ids
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        usage = shared.usage()
+        check('多執行緒每個商店只建立一次實例',
+              all(len(ids) == 1 for ids in seen.values()) and all(u.builds == 1 for u in usage.values()))
+        check('多執行緒取用次數不遺漏', sum(u.requests for u in usage.values()) == 8 * per_thread)
+
+        # CSV 與環境變數
+        csv_path = Path(tmp) / 'merchants.csv'
+        csv_path.write_text('provider,merchant_id,hash_key,hash_iv,environment\n'
+                            'payuni,U1,' + 'k' * 32 + ',' + 'v' * 16 + ',production\n', encoding='utf-8')
+        check('CSV 金鑰檔', MerchantRegistry(csv_path).get('payuni', 'U1', 'production').mer_id == 'U1')
+        os.environ['TEST_MERCHANTS'] = json.dumps(make_merchants(3))
+        check('環境變數 JSON', MerchantRegistry.from_env('TEST_MERCHANTS').get('payuni', 'M00002').mer_id == 'M00002')
+        os.environ['TEST_MERCHANTS'] = str(csv_path)
+        check('環境變數檔案路徑', len(MerchantRegistry.from_env('TEST_MERCHANTS').merchants()) == 1)
+
+        # 耗時比較
+        credentials = {key: shared.credentials(*key) for key in keys}
+        started = time.perf_counter()
+        for i in range(args.count):
+            key = keys[i % len(keys)]
+            PROVIDERS[key[0]](credentials[key])
+        per_request = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for i in range(args.count):
+            shared.get(*keys[i % len(keys)])
+        cached = time.perf_counter() - started
+
+    print(f"\n   每次建立服務物件: {per_request / args.count * 1e6:.2f} us/次")
+    print(f"   registry.get:     {cached / args.count * 1e6:.2f} us/次 (含鎖、LRU 與使用統計)")
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+NewebPay NotifyURL 接收器測試 (newebpay_notify_server.py)
+
+驗證:
+- TradeSha 正確但內容有誤的通知 (Result 不是物件、Amt 不是數字、TradeInfo 無法解密)
+  只計入 decrypt_errors，之後的通知照常解析 (同步解密與 thread pool 皆同)
+- TradeSha 錯誤、表單不是 UTF-8 時回應 400
+- POST 內容超過 max_body_size 時回應 413 並關閉連線
+
+使用方法:
+    python test_newebpay_notify_server.py
+"""
+
+import asyncio
+import json
+import sys
+import urllib.parse
+from typing import Dict, List
+
+from newebpay_notify_server import (
+    DEMO_HASH_IV, DEMO_HASH_KEY, DEMO_MERCHANT_ID, NewebPayMPGService, NewebPayNotifyReceiver,
+)
+
+SERVICE = NewebPayMPGService(DEMO_MERCHANT_ID, DEMO_HASH_KEY, DEMO_HASH_IV)
+
+
+def notification(result, trade_info: str = None, trade_sha: str = None) -> bytes:
+    """已簽章的通知 POST body (result 原樣放入 TradeInfo 的 Result)"""
+    if trade_info is None:
+        trade_info = SERVICE.encrypt_text(json.dumps({'Status': 'SUCCESS', 'Message': '授權成功',
+                                                      'Result': result}, ensure_ascii=False))
+    return urllib.parse.urlencode({
+        'Status': 'SUCCESS',
+        'MerchantID': DEMO_MERCHANT_ID,
+        'TradeInfo': trade_info,
+        'TradeSha': trade_sha if trade_sha is not None else SERVICE.generate_trade_sha(trade_info),
+    }).encode('ascii')
+
+
+def valid_result(order_no: str) -> Dict:
+    return {'MerchantID': DEMO_MERCHANT_ID, 'Amt': 100, 'TradeNo': f'T{order_no}', 'MerchantOrderNo': order_no}
+
+
+async def post(receiver: NewebPayNotifyReceiver, body: bytes, content_length: int = None) -> str:
+    """送出一個請求並回傳 HTTP 狀態碼 (content_length 大於 body 時只送出標頭)"""
+    reader, writer = await asyncio.open_connection(receiver.host, receiver.port)
+    try:
+        length = len(body) if content_length is None else content_length
+        writer.write(f'POST {receiver.path} HTTP/1.1\r\nHost: {receiver.host}\r\n'
+                     f'Content-Type: application/x-www-form-urlencoded\r\n'
+                     f'Content-Length: {length}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body)
+        await writer.drain()
+        return (await reader.readline()).decode('latin-1').split(' ', 2)[1]
+    finally:
+        writer.close()
+
+
+async def test_bad_payloads(check, workers: int):
+    """壞資料只計入錯誤，不影響之後的通知"""
+    label = f'workers={workers}'
+    async with NewebPayNotifyReceiver(workers=workers, max_body_size=4096) as receiver:
+        bad = [
+            notification(['MPG-LIST']),                                  # Result 不是物件
+            notification({**valid_result('MPG-AMT'), 'Amt': 'abc'}),     # Amt 不是數字
+            notification(None, trade_info='00ff' * 8),                    # TradeSha 正確但無法解密
+        ]
+        statuses = [await post(receiver, body) for body in bad]
+        statuses.append(await post(receiver, notification(valid_result('MPG-OK'))))
+        await receiver.drain()
+
+        check(f'{label}: 內容有誤的通知計入 decrypt_errors，之後的通知照常解析 ({receiver.stats})',
+              statuses == ['200'] * 4 and receiver.stats.decrypt_errors == 3 and receiver.stats.decoded == 1
+              and (await receiver.get()).merchant_order_no == 'MPG-OK')
+
+        rejected = [await post(receiver, notification(valid_result('MPG-SHA'), trade_sha='0' * 64)),
+                    await post(receiver, b'TradeInfo=\xff\xfe&TradeSha=\xff')]
+        check(f'{label}: TradeSha 錯誤與非 UTF-8 表單回應 400', rejected == ['400', '400'])
+
+        oversized = await post(receiver, b'', content_length=1024 * 1024)
+        check(f'{label}: 超過 max_body_size 回應 413',
+              oversized == '413' and receiver.stats.oversized == 1
+              and await post(receiver, notification(valid_result('MPG-AFTER'))) == '200')
+        await receiver.drain()
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("NewebPay NotifyURL 接收器測試")
+    print("=" * 60 + "\n")
+
+    for workers in (0, 2):
+        asyncio.run(test_bad_payloads(check, workers))
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -33,6 +33,8 @@ try:
 except ImportError:
     HAS_CRYPTO = False
 
+from ecpay_checkmac import CheckMacValue
+
 
 # 平台設定
 PLATFORMS = {
@@ -73,12 +75,8 @@ PLATFORMS = {
 
 
 def generate_ecpay_mac(params: dict, hash_key: str, hash_iv: str) -> str:
-    """ECPay CheckMacValue (SHA256)"""
-    sorted_params = sorted(params.items())
-    param_str = '&'.join(f'{k}={v}' for k, v in sorted_params)
-    raw = f'HashKey={hash_key}&{param_str}&HashIV={hash_iv}'
-    encoded = urllib.parse.quote_plus(raw).lower()
-    return hashlib.sha256(encoded.encode('utf-8')).hexdigest().upper()
+    """ECPay CheckMacValue (SHA256，.NET 風格 URL Encode)"""
+    return CheckMacValue(hash_key, hash_iv).compute(params)
 
 
 def generate_newebpay_trade_info(params: dict, hash_key: str, hash_iv: str) -> str:
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+PAYUNi AES-256-GCM 加解密測試 (payuni_crypto.py)
+
+驗證:
+- encrypt / decrypt / checksum 與範例 PAYUNiPaymentService.encrypt_data / decrypt_data / generate_checksum
+  逐字相同，兩邊互相解密得到原本的資料
+- EncryptInfo 格式: hex(密文 + 16 bytes tag)，可直接以 pycryptodome 的 GCM 解密驗證
+- 竄改密文或 tag、長度不足、hex 格式錯誤丟出 ValueError；HashKey 長度錯誤丟出 ValueError
+- parse_query 與 parse_qs + 單值轉換相同 (空值略過、同名參數轉 list、+ 與 %xx、無 = 的片段)
+- verify_checksum 大小寫不敏感、get_cipher 依金鑰快取
+
+使用方法:
+    python test_payuni_crypto.py
+"""
+
+import hashlib
+import sys
+import urllib.parse
+from typing import List
+
+from Crypto.Cipher import AES
+
+from example_loader import load_example
+from payuni_crypto import TAG_SIZE, PAYUNiCipher, get_cipher, parse_query
+
+payuni = load_example('payuni-payment-example')
+
+MER_ID = 'U12345678'
+HASH_KEY = '12345678901234567890123456789012'
+HASH_IV = '1234567890123456'
+
+
+def reference_parse(text: str) -> dict:
+    """範例 decrypt_data 的解析方式"""
+    return {k: v[0] if len(v) == 1 else v for k, v in urllib.parse.parse_qs(text).items()}
+
+
+def test_compatibility(check):
+    """與範例實作相容"""
+    service = payuni.PAYUNiPaymentService(MER_ID, HASH_KEY, HASH_IV)
+    cipher = PAYUNiCipher(HASH_KEY, HASH_IV)
+
+    payloads = [
+        {'MerID': MER_ID, 'MerTradeNo': 'ORD001', 'TradeAmt': 1000, 'ProdDesc': '測試商品 x 1',
+         'Note': 'a&b=c+d 100%', 'Timestamp': 1700000000},
+        {'MerID': MER_ID, 'Status': 'SUCCESS', 'Message': '交易成功'},
+        {'A': 'x'},
+        *({'K': 'y' * n} for n in range(0, 40, 7)),
+    ]
+    encrypted = cipher.encrypt_many(payloads)
+    check(f'encrypt 與 encrypt_data 逐字相同 ({len(payloads)} 筆)',
+          encrypted == [service.encrypt_data(p) for p in payloads])
+    check('decrypt 與 decrypt_data 結果相同',
+          cipher.decrypt_many(encrypted) == [service.decrypt_data(e) for e in encrypted])
+    check('checksum 與 generate_checksum 相同',
+          all(cipher.checksum(e) == service.generate_checksum(e) for e in encrypted))
+
+    expected = hashlib.sha256((encrypted[0] + HASH_KEY + HASH_IV).encode()).hexdigest().upper()
+    check('checksum = SHA256(EncryptInfo + HashKey + HashIV) 大寫', cipher.checksum(encrypted[0]) == expected)
+
+    raw = bytes.fromhex(encrypted[0])
+    plain = AES.new(HASH_KEY.encode(), AES.MODE_GCM, nonce=HASH_IV.encode()).decrypt_and_verify(
+        raw[:-TAG_SIZE], raw[-TAG_SIZE:])
+    check('EncryptInfo 為 hex(密文 + tag)，可直接以 GCM 解密為查詢字串',
+          plain.decode() == urllib.parse.urlencode(payloads[0]))
+    check('範例加密的資料可由 cipher 解密，反之亦然',
+          cipher.decrypt(service.encrypt_data(payloads[0])) == service.decrypt_data(cipher.encrypt(payloads[0])))
+
+
+def test_errors(check):
+    """錯誤處理"""
+    cipher = PAYUNiCipher(HASH_KEY, HASH_IV)
+    encrypted = cipher.encrypt({'MerID': MER_ID, 'TradeAmt': 100})
+    flip = {'0': '1'}
+
+    def flipped(index: int) -> str:
+        return encrypted[:index] + flip.get(encrypted[index], '0') + encrypted[index + 1:]
+
+    cases = {
+        '竄改密文': flipped(0),
+        '竄改 tag': flipped(len(encrypted) - 1),
+        '只有 tag': encrypted[-TAG_SIZE * 2:],
+        '空資料': '',
+        'hex 格式錯誤': 'zz' + encrypted[2:],
+        '金鑰不同': PAYUNiCipher('x' * 32, HASH_IV).encrypt({'A': 1}),
+    }
+    failed = []
+    for name, data in cases.items():
+        try:
+            cipher.decrypt(data)
+            failed.append(name)
+        except ValueError:
+            pass
+    check(f'解密錯誤丟出 ValueError ({len(cases) - len(failed)}/{len(cases)})', not failed)
+
+    rejected = 0
+    for key, iv in ((HASH_KEY[:31], HASH_IV), (HASH_KEY, '')):
+        try:
+            PAYUNiCipher(key, iv)
+        except ValueError:
+            rejected += 1
+    check('HashKey 長度錯誤或 HashIV 為空丟出 ValueError', rejected == 2)
+
+
+def test_parse_query(check):
+    """查詢字串解析"""
+    samples = [
+        'A=1&B=&C=x+y%26z&A=2&D',
+        'Message=%E4%BA%A4%E6%98%93%E6%88%90%E5%8A%9F&Amt=100',
+        'a%2Bb=1+2&a+b=3',
+        'X=1&X=2&X=3',
+        '=v&K==&&P=%',
+        '',
+    ]
+    mismatched = [s for s in samples if parse_query(s) != reference_parse(s)]
+    check(f'parse_query 與 parse_qs + 單值轉換相同 ({len(samples) - len(mismatched)}/{len(samples)})',
+          not mismatched)
+    check('空值略過、同名參數轉 list',
+          parse_query('A=1&B=&A=2') == {'A': ['1', '2']})
+
+
+def test_checksum(check):
+    """Checksum 驗證與快取"""
+    cipher = get_cipher(HASH_KEY, HASH_IV)
+    encrypted = cipher.encrypt({'MerID': MER_ID})
+    checksum = cipher.checksum(encrypted)
+    check('verify_checksum 大小寫不敏感',
+          cipher.verify_checksum(encrypted, checksum) and cipher.verify_checksum(encrypted, checksum.lower()))
+    check('竄改 EncryptInfo 時 verify_checksum 失敗', not cipher.verify_checksum(encrypted + '00', checksum))
+    check('get_cipher 依金鑰快取',
+          get_cipher(HASH_KEY, HASH_IV) is cipher and get_cipher('x' * 32, HASH_IV) is not cipher)
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("PAYUNi AES-256-GCM 加解密測試")
+    print("=" * 60 + "\n")
+
+    test_compatibility(check)
+    test_errors(check)
+    test_parse_query(check)
+    test_checksum(check)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
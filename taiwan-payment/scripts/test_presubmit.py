@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+送出前規則檢查測試 (presubmit.py)
+
+驗證:
+- 三家服務商正確的訂單資料通過
+- 每條規則回報 error-codes.csv 對應的錯誤碼 (10100050 金額錯誤、INVALID_PAYMENT_TYPE...)
+- 金額超出 payment-methods.csv 的付款方式上下限 (超商代碼 30 ~ 20000)
+- record() 後同一訂單編號預測為重複，不同服務商各自獨立，LRU 容量固定
+並量測每筆檢查的耗時。
+
+使用方法:
+    python test_presubmit.py
+"""
+
+import dataclasses
+import sys
+import time
+from typing import List
+
+from example_loader import load_example
+from presubmit import PresubmitChecker, RecentKeys
+
+ecpay = load_example('ecpay-payment-example')
+newebpay = load_example('newebpay-payment-example')
+payuni = load_example('payuni-payment-example')
+
+ECPAY_ORDER = ecpay.PaymentOrderData(
+    merchant_trade_no='ORD001', total_amount=1000, trade_desc='測試交易', item_name='測試商品',
+    return_url='https://example.com/notify', choose_payment='Credit',
+    merchant_trade_date='2024/01/15 12:00:00',
+)
+NEWEBPAY_ORDER = newebpay.MPGOrderData(
+    merchant_order_no='ORD001', amt=1000, item_desc='測試商品', email='test@example.com',
+    return_url='https://example.com/return', enable_credit=True, enable_cvs=True,
+)
+PAYUNI_ORDER = payuni.PaymentOrderData(
+    mer_trade_no='ORD001', trade_amt=1000, prod_desc='測試商品', return_url='https://example.com/return',
+    notify_url='https://example.com/notify', pay_type='CVS',
+)
+
+
+def codes(checker: PresubmitChecker, data) -> List[str]:
+    return [violation.code for violation in checker.check(data)]
+
+
+def test_rules(check):
+    """規則"""
+    checker = PresubmitChecker()
+    check('三家服務商正確的訂單通過',
+          not checker.check(ECPAY_ORDER) and not checker.check(NEWEBPAY_ORDER) and not checker.check(PAYUNI_ORDER))
+
+    replace = dataclasses.replace
+    cases = [
+        ('ECPay 金額為 0', replace(ECPAY_ORDER, total_amount=0), '10100050'),
+        ('ECPay 金額為小數', replace(ECPAY_ORDER, total_amount=99.5), '10100050'),
+        ('ECPay 超商代碼低於 30 元', replace(ECPAY_ORDER, choose_payment='CVS', total_amount=20), '10100050'),
+        ('ECPay ATM 超過 49999 元', replace(ECPAY_ORDER, choose_payment='ATM', total_amount=50000), '10100050'),
+        ('ECPay 訂單編號含符號', replace(ECPAY_ORDER, merchant_trade_no='ORD-001'), '10100001'),
+        ('ECPay 交易時間格式', replace(ECPAY_ORDER, merchant_trade_date='2024-01-15 12:00:00'), '10100001'),
+        ('NewebPay 金額為負數', replace(NEWEBPAY_ORDER, amt=-1), 'AMT-001'),
+        ('NewebPay Email 格式', replace(NEWEBPAY_ORDER, email='test@'), 'TRA10001'),
+        ('NewebPay 未啟用付款方式', replace(NEWEBPAY_ORDER, enable_credit=False, enable_cvs=False), 'TRA10001'),
+        ('PAYUNi 不支援的支付方式', replace(PAYUNI_ORDER, pay_type='LinePay'), 'INVALID_PAYMENT_TYPE'),
+        ('PAYUNi 超商代碼超過 20000 元', replace(PAYUNI_ORDER, trade_amt=30000), 'INVALID_AMOUNT'),
+    ]
+    missed = [f'{name} {codes(checker, data)}' for name, data, code in cases if code not in codes(checker, data)]
+    check(f'{len(cases)} 種必定失敗的訂單皆預測出錯誤碼 {missed or ""}', not missed)
+
+    check('NewebPay 只要有一種付款方式接受金額即通過 (超商代碼 + 信用卡，50000 元)',
+          not checker.check(replace(NEWEBPAY_ORDER, amt=50000))
+          and codes(checker, replace(NEWEBPAY_ORDER, amt=50000, enable_credit=False)) == ['AMT-001'])
+
+    violation = checker.check(replace(PAYUNI_ORDER, pay_type='LinePay'))[0]
+    check(f'Violation 帶有 error-codes.csv 的說明 ({violation})',
+          violation.info.message == '不支援的支付方式' and not violation.info.is_retryable)
+
+
+def test_duplicates(check):
+    """重複訂單編號"""
+    checker = PresubmitChecker()
+    for order in (ECPAY_ORDER, NEWEBPAY_ORDER, PAYUNI_ORDER):
+        checker.record(order)
+    check('record() 後同一訂單編號預測為重複 (10100003 / MPG03009 / DUPLICATE_ORDER)',
+          codes(checker, ECPAY_ORDER) == ['10100003'] and codes(checker, NEWEBPAY_ORDER) == ['MPG03009']
+          and codes(checker, PAYUNI_ORDER) == ['DUPLICATE_ORDER'])
+
+    other = PresubmitChecker()
+    other.record(ECPAY_ORDER)
+    check('不同服務商的同一訂單編號各自獨立',
+          not other.check(NEWEBPAY_ORDER) and not other.check(PAYUNI_ORDER))
+
+    recent = RecentKeys(capacity=2)
+    for key in 'abc':
+        recent.put(key)
+    check('LRU 容量固定', len(recent) == 2 and 'a' not in recent and 'c' in recent)
+
+    try:
+        checker.check(object())
+        check('未知資料類別丟出 TypeError', False)
+    except TypeError:
+        check('未知資料類別丟出 TypeError', True)
+
+
+def benchmark(count: int = 100_000):
+    """每筆檢查耗時"""
+    checker = PresubmitChecker()
+    orders = [ECPAY_ORDER, NEWEBPAY_ORDER, PAYUNI_ORDER]
+    started = time.perf_counter()
+    for i in range(count):
+        checker.check(orders[i % 3])
+    elapsed = time.perf_counter() - started
+    print(f"\n   {count:,} 筆訂單檢查: 每筆 {elapsed / count * 1e6:.1f} µs ({count / elapsed:,.0f} 筆/秒)")
+
+
+def main():
+    failures: List[str] = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("送出前規則檢查測試")
+    print("=" * 60 + "\n")
+
+    test_rules(check)
+    test_duplicates(check)
+    benchmark()
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+付款回呼對帳測試 (reconcile.py)
+
+產生三家服務商混合的回呼紀錄與訂單帳本，並注入已知差異，驗證:
+- field-mappings.csv 正規化 (ECPay / NewebPay Result / PAYUNi)
+- 五種差異 (amount / status / duplicate / missing_order / missing_callback) 的數量
+- 同一筆交易重送通知不視為重複扣款
+- 強制再分割時結果與一般分割相同
+- 資料量放大 4 倍時記憶體峰值不隨之成長
+
+使用方法:
+    python test_reconcile.py
+    python test_reconcile.py --count 200000
+"""
+
+import argparse
+import io
+import json
+import sys
+import tempfile
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from reconcile import PaymentReconciler, normalize_callback, read_records
+
+
+def make_callback(provider: str, order_id: str, amount: int, trade_no: str, paid: bool = True) -> Dict:
+    """產生各服務商格式的回呼"""
+    if provider == 'ecpay':
+        return {'MerchantID': '3002607', 'MerchantTradeNo': order_id, 'TradeNo': trade_no,
+                'TradeAmt': str(amount), 'RtnCode': '1' if paid else '10100058', 'RtnMsg': 'OK'}
+    if provider == 'newebpay':
+        return {'Status': 'SUCCESS' if paid else 'MPG03009', 'Message': 'OK',
+                'Result': {'MerchantID': 'MS1', 'MerchantOrderNo': order_id, 'Amt': amount, 'TradeNo': trade_no}}
+    return {'Status': 'SUCCESS', 'Message': 'OK', 'MerID': 'U1', 'MerTradeNo': order_id,
+            'TradeNo': trade_no, 'TradeAmt': amount, 'TradeStatus': '1' if paid else '2'}
+
+
+def generate(count: int) -> Tuple[Iterator[Dict], Iterator[Dict], Counter]:
+    """
+    產生回呼與訂單 (皆為 iterator)，並回傳預期的差異數量
+
+    每 100 筆訂單注入: 金額錯誤 1、訂單未付款 1、重複扣款 1、訂單已付款但無回呼 1、
+    訂單已付款但付款失敗 1、重送通知 1；另有 count // 100 筆找不到訂單的回呼。
+    """
+    providers = ('ecpay', 'newebpay', 'payuni')
+    expected = Counter()
+    for i in range(count):
+        kind = i % 100
+        if kind in (0, 1, 2, 3, 4):
+            expected[('amount', 'status', 'duplicate', 'missing_callback', 'status')[kind]] += 1
+    expected['missing_order'] = count // 100
+
+    def orders() -> Iterator[Dict]:
+        for i in range(count):
+            status = 'pending' if i % 100 == 1 else 'paid'
+            yield {'order_id': f'ORD{i:09d}', 'amount': str(100 + i % 997), 'status': status}
+
+    def callbacks() -> Iterator[Dict]:
+        for i in range(count):
+            kind = i % 100
+            provider = providers[i % 3]
+            order_id = f'ORD{i:09d}'
+            amount = 100 + i % 997
+            if kind == 3:
+                continue
+            if kind == 4:
+                yield make_callback(provider, order_id, amount, f'T{i}', paid=False)
+                continue
+            yield make_callback(provider, order_id, amount + (1 if kind == 0 else 0), f'T{i}')
+            if kind == 2:
+                yield make_callback(provider, order_id, amount, f'T{i}-2')
+            if kind == 5:
+                yield make_callback(provider, order_id, amount, f'T{i}')  # 重送
+        for i in range(count // 100):
+            yield make_callback(providers[i % 3], f'GHOST{i:07d}', 100, f'G{i}')
+
+    return callbacks(), orders(), expected
+
+
+def run(count: int, **options) -> Tuple[Counter, List[Dict], object]:
+    callbacks, orders, expected = generate(count)
+    output = io.StringIO()
+    result = PaymentReconciler(**options).run(callbacks, orders, output)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    return expected, records, result
+
+
+def peak_memory(count: int, **options) -> int:
+    callbacks, orders, _ = generate(count)
+    with open(tempfile.mktemp(suffix='.jsonl'), 'w', encoding='utf-8') as output:
+        tracemalloc.start()
+        PaymentReconciler(**options).run(callbacks, orders, output)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    Path(output.name).unlink()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='付款回呼對帳測試')
+    parser.add_argument('--count', type=int, default=20000, help='訂單數 (預設: 20000)')
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("付款回呼對帳測試")
+    print("=" * 60 + "\n")
+
+    # 正規化
+    newebpay = normalize_callback({'Status': 'SUCCESS', 'Result': json.dumps({'MerchantOrderNo': 'A1', 'Amt': 50})})
+    payuni = normalize_callback(make_callback('payuni', 'B1', 70, 'T', paid=False))
+    ecpay = normalize_callback(make_callback('ecpay', 'C1', 90, 'T'))
+    check('NewebPay Result 字串解析', (newebpay['provider'], newebpay['order_id'], newebpay['amount'],
+                                        newebpay['paid']) == ('newebpay', 'A1', 50, True))
+    check('PAYUNi TradeStatus 失敗', (payuni['provider'], payuni['paid']) == ('payuni', False))
+    check('ECPay TradeAmt 對應 amount', (ecpay['provider'], ecpay['amount']) == ('ecpay', 90))
+
+    # 差異數量
+    expected, records, result = run(args.count)
+    actual = Counter(r['type'] for r in records)
+    check(f'差異數量 {dict(actual)}', actual == expected and result.mismatches == expected)
+    check('重送通知不視為重複扣款', not any(r['type'] == 'duplicate' and int(r['order_id'][3:]) % 100 == 5
+                                     for r in records))
+    check(f'相符筆數 ({result.matched})',
+          result.matched == args.count - expected['amount'] - expected['status'] - expected['missing_callback'])
+
+    # 強制再分割
+    _, small_records, small_result = run(args.count, partitions=8, max_partition_bytes=64 * 1024)
+    key = lambda r: (r['type'], r['order_id'], r.get('trade_no', ''))
+    check(f'再分割結果一致 (再分割 {small_result.repartitioned} 次)',
+          small_result.repartitioned > 0 and sorted(map(key, small_records)) == sorted(map(key, records)))
+
+    # 記憶體上限: 單一分割不超過 max_partition_bytes，資料量 4 倍時峰值不應成長 2 倍以上
+    options = {'partitions': 16, 'max_partition_bytes': 64 * 1024}
+    small_peak = peak_memory(args.count // 4, **options)
+    large_peak = peak_memory(args.count, **options)
+    check(f'記憶體峰值有上限 ({small_peak / 1024:.0f} KB → {large_peak / 1024:.0f} KB)',
+          large_peak < small_peak * 2)
+
+    # 檔案輸入 (CSV 訂單 + JSONL 回呼)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        (tmp / 'orders.csv').write_text('order_id,amount,status\nX1,100,paid\nX2,200,paid\n', encoding='utf-8')
+        (tmp / 'callbacks.jsonl').write_text(
+            json.dumps(make_callback('ecpay', 'X1', 100, 'T1')) + '\n', encoding='utf-8')
+        output = io.StringIO()
+        file_result = PaymentReconciler().run(read_records(tmp / 'callbacks.jsonl'),
+                                              read_records(tmp / 'orders.csv'), output)
+        check('CSV / JSONL 檔案輸入', file_result.matched == 1
+              and json.loads(output.getvalue())['type'] == 'missing_callback')
+
+        # 壞資料: 格式錯誤的行、非物件紀錄只計為格式錯誤；帳本重複的訂單編號回報 duplicate_order
+        (tmp / 'bad.jsonl').write_text('\n'.join([
+            json.dumps(make_callback('ecpay', 'X1', 100, 'T1')),
+            '{"MerchantTradeNo": ',
+            '[1, 2]',
+            '"text"',
+            json.dumps({'Status': 'SUCCESS', 'Result': ['X2']}),
+        ]) + '\n', encoding='utf-8')
+        (tmp / 'orders.jsonl').write_text('\n'.join([
+            json.dumps({'order_id': 'X1', 'amount': 100, 'status': 'paid'}),
+            json.dumps({'order_id': 'X1', 'amount': 150, 'status': 'paid'}),
+            'null',
+        ]) + '\n', encoding='utf-8')
+        errors = []
+        output = io.StringIO()
+        bad_result = PaymentReconciler().run(
+            read_records(tmp / 'bad.jsonl', on_error=lambda line_no, error: errors.append(line_no)),
+            read_records(tmp / 'orders.jsonl'), output)
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        check(f'壞資料計為格式錯誤後繼續 (無法解析: 第 {errors} 行，格式錯誤 {bad_result.invalid} 筆)',
+              errors == [2] and bad_result.invalid == 4 and bad_result.matched == 1)
+        check('帳本重複的訂單編號回報 duplicate_order (以第一筆對帳)',
+              [(r['type'], r['order_amount'], r['first_order_amount']) for r in records]
+              == [('duplicate_order', 150, 100)])
+        try:
+            list(read_records(tmp / 'bad.jsonl'))
+            check('未指定 on_error 時格式錯誤丟出 ValueError', False)
+        except ValueError:
+            check('未指定 on_error 時格式錯誤丟出 ValueError', True)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+金流沙箱測試 (sandbox_server.py)
+
+以範例服務類別與 test_payment.py 的簽章方式對本機沙箱發送請求，驗證:
+- ECPay / NewebPay / PAYUNi 的建立訂單與查詢回應格式、簽章可被 client 驗證
+- 簽章錯誤時回應對應的錯誤碼
+- 延遲分佈的抽樣統計
+- 錯誤注入比例與錯誤碼皆來自 data/error-codes.csv
+- 限流回應 429 + Retry-After，放行數量符合 token bucket
+- ProviderSandbox 為抽象類別；sandbox_core.py 三個技能的副本內容相同
+- HTTP 503 與斷線注入
+並量測多執行緒 client 的吞吐量。
+
+使用方法:
+    python test_sandbox_server.py
+    python test_sandbox_server.py --threads 16 --count 2000 --latency lognormal:20,0.5
+"""
+
+import argparse
+import hashlib
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+import requests
+
+from ecpay_checkmac import CheckMacValue
+from example_loader import load_example
+from sandbox_core import ProviderSandbox, Response
+from sandbox_server import (
+    DEFAULT_MERCHANTS, LatencyModel, PaymentSandbox, SandboxPolicy, SandboxThread, load_error_codes,
+)
+from test_payment import generate_ecpay_mac
+
+# sandbox_core.py 有副本的技能
+SKILLS = ('taiwan-invoice', 'taiwan-payment', 'taiwan-logistics')
+
+ecpay = load_example('ecpay-payment-example')
+newebpay = load_example('newebpay-payment-example')
+payuni = load_example('payuni-payment-example')
+
+ECPAY_ID = '3002607'
+NEWEBPAY_ID, PAYUNI_ID = next(iter(DEFAULT_MERCHANTS['newebpay'])), next(iter(DEFAULT_MERCHANTS['payuni']))
+
+
+def payuni_service(base_url: str):
+    service = payuni.PAYUNiPaymentService(PAYUNI_ID, *DEFAULT_MERCHANTS['payuni'][PAYUNI_ID])
+    service.api_url = base_url + '/api/upp'
+    service.query_url = base_url + '/api/trade_query'
+    return service
+
+
+def payuni_order(order_no: str, amount: int = 100):
+    return payuni.PaymentOrderData(mer_trade_no=order_no, trade_amt=amount, prod_desc='測試商品',
+                                   return_url='https://example.com/return',
+                                   notify_url='https://example.com/notify', pay_type='Credit')
+
+
+def payuni_query(session: requests.Session, service, order_no: str) -> requests.Response:
+    encrypt_info = service.encrypt_data({'MerID': PAYUNI_ID, 'MerTradeNo': order_no, 'Timestamp': int(time.time())})
+    return session.post(service.query_url, data={'MerID': PAYUNI_ID, 'Version': '1.0', 'EncryptInfo': encrypt_info,
+                                                 'HashInfo': service.generate_checksum(encrypt_info)}, timeout=10)
+
+
+def check_formats(check) -> None:
+    """三家服務商的請求 / 回應格式"""
+    with SandboxThread(PaymentSandbox()) as sandbox:
+        session = requests.Session()
+
+        # ECPay: create_order 的表單直接送到 AioCheckOut，再以 test_payment.py 的方式查詢
+        service = ecpay.ECPayPaymentService(ECPAY_ID, *DEFAULT_MERCHANTS['ecpay'][ECPAY_ID])
+        order = service.create_order(ecpay.PaymentOrderData(
+            merchant_trade_no='SBX0001', total_amount=1200, trade_desc='沙箱', item_name='測試商品',
+            return_url='https://example.com/notify', choose_payment='Credit'))
+        checkout = session.post(sandbox.url + '/Cashier/AioCheckOut/V5', data=order.form_data)
+        params = {'MerchantID': ECPAY_ID, 'MerchantTradeNo': 'SBX0001', 'TimeStamp': int(time.time())}
+        params['CheckMacValue'] = generate_ecpay_mac(params, *DEFAULT_MERCHANTS['ecpay'][ECPAY_ID])
+        result = dict(urllib.parse.parse_qsl(session.post(sandbox.url + '/Cashier/QueryTradeInfo/V5',
+                                                          data=params).text, keep_blank_values=True))
+        check('ECPay 建立訂單與查詢 (CheckMacValue 可驗證)',
+              checkout.status_code == 200 and result.get('TradeStatus') == '1' and result.get('TradeAmt') == '1200'
+              and CheckMacValue(*DEFAULT_MERCHANTS['ecpay'][ECPAY_ID]).verify(result))
+        params['CheckMacValue'] = '0' * 64
+        result = dict(urllib.parse.parse_qsl(session.post(sandbox.url + '/Cashier/QueryTradeInfo/V5',
+                                                          data=params).text, keep_blank_values=True))
+        check('ECPay CheckMacValue 錯誤回應 10100058', result.get('RtnCode') == '10100058')
+
+        # NewebPay: MPG 表單 + QueryTradeInfo (CheckValue / CheckCode)
+        hash_key, hash_iv = DEFAULT_MERCHANTS['newebpay'][NEWEBPAY_ID]
+        service = newebpay.NewebPayMPGService(NEWEBPAY_ID, hash_key, hash_iv)
+        order = service.create_order(newebpay.MPGOrderData(
+            merchant_order_no='SBX0002', amt=880, item_desc='測試商品', email='test@example.com',
+            return_url='https://example.com/return'))
+        gateway = session.post(sandbox.url + '/MPG/mpg_gateway', data={
+            'MerchantID': NEWEBPAY_ID, 'TradeInfo': order.trade_info, 'TradeSha': order.trade_sha,
+            'Version': order.version})
+        check_value = hashlib.sha256(f'IV={hash_iv}&Amt=880&MerchantID={NEWEBPAY_ID}&MerchantOrderNo=SBX0002'
+                                     f'&Key={hash_key}'.encode()).hexdigest().upper()
+        query = session.post(sandbox.url + '/API/QueryTradeInfo', data={
+            'MerchantID': NEWEBPAY_ID, 'Version': '1.3', 'RespondType': 'JSON', 'CheckValue': check_value,
+            'TimeStamp': int(time.time()), 'MerchantOrderNo': 'SBX0002', 'Amt': 880}).json()
+        trade = query.get('Result', {})
+        check_params = urllib.parse.urlencode(sorted((k, trade.get(k)) for k in
+                                                     ('Amt', 'MerchantID', 'MerchantOrderNo', 'TradeNo')))
+        check_code = hashlib.sha256(f'HashIV={hash_iv}&{check_params}&HashKey={hash_key}'
+                                    .encode()).hexdigest().upper()
+        check('NewebPay MPG 與查詢 (CheckCode 可驗證)',
+              gateway.status_code == 200 and query['Status'] == 'SUCCESS' and trade.get('CheckCode') == check_code)
+
+        # PAYUNi: 直接使用範例的 create_order (EncryptInfo / HashInfo)
+        service = payuni_service(sandbox.url)
+        created = service.create_order(payuni_order('SBX0003', 300))
+        duplicate = service.create_order(payuni_order('SBX0003', 300))
+        queried = service.decrypt_data(payuni_query(session, service, 'SBX0003').json()['EncryptInfo'])
+        check('PAYUNi create_order 與 trade_query',
+              created.success and created.trade_no and created.payment_url
+              and queried['TradeNo'] == created.trade_no and queried['TradeAmt'] == '300')
+        check('PAYUNi 重複訂單回應 DUPLICATE_ORDER',
+              not duplicate.success and duplicate.error_code == 'DUPLICATE_ORDER')
+
+
+def check_policy(check) -> None:
+    """延遲分佈、錯誤注入、限流、503 與斷線"""
+    rng = random.Random(1)
+    samples = {spec: [LatencyModel.parse(spec).sample(rng) * 1000 for _ in range(20000)]
+               for spec in ('fixed:20', 'uniform:10,30', 'normal:20,5', 'lognormal:20,0.5', 'exponential:20')}
+    means = {spec: statistics.fmean(values) for spec, values in samples.items()}
+    check('延遲分佈抽樣 (平均值 / 中位數)',
+          means['fixed:20'] == 20 and abs(means['uniform:10,30'] - 20) < 0.5 and abs(means['normal:20,5'] - 20) < 0.5
+          and abs(statistics.median(samples['lognormal:20,0.5']) - 20) < 1 and abs(means['exponential:20'] - 20) < 1)
+
+    # 伺服器端延遲
+    with SandboxThread(PaymentSandbox(SandboxPolicy(latency=LatencyModel.parse('fixed:30')))) as sandbox:
+        session = requests.Session()
+        service = payuni_service(sandbox.url)
+        elapsed = []
+        for i in range(10):
+            started = time.perf_counter()
+            payuni_query(session, service, f'NONE{i}')
+            elapsed.append(time.perf_counter() - started)
+    check(f'回應延遲套用 (中位數 {statistics.median(elapsed) * 1000:.1f} ms)',
+          0.03 <= statistics.median(elapsed) < 0.06)
+
+    # 錯誤碼注入
+    policy = SandboxPolicy(error_rate=0.3, seed=7)
+    with SandboxThread(PaymentSandbox(policy)) as sandbox:
+        session = requests.Session()
+        service = payuni_service(sandbox.url)
+        results = [service.create_order(payuni_order(f'INJ{i:05d}')) for i in range(1000)]
+        injected = sandbox.stats.injected
+    csv_codes = {code for code, _ in load_error_codes()['payuni']}
+    failed = Counter(r.error_code for r in results if not r.success)
+    check(f'錯誤注入比例 ({sum(failed.values()) / len(results):.1%}，預期 30%)',
+          abs(sum(failed.values()) / len(results) - 0.3) < 0.05 and sum(injected.values()) == sum(failed.values()))
+    check(f'注入的錯誤碼皆來自 error-codes.csv ({len(failed)} 種)', set(failed) <= csv_codes and len(failed) > 5)
+
+    policy = SandboxPolicy(error_rate=1.0, error_codes={'payuni': ['API_TIMEOUT']})
+    with SandboxThread(PaymentSandbox(policy)) as sandbox:
+        result = payuni_service(sandbox.url).create_order(payuni_order('ONLY0001'))
+    check('限定注入的錯誤碼', result.error_code == 'API_TIMEOUT' and result.message == 'API 請求逾時')
+
+    # 限流: 每秒 20 筆、瞬間容量 5；0.5 秒內連續送出
+    with SandboxThread(PaymentSandbox(SandboxPolicy(rate_limit=20, burst=5))) as sandbox:
+        session = requests.Session()
+        service = payuni_service(sandbox.url)
+        statuses, retry_after = Counter(), set()
+        started = time.perf_counter()
+        while time.perf_counter() - started < 0.5:
+            response = payuni_query(session, service, 'RATE')
+            statuses[response.status_code] += 1
+            if response.status_code == 429:
+                retry_after.add(response.headers.get('Retry-After'))
+        elapsed = time.perf_counter() - started
+    allowed = 5 + 20 * elapsed
+    check(f'限流回應 429 + Retry-After (放行 {statuses[200]}，上限約 {allowed:.0f}，拒絕 {statuses[429]})',
+          statuses[429] > 0 and retry_after == {'1'} and statuses[200] <= allowed + 1)
+
+    # 503 與斷線
+    with SandboxThread(PaymentSandbox(SandboxPolicy(http_error_rate=0.5, drop_rate=0.2, seed=3))) as sandbox:
+        outcomes = Counter()
+        service = payuni_service(sandbox.url)
+        for i in range(200):
+            try:
+                outcomes[payuni_query(requests.Session(), service, 'X').status_code] += 1
+            except requests.ConnectionError:
+                outcomes['drop'] += 1
+        stats = sandbox.stats
+    check(f'HTTP 503 與斷線注入 {dict(outcomes)}',
+          outcomes[503] == stats.http_errors and outcomes['drop'] == stats.dropped
+          and 60 < outcomes[503] < 140 and 20 < outcomes['drop'] < 60)
+
+
+def core_copy_mismatches() -> List[str]:
+    """
+    sandbox_core.py 在三個技能各有一份，內容必須相同
+
+    Returns:
+        內容不同的技能目錄 (技能單獨安裝、找不到其他副本時為空)
+    """
+    scripts_dir = Path(__file__).resolve().parent
+    source = (scripts_dir / 'sandbox_core.py').read_bytes()
+    mismatched = []
+    for skill in SKILLS:
+        copy = scripts_dir.parent.parent / skill / 'scripts' / 'sandbox_core.py'
+        if copy.exists() and copy.read_bytes() != source:
+            mismatched.append(skill)
+    return mismatched
+
+
+def check_core(check) -> None:
+    """共用部分 (sandbox_core.py)"""
+    class Incomplete(ProviderSandbox):
+        def error_response(self, provider, code, message):
+            return Response.json({'code': code})
+
+    rejected = 0
+    for cls in (ProviderSandbox, Incomplete):
+        try:
+            cls()
+        except TypeError:
+            rejected += 1
+    check('ProviderSandbox 為抽象類別 (未實作 error_codes / error_response 不可建立)', rejected == 2)
+
+    mismatched = core_copy_mismatches()
+    check(f"sandbox_core.py 三個技能的副本一致{' (' + ', '.join(mismatched) + ')' if mismatched else ''}",
+          not mismatched)
+
+
+def benchmark(threads: int, count: int, latency: str) -> None:
+    """多執行緒 client 對沙箱的吞吐量 (PAYUNi create_order)"""
+    policy = SandboxPolicy(latency=LatencyModel.parse(latency), seed=1)
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    with SandboxThread(PaymentSandbox(policy)) as sandbox:
+        def worker(offset: int):
+            service = payuni_service(sandbox.url)
+            local = []
+            for i in range(offset, count, threads):
+                started = time.perf_counter()
+                service.create_order(payuni_order(f'BEN{i:08d}'))
+                local.append(time.perf_counter() - started)
+            with lock:
+                latencies.extend(local)
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"\n   吞吐量 ({threads} 執行緒, {count} 筆, 延遲 {latency}): {count / elapsed:,.0f} 筆/秒")
+    print(f"   p50 {latencies[len(latencies) // 2] * 1000:.1f} ms   "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='金流沙箱測試')
+    parser.add_argument('--threads', type=int, default=8, help='吞吐量量測的執行緒數 (預設: 8)')
+    parser.add_argument('--count', type=int, default=800, help='吞吐量量測的請求數 (預設: 800)')
+    parser.add_argument('--latency', default='lognormal:10,0.5', help='吞吐量量測的延遲分佈')
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(name: str, passed: bool):
+        print(f"   {'[PASS]' if passed else '[FAIL]'} {name}")
+        if not passed:
+            failures.append(name)
+
+    print("=" * 60)
+    print("金流沙箱測試")
+    print("=" * 60 + "\n")
+
+    check_formats(check)
+    check_policy(check)
+    check_core(check)
+    benchmark(args.threads, args.count, args.latency)
+
+    print("\n" + "=" * 60)
+    print(f"[FAIL] {', '.join(failures)}" if failures else "[DONE] 測試完成")
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())